@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+对比引擎性能基准测试
+
+在临时SQLite数据库中创建两组50个字段的表（有主键/无主键），
+分别测量按主键对比和按位置对比每秒处理的行数。
+
+用法: python benchmark_comparison.py [--rows 200000] [--diff-every 1000] [--repeat 3]
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from table_diff import TableComparator, SQLiteAdapter
+
+FIELD_COUNT = 50
+
+
+def create_benchmark_database(db_path: str, rows: int, diff_every: int):
+    """创建50个字段的基准测试表，每diff_every行有一行数据不同"""
+    conn = sqlite3.connect(db_path)
+    fields = [f"field_{i:02d}" for i in range(FIELD_COUNT)]
+    columns = ", ".join(f"{field} TEXT" for field in fields)
+    placeholders = ", ".join("?" for _ in range(FIELD_COUNT + 1))
+    for table, key in (('bench_pk1', 'INTEGER PRIMARY KEY'), ('bench_pk2', 'INTEGER PRIMARY KEY'),
+                       ('bench_heap1', 'INTEGER'), ('bench_heap2', 'INTEGER')):
+        conn.execute(f"CREATE TABLE {table} (id {key}, {columns})")
+
+    batch1 = []
+    batch2 = []
+    for i in range(rows):
+        values = [i] + [f"value_{j:02d}_{i}" for j in range(FIELD_COUNT)]
+        batch1.append(values)
+        if i % diff_every == 0:
+            values = list(values)
+            values[FIELD_COUNT // 2] = "changed"
+        batch2.append(values)
+        if len(batch1) >= 10000:
+            for table, batch in (('bench_pk1', batch1), ('bench_heap1', batch1),
+                                 ('bench_pk2', batch2), ('bench_heap2', batch2)):
+                conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", batch)
+            batch1 = []
+            batch2 = []
+    for table, batch in (('bench_pk1', batch1), ('bench_heap1', batch1),
+                         ('bench_pk2', batch2), ('bench_heap2', batch2)):
+        conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", batch)
+    conn.commit()
+    conn.close()
+
+
+def run_benchmark(db_path: str, table1: str, table2: str, repeat: int) -> tuple:
+    """运行对比并返回(最佳耗时, 处理行数, 差异数)"""
+    adapter = SQLiteAdapter()
+    adapter.connect(db_path=db_path)
+    best = None
+    result = None
+    try:
+        for _ in range(repeat):
+            comparator = TableComparator(adapter)
+            comparator.set_tables(table1, table2)
+            start = time.perf_counter()
+            result = comparator.compare()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        adapter.close()
+    rows = result['table1_row_count'] + result['table2_row_count']
+    return best, rows, len(result['row_differences'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比引擎性能基准测试')
+    parser.add_argument('--rows', type=int, default=200000, help='每个表的行数 (默认: 200000)')
+    parser.add_argument('--diff-every', type=int, default=1000, help='每隔多少行产生一行差异 (默认: 1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='每项测试重复次数，取最快一次 (默认: 3)')
+    args = parser.parse_args()
+
+    # 基准测试只关心耗时，关闭对比过程中的日志输出
+    logging.getLogger().setLevel(logging.WARNING)
+
+    temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+    temp_db.close()
+    try:
+        print(f"创建基准测试数据: 每个表 {args.rows} 行, {FIELD_COUNT + 1} 个字段")
+        create_benchmark_database(temp_db.name, args.rows, args.diff_every)
+        for name, table1, table2 in (('按主键对比', 'bench_pk1', 'bench_pk2'),
+                                     ('按位置对比', 'bench_heap1', 'bench_heap2')):
+            elapsed, rows, diffs = run_benchmark(temp_db.name, table1, table2, args.repeat)
+            print(f"{name}: {elapsed:.2f} 秒, {rows / elapsed:,.0f} 行/秒, 差异 {diffs} 行")
+    finally:
+        os.unlink(temp_db.name)
+
+
+if __name__ == '__main__':
+    main()
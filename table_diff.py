@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import copy
+import csv
+import difflib
 import sqlite3
 from typing import List, Optional, Dict, Any, Union
 from abc import ABC, abstractmethod
@@ -9,6 +12,22 @@ import logging
 import sys
 import os
 import importlib
+import io
+import hashlib
+import json
+import pickle
+import queue
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from itertools import zip_longest
+from operator import itemgetter
 
 # 新增 Union 类型用于 run_comparison 参数类型提示
 
@@ -16,1201 +35,6049 @@ import importlib
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 流式读取时每批从游标获取的行数
+DEFAULT_FETCH_SIZE = 1000
 
-class DatabaseAdapter(ABC):
-    """数据库适配器抽象基类"""
+
+def iter_cursor_batches(cursor, batch_size: int = DEFAULT_FETCH_SIZE):
+    """
+    按批次从游标中读取数据，避免一次性将结果集加载到内存
+
+    :param cursor: 数据库游标（需支持fetchmany，否则退化为逐行迭代）
+    :param batch_size: 每批读取的行数
+    :return: 逐批产出行列表的生成器
+    """
+    fetchmany = getattr(cursor, 'fetchmany', None)
+    if fetchmany is None:
+        batch = []
+        for row in cursor:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    while True:
+        rows = fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def iter_cursor_rows(cursor, batch_size: int = DEFAULT_FETCH_SIZE):
+    """
+    按批次读取游标并逐行产出数据
+
+    :param cursor: 数据库游标
+    :param batch_size: 每批读取的行数
+    :return: 逐行产出数据的生成器
+    """
+    for rows in iter_cursor_batches(cursor, batch_size):
+        for row in rows:
+            yield row
+
+
+# 分段校验和对比时，行数不超过该值的不一致分段直接拉取数据逐行对比
+DEFAULT_CHECKSUM_LEAF_SIZE = 1000
+
+# 持久化的分段校验和树中每个内部节点的子节点数
+CHECKSUM_TREE_FANOUT = 16
+
+# 主键+行哈希两阶段对比时，每批按主键拉取完整数据的行数（Oracle的IN列表最多1000项）
+DEFAULT_KEY_HASH_BATCH_SIZE = 500
+MAX_KEY_HASH_BATCH_SIZE = 1000
+
+# 按行顺序对齐对比时每侧窗口中保留的行数
+DEFAULT_ALIGNMENT_WINDOW = 1000
+
+# 主键+行哈希两阶段对比时行哈希列的别名
+KEY_HASH_COLUMN = 'table_diff_hash'
+
+# 无主键表下推对比时每组相同的行的出现次数列的别名
+ROW_COUNT_COLUMN = 'table_diff_count'
+
+# 计算行哈希时字段之间的分隔符和转义字符：字段文本中的转义字符和分隔符前加转义字符，
+# 使不同的行不会得到相同的哈希文本
+ROW_HASH_SEPARATOR = '|'
+ROW_HASH_ESCAPE = '\\'
+
+# 计算行哈希时用于表示NULL的文本，任何字段文本转义后都不会等于该文本
+CHECKSUM_NULL_TEXT = ROW_HASH_ESCAPE + 'N'
+
+
+def _row_hash_text(values) -> bytes:
+    """将一行数据转换为计算行哈希使用的文本（各字段文本转义后以ROW_HASH_SEPARATOR分隔，NULL使用CHECKSUM_NULL_TEXT）"""
+    parts = []
+    for value in values:
+        if value is None:
+            parts.append(CHECKSUM_NULL_TEXT)
+            continue
+        text = value.hex() if isinstance(value, bytes) else str(value)
+        parts.append(text.replace(ROW_HASH_ESCAPE, ROW_HASH_ESCAPE * 2)
+                     .replace(ROW_HASH_SEPARATOR, ROW_HASH_ESCAPE + ROW_HASH_SEPARATOR))
+    return ROW_HASH_SEPARATOR.join(parts).encode('utf-8')
+
+
+def _sqlite_row_hash(*values) -> int:
+    """SQLite自定义函数：计算一行数据的64位哈希值"""
+    digest = hashlib.md5(_row_hash_text(values)).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def _sqlite_row_md5(*values) -> str:
+    """SQLite自定义函数：计算一行数据的MD5十六进制摘要（与其他数据库的MD5行哈希文本一致）"""
+    return hashlib.md5(_row_hash_text(values)).hexdigest()
+
+
+# Oracle和达梦数据库按列计算ORA_HASH后，每次拼接再计算哈希的列数（拼接的文本不超过VARCHAR2的4000字节）
+ORA_HASH_GROUP_SIZE = 100
+
+
+def _ora_hash_checksum_select(fields: List[str], seeds=(0, 1)) -> str:
+    """
+    构建Oracle和达梦数据库计算一段数据的行数和聚合哈希的SELECT表达式
     
-    @abstractmethod
-    def connect(self, **kwargs):
-        """建立数据库连接"""
-        pass
+    每个字段的文本单独计算ORA_HASH（NULL为N），各字段哈希的文本按组以ROW_HASH_SEPARATOR拼接后再计算ORA_HASH
+    得到行哈希。拼接的文本长度只与字段数有关，宽行也不会超过VARCHAR2的长度上限（ORA-01489）。
+    每个种子分别计算一个行哈希的SUM，降低32位哈希的碰撞概率。
     
-    @abstractmethod
-    def get_table_fields(self, table_name: str) -> List[str]:
-        """获取表字段列表"""
-        pass
+    :param fields: 参与哈希计算的字段列表
+    :param seeds: ORA_HASH的种子
+    :return: SELECT表达式
+    """
+    separator = f" || '{ROW_HASH_SEPARATOR}' || "
+    sums = []
+    for seed in seeds:
+        hashes = [f"NVL2(TO_CHAR({field}), TO_CHAR(ORA_HASH(TO_CHAR({field}), 4294967295, {seed})), 'N')"
+                  for field in fields]
+        while True:
+            groups = [f"ORA_HASH({separator.join(hashes[start:start + ORA_HASH_GROUP_SIZE])}, 4294967295, {seed})"
+                      for start in range(0, len(hashes), ORA_HASH_GROUP_SIZE)]
+            if len(groups) == 1:
+                break
+            hashes = [f"TO_CHAR({group})" for group in groups]
+        sums.append(f"SUM({groups[0]})")
+    return f"COUNT(*), {', '.join(sums)}"
+
+
+class _SQLiteXorAggregate:
+    """SQLite自定义聚合函数：对行哈希值做异或聚合"""
     
-    @abstractmethod
-    def execute_query(self, query: str):
-        """执行查询"""
-        pass
+    def __init__(self):
+        self.value = 0
     
-    @abstractmethod
-    def close(self):
-        """关闭数据库连接"""
-        pass
+    def step(self, value):
+        if value is not None:
+            self.value ^= value
     
-    def get_primary_keys(self, table_name: str) -> List[str]:
-        """获取表的主键字段列表"""
-        return []  # 默认实现，子类可以重写
+    def finalize(self):
+        return self.value
 
 
-class SQLiteAdapter(DatabaseAdapter):
-    """SQLite数据库适配器"""
+# 后台预读时每个游标最多缓存的批次数
+DEFAULT_PREFETCH_BATCHES = 4
+
+# 磁盘元数据缓存的默认有效期（秒）
+DEFAULT_METADATA_CACHE_TTL = 3600
+
+# 增量对比保存水位线的默认状态文件
+DEFAULT_WATERMARK_STATE_FILE = 'table_diff_watermarks.json'
+
+# CSV差异报告写入文件时的缓冲区大小（字节）
+DEFAULT_CSV_BUFFER_SIZE = 1024 * 1024
+
+# MySQL适配器保留的空闲流式查询连接数
+MAX_IDLE_STREAM_CONNECTIONS = 2
+
+
+class PrefetchCursor:
+    """
+    在后台线程中按批次预读数据的游标包装类
     
-    def __init__(self):
-        self.connection = None
+    读取线程将批次放入有界队列，对比线程通过fetchmany逐批取出。队列满时读取线程阻塞，
+    因此内存占用不超过 max_batches 个批次。
+    """
     
-    def connect(self, **kwargs):
-        db_path = kwargs.get('db_path')
-        logger.info(f"连接到SQLite数据库: {db_path}")
-        self.connection = sqlite3.connect(db_path)
-        return self.connection
+    _END = object()
     
-    def get_table_fields(self, table_name: str) -> List[str]:
-        logger.info(f"获取SQLite表 {table_name} 的字段")
-        cursor = self.connection.execute(f"PRAGMA table_info({table_name})")
-        fields = [row[1] for row in cursor.fetchall()]
-        logger.info(f"表 {table_name} 的字段: {fields}")
-        return fields
+    def __init__(self, cursor, batch_size: int = DEFAULT_FETCH_SIZE, max_batches: int = DEFAULT_PREFETCH_BATCHES):
+        """
+        初始化并启动读取线程
+        
+        :param cursor: 被包装的数据库游标
+        :param batch_size: 每批读取的行数
+        :param max_batches: 队列中最多缓存的批次数
+        """
+        self.cursor = cursor
+        self.batch_size = batch_size
+        # 以文本形式返回值的游标提供decode_row
+        self.decode_row = getattr(cursor, 'decode_row', None)
+        self.batches = queue.Queue(maxsize=max_batches)
+        self.stopped = threading.Event()
+        self.finished = False
+        self.thread = threading.Thread(target=self._read, name='table-diff-prefetch', daemon=True)
+        self.thread.start()
     
-    def get_primary_keys(self, table_name: str) -> List[str]:
-        """获取SQLite表的主键字段"""
-        logger.info(f"获取SQLite表 {table_name} 的主键")
-        cursor = self.connection.execute(f"PRAGMA table_info({table_name})")
-        primary_keys = [row[1] for row in cursor.fetchall() if row[5] > 0]  # pk列大于0表示是主键
-        logger.info(f"表 {table_name} 的主键: {primary_keys}")
-        return primary_keys
+    @property
+    def description(self):
+        return self.cursor.description
     
-    def execute_query(self, query: str):
-        logger.info(f"执行SQLite查询: {query}")
-        return self.connection.execute(query)
+    def _read(self):
+        """读取线程：按批次读取游标直到结束或被停止"""
+        try:
+            for rows in iter_cursor_batches(self.cursor, self.batch_size):
+                if not self._put(rows):
+                    return
+            self._put(self._END)
+        except Exception as e:
+            self._put(e)
+    
+    def _put(self, item) -> bool:
+        """放入队列，被停止时返回False"""
+        while not self.stopped.is_set():
+            try:
+                self.batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def fetchmany(self, size: int = None) -> list:
+        """取出下一批数据，批次大小由构造时的batch_size决定"""
+        if self.finished:
+            return []
+        item = self.batches.get()
+        if item is self._END:
+            self.finished = True
+            return []
+        if isinstance(item, Exception):
+            self.finished = True
+            raise item
+        return item
     
     def close(self):
-        if self.connection:
-            logger.info("关闭SQLite数据库连接")
-            self.connection.close()
+        """停止读取线程并关闭底层游标"""
+        self.stopped.set()
+        self.thread.join()
+        self.finished = True
+        close = getattr(self.cursor, 'close', None)
+        if close is not None:
+            close()
 
 
-class MySQLAdapter(DatabaseAdapter):
-    """MySQL数据库适配器"""
-    
-    def __init__(self):
-        self.connection = None
+# 按位置对比时表示一侧游标已读完的占位对象
+_MISSING_ROW = object()
+
+
+class DifferenceSink:
+    """
+    行差异输出接口
     
-    def connect(self, **kwargs):
-        try:
-            import mysql.connector
-        except ImportError:
-            raise ImportError("需要安装mysql-connector-python库: pip install mysql-connector-python")
-        
-        host = kwargs.get('host', 'localhost')
-        port = kwargs.get('port', 3306)
-        user = kwargs.get('user')
-        password = kwargs.get('password')
-        database = kwargs.get('database')
-        
-        logger.info(f"连接到MySQL数据库: {host}:{port}, 用户: {user}, 数据库: {database}")
-        
-        self.connection = mysql.connector.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database,
-            buffered=True  # 添加buffered参数以避免游标问题
-        )
-        return self.connection
+    对比引擎每发现一行差异就调用append。按主键归并对比需要回退到内存对比时，
+    通过mark记录当前位置，并用rollback撤销之后输出的差异。
+    """
     
-    def get_table_fields(self, table_name: str) -> List[str]:
-        logger.info(f"获取MySQL表 {table_name} 的字段")
-        cursor = self.connection.cursor(buffered=True)  # 使用buffered游标
-        cursor.execute(f"DESCRIBE {table_name}")
-        fields = [row[0] for row in cursor.fetchall()]
-        cursor.close()  # 关闭游标
-        logger.info(f"表 {table_name} 的字段: {fields}")
-        return fields
+    def append(self, row_diff: Dict[str, Any]):
+        """输出一行差异"""
+        raise NotImplementedError
     
-    def get_primary_keys(self, table_name: str) -> List[str]:
-        """获取MySQL表的主键字段"""
-        logger.info(f"获取MySQL表 {table_name} 的主键")
-        cursor = self.connection.cursor(buffered=True)  # 使用buffered游标
-        cursor.execute(f"SHOW KEYS FROM {table_name} WHERE Key_name = 'PRIMARY'")
-        primary_keys = [row[4] for row in cursor.fetchall()]  # Column_name列
-        cursor.close()  # 关闭游标
-        logger.info(f"表 {table_name} 的主键: {primary_keys}")
-        return primary_keys
+    def mark(self):
+        """返回当前输出位置"""
+        raise NotImplementedError
     
-    def execute_query(self, query: str):
-        logger.info(f"执行MySQL查询: {query}")
-        cursor = self.connection.cursor(buffered=True)  # 使用buffered游标
-        cursor.execute(query)
-        return cursor
+    def rollback(self, mark):
+        """撤销mark之后输出的差异"""
+        raise NotImplementedError
     
     def close(self):
-        if self.connection:
-            logger.info("关闭MySQL数据库连接")
-            self.connection.close()
+        """结束输出"""
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
-class PostgreSQLAdapter(DatabaseAdapter):
-    """PostgreSQL数据库适配器"""
+class DifferenceList(list, DifferenceSink):
+    """将行差异保存在内存列表中的差异输出（默认）"""
     
-    def __init__(self):
-        self.connection = None
+    def mark(self) -> int:
+        return len(self)
     
-    def connect(self, **kwargs):
-        try:
-            import psycopg2
-        except ImportError:
-            raise ImportError("需要安装psycopg2库: pip install psycopg2")
-        
-        host = kwargs.get('host', 'localhost')
-        port = kwargs.get('port', 5432)
-        user = kwargs.get('user')
-        password = kwargs.get('password')
-        database = kwargs.get('database')
-        
-        logger.info(f"连接到PostgreSQL数据库: {host}:{port}, 用户: {user}, 数据库: {database}")
-        
-        self.connection = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database
-        )
-        return self.connection
+    def rollback(self, mark: int):
+        del self[mark:]
+
+
+class CsvDifferenceSink(DifferenceSink):
+    """边对比边将行差异写入CSV文件的差异输出，内存中只保留写入的行数"""
     
-    def get_table_fields(self, table_name: str) -> List[str]:
-        logger.info(f"获取PostgreSQL表 {table_name} 的字段")
-        cursor = self.connection.cursor()
-        
-        # 首先尝试使用当前数据库和模式
-        try:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = %s AND table_catalog = %s
-                ORDER BY ordinal_position
-            """, (table_name, self.connection.info.dbname))
-            
-            fields_result = cursor.fetchall()
-            if fields_result:
-                fields = [row[0] for row in fields_result]
-                logger.info(f"通过information_schema获取到表 {table_name} 的字段: {fields}")
-                return fields
-        except Exception as e:
-            logger.warning(f"通过information_schema获取字段失败: {e}")
+    FIELDNAMES = ['row_type', 'key_info', 'row_number', 'column_name', 'table1_value', 'table2_value']
+    
+    def __init__(self, output_file: str, buffer_size: int = DEFAULT_CSV_BUFFER_SIZE):
+        """
+        打开CSV文件并写入表头
         
-        # 如果上面的方法失败，尝试直接查询pg_attribute
-        try:
-            cursor.execute("""
-                SELECT a.attname AS column_name
-                FROM pg_class c
-                JOIN pg_attribute a ON a.attrelid = c.oid
-                JOIN pg_type t ON a.atttypid = t.oid
-                LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
-                LEFT JOIN pg_namespace n ON n.oid = c.relnamespace
-                WHERE c.relname = %s 
-                AND a.attnum > 0
-                AND NOT a.attisdropped
-                ORDER BY a.attnum
-            """, (table_name,))
-            
-            fields = [row[0] for row in cursor.fetchall()]
-            if fields:
-                logger.info(f"通过pg_attribute获取到表 {table_name} 的字段: {fields}")
-                return fields
-        except Exception as e:
-            logger.warning(f"通过pg_attribute获取字段失败: {e}")
-            
-        # 如果都失败了，抛出表不存在的异常
-        raise ValueError(f"表 '{table_name}' 不存在")
+        :param output_file: 输出文件路径
+        :param buffer_size: 文件写入缓冲区大小（字节）
+        """
+        logger.info(f"生成CSV报告到文件: {output_file}")
+        self.output_file = output_file
+        self.file = open(output_file, 'w', newline='', encoding='utf-8', buffering=buffer_size)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.FIELDNAMES)
+        self.row_count = 0
     
-    def get_primary_keys(self, table_name: str) -> List[str]:
-        """获取PostgreSQL表的主键字段"""
-        logger.info(f"获取PostgreSQL表 {table_name} 的主键")
-        try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT a.attname
-                FROM pg_index i
-                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
-                WHERE i.indrelid = %s::regclass AND i.indisprimary
-            """, (table_name,))
-            
-            primary_keys = [row[0] for row in cursor.fetchall()]
-            logger.info(f"表 {table_name} 的主键: {primary_keys}")
-            return primary_keys
-        except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "does not exist" in error_msg or "not found" in error_msg or "unknown" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
-            else:
-                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
+    def append(self, row_diff: Dict[str, Any]):
+        row_type = row_diff.get('type', 'unknown')
+        row_number = row_diff['row_number']
+        key_info = ''
+        # 如果有主键信息，则记录主键信息
+        if 'key' in row_diff:
+            key_info = ', '.join([f"{k}={v}" for k, v in row_diff['key'].items()])
+        self.writer.writerows(
+            (row_type, key_info, row_number, diff['field'], diff['table1_value'], diff['table2_value'])
+            for diff in row_diff['differences'])
+        self.row_count += 1
     
-    def execute_query(self, query: str):
-        logger.info(f"执行PostgreSQL查询: {query}")
-        cursor = self.connection.cursor()
-        cursor.execute(query)
-        return cursor
+    def mark(self) -> tuple:
+        return self.file.tell(), self.row_count
+    
+    def rollback(self, mark: tuple):
+        position, self.row_count = mark
+        self.file.seek(position)
+        self.file.truncate()
     
     def close(self):
-        if self.connection:
-            logger.info("关闭PostgreSQL数据库连接")
-            self.connection.close()
+        if not self.file.closed:
+            self.file.close()
+            logger.info(f"CSV报告生成完成，共写入 {self.row_count} 行差异")
 
 
-class OracleAdapter(DatabaseAdapter):
-    """Oracle数据库适配器"""
-    
-    def __init__(self):
-        self.connection = None
+class DifferenceLimitReached(Exception):
+    """输出的行差异达到上限，对比提前结束"""
+    pass
+
+
+class _LimitedDifferences(DifferenceSink):
+    """输出的行差异达到上限时抛出DifferenceLimitReached，使对比引擎停止读取数据"""
     
-    def connect(self, **kwargs):
-        try:
-            import oracledb
-        except ImportError:
-            raise ImportError("需要安装oracledb库: pip install oracledb")
-        
-        host = kwargs.get('host', 'localhost')
-        port = kwargs.get('port', 1521)
-        user = kwargs.get('user')
-        password = kwargs.get('password')
-        database = kwargs.get('database')
-        service_name = kwargs.get('service_name')
-        
-        logger.info(f"连接到Oracle数据库: {host}:{port}, 用户: {user}, 数据库: {database}")
-        
-        # 构建DSN
-        if service_name:
-            dsn = oracledb.makedsn(host, port, service_name=service_name)
+    def __init__(self, sink: DifferenceSink, max_diffs: int):
+        self.sink = sink
+        self.max_diffs = max_diffs
+        self.count = 0
+    
+    def append(self, row_diff: Dict[str, Any]):
+        self.sink.append(row_diff)
+        self.count += 1
+        if self.count >= self.max_diffs:
+            raise DifferenceLimitReached(f"行差异达到上限 {self.max_diffs}")
+    
+    def mark(self) -> tuple:
+        return self.sink.mark(), self.count
+    
+    def rollback(self, mark: tuple):
+        sink_mark, self.count = mark
+        self.sink.rollback(sink_mark)
+
+
+class _DifferenceTee(DifferenceSink):
+    """同时输出到多个差异输出"""
+    
+    def __init__(self, *sinks: DifferenceSink):
+        self.sinks = sinks
+    
+    def append(self, row_diff: Dict[str, Any]):
+        for sink in self.sinks:
+            sink.append(row_diff)
+    
+    def mark(self) -> tuple:
+        return tuple(sink.mark() for sink in self.sinks)
+    
+    def rollback(self, mark: tuple):
+        for sink, sink_mark in zip(self.sinks, mark):
+            sink.rollback(sink_mark)
+
+
+class _DifferenceKeys(DifferenceSink):
+    """记录输出的行差异的主键，增量对比保存仍然不同的行，下次对比时重新检查"""
+    
+    def __init__(self, primary_keys: List[str]):
+        self.primary_keys = primary_keys
+        self.keys = []
+        # 有差异没有主键时无法记录
+        self.complete = True
+    
+    def append(self, row_diff: Dict[str, Any]):
+        key = row_diff.get('key')
+        if key is None:
+            self.complete = False
         else:
-            dsn = oracledb.makedsn(host, port, sid=database)
-            
-        self.connection = oracledb.connect(
-            user=user,
-            password=password,
-            dsn=dsn
-        )
-        return self.connection
+            self.keys.append(tuple(key[pk] for pk in self.primary_keys))
     
-    def get_table_fields(self, table_name: str) -> List[str]:
-        logger.info(f"获取Oracle表 {table_name} 的字段")
+    def mark(self) -> tuple:
+        return len(self.keys), self.complete
+    
+    def rollback(self, mark: tuple):
+        count, self.complete = mark
+        del self.keys[count:]
+
+
+def _normalize_number(value):
+    """数值归一化：浮点数转换为Decimal，使Decimal('1.50')与1.5、0.1与Decimal('0.10')比较相等"""
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return value
+
+
+def _normalize_text(value):
+    """定长字符归一化：去掉CHAR类型尾部填充的空格"""
+    if isinstance(value, str):
+        return value.rstrip(' ')
+    return value
+
+
+def _normalize_binary(value):
+    """二进制归一化：bytearray、memoryview转换为bytes"""
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return value
+
+
+def _normalize_datetime(value):
+    """日期时间归一化：带时区的时间转换为UTC后去掉时区（不带时区的时间视为UTC），日期转换为零点的时间"""
+    if isinstance(value, datetime):
+        if value.utcoffset() is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+# 列的值类别 -> 归一化函数（函数只转换对应的Python类型，其他值原样返回）
+VALUE_NORMALIZERS = {
+    'number': _normalize_number,
+    'char': _normalize_text,
+    'binary': _normalize_binary,
+    'datetime': _normalize_datetime,
+}
+
+
+def _hashable_value(value):
+    """把不可哈希的值（bytearray、memoryview、数组、JSON对象等）转换为可以作为行键的值"""
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable_value(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _hashable_value(item)) for key, item in value.items()))
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _decode_text_number(value):
+    """把数据库以文本形式返回的数值转换为int或Decimal，无法识别时保留文本"""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('ascii')
+    elif not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return value
+
+
+# datetime.fromisoformat只接受3位或6位小数秒
+_ISO_FRACTION_PATTERN = re.compile(r'\.(\d+)')
+
+
+def _decode_text_datetime(value):
+    """把数据库以文本形式返回的日期时间（YYYY-MM-DD[ HH:MM:SS[.f]]）转换为date或datetime，无法识别时保留文本"""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('ascii')
+    elif not isinstance(value, str):
+        return value
+    try:
+        if len(value) == 10:
+            return date.fromisoformat(value)
+        return datetime.fromisoformat(
+            _ISO_FRACTION_PATTERN.sub(lambda match: '.' + (match.group(1) + '000000')[:6], value, count=1))
+    except ValueError:
+        return value
+
+
+def _decode_text_string(value):
+    """把字节形式的字符串按UTF-8解码，无法解码时保留字节"""
+    if isinstance(value, (bytes, bytearray)):
         try:
-            cursor = self.connection.cursor()
-            # 处理可能包含模式的表名
-            if '.' in table_name:
-                parts = table_name.split('.')
-                if len(parts) == 2:
-                    owner, table = parts
-                else:
-                    owner, table = None, table_name
-            else:
-                owner, table = None, table_name
-                
-            if owner:
-                cursor.execute("""
-                    SELECT column_name 
-                    FROM all_tab_columns 
-                    WHERE table_name = UPPER(%s) AND owner = UPPER(%s)
-                    ORDER BY column_id
-                """, (table, owner))
-            else:
-                cursor.execute("""
-                    SELECT column_name 
-                    FROM user_tab_columns 
-                    WHERE table_name = UPPER(%s)
-                    ORDER BY column_id
-                """, (table,))
-                
-            fields = [row[0] for row in cursor.fetchall()]
-            logger.info(f"表 {table_name} 的字段: {fields}")
-            return fields
-        except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
-            else:
-                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return bytes(value)
+    return value
+
+
+# 值类别 -> 把数据库返回的文本或字节转换为Python值的函数
+TEXT_VALUE_DECODERS = {
+    'number': _decode_text_number,
+    'datetime': _decode_text_datetime,
+    'text': _decode_text_string,
+    'char': _decode_text_string,
+    'binary': _normalize_binary,
+}
+
+# 游标description的类型代码为Python类型时（如pyodbc、dmPython）对应的值类别
+_PYTHON_TYPE_KINDS = (
+    (bool, None),
+    ((int, float, Decimal), 'number'),
+    (str, 'text'),
+    ((bytes, bytearray, memoryview), 'binary'),
+    (date, 'datetime'),
+)
+
+# 类型代码为类型对象时（如oracledb的DB_TYPE_*）按类型名判断值类别
+_TYPE_NAME_KINDS = {
+    'NUMBER': 'number', 'NUMERIC': 'number', 'DECIMAL': 'number', 'FLOAT': 'number', 'DOUBLE': 'number',
+    'REAL': 'number', 'INTEGER': 'number', 'BIGINT': 'number', 'BINARY_FLOAT': 'number',
+    'BINARY_DOUBLE': 'number', 'BINARY_INTEGER': 'number',
+    'CHAR': 'char', 'NCHAR': 'char', 'FIXED_CHAR': 'char', 'FIXED_NCHAR': 'char', 'FIXED_STRING': 'char',
+    'VARCHAR': 'text', 'NVARCHAR': 'text', 'STRING': 'text', 'LONG': 'text', 'LONG_STRING': 'text',
+    'CLOB': 'text', 'NCLOB': 'text',
+    'RAW': 'binary', 'LONG_RAW': 'binary', 'BLOB': 'binary', 'BINARY': 'binary', 'LONG_BINARY': 'binary',
+    'DATE': 'datetime', 'DATETIME': 'datetime', 'TIMESTAMP': 'datetime', 'TIMESTAMP_TZ': 'datetime',
+    'TIMESTAMP_LTZ': 'datetime',
+}
+
+
+# 列对比规则中可以使用的规则名
+COLUMN_RULE_NAMES = ('tolerance', 'round', 'trim', 'ignore_case', 'truncate', 'timezone')
+
+# truncate规则可以截断到的时间精度 -> datetime.replace的参数
+_TRUNCATE_FIELDS = {
+    'millisecond': None,
+    'second': {'microsecond': 0},
+    'minute': {'second': 0, 'microsecond': 0},
+    'hour': {'minute': 0, 'second': 0, 'microsecond': 0},
+    'day': {'hour': 0, 'minute': 0, 'second': 0, 'microsecond': 0},
+}
+
+
+def _parse_timezone(name: str):
+    """
+    解析时区，支持 'UTC'、'+08:00' 这样的UTC偏移和 'Asia/Shanghai' 这样的时区名（需要Python 3.9+）
+
+    :param name: 时区
+    :return: tzinfo对象
+    """
+    text = str(name).strip()
+    if text.upper() in ('UTC', 'Z'):
+        return timezone.utc
+    if text[:1] in ('+', '-'):
+        hours, _, minutes = text[1:].partition(':')
+        try:
+            offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        except ValueError:
+            raise ValueError(f"无法识别的时区: {name}")
+        return timezone(-offset if text[0] == '-' else offset)
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(text)
+    except Exception:
+        raise ValueError(f"无法识别的时区: {name}")
+
+
+def load_column_rules(rules: Union[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    加载并校验列对比规则
+
+    规则为 {列名: {规则名: 参数}}，支持的规则：
+    tolerance（数值允许的绝对误差）、round（保留的小数位数）、trim（去掉首尾空格）、
+    ignore_case（忽略大小写）、truncate（时间截断到 millisecond/second/minute/hour/day）、
+    timezone（带时区的时间转换到该时区后与不带时区的时间比较）。
+
+    :param rules: 规则字典，或JSON格式的规则文件路径
+    :return: 校验后的规则字典
+    """
+    if isinstance(rules, str):
+        with open(rules, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+    if not isinstance(rules, dict):
+        raise ValueError("列对比规则必须是 {列名: {规则名: 参数}} 格式")
     
-    def get_primary_keys(self, table_name: str) -> List[str]:
-        """获取Oracle表的主键字段"""
-        logger.info(f"获取Oracle表 {table_name} 的主键")
+    column_rules = {}
+    for column, rule in rules.items():
+        if not isinstance(rule, dict):
+            raise ValueError(f"列 {column} 的对比规则必须是字典: {rule}")
+        for name, value in rule.items():
+            if name not in COLUMN_RULE_NAMES:
+                raise ValueError(f"列 {column} 的对比规则 {name} 不受支持，可用规则: {', '.join(COLUMN_RULE_NAMES)}")
+            if name == 'tolerance' and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+                raise ValueError(f"列 {column} 的tolerance必须是非负数: {value}")
+            if name == 'round' and (isinstance(value, bool) or not isinstance(value, int)):
+                raise ValueError(f"列 {column} 的round必须是整数: {value}")
+            if name in ('trim', 'ignore_case') and not isinstance(value, bool):
+                raise ValueError(f"列 {column} 的{name}必须是true或false: {value}")
+            if name == 'truncate' and value not in _TRUNCATE_FIELDS:
+                raise ValueError(f"列 {column} 的truncate必须是 {', '.join(_TRUNCATE_FIELDS)} 之一: {value}")
+            if name == 'timezone':
+                _parse_timezone(value)
+        column_rules[column] = dict(rule)
+    return column_rules
+
+
+def _to_decimal(value) -> Decimal:
+    """将数值转换为Decimal（浮点数按其最短的十进制表示转换）"""
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def _within_tolerance(value1, value2, tolerance: Decimal) -> bool:
+    """两个数值之差的绝对值是否不超过tolerance，任一值为NULL或不是数值时返回False"""
+    if value1 is None or value2 is None:
+        return False
+    try:
+        return abs(_to_decimal(value1) - _to_decimal(value2)) <= tolerance
+    except (TypeError, ValueError, ArithmeticError):
+        return False
+
+
+def _datetime_rule_transform(rule: Dict[str, Any]):
+    """
+    根据列对比规则中的timezone和truncate生成时间值的转换函数
+
+    :param rule: 列对比规则
+    :return: 转换函数，规则中没有时间相关的规则时返回None
+    """
+    tz = _parse_timezone(rule['timezone']) if rule.get('timezone') else None
+    unit = rule.get('truncate')
+    if tz is None and unit is None:
+        return None
+    replace_fields = _TRUNCATE_FIELDS.get(unit)
+    
+    def transform(value):
+        if not isinstance(value, datetime):
+            return value
+        if tz is not None and value.utcoffset() is not None:
+            value = value.astimezone(tz).replace(tzinfo=None)
+        if unit == 'millisecond':
+            return value.replace(microsecond=value.microsecond // 1000 * 1000)
+        if replace_fields:
+            return value.replace(**replace_fields)
+        return value
+    return transform
+
+
+class KeyOrderError(RuntimeError):
+    """数据库返回的主键顺序与归并对比所需的顺序不一致"""
+    pass
+
+
+# 外存哈希分区对比时每一侧拆分的分区数
+DEFAULT_SPILL_PARTITIONS = 16
+
+# 写入分区文件前每个分区缓存的行数
+SPILL_BUFFER_ROWS = 1000
+
+# 由分区文件大小估算加载到内存后占用空间的倍数（Python对象的额外开销）
+SPILL_MEMORY_FACTOR = 4
+
+# 分区过大时递归拆分的最大层数
+MAX_SPILL_DEPTH = 4
+
+_MEMORY_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2,
+                 'G': 1024 ** 3, 'GB': 1024 ** 3, 'T': 1024 ** 4, 'TB': 1024 ** 4}
+
+
+def parse_memory_size(value: Union[int, str]) -> int:
+    """
+    解析内存大小，支持纯数字（字节）或带K/M/G/T单位的字符串，如 '512M'、'16G'
+
+    :param value: 内存大小
+    :return: 字节数
+    """
+    if isinstance(value, int):
+        size = value
+    else:
+        text = str(value).strip().upper()
+        number = text.rstrip('KMGTB')
+        unit = text[len(number):]
+        if unit not in _MEMORY_UNITS:
+            raise ValueError(f"无法识别的内存大小: {value}")
         try:
-            cursor = self.connection.cursor()
-            # 处理可能包含模式的表名
-            if '.' in table_name:
-                parts = table_name.split('.')
-                if len(parts) == 2:
-                    owner, table = parts
-                else:
-                    owner, table = None, table_name
-            else:
-                owner, table = None, table_name
-                
-            if owner:
-                cursor.execute("""
-                    SELECT cols.column_name
-                    FROM all_constraints cons
-                    JOIN all_cons_columns cols ON cons.constraint_name = cols.constraint_name AND cons.owner = cols.owner
-                    WHERE cols.table_name = UPPER(%s) AND cols.owner = UPPER(%s) AND cons.constraint_type = 'P'
-                    ORDER BY cols.position
-                """, (table, owner))
-            else:
-                cursor.execute("""
-                    SELECT column_name
-                    FROM user_cons_columns
-                    WHERE table_name = UPPER(%s) AND constraint_name IN (
-                        SELECT constraint_name 
-                        FROM user_constraints 
-                        WHERE constraint_type = 'P'
-                    )
-                    ORDER BY position
-                """, (table,))
-                
-            primary_keys = [row[0] for row in cursor.fetchall()]
-            logger.info(f"表 {table_name} 的主键: {primary_keys}")
-            return primary_keys
-        except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
-            else:
-                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
+            size = int(float(number) * _MEMORY_UNITS[unit])
+        except ValueError:
+            raise ValueError(f"无法识别的内存大小: {value}")
+    if size <= 0:
+        raise ValueError(f"内存大小必须大于0: {value}")
+    return size
+
+
+class _SpillPartitions:
+    """按主键哈希将一侧的行数据拆分写入多个临时分区文件"""
     
-    def execute_query(self, query: str):
-        logger.info(f"执行Oracle查询: {query}")
-        cursor = self.connection.cursor()
-        cursor.execute(query)
-        return cursor
+    def __init__(self, prefix: str, partition_count: int, depth: int):
+        self.paths = [f"{prefix}_{index}.spill" for index in range(partition_count)]
+        self.files = [open(path, 'wb') for path in self.paths]
+        self.buffers = [[] for _ in range(partition_count)]
+        # 每一层使用不同的哈希函数，使递归拆分能把同一个分区继续分散
+        self.depth = depth
+        self.row_count = 0
+    
+    def add(self, key: tuple, row):
+        index = hash((self.depth, key)) % len(self.files)
+        buffer = self.buffers[index]
+        buffer.append(row)
+        if len(buffer) >= SPILL_BUFFER_ROWS:
+            pickle.dump(buffer, self.files[index], pickle.HIGHEST_PROTOCOL)
+            buffer.clear()
+        self.row_count += 1
     
     def close(self):
-        if self.connection:
-            logger.info("关闭Oracle数据库连接")
-            self.connection.close()
+        for file, buffer in zip(self.files, self.buffers):
+            if not file.closed:
+                if buffer:
+                    pickle.dump(buffer, file, pickle.HIGHEST_PROTOCOL)
+                    buffer.clear()
+                file.close()
+    
+    @staticmethod
+    def read(path: str):
+        """逐行读取分区文件"""
+        with open(path, 'rb') as file:
+            while True:
+                try:
+                    rows = pickle.load(file)
+                except EOFError:
+                    return
+                for row in rows:
+                    yield row
+
+
+def _unique_keys_from_rows(rows) -> List[List[str]]:
+    """
+    把按索引名和列位置排序的唯一索引列信息汇总为可用作匹配键的字段列表
+    
+    包含可为空的列（唯一索引允许多个NULL）或表达式列（列名为None）的索引不能唯一确定一行，不返回。
+    
+    :param rows: (索引名, 列名, 是否NOT NULL) 的序列
+    :return: 每个非空唯一索引的字段列表，相同字段的索引只返回一次
+    """
+    indexes = {}
+    for index_name, column_name, not_null in rows:
+        columns = indexes.setdefault(index_name, [])
+        if columns is not None:
+            indexes[index_name] = columns + [column_name] if column_name is not None and not_null else None
+    unique_keys = []
+    for columns in indexes.values():
+        if columns and columns not in unique_keys:
+            unique_keys.append(columns)
+    return unique_keys
+
+
+class DatabaseAdapter(ABC):
+    """数据库适配器抽象基类"""
+    
+    @abstractmethod
+    def connect(self, **kwargs):
+        """建立数据库连接"""
+        pass
+    
+    @abstractmethod
+    def get_table_fields(self, table_name: str) -> List[str]:
+        """获取表字段列表"""
+        pass
+    
+    @abstractmethod
+    def execute_query(self, query: str, fetch_size: Optional[int] = None):
+        """
+        执行查询
+        
+        :param query: 查询SQL语句
+        :param fetch_size: 流式读取的批次大小；为None时使用普通游标，否则使用服务端/非缓冲游标
+        :return: 游标
+        """
+        pass
+    
+    @abstractmethod
+    def close(self):
+        """关闭数据库连接"""
+        pass
+    
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        """获取表的主键字段列表"""
+        return []  # 默认实现，子类可以重写
+    
+    def get_unique_keys(self, table_name: str) -> List[List[str]]:
+        """
+        获取表上所有列都为NOT NULL的唯一约束和唯一索引（不含主键、部分索引和表达式索引）
+        
+        :param table_name: 表名
+        :return: 每个唯一索引按索引中顺序排列的字段列表
+        """
+        return []  # 默认实现，子类可以重写
+    
+    def get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取表的字段类型，返回 {字段名: 类型名}"""
+        return {}  # 默认实现，子类可以重写
+    
+    def cancel(self):
+        """取消连接上正在执行的查询（驱动不支持时不做任何操作）"""
+        pass
+    
+    def execute_bulk_query(self, query: str, fetch_size: Optional[int] = None,
+                           native_columns: Optional[List[str]] = None):
+        """
+        使用数据库的批量导出协议执行查询（如PostgreSQL的COPY ... TO STDOUT）
+        
+        返回的游标与execute_query返回的流式游标一样支持description和fetchmany，行中的值类型也相同。
+        
+        :param query: 查询SQL语句
+        :param fetch_size: 每批返回的行数
+        :param native_columns: 为None时所有列转换为Python值；否则只转换这些列，其余列保留文本，
+                               由游标的decode_row转换（与execute_text_query相同）
+        :return: 游标，不支持批量读取时返回None
+        """
+        return None  # 默认不支持，子类可以重写
+    
+    def execute_text_query(self, query: str, fetch_size: Optional[int] = None, native_columns: List[str] = ()):
+        """
+        流式执行查询，值以数据库返回的文本形式提供，省去驱动逐值转换为Python对象的开销
+        
+        同一种数据库对相同的值转换出的文本相同，因此只用于两侧是同一种数据库的对比。
+        返回的游标提供decode_row(row)，把一行中的文本转换为与execute_query相同的Python值。
+        
+        :param query: 查询SQL语句
+        :param fetch_size: 流式读取的批次大小
+        :param native_columns: 读取时即转换为Python值的列（如用于排序和匹配的主键）
+        :return: 游标，不支持时返回None
+        """
+        return None  # 默认不支持，子类可以重写
+    
+    def _text_decoders(self, description) -> list:
+        """根据游标description中的类型代码生成每列把文本转换为Python值的函数"""
+        return [TEXT_VALUE_DECODERS.get(self.column_kind(column[1])) for column in description]
+    
+    def column_kind(self, type_code) -> Optional[str]:
+        """
+        根据游标description中的类型代码判断列的值类别
+        
+        默认实现识别Python类型形式的类型代码，以及名称形式的类型对象（如oracledb的DB_TYPE_NUMBER）。
+        
+        :param type_code: description中的type_code
+        :return: 'number'、'text'、'char'（定长字符）、'binary'、'datetime'，无法判断时返回None
+        """
+        if isinstance(type_code, type):
+            for python_types, kind in _PYTHON_TYPE_KINDS:
+                if issubclass(type_code, python_types):
+                    return kind
+        name = getattr(type_code, 'name', None) or getattr(type_code, '__name__', None)
+        if not isinstance(name, str):
+            return None
+        name = name.upper()
+        if name.startswith('DB_TYPE_'):
+            name = name[len('DB_TYPE_'):]
+        return _TYPE_NAME_KINDS.get(name)
+    
+    def build_checksum_select(self, fields: List[str], primary_keys: List[str]) -> Optional[str]:
+        """
+        构建计算一段数据的行数和聚合哈希的SELECT表达式
+        
+        第一列必须是COUNT(*)，其余列为聚合哈希值。同一种数据库对相同数据计算出的结果相同。
+        
+        :param fields: 参与哈希计算的字段列表
+        :param primary_keys: 主键字段列表（部分数据库的聚合需要按主键排序）
+        :return: SELECT表达式，不支持时返回None
+        """
+        return None  # 默认不支持，子类可以重写
+    
+    def build_row_hash(self, fields: List[str]) -> Optional[str]:
+        """
+        构建计算单行哈希的表达式
+        
+        结果为小写十六进制的MD5摘要，哈希的文本是各字段转换为文本并转义（NULL为CHECKSUM_NULL_TEXT）
+        后以ROW_HASH_SEPARATOR连接，因此不同数据库对文本表示相同的数据计算出的哈希相同。
+        
+        :param fields: 参与哈希计算的字段列表
+        :return: SQL表达式，不支持时返回None
+        """
+        return None  # 默认不支持，子类可以重写
+    
+    def sql_text_literal(self, text: str) -> str:
+        """
+        将文本转换为SQL字符串字面量
+        
+        :param text: 文本
+        :return: SQL字符串字面量
+        """
+        return "'" + text.replace("'", "''") + "'"
+    
+    def row_hash_value(self, text_expression: str) -> str:
+        """
+        构建行哈希中一个字段的文本表达式：转义其中的转义字符和分隔符，NULL转换为CHECKSUM_NULL_TEXT
+        
+        :param text_expression: 字段转换为文本的SQL表达式
+        :return: SQL表达式
+        """
+        literal = self.sql_text_literal
+        escaped = (f"REPLACE(REPLACE({text_expression}, {literal(ROW_HASH_ESCAPE)}, {literal(ROW_HASH_ESCAPE * 2)}), "
+                   f"{literal(ROW_HASH_SEPARATOR)}, {literal(ROW_HASH_ESCAPE + ROW_HASH_SEPARATOR)})")
+        return f"COALESCE({escaped}, {literal(CHECKSUM_NULL_TEXT)})"
+    
+    def null_safe_equal(self, left: str, right: str) -> str:
+        """
+        构建NULL安全的相等条件，两侧都为NULL时视为相等，结果不会为NULL
+        
+        :param left: 左侧表达式
+        :param right: 右侧表达式
+        :return: SQL条件表达式
+        """
+        return f"(CASE WHEN {left} = {right} OR ({left} IS NULL AND {right} IS NULL) THEN 1 ELSE 0 END) = 1"
+    
+    def supports_full_outer_join(self) -> bool:
+        """是否使用FULL OUTER JOIN（否则使用两个方向的LEFT JOIN的UNION ALL代替）"""
+        return True
+    
+    def integer_division(self, dividend: str, divisor: int) -> str:
+        """
+        构建非负整数表达式除以正整数后向下取整的表达式（用于按固定宽度计算主键所在的分段）
+        
+        :param dividend: 被除数表达式（值不小于0）
+        :param divisor: 除数
+        :return: SQL表达式
+        """
+        return f"FLOOR(({dividend}) / {divisor})"
+    
+    def get_modification_counters(self, table_name: str) -> Optional[Dict[str, int]]:
+        """
+        从数据库的统计信息中读取表的累计修改次数
+        
+        计数器与上次相同说明表没有变化；包含deletes时可以判断是否删除过行。
+        
+        :param table_name: 表名
+        :return: {'inserts': 插入行数, 'updates': 更新行数, 'deletes': 删除行数}，不支持时返回None
+        """
+        return None  # 默认不支持，子类可以重写
+    
+    def watermark_literal(self, value) -> str:
+        """
+        将水位线列的值转换为SQL字面量，用于增量对比的 列 > 字面量 条件
+        
+        :param value: 查询返回的水位线列最大值（数值、字符串、日期或时间）
+        :return: SQL字面量
+        """
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            return str(value)
+        if isinstance(value, str):
+            return "'" + value.replace("'", "''") + "'"
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                return f"TIMESTAMP WITH TIME ZONE '{value.isoformat(' ')}'"
+            return f"TIMESTAMP '{value.isoformat(' ')}'"
+        if isinstance(value, date):
+            return f"DATE '{value.isoformat()}'"
+        raise ValueError(f"水位线值 {value!r} 的类型 {type(value).__name__} 无法转换为SQL字面量")
+    
+    def clone(self) -> 'DatabaseAdapter':
+        """
+        使用相同的连接参数创建一个新连接的适配器
+        
+        :return: 已连接的新适配器实例
+        """
+        connect_params = getattr(self, 'connect_params', None)
+        if connect_params is None:
+            raise RuntimeError(f"{type(self).__name__} 尚未建立连接，无法复制连接")
+        adapter = type(self)()
+        adapter.connect(**connect_params)
+        return adapter
+
+
+class ConnectionPool:
+    """
+    数据库连接池
+    
+    按需通过适配器的clone()创建新连接，最多创建size个连接，用完后归还供其他任务复用。
+    """
+    
+    def __init__(self, adapter: DatabaseAdapter, size: int):
+        """
+        初始化连接池
+        
+        :param adapter: 提供连接参数的适配器
+        :param size: 最大连接数
+        """
+        self.adapter = adapter
+        self.size = size
+        self.adapters = []
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+    
+    def acquire(self) -> DatabaseAdapter:
+        """获取一个连接，没有空闲连接且未达到上限时创建新连接"""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            create = len(self.adapters) < self.size
+            if create:
+                # 先占位，避免并发创建超过上限
+                self.adapters.append(None)
+        if not create:
+            return self.idle.get()
+        try:
+            adapter = self.adapter.clone()
+        except Exception:
+            with self.lock:
+                self.adapters.remove(None)
+            raise
+        with self.lock:
+            self.adapters[self.adapters.index(None)] = adapter
+        return adapter
+    
+    def release(self, adapter: DatabaseAdapter):
+        """归还连接"""
+        self.idle.put(adapter)
+    
+    def close(self):
+        """关闭连接池中的所有连接"""
+        for adapter in self.adapters:
+            if adapter is not None:
+                adapter.close()
+        self.adapters = []
+
+
+class MetadataCache:
+    """
+    表元数据缓存
+    
+    每个表的字段、字段类型、主键和唯一索引只从数据库目录中读取一次。可选地将结果保存到磁盘文件，
+    以连接和表名为键，在ttl秒内的后续对比直接使用文件中的元数据。
+    """
+    
+    def __init__(self, cache_file: Optional[str] = None, ttl: float = DEFAULT_METADATA_CACHE_TTL):
+        """
+        初始化元数据缓存
+        
+        :param cache_file: 磁盘缓存文件路径，为None时只在内存中缓存
+        :param ttl: 缓存有效期（秒）
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        if cache_file:
+            self._load()
+    
+    @staticmethod
+    def connection_key(adapter: DatabaseAdapter) -> str:
+        """
+        生成标识数据库连接的缓存键（不包含密码）
+        
+        :param adapter: 数据库适配器
+        :return: 缓存键；适配器没有连接参数时返回只在当前进程内有效的键
+        """
+        connect_params = getattr(adapter, 'connect_params', None)
+        if not isinstance(connect_params, dict):
+            return f"{type(adapter).__name__}@{id(adapter)}"
+        params = ','.join(f"{name}={value}" for name, value in sorted(connect_params.items())
+                          if name != 'password')
+        return f"{type(adapter).__name__}:{params}"
+    
+    @staticmethod
+    def _is_persistent(key: str) -> bool:
+        """进程内的临时键无法在下次运行时复用，不写入磁盘"""
+        return '@' not in key.split(':', 1)[0]
+    
+    def get_table_fields(self, adapter: DatabaseAdapter, table_name: str) -> List[str]:
+        """获取表字段列表"""
+        return list(self._get(adapter, table_name, 'fields', adapter.get_table_fields))
+    
+    def get_primary_keys(self, adapter: DatabaseAdapter, table_name: str) -> List[str]:
+        """获取表的主键字段列表"""
+        return list(self._get(adapter, table_name, 'primary_keys', adapter.get_primary_keys))
+    
+    def get_unique_keys(self, adapter: DatabaseAdapter, table_name: str) -> List[List[str]]:
+        """获取表的非空唯一索引字段列表"""
+        return [list(columns) for columns in self._get(adapter, table_name, 'unique_keys', adapter.get_unique_keys)]
+    
+    def get_column_types(self, adapter: DatabaseAdapter, table_name: str) -> Dict[str, str]:
+        """获取表的字段类型"""
+        return dict(self._get(adapter, table_name, 'column_types', adapter.get_column_types))
+    
+    def invalidate(self, adapter: Optional[DatabaseAdapter] = None, table_name: Optional[str] = None):
+        """
+        清除缓存
+        
+        :param adapter: 只清除该连接的缓存，为None时清除全部
+        :param table_name: 只清除该表的缓存
+        """
+        with self.lock:
+            if adapter is None:
+                self.entries = {}
+            else:
+                prefix = self.connection_key(adapter) + '|'
+                for key in list(self.entries):
+                    if key.startswith(prefix) and (table_name is None or key == prefix + table_name):
+                        del self.entries[key]
+            self._save()
+    
+    def _get(self, adapter: DatabaseAdapter, table_name: str, kind: str, loader):
+        """读取缓存的元数据，不存在或已过期时调用loader从数据库获取"""
+        connection_key = self.connection_key(adapter)
+        key = f"{connection_key}|{table_name}"
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry['cached_at'] > self.ttl:
+                logger.info(f"表 {table_name} 的元数据缓存已过期")
+                entry = None
+                del self.entries[key]
+            if entry is not None and kind in entry:
+                return entry[kind]
+        
+        # 在锁外查询数据库，避免两侧并发读取元数据时相互等待
+        value = loader(table_name)
+        with self.lock:
+            entry = self.entries.setdefault(key, {'cached_at': time.time()})
+            entry[kind] = value
+            if self._is_persistent(key):
+                self._save()
+        return value
+    
+    def _load(self):
+        """从磁盘加载未过期的缓存"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取元数据缓存文件 {self.cache_file} 失败: {e}")
+            return
+        now = time.time()
+        self.entries = {key: entry for key, entry in entries.items()
+                        if now - entry.get('cached_at', 0) <= self.ttl}
+        logger.info(f"从 {self.cache_file} 加载了 {len(self.entries)} 个表的元数据缓存")
+    
+    def _save(self):
+        """将缓存写入磁盘（调用方需持有锁）"""
+        if not self.cache_file:
+            return
+        entries = {key: entry for key, entry in self.entries.items() if self._is_persistent(key)}
+        temp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            logger.warning(f"写入元数据缓存文件 {self.cache_file} 失败: {e}")
+
+
+class WatermarkStore:
+    """
+    增量对比的水位线状态
+    
+    以两侧连接、表名和水位线列为键，在本地JSON文件中保存每对表上次对比开始时两侧水位线列的最大值
+    （SQL字面量）、对比设置和上次对比后仍然不同的行的主键，下次对比只需检查水位线之后变化的行和这些行。
+    """
+    
+    def __init__(self, state_file: str = DEFAULT_WATERMARK_STATE_FILE):
+        """
+        初始化水位线状态
+        
+        :param state_file: 状态文件路径
+        """
+        self.state_file = state_file
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def state_key(db1: DatabaseAdapter, table1: str, db2: DatabaseAdapter, table2: str, column: str) -> str:
+        """
+        生成标识一对表和水位线列的状态键（不包含密码）
+        
+        :return: 状态键
+        """
+        return '|'.join((MetadataCache.connection_key(db1), table1, MetadataCache.connection_key(db2), table2, column))
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取上次对比保存的水位线
+        
+        :param key: 状态键
+        :return: {'table1': 字面量, 'table2': 字面量, 'settings': 对比设置, 'pending_keys': 主键元组列表,
+                  'saved_at': 时间戳}，没有时返回None
+        """
+        with self.lock:
+            state = self._load().get(key)
+        if state is not None:
+            state['pending_keys'] = [tuple(Decimal(value['decimal']) if isinstance(value, dict) else value
+                                           for value in pending_key) for pending_key in state.get('pending_keys', [])]
+        return state
+    
+    def set(self, key: str, table1: Optional[str], table2: Optional[str], settings: Dict[str, Any],
+            pending_keys: Optional[List[tuple]] = None):
+        """
+        保存本次对比的水位线
+        
+        :param key: 状态键
+        :param table1: 表1水位线列最大值的SQL字面量（表为空时为None）
+        :param table2: 表2水位线列最大值的SQL字面量（表为空时为None）
+        :param settings: 影响对比范围的设置（对比字段和WHERE条件），变化后不再使用保存的水位线
+        :param pending_keys: 本次对比后仍然不同的行的主键（值为整数、小数或字符串）
+        """
+        pending_keys = [[{'decimal': str(value)} if isinstance(value, Decimal) else value for value in pending_key]
+                        for pending_key in pending_keys or []]
+        with self.lock:
+            states = self._load()
+            states[key] = {'table1': table1, 'table2': table2, 'settings': settings,
+                           'pending_keys': pending_keys, 'saved_at': time.time()}
+            temp_file = f"{self.state_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(states, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.state_file)
+        logger.info(f"水位线已保存到 {self.state_file}")
+    
+    def _load(self) -> Dict[str, Any]:
+        """读取状态文件（调用方需持有锁），文件不存在或无法解析时返回空字典"""
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取水位线状态文件 {self.state_file} 失败: {e}")
+            return {}
+
+
+class ChecksumTreeStore:
+    """
+    持久化的分段校验和树（Merkle树）
+    
+    保存在本地SQLite文件中，每对表一棵树。叶子按第一个主键字段的固定宽度范围划分，保存每侧每个分段的行数和
+    数据库计算的聚合哈希；内部节点保存子节点的行数之和与子节点哈希的MD5。树的参数（对比设置、分段起点和宽度、
+    高度）和每侧上次的统计信息、水位线保存在trees表中，节点保存在nodes表中。
+    """
+    
+    def __init__(self, state_file: str):
+        """
+        打开（不存在时创建）校验和树文件
+        
+        :param state_file: SQLite文件路径
+        """
+        self.state_file = state_file
+        self.connection = sqlite3.connect(state_file, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS trees (
+                tree_key TEXT PRIMARY KEY, settings TEXT NOT NULL, base INTEGER NOT NULL, width INTEGER NOT NULL,
+                height INTEGER NOT NULL, state1 TEXT, state2 TEXT);
+            CREATE TABLE IF NOT EXISTS nodes (
+                tree_key TEXT NOT NULL, side INTEGER NOT NULL, level INTEGER NOT NULL, position INTEGER NOT NULL,
+                row_count INTEGER NOT NULL, checksum TEXT NOT NULL,
+                PRIMARY KEY (tree_key, side, level, position)) WITHOUT ROWID;
+        """)
+    
+    def load(self, tree_key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取树的参数
+        
+        :param tree_key: 标识一对表的键
+        :return: {'settings', 'base', 'width', 'height', 'states'}，不存在时返回None
+        """
+        row = self.connection.execute(
+            "SELECT settings, base, width, height, state1, state2 FROM trees WHERE tree_key = ?", (tree_key,)).fetchone()
+        if row is None:
+            return None
+        return {'settings': json.loads(row[0]), 'base': row[1], 'width': row[2], 'height': row[3],
+                'states': [json.loads(state) if state else None for state in row[4:6]]}
+    
+    def load_nodes(self, tree_key: str, side: int) -> List[Dict[int, tuple]]:
+        """
+        读取一侧的所有节点
+        
+        :param tree_key: 标识一对表的键
+        :param side: 1表示表1，2表示表2
+        :return: 每层 {位置: (行数, 哈希)} 的列表，第0层为叶子
+        """
+        levels = [{}]
+        for level, position, row_count, checksum in self.connection.execute(
+                "SELECT level, position, row_count, checksum FROM nodes WHERE tree_key = ? AND side = ?",
+                (tree_key, side)):
+            while len(levels) <= level:
+                levels.append({})
+            levels[level][position] = (row_count, checksum)
+        return levels
+    
+    def save(self, tree_key: str, tree: Dict[str, Any], sides: List[tuple]):
+        """
+        在一个事务中保存树的参数和两侧变化的节点
+        
+        :param tree_key: 标识一对表的键
+        :param tree: 树的参数（settings、base、width、height、states）
+        :param sides: 每侧的 (节点列表, 变化的(层, 位置)集合)，变化的集合为None时替换该侧的所有节点
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO trees VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (tree_key, json.dumps(tree['settings'], sort_keys=True), tree['base'], tree['width'], tree['height'],
+                 *(json.dumps(state, sort_keys=True) for state in tree['states'])))
+            for side, (levels, changed) in enumerate(sides, 1):
+                if changed is None:
+                    self.connection.execute("DELETE FROM nodes WHERE tree_key = ? AND side = ?", (tree_key, side))
+                    changed = {(level, position) for level, nodes in enumerate(levels) for position in nodes}
+                self.connection.executemany(
+                    "DELETE FROM nodes WHERE tree_key = ? AND side = ? AND level = ? AND position = ?",
+                    [(tree_key, side, level, position) for level, position in changed
+                     if position not in levels[level]])
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?)",
+                    [(tree_key, side, level, position) + levels[level][position] for level, position in changed
+                     if position in levels[level]])
+    
+    def close(self):
+        """关闭文件"""
+        self.connection.close()
+
+
+# SQLite按内存映射读取的最大字节数，大文件可减少read系统调用和页拷贝
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+# SQLite页缓存大小（KB）
+SQLITE_CACHE_SIZE_KB = 64 * 1024
+
+# 对比两个SQLite数据库文件时，目标数据库附加到源数据库连接后使用的数据库名
+SQLITE_ATTACH_ALIAS = 'table_diff_target'
+
+
+class SQLiteAdapter(DatabaseAdapter):
+    """SQLite数据库适配器"""
+    
+    def __init__(self):
+        self.connection = None
+        self.connect_params = None
+    
+    def connect(self, **kwargs):
+        db_path = kwargs.get('db_path')
+        read_only = kwargs.get('read_only', False)
+        logger.info(f"连接到SQLite数据库: {db_path}{'（只读）' if read_only else ''}")
+        self.connect_params = dict(kwargs)
+        # 使用URI打开数据库，附加其他数据库文件时同样可以指定只读模式
+        # 并行对比时连接由连接池在工作线程之间传递（同一时刻只被一个线程使用）
+        self.connection = sqlite3.connect(self.database_uri(db_path, read_only), uri=True,
+                                          check_same_thread=False)
+        self.connection.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        self.connection.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        # 注册分段校验和对比所需的哈希函数
+        self.connection.create_function('table_diff_row_hash', -1, _sqlite_row_hash)
+        self.connection.create_aggregate('table_diff_xor', 1, _SQLiteXorAggregate)
+        self.connection.create_function('table_diff_row_md5', -1, _sqlite_row_md5)
+        return self.connection
+    
+    def get_table_fields(self, table_name: str) -> List[str]:
+        logger.info(f"获取SQLite表 {table_name} 的字段")
+        cursor = self.connection.execute(f"PRAGMA table_info({table_name})")
+        fields = [row[1] for row in cursor.fetchall()]
+        logger.info(f"表 {table_name} 的字段: {fields}")
+        return fields
+    
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        """获取SQLite表的主键字段"""
+        logger.info(f"获取SQLite表 {table_name} 的主键")
+        cursor = self.connection.execute(f"PRAGMA table_info({table_name})")
+        primary_keys = [row[1] for row in cursor.fetchall() if row[5] > 0]  # pk列大于0表示是主键
+        logger.info(f"表 {table_name} 的主键: {primary_keys}")
+        return primary_keys
+    
+    def get_unique_keys(self, table_name: str) -> List[List[str]]:
+        """获取SQLite表的非空唯一索引字段（PRAGMA index_list）"""
+        logger.info(f"获取SQLite表 {table_name} 的唯一索引")
+        not_null = {row[1]: bool(row[3]) for row in self.connection.execute(f"PRAGMA table_info({table_name})")}
+        rows = []
+        # index_list的列: seq, name, unique, origin（pk表示主键）, partial
+        for index in self.connection.execute(f"PRAGMA index_list({table_name})").fetchall():
+            if index[2] and index[3] != 'pk' and not (len(index) > 4 and index[4]):
+                quoted_name = index[1].replace("'", "''")
+                for column in self.connection.execute(f"PRAGMA index_info('{quoted_name}')"):
+                    rows.append((index[1], column[2], not_null.get(column[2], False)))
+        unique_keys = _unique_keys_from_rows(rows)
+        logger.info(f"表 {table_name} 的非空唯一索引: {unique_keys}")
+        return unique_keys
+    
+    def get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取SQLite表的字段类型"""
+        logger.info(f"获取SQLite表 {table_name} 的字段类型")
+        cursor = self.connection.execute(f"PRAGMA table_info({table_name})")
+        return {row[1]: row[2] for row in cursor.fetchall()}
+    
+    @staticmethod
+    def database_uri(db_path: str, read_only: bool = False) -> str:
+        """
+        将数据库文件路径转换为SQLite URI
+        
+        :param db_path: 数据库文件路径（:memory:表示内存数据库）
+        :param read_only: 是否以只读模式打开
+        :return: SQLite URI
+        """
+        if db_path == ':memory:':
+            return 'file::memory:'
+        uri = 'file:' + urllib.request.pathname2url(os.path.abspath(db_path))
+        return uri + '?mode=ro' if read_only else uri
+    
+    def attach(self, db_path: str, alias: str):
+        """
+        以只读模式将另一个数据库文件附加到当前连接
+        
+        :param db_path: 数据库文件路径
+        :param alias: 附加后使用的数据库名
+        """
+        logger.info(f"以只读模式附加SQLite数据库 {db_path} 为 {alias}")
+        self.connection.execute(f"ATTACH DATABASE ? AS {alias}", (self.database_uri(db_path, True),))
+    
+    def detach(self, alias: str):
+        """分离附加的数据库"""
+        self.connection.execute(f"DETACH DATABASE {alias}")
+    
+    def null_safe_equal(self, left: str, right: str) -> str:
+        return f"{left} IS {right}"
+    
+    def integer_division(self, dividend: str, divisor: int) -> str:
+        # 整数相除即为整数除法，FLOOR函数需要编译时启用数学函数
+        return f"CAST(({dividend}) / {divisor} AS INTEGER)"
+    
+    def watermark_literal(self, value) -> str:
+        # SQLite的日期时间以文本保存，按文本比较
+        if isinstance(value, (date, datetime)):
+            return f"'{value.isoformat(' ') if isinstance(value, datetime) else value.isoformat()}'"
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return f"X'{bytes(value).hex()}'"
+        return super().watermark_literal(value)
+    
+    def supports_full_outer_join(self) -> bool:
+        # SQLite不会展开FULL OUTER JOIN中的子查询，只能逐行扫描物化的结果；
+        # 两个LEFT JOIN都能使用主键索引查找
+        return False
+    
+    def build_checksum_select(self, fields: List[str], primary_keys: List[str]) -> Optional[str]:
+        field_list = ', '.join(fields)
+        return f"COUNT(*), table_diff_xor(table_diff_row_hash({field_list}))"
+    
+    def build_row_hash(self, fields: List[str]) -> Optional[str]:
+        return f"table_diff_row_md5({', '.join(fields)})"
+    
+    def cancel(self):
+        if self.connection:
+            self.connection.interrupt()
+    
+    def execute_query(self, query: str, fetch_size: Optional[int] = None):
+        logger.info(f"执行SQLite查询: {query}")
+        cursor = self.connection.execute(query)
+        if fetch_size:
+            # SQLite游标本身按需逐步获取数据，只需设置fetchmany的默认批次大小
+            cursor.arraysize = fetch_size
+        return cursor
+    
+    def close(self):
+        if self.connection:
+            logger.info("关闭SQLite数据库连接")
+            self.connection.close()
+
+
+class _ConnectionOwningCursor:
+    """独占一个专用连接的游标包装类，关闭游标时同时关闭该连接"""
+    
+    def __init__(self, cursor, connection, connections: list):
+        self.cursor = cursor
+        self.connection = connection
+        self.connections = connections
+    
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+    
+    def __iter__(self):
+        return iter(self.cursor)
+    
+    def close(self):
+        try:
+            self.cursor.close()
+        except Exception as e:
+            # 非缓冲游标未读完时关闭可能报错，随后关闭连接即可
+            logger.debug(f"关闭流式游标时出错: {e}")
+        if self.connection in self.connections:
+            self.connections.remove(self.connection)
+            self.connection.close()
+
+
+class _ReusableConnectionCursor(_ConnectionOwningCursor):
+    """独占一个专用连接的游标包装类，关闭游标时把结果已读完的连接交还给适配器复用"""
+    
+    def __init__(self, cursor, connection, adapter):
+        self.cursor = cursor
+        self.connection = connection
+        self.adapter = adapter
+    
+    def close(self):
+        try:
+            self.cursor.close()
+            reusable = True
+        except Exception as e:
+            # 非缓冲游标未读完时关闭会报错，连接上还有未读的结果，不能复用
+            logger.debug(f"关闭流式游标时出错: {e}")
+            reusable = False
+        self.adapter._release_stream_connection(self.connection, reusable)
+
+
+class _TextRowCursor:
+    """
+    以文本形式返回值的游标包装类
+    
+    native_columns中的列（如主键）在读取时立即转换为Python值，保证按主键归并时的顺序与数据库一致；
+    其余列保留数据库返回的文本，只有输出到差异报告的行才通过decode_row转换。
+    """
+    
+    def __init__(self, cursor, make_decoders, native_columns: List[str]):
+        """
+        :param cursor: 以文本形式返回值的游标
+        :param make_decoders: 根据游标description生成每列转换函数（None表示该列不需要转换）的函数
+        :param native_columns: 读取时立即转换为Python值的列名
+        """
+        self.cursor = cursor
+        self.make_decoders = make_decoders
+        self.native_columns = {column.upper() for column in native_columns}
+        # 服务端游标在第一次读取后才有description，因此在读取时生成转换函数
+        self.decoders = None
+        self.native_decoders = None
+    
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+    
+    def __iter__(self):
+        return iter_cursor_rows(self)
+    
+    def _prepare(self):
+        names = [column[0].upper() for column in self.cursor.description]
+        decoders = self.make_decoders(self.cursor.description)
+        self.native_decoders = [(index, decoder) for index, (name, decoder) in enumerate(zip(names, decoders))
+                                if decoder is not None and name in self.native_columns]
+        self.decoders = [None if name in self.native_columns else decoder for name, decoder in zip(names, decoders)]
+    
+    def fetchmany(self, size: int = None) -> list:
+        rows = self.cursor.fetchmany(size) if size else self.cursor.fetchmany()
+        if not rows:
+            return rows
+        if self.decoders is None:
+            self._prepare()
+        native_decoders = self.native_decoders
+        if not native_decoders:
+            return rows
+        converted = []
+        for row in rows:
+            row = list(row)
+            for index, decoder in native_decoders:
+                value = row[index]
+                if value is not None:
+                    row[index] = decoder(value)
+            converted.append(tuple(row))
+        return converted
+    
+    def fetchall(self) -> list:
+        return list(iter_cursor_rows(self))
+    
+    def decode_row(self, row: tuple) -> tuple:
+        """把一行中以文本形式返回的值转换为Python值"""
+        if self.decoders is None:
+            self._prepare()
+        return tuple(value if decoder is None or value is None else decoder(value)
+                     for value, decoder in zip(row, self.decoders))
+    
+    def close(self):
+        self.cursor.close()
+
+
+# mysql-connector游标description中的字段类型代码 -> 值类别（TEXT和BLOB使用相同的类型代码）
+MYSQL_TYPE_KINDS = {
+    0: 'number', 1: 'number', 2: 'number', 3: 'number', 4: 'number', 5: 'number', 8: 'number',
+    9: 'number', 13: 'number', 246: 'number',
+    7: 'datetime', 10: 'datetime', 12: 'datetime', 14: 'datetime',
+    15: 'text', 245: 'text', 247: 'text', 248: 'text', 253: 'text', 254: 'char',
+    16: 'binary', 249: 'binary', 250: 'binary', 251: 'binary', 252: 'binary',
+}
+
+
+class MySQLAdapter(DatabaseAdapter):
+    """MySQL数据库适配器"""
+    
+    def __init__(self):
+        self.connection = None
+        self.connect_params = None
+        # 流式查询使用的专用连接（非缓冲游标在读完之前会独占连接）
+        self.stream_connections = []
+        # 结果已读完、可供下一个流式查询复用的专用连接
+        self.idle_stream_connections = []
+        # 查询被终止的专用连接，游标关闭后不再复用
+        self.cancelled_stream_connections = []
+        self.stream_lock = threading.Lock()
+    
+    def connect(self, **kwargs):
+        try:
+            import mysql.connector
+        except ImportError:
+            raise ImportError("需要安装mysql-connector-python库: pip install mysql-connector-python")
+        
+        host = kwargs.get('host', 'localhost')
+        port = kwargs.get('port', 3306)
+        user = kwargs.get('user')
+        password = kwargs.get('password')
+        database = kwargs.get('database')
+        
+        logger.info(f"连接到MySQL数据库: {host}:{port}, 用户: {user}, 数据库: {database}")
+        
+        self.connect_params = {
+            'host': host,
+            'port': port,
+            'user': user,
+            'password': password,
+            'database': database
+        }
+        self.connection = mysql.connector.connect(
+            buffered=True,  # 添加buffered参数以避免游标问题
+            **self.connect_params
+        )
+        return self.connection
+    
+    def get_table_fields(self, table_name: str) -> List[str]:
+        logger.info(f"获取MySQL表 {table_name} 的字段")
+        cursor = self.connection.cursor(buffered=True)  # 使用buffered游标
+        cursor.execute(f"DESCRIBE {table_name}")
+        fields = [row[0] for row in cursor.fetchall()]
+        cursor.close()  # 关闭游标
+        logger.info(f"表 {table_name} 的字段: {fields}")
+        return fields
+    
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        """获取MySQL表的主键字段"""
+        logger.info(f"获取MySQL表 {table_name} 的主键")
+        cursor = self.connection.cursor(buffered=True)  # 使用buffered游标
+        cursor.execute(f"SHOW KEYS FROM {table_name} WHERE Key_name = 'PRIMARY'")
+        primary_keys = [row[4] for row in cursor.fetchall()]  # Column_name列
+        cursor.close()  # 关闭游标
+        logger.info(f"表 {table_name} 的主键: {primary_keys}")
+        return primary_keys
+    
+    def get_unique_keys(self, table_name: str) -> List[List[str]]:
+        """获取MySQL表的非空唯一索引字段（SHOW INDEX）"""
+        logger.info(f"获取MySQL表 {table_name} 的唯一索引")
+        cursor = self.connection.cursor(buffered=True)
+        cursor.execute(f"SHOW INDEX FROM {table_name} WHERE Non_unique = 0 AND Key_name <> 'PRIMARY'")
+        rows = cursor.fetchall()
+        cursor.close()
+        # Key_name, Column_name（表达式索引为NULL）, Null（可为空时为YES）列，按索引和Seq_in_index排列
+        unique_keys = _unique_keys_from_rows((row[2], row[4], row[9] != 'YES') for row in rows)
+        logger.info(f"表 {table_name} 的非空唯一索引: {unique_keys}")
+        return unique_keys
+    
+    def get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取MySQL表的字段类型"""
+        logger.info(f"获取MySQL表 {table_name} 的字段类型")
+        cursor = self.connection.cursor(buffered=True)
+        cursor.execute(f"DESCRIBE {table_name}")
+        column_types = {row[0]: row[1] for row in cursor.fetchall()}  # Field, Type列
+        cursor.close()
+        return column_types
+    
+    def null_safe_equal(self, left: str, right: str) -> str:
+        return f"{left} <=> {right}"
+    
+    def supports_full_outer_join(self) -> bool:
+        return False
+    
+    def build_checksum_select(self, fields: List[str], primary_keys: List[str]) -> Optional[str]:
+        row_hash = f"CAST(CONV(SUBSTRING({self.build_row_hash(fields)}, 1, 16), 16, 10) AS UNSIGNED)"
+        return f"COUNT(*), BIT_XOR({row_hash})"
+    
+    def build_row_hash(self, fields: List[str]) -> Optional[str]:
+        columns = ', '.join(self.row_hash_value(f"CAST({field} AS CHAR)") for field in fields)
+        return f"MD5(CONCAT_WS({self.sql_text_literal(ROW_HASH_SEPARATOR)}, {columns}))"
+    
+    def sql_text_literal(self, text: str) -> str:
+        # 默认的sql_mode中反斜杠是字符串字面量的转义字符
+        return "'" + text.replace('\\', '\\\\').replace("'", "''") + "'"
+    
+    def column_kind(self, type_code) -> Optional[str]:
+        return MYSQL_TYPE_KINDS.get(type_code)
+    
+    def execute_query(self, query: str, fetch_size: Optional[int] = None):
+        logger.info(f"执行MySQL查询: {query}")
+        if fetch_size:
+            return self._execute_streaming_query(query)
+        cursor = self.connection.cursor(buffered=True)  # 使用buffered游标
+        cursor.execute(query)
+        return cursor
+    
+    def execute_text_query(self, query: str, fetch_size: Optional[int] = None, native_columns: List[str] = ()):
+        # raw游标直接返回协议中的字节，不做任何类型转换
+        logger.info(f"以文本形式执行MySQL查询: {query}")
+        if fetch_size:
+            cursor = self._execute_streaming_query(query, raw=True)
+        else:
+            cursor = self.connection.cursor(buffered=True, raw=True)
+            cursor.execute(query)
+        return _TextRowCursor(cursor, self._text_decoders, native_columns)
+    
+    def cancel(self):
+        # 非缓冲游标关闭时会先读完剩余结果，因此通过主连接终止专用连接上正在执行的查询
+        if not self.connection:
+            return
+        with self.stream_lock:
+            connections = list(self.stream_connections)
+            self.cancelled_stream_connections.extend(connections)
+        for connection in connections:
+            cursor = self.connection.cursor(buffered=True)
+            try:
+                cursor.execute(f"KILL QUERY {connection.connection_id}")
+            except Exception as e:
+                logger.debug(f"终止MySQL查询时出错: {e}")
+            finally:
+                cursor.close()
+    
+    def _execute_streaming_query(self, query: str, raw: bool = False):
+        """
+        使用非缓冲游标执行查询，结果集按需从服务器读取
+        
+        非缓冲游标在结果读完之前会占用整个连接，因此每个流式查询使用一个专用连接，
+        避免与同一适配器上的元数据查询或另一侧的查询冲突。结果读完后连接放回空闲列表，
+        下一个流式查询（如校验和的分段、按主键哈希拉取的批次）直接复用，省去重新建立连接和认证。
+        """
+        import mysql.connector
+        
+        while True:
+            with self.stream_lock:
+                reused = bool(self.idle_stream_connections)
+                connection = self.idle_stream_connections.pop() if reused else None
+            if connection is None:
+                connection = mysql.connector.connect(buffered=False, **self.connect_params)
+            with self.stream_lock:
+                self.stream_connections.append(connection)
+            try:
+                cursor = connection.cursor(buffered=False, raw=True) if raw else connection.cursor(buffered=False)
+                cursor.execute(query)
+            except Exception:
+                self._release_stream_connection(connection, False)
+                if reused and not self._stream_connection_alive(connection):
+                    # 空闲的连接可能已被服务器断开（如超过wait_timeout），使用新的连接重试
+                    logger.debug("MySQL空闲的流式查询连接已断开，使用新的连接重试")
+                    continue
+                raise
+            return _ReusableConnectionCursor(cursor, connection, self)
+    
+    def _release_stream_connection(self, connection, reusable: bool) -> None:
+        """
+        归还流式查询的专用连接，可以复用时放回空闲列表，否则关闭
+        
+        :param connection: 专用连接
+        :param reusable: 连接上的结果是否已读完
+        """
+        with self.stream_lock:
+            if connection not in self.stream_connections:
+                return
+            self.stream_connections.remove(connection)
+            if connection in self.cancelled_stream_connections:
+                self.cancelled_stream_connections.remove(connection)
+                reusable = False
+            if reusable and len(self.idle_stream_connections) < MAX_IDLE_STREAM_CONNECTIONS:
+                self.idle_stream_connections.append(connection)
+                return
+        self._close_stream_connection(connection)
+    
+    @staticmethod
+    def _stream_connection_alive(connection) -> bool:
+        """连接是否仍然可用"""
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _close_stream_connection(connection) -> None:
+        """关闭流式查询的专用连接"""
+        try:
+            connection.close()
+        except Exception as e:
+            logger.debug(f"关闭MySQL流式查询连接时出错: {e}")
+    
+    def close(self):
+        with self.stream_lock:
+            connections = self.stream_connections + self.idle_stream_connections
+            self.stream_connections = []
+            self.idle_stream_connections = []
+            self.cancelled_stream_connections = []
+        for connection in connections:
+            self._close_stream_connection(connection)
+        if self.connection:
+            logger.info("关闭MySQL数据库连接")
+            self.connection.close()
+
+
+# psycopg2游标description中的类型OID -> 值类别
+POSTGRESQL_TYPE_KINDS = {
+    20: 'number', 21: 'number', 23: 'number', 26: 'number', 700: 'number', 701: 'number', 790: 'number',
+    1700: 'number',
+    18: 'char', 1042: 'char', 19: 'text', 25: 'text', 1043: 'text',
+    17: 'binary',
+    1082: 'datetime', 1114: 'datetime', 1184: 'datetime',
+}
+
+
+# 逐值使用psycopg2类型转换函数时可以跳过的文本类型OID（转换结果就是原始文本）
+POSTGRESQL_TEXT_TYPE_OIDS = frozenset((18, 19, 25, 1042, 1043))
+# 以文本形式获取时保留文本的类型OID（数值、时间和二进制）
+POSTGRESQL_TEXT_OUTPUT_OIDS = tuple(oid for oid, kind in POSTGRESQL_TYPE_KINDS.items()
+                                    if kind in ('number', 'datetime', 'binary'))
+
+
+def _keep_text(value, cursor):
+    """保留数据库返回的文本的psycopg2类型转换函数"""
+    return value
+
+
+def _bind_caster(caster, cursor):
+    """把psycopg2的类型转换函数绑定到游标，返回只需要文本参数的函数"""
+    if caster is None:
+        return None
+    return lambda value: caster(value, cursor)
+
+# COPY文本格式中的反斜杠转义序列
+_COPY_ESCAPE_PATTERN = re.compile(r'\\(?:x([0-9a-fA-F]{1,2})|([0-7]{1,3})|(.))', re.DOTALL)
+_COPY_ESCAPE_CHARS = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+
+
+def _copy_unescape_match(match) -> str:
+    if match.group(1):
+        return chr(int(match.group(1), 16))
+    if match.group(2):
+        return chr(int(match.group(2), 8))
+    char = match.group(3)
+    return _COPY_ESCAPE_CHARS.get(char, char)
+
+
+def _copy_unescape(text: str) -> str:
+    """还原COPY文本格式中的反斜杠转义"""
+    return _COPY_ESCAPE_PATTERN.sub(_copy_unescape_match, text)
+
+
+class _CopyAborted(Exception):
+    """读取方关闭游标后中止COPY输出"""
+
+
+class _CopyOutputWriter(io.TextIOBase):
+    """
+    接收COPY ... TO STDOUT输出的文件对象
+    
+    psycopg2对文本文件对象写入已解码的字符串。写入的数据块累积到一定数量后作为一段文本放入队列。
+    """
+    
+    def __init__(self, put, chunk_writes: int):
+        self._put = put
+        self._chunk_writes = chunk_writes
+        self._parts = []
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        self._parts.append(data)
+        if len(self._parts) >= self._chunk_writes:
+            self.send()
+        return len(data)
+    
+    def send(self):
+        """将累积的数据作为一段文本放入队列"""
+        if self._parts:
+            self._put(''.join(self._parts))
+            self._parts = []
+
+
+class _PostgreSQLCopyCursor:
+    """
+    以COPY (查询) TO STDOUT读取结果集的游标
+    
+    COPY在后台线程中执行，输出的文本按段放入有界队列；fetchmany逐段解析出行，
+    并用psycopg2的类型转换函数把文本转换为与普通游标相同的Python值。
+    """
+    
+    def __init__(self, connection, query: str, description, casters: list, batch_size: int,
+                 native_columns: Optional[List[str]] = None):
+        """
+        初始化并启动COPY线程
+        
+        :param connection: 执行COPY的专用连接
+        :param query: 查询SQL语句
+        :param description: 查询结果的列描述
+        :param casters: 每列的类型转换函数（None表示保留文本）
+        :param batch_size: fetchmany默认返回的行数
+        :param native_columns: 为None时读取时转换所有列；否则只转换这些列，其余列由decode_row转换
+        """
+        self.connection = connection
+        self.description = description
+        self.arraysize = batch_size
+        self.cursor = connection.cursor()
+        self.decoders = [None] * len(casters)
+        if native_columns is not None:
+            native = {column.upper() for column in native_columns}
+            names = [column[0].upper() for column in description]
+            self.decoders = [None if name in native else caster for name, caster in zip(names, casters)]
+            casters = [caster if name in native else None for name, caster in zip(names, casters)]
+        self.cast_columns = [(index, caster) for index, caster in enumerate(casters) if caster is not None]
+        self.chunks = queue.Queue(maxsize=DEFAULT_PREFETCH_BATCHES)
+        self.stopped = threading.Event()
+        self.finished = False
+        self.pending = []
+        self.partial = ''
+        self.thread = threading.Thread(target=self._copy, args=(query,), name='table-diff-copy', daemon=True)
+        self.thread.start()
+    
+    def _copy(self, query: str):
+        """COPY线程：把查询结果以文本格式写入队列"""
+        writer = _CopyOutputWriter(self._put, max(1, self.arraysize))
+        try:
+            self.cursor.copy_expert(f"COPY ({query}) TO STDOUT", writer)
+            writer.send()
+            self._put(None)
+        except _CopyAborted:
+            pass
+        except Exception as e:
+            if not self.stopped.is_set():
+                self._put(e)
+    
+    def _put(self, item):
+        """放入队列，游标被关闭时中止COPY"""
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _CopyAborted()
+    
+    def _parse(self, chunk: str):
+        """解析一段COPY文本，末尾不完整的行留到下一段"""
+        lines = (self.partial + chunk).split('\n')
+        self.partial = lines.pop()
+        cursor = self.cursor
+        cast_columns = self.cast_columns
+        rows = self.pending
+        for line in lines:
+            values = line.split('\t')
+            if '\\' in line:
+                values = [None if value == '\\N' else (_copy_unescape(value) if '\\' in value else value)
+                          for value in values]
+            for index, caster in cast_columns:
+                value = values[index]
+                if value is not None:
+                    values[index] = caster(value, cursor)
+            rows.append(tuple(values))
+    
+    def fetchmany(self, size: int = None) -> list:
+        """取出最多size行数据"""
+        size = size or self.arraysize
+        while len(self.pending) < size and not self.finished:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.finished = True
+            elif isinstance(chunk, Exception):
+                self.finished = True
+                raise chunk
+            else:
+                self._parse(chunk)
+        rows = self.pending[:size]
+        del self.pending[:size]
+        return rows
+    
+    def fetchall(self) -> list:
+        rows = []
+        while True:
+            batch = self.fetchmany()
+            if not batch:
+                return rows
+            rows.extend(batch)
+    
+    def decode_row(self, row: tuple) -> tuple:
+        """把一行中读取时未转换的列转换为Python值"""
+        cursor = self.cursor
+        return tuple(value if caster is None or value is None else caster(value, cursor)
+                     for value, caster in zip(row, self.decoders))
+    
+    def close(self):
+        """停止COPY线程；COPY尚未结束时先取消服务器上的查询"""
+        self.stopped.set()
+        if self.thread.is_alive() and not self.finished:
+            try:
+                self.connection.cancel()
+            except Exception as e:
+                logger.debug(f"取消PostgreSQL COPY时出错: {e}")
+        self.thread.join()
+        self.finished = True
+        self.pending = []
+        try:
+            self.cursor.close()
+        except Exception as e:
+            logger.debug(f"关闭PostgreSQL COPY游标时出错: {e}")
+
+
+class PostgreSQLAdapter(DatabaseAdapter):
+    """PostgreSQL数据库适配器"""
+    
+    def __init__(self):
+        self.connection = None
+        self.connect_params = None
+        # 用于生成唯一的服务端游标名称
+        self.cursor_counter = 0
+        # COPY批量读取使用的专用连接
+        self.copy_connections = []
+    
+    def connect(self, **kwargs):
+        try:
+            import psycopg2
+        except ImportError:
+            raise ImportError("需要安装psycopg2库: pip install psycopg2")
+        
+        logger.info(f"连接到PostgreSQL数据库: {kwargs.get('host', 'localhost')}:{kwargs.get('port', 5432)}, "
+                    f"用户: {kwargs.get('user')}, 数据库: {kwargs.get('database')}")
+        
+        self.connect_params = dict(kwargs)
+        self.connection = self._open_connection()
+        return self.connection
+    
+    def _open_connection(self):
+        """使用保存的连接参数打开一个新连接"""
+        import psycopg2
+        
+        return psycopg2.connect(
+            host=self.connect_params.get('host', 'localhost'),
+            port=self.connect_params.get('port', 5432),
+            user=self.connect_params.get('user'),
+            password=self.connect_params.get('password'),
+            database=self.connect_params.get('database')
+        )
+    
+    def get_table_fields(self, table_name: str) -> List[str]:
+        logger.info(f"获取PostgreSQL表 {table_name} 的字段")
+        cursor = self.connection.cursor()
+        
+        # 首先尝试使用当前数据库和模式
+        try:
+            cursor.execute("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = %s AND table_catalog = %s
+                ORDER BY ordinal_position
+            """, (table_name, self.connection.info.dbname))
+            
+            fields_result = cursor.fetchall()
+            if fields_result:
+                fields = [row[0] for row in fields_result]
+                logger.info(f"通过information_schema获取到表 {table_name} 的字段: {fields}")
+                return fields
+        except Exception as e:
+            logger.warning(f"通过information_schema获取字段失败: {e}")
+        
+        # 如果上面的方法失败，尝试直接查询pg_attribute
+        try:
+            cursor.execute("""
+                SELECT a.attname AS column_name
+                FROM pg_class c
+                JOIN pg_attribute a ON a.attrelid = c.oid
+                JOIN pg_type t ON a.atttypid = t.oid
+                LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+                LEFT JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relname = %s 
+                AND a.attnum > 0
+                AND NOT a.attisdropped
+                ORDER BY a.attnum
+            """, (table_name,))
+            
+            fields = [row[0] for row in cursor.fetchall()]
+            if fields:
+                logger.info(f"通过pg_attribute获取到表 {table_name} 的字段: {fields}")
+                return fields
+        except Exception as e:
+            logger.warning(f"通过pg_attribute获取字段失败: {e}")
+            
+        # 如果都失败了，抛出表不存在的异常
+        raise ValueError(f"表 '{table_name}' 不存在")
+    
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        """获取PostgreSQL表的主键字段"""
+        logger.info(f"获取PostgreSQL表 {table_name} 的主键")
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                SELECT a.attname
+                FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = %s::regclass AND i.indisprimary
+            """, (table_name,))
+            
+            primary_keys = [row[0] for row in cursor.fetchall()]
+            logger.info(f"表 {table_name} 的主键: {primary_keys}")
+            return primary_keys
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "does not exist" in error_msg or "not found" in error_msg or "unknown" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
+    
+    def get_unique_keys(self, table_name: str) -> List[List[str]]:
+        """获取PostgreSQL表的非空唯一索引字段（pg_index.indisunique）"""
+        logger.info(f"获取PostgreSQL表 {table_name} 的唯一索引")
+        cursor = self.connection.cursor()
+        # 部分索引（indpred）和表达式索引（indexprs）不能唯一确定一行
+        cursor.execute("""
+            SELECT c.relname, a.attname, a.attnotnull
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            CROSS JOIN LATERAL unnest(i.indkey::smallint[]) WITH ORDINALITY AS k(attnum, position)
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+            WHERE i.indrelid = %s::regclass AND i.indisunique AND NOT i.indisprimary
+              AND i.indpred IS NULL AND i.indexprs IS NULL
+            ORDER BY c.relname, k.position
+        """, (table_name,))
+        unique_keys = _unique_keys_from_rows(cursor.fetchall())
+        logger.info(f"表 {table_name} 的非空唯一索引: {unique_keys}")
+        return unique_keys
+    
+    def get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取PostgreSQL表的字段类型"""
+        logger.info(f"获取PostgreSQL表 {table_name} 的字段类型")
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+            FROM pg_attribute a
+            WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+            ORDER BY a.attnum
+        """, (table_name,))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    def null_safe_equal(self, left: str, right: str) -> str:
+        return f"{left} IS NOT DISTINCT FROM {right}"
+    
+    def get_modification_counters(self, table_name: str) -> Optional[Dict[str, int]]:
+        # 累计的插入、更新、删除行数，统计信息在事务结束后异步上报
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT n_tup_ins, n_tup_upd, n_tup_del
+            FROM pg_stat_user_tables
+            WHERE relid = %s::regclass
+        """, (table_name,))
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return None
+        return {'inserts': int(row[0]), 'updates': int(row[1]), 'deletes': int(row[2])}
+    
+    def build_checksum_select(self, fields: List[str], primary_keys: List[str]) -> Optional[str]:
+        order_by = ', '.join(primary_keys)
+        return f"COUNT(*), md5(string_agg({self.build_row_hash(fields)}, '' ORDER BY {order_by}))"
+    
+    def build_row_hash(self, fields: List[str]) -> Optional[str]:
+        separator = f" || {self.sql_text_literal(ROW_HASH_SEPARATOR)} || "
+        columns = separator.join(self.row_hash_value(f"CAST({field} AS TEXT)") for field in fields)
+        return f"md5({columns})"
+    
+    def column_kind(self, type_code) -> Optional[str]:
+        return POSTGRESQL_TYPE_KINDS.get(type_code)
+    
+    def cancel(self):
+        for connection in [self.connection] + self.copy_connections:
+            if connection:
+                connection.cancel()
+    
+    def execute_bulk_query(self, query: str, fetch_size: Optional[int] = None,
+                           native_columns: Optional[List[str]] = None):
+        """
+        使用COPY (查询) TO STDOUT读取结果集
+        
+        COPY以连续的文本流返回全部结果，省去服务端游标逐批FETCH的往返。COPY进行中会占用整个连接，
+        因此每个查询使用一个专用连接。列类型先通过LIMIT 0的查询获取，再用psycopg2注册的类型转换函数
+        把文本转换为与普通游标相同的Python值（指定native_columns时只转换这些列）。
+        """
+        import psycopg2.extensions
+        
+        logger.info(f"使用COPY执行PostgreSQL查询: {query}")
+        connection = self._open_connection()
+        self.copy_connections.append(connection)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT * FROM ({query}) AS table_diff_copy LIMIT 0")
+            description = cursor.description
+            cursor.close()
+            casters = [None if column[1] in POSTGRESQL_TEXT_TYPE_OIDS
+                       else psycopg2.extensions.string_types.get(column[1]) for column in description]
+            copy_cursor = _PostgreSQLCopyCursor(connection, query, description, casters,
+                                                fetch_size or DEFAULT_FETCH_SIZE, native_columns)
+        except Exception:
+            self.copy_connections.remove(connection)
+            connection.close()
+            raise
+        return _ConnectionOwningCursor(copy_cursor, connection, self.copy_connections)
+    
+    def execute_query(self, query: str, fetch_size: Optional[int] = None):
+        logger.info(f"执行PostgreSQL查询: {query}")
+        cursor = self._cursor(fetch_size)
+        cursor.execute(query)
+        return cursor
+    
+    def execute_text_query(self, query: str, fetch_size: Optional[int] = None, native_columns: List[str] = ()):
+        import psycopg2.extensions
+        
+        logger.info(f"以文本形式执行PostgreSQL查询: {query}")
+        cursor = self._cursor(fetch_size)
+        # 只对这个游标注册保留文本的类型转换函数
+        psycopg2.extensions.register_type(
+            psycopg2.extensions.new_type(POSTGRESQL_TEXT_OUTPUT_OIDS, 'TABLE_DIFF_TEXT', _keep_text), cursor)
+        cursor.execute(query)
+        
+        def make_decoders(description):
+            return [_bind_caster(psycopg2.extensions.string_types.get(column[1]), cursor)
+                    if column[1] in POSTGRESQL_TEXT_OUTPUT_OIDS else None for column in description]
+        
+        return _TextRowCursor(cursor, make_decoders, native_columns)
+    
+    def _cursor(self, fetch_size: Optional[int]):
+        """创建游标，流式读取时使用命名游标（服务端游标），每次从服务器获取itersize行"""
+        if not fetch_size:
+            return self.connection.cursor()
+        self.cursor_counter += 1
+        cursor = self.connection.cursor(name=f"table_diff_cursor_{self.cursor_counter}")
+        cursor.itersize = fetch_size
+        cursor.arraysize = fetch_size
+        return cursor
+    
+    def close(self):
+        for connection in self.copy_connections:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.debug(f"关闭PostgreSQL COPY连接时出错: {e}")
+        self.copy_connections = []
+        if self.connection:
+            logger.info("关闭PostgreSQL数据库连接")
+            self.connection.close()
+
+
+# 以文本形式获取时每个值的最大长度
+TEXT_OUTPUT_SIZE = 64
+
+# 以文本形式获取时间列时设置的会话格式，使文本包含完整精度且不受客户端语言环境影响
+ORACLE_TEXT_SESSION_SQL = ("ALTER SESSION SET NLS_DATE_FORMAT = 'YYYY-MM-DD HH24:MI:SS' "
+                           "NLS_TIMESTAMP_FORMAT = 'YYYY-MM-DD HH24:MI:SS.FF9' NLS_NUMERIC_CHARACTERS = '.,'")
+DM_TEXT_SESSION_SQL = ("ALTER SESSION SET NLS_DATE_FORMAT = 'YYYY-MM-DD HH24:MI:SS' "
+                       "NLS_TIMESTAMP_FORMAT = 'YYYY-MM-DD HH24:MI:SS.FF6'")
+
+
+def _fetch_tuning_params(params: Dict[str, Any]) -> tuple:
+    """
+    读取连接参数中的arraysize（每次网络往返获取的行数）和prefetchrows（执行查询时预取的行数）
+    
+    :param params: 连接参数
+    :return: (arraysize, prefetchrows)，未设置的为None
+    """
+    arraysize = params.get('arraysize')
+    prefetchrows = params.get('prefetchrows')
+    if arraysize is not None and (not isinstance(arraysize, int) or arraysize < 1):
+        raise ValueError(f"arraysize必须是大于0的整数: {arraysize}")
+    if prefetchrows is not None and (not isinstance(prefetchrows, int) or prefetchrows < 0):
+        raise ValueError(f"prefetchrows必须是大于等于0的整数: {prefetchrows}")
+    return arraysize, prefetchrows
+
+
+def add_fetch_tuning_params(db_type: str, connect_params: Dict[str, Any],
+                            arraysize: Optional[int] = None, prefetchrows: Optional[int] = None):
+    """
+    将arraysize和prefetchrows加入Oracle和达梦数据库的连接参数（其他数据库不支持，不做修改）
+    
+    :param db_type: 数据库类型
+    :param connect_params: 连接参数
+    :param arraysize: 每次网络往返获取的行数
+    :param prefetchrows: 执行查询时预取的行数
+    """
+    if db_type not in ('oracle', 'dm'):
+        return
+    if arraysize is not None:
+        connect_params['arraysize'] = arraysize
+    if prefetchrows is not None:
+        connect_params['prefetchrows'] = prefetchrows
+
+
+class OracleAdapter(DatabaseAdapter):
+    """Oracle数据库适配器"""
+    
+    def __init__(self):
+        self.connection = None
+        self.connect_params = None
+        # 流式读取时每次网络往返获取的行数和预取的行数（None表示与fetch_size相同）
+        self.arraysize = None
+        self.prefetchrows = None
+        # 是否已设置以文本形式获取时间列所需的会话格式
+        self.text_session = False
+    
+    def connect(self, **kwargs):
+        try:
+            import oracledb
+        except ImportError:
+            raise ImportError("需要安装oracledb库: pip install oracledb")
+        
+        host = kwargs.get('host', 'localhost')
+        port = kwargs.get('port', 1521)
+        user = kwargs.get('user')
+        password = kwargs.get('password')
+        database = kwargs.get('database')
+        service_name = kwargs.get('service_name')
+        
+        logger.info(f"连接到Oracle数据库: {host}:{port}, 用户: {user}, 数据库: {database}")
+        
+        self.arraysize, self.prefetchrows = _fetch_tuning_params(kwargs)
+        self.connect_params = dict(kwargs)
+        # 构建DSN
+        if service_name:
+            dsn = oracledb.makedsn(host, port, service_name=service_name)
+        else:
+            dsn = oracledb.makedsn(host, port, sid=database)
+            
+        self.connection = oracledb.connect(
+            user=user,
+            password=password,
+            dsn=dsn
+        )
+        return self.connection
+    
+    def get_table_fields(self, table_name: str) -> List[str]:
+        logger.info(f"获取Oracle表 {table_name} 的字段")
+        try:
+            cursor = self.connection.cursor()
+            # 处理可能包含模式的表名
+            if '.' in table_name:
+                parts = table_name.split('.')
+                if len(parts) == 2:
+                    owner, table = parts
+                else:
+                    owner, table = None, table_name
+            else:
+                owner, table = None, table_name
+                
+            if owner:
+                cursor.execute("""
+                    SELECT column_name 
+                    FROM all_tab_columns 
+                    WHERE table_name = UPPER(%s) AND owner = UPPER(%s)
+                    ORDER BY column_id
+                """, (table, owner))
+            else:
+                cursor.execute("""
+                    SELECT column_name 
+                    FROM user_tab_columns 
+                    WHERE table_name = UPPER(%s)
+                    ORDER BY column_id
+                """, (table,))
+                
+            fields = [row[0] for row in cursor.fetchall()]
+            logger.info(f"表 {table_name} 的字段: {fields}")
+            return fields
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
+    
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        """获取Oracle表的主键字段"""
+        logger.info(f"获取Oracle表 {table_name} 的主键")
+        try:
+            cursor = self.connection.cursor()
+            # 处理可能包含模式的表名
+            if '.' in table_name:
+                parts = table_name.split('.')
+                if len(parts) == 2:
+                    owner, table = parts
+                else:
+                    owner, table = None, table_name
+            else:
+                owner, table = None, table_name
+                
+            if owner:
+                cursor.execute("""
+                    SELECT cols.column_name
+                    FROM all_constraints cons
+                    JOIN all_cons_columns cols ON cons.constraint_name = cols.constraint_name AND cons.owner = cols.owner
+                    WHERE cols.table_name = UPPER(%s) AND cols.owner = UPPER(%s) AND cons.constraint_type = 'P'
+                    ORDER BY cols.position
+                """, (table, owner))
+            else:
+                cursor.execute("""
+                    SELECT column_name
+                    FROM user_cons_columns
+                    WHERE table_name = UPPER(%s) AND constraint_name IN (
+                        SELECT constraint_name 
+                        FROM user_constraints 
+                        WHERE constraint_type = 'P'
+                    )
+                    ORDER BY position
+                """, (table,))
+                
+            primary_keys = [row[0] for row in cursor.fetchall()]
+            logger.info(f"表 {table_name} 的主键: {primary_keys}")
+            return primary_keys
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
+    
+    def get_unique_keys(self, table_name: str) -> List[List[str]]:
+        """获取Oracle表的非空唯一索引字段（ALL_INDEXES）"""
+        logger.info(f"获取Oracle表 {table_name} 的唯一索引")
+        cursor = self.connection.cursor()
+        # 函数索引的列是隐藏的虚拟列，在tab_columns中不存在，nullable为NULL
+        if '.' in table_name:
+            owner, table = table_name.split('.', 1)
+            cursor.execute("""
+                SELECT ic.index_name, ic.column_name, tc.nullable
+                FROM all_indexes i
+                JOIN all_ind_columns ic ON ic.index_owner = i.owner AND ic.index_name = i.index_name
+                LEFT JOIN all_tab_columns tc ON tc.owner = i.table_owner AND tc.table_name = i.table_name
+                    AND tc.column_name = ic.column_name
+                WHERE i.table_name = UPPER(:1) AND i.table_owner = UPPER(:2) AND i.uniqueness = 'UNIQUE'
+                ORDER BY ic.index_name, ic.column_position
+            """, (table, owner))
+        else:
+            cursor.execute("""
+                SELECT ic.index_name, ic.column_name, tc.nullable
+                FROM user_indexes i
+                JOIN user_ind_columns ic ON ic.index_name = i.index_name
+                LEFT JOIN user_tab_columns tc ON tc.table_name = i.table_name AND tc.column_name = ic.column_name
+                WHERE i.table_name = UPPER(:1) AND i.uniqueness = 'UNIQUE'
+                ORDER BY ic.index_name, ic.column_position
+            """, (table_name,))
+        unique_keys = _unique_keys_from_rows((row[0], row[1], row[2] == 'N') for row in cursor.fetchall())
+        logger.info(f"表 {table_name} 的非空唯一索引: {unique_keys}")
+        return unique_keys
+    
+    def get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取Oracle表的字段类型"""
+        logger.info(f"获取Oracle表 {table_name} 的字段类型")
+        cursor = self.connection.cursor()
+        if '.' in table_name:
+            owner, table = table_name.split('.', 1)
+            cursor.execute("""
+                SELECT column_name, data_type
+                FROM all_tab_columns
+                WHERE table_name = UPPER(:1) AND owner = UPPER(:2)
+                ORDER BY column_id
+            """, (table, owner))
+        else:
+            cursor.execute("""
+                SELECT column_name, data_type
+                FROM user_tab_columns
+                WHERE table_name = UPPER(:1)
+                ORDER BY column_id
+            """, (table_name,))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    def null_safe_equal(self, left: str, right: str) -> str:
+        # DECODE将两个NULL视为相等
+        return f"DECODE({left}, {right}, 1, 0) = 1"
+    
+    def build_checksum_select(self, fields: List[str], primary_keys: List[str]) -> Optional[str]:
+        return _ora_hash_checksum_select(fields)
+    
+    def build_row_hash(self, fields: List[str]) -> Optional[str]:
+        separator = f" || {self.sql_text_literal(ROW_HASH_SEPARATOR)} || "
+        columns = separator.join(self.row_hash_value(f"TO_CHAR({field})") for field in fields)
+        # STANDARD_HASH需要Oracle 12c及以上版本；拼接的文本超过4000字节时查询失败，由对比引擎回退到常规主键对比
+        return f"LOWER(RAWTOHEX(STANDARD_HASH({columns}, 'MD5')))"
+    
+    def cancel(self):
+        if self.connection:
+            self.connection.cancel()
+    
+    def execute_query(self, query: str, fetch_size: Optional[int] = None):
+        logger.info(f"执行Oracle查询: {query}")
+        cursor = self._cursor(fetch_size)
+        cursor.execute(query)
+        return cursor
+    
+    def execute_text_query(self, query: str, fetch_size: Optional[int] = None, native_columns: List[str] = ()):
+        import oracledb
+        
+        if not self.text_session:
+            cursor = self.connection.cursor()
+            cursor.execute(ORACLE_TEXT_SESSION_SQL)
+            cursor.close()
+            self.text_session = True
+        logger.info(f"以文本形式执行Oracle查询: {query}")
+        text_types = (oracledb.DB_TYPE_NUMBER, oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP)
+        native = {column.upper() for column in native_columns}
+        
+        def output_type_handler(cursor, metadata):
+            if metadata.type_code in text_types and metadata.name.upper() not in native:
+                return cursor.var(oracledb.DB_TYPE_VARCHAR, TEXT_OUTPUT_SIZE, arraysize=cursor.arraysize)
+        
+        cursor = self._cursor(fetch_size)
+        cursor.outputtypehandler = output_type_handler
+        cursor.execute(query)
+        # native_columns已由outputtypehandler按原始类型获取
+        return _TextRowCursor(cursor, self._text_decoders, ())
+    
+    def _cursor(self, fetch_size: Optional[int]):
+        """创建游标，流式读取时增大每次网络往返获取的行数"""
+        cursor = self.connection.cursor()
+        if fetch_size:
+            # prefetchrows需在execute之前设置，使执行查询的那次往返同时返回第一批数据
+            cursor.arraysize = self.arraysize or fetch_size
+            cursor.prefetchrows = self.prefetchrows if self.prefetchrows is not None else cursor.arraysize
+        return cursor
+    
+    def close(self):
+        if self.connection:
+            logger.info("关闭Oracle数据库连接")
+            self.connection.close()
+
+
+# pymssql游标description中的类型代码 -> 值类别（pymssql不区分CHAR和VARCHAR）
+MSSQL_TYPE_KINDS = {1: 'text', 2: 'binary', 3: 'number', 4: 'datetime', 5: 'number'}
+
+
+class MSSQLAdapter(DatabaseAdapter):
+    """MSSQL数据库适配器"""
+    
+    def __init__(self):
+        self.connection = None
+        self.connect_params = None
+    
+    def connect(self, **kwargs):
+        try:
+            import pymssql
+        except ImportError:
+            raise ImportError("需要安装pymssql库: pip install pymssql")
+        
+        host = kwargs.get('host', 'localhost')
+        port = kwargs.get('port', 1433)
+        user = kwargs.get('user')
+        password = kwargs.get('password')
+        database = kwargs.get('database')
+        
+        # 构建服务器地址
+        if port != 1433:
+            server = f"{host}:{port}"
+        else:
+            server = host
+            
+        logger.info(f"连接到MSSQL数据库: {server}, 用户: {user}, 数据库: {database}")
+        
+        self.connect_params = dict(kwargs)
+        self.connection = pymssql.connect(
+            server=server,
+            user=user,
+            password=password,
+            database=database
+        )
+        return self.connection
+    
+    def get_table_fields(self, table_name: str) -> List[str]:
+        logger.info(f"获取MSSQL表 {table_name} 的字段")
+        try:
+            cursor = self.connection.cursor()
+            
+            # 处理可能包含模式的表名
+            if '.' in table_name:
+                parts = table_name.split('.')
+                if len(parts) == 2:
+                    schema, table = parts
+                else:
+                    schema, table = 'dbo', table_name
+            else:
+                schema, table = 'dbo', table_name
+                
+            cursor.execute("""
+                SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_NAME = %s AND TABLE_SCHEMA = %s
+                ORDER BY ORDINAL_POSITION
+            """, (table, schema))
+            
+            fields = [row[0] for row in cursor.fetchall()]
+            logger.info(f"表 {table_name} 的字段: {fields}")
+            return fields
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
+    
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        """获取MSSQL表的主键字段"""
+        logger.info(f"获取MSSQL表 {table_name} 的主键")
+        try:
+            cursor = self.connection.cursor()
+            
+            # 处理可能包含模式的表名
+            if '.' in table_name:
+                parts = table_name.split('.')
+                if len(parts) == 2:
+                    schema, table = parts
+                else:
+                    schema, table = 'dbo', table_name
+            else:
+                schema, table = 'dbo', table_name
+                
+            cursor.execute("""
+                SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE 
+                WHERE OBJECTPROPERTY(OBJECT_ID(CONSTRAINT_SCHEMA + '.' + QUOTENAME(CONSTRAINT_NAME)), 'IsPrimaryKey') = 1
+                AND TABLE_NAME = %s AND TABLE_SCHEMA = %s
+                ORDER BY ORDINAL_POSITION
+            """, (table, schema))
+            
+            primary_keys = [row[0] for row in cursor.fetchall()]
+            logger.info(f"表 {table_name} 的主键: {primary_keys}")
+            return primary_keys
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
+    
+    def get_unique_keys(self, table_name: str) -> List[List[str]]:
+        """获取MSSQL表的非空唯一索引字段（sys.indexes）"""
+        logger.info(f"获取MSSQL表 {table_name} 的唯一索引")
+        cursor = self.connection.cursor()
+        schema, table = table_name.split('.', 1) if '.' in table_name else ('dbo', table_name)
+        # 筛选索引（has_filter）不能唯一确定一行，INCLUDE列不属于索引键
+        cursor.execute("""
+            SELECT i.name, c.name, c.is_nullable
+            FROM sys.indexes i
+            JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+            JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+            WHERE i.object_id = OBJECT_ID(%s) AND i.is_unique = 1 AND i.is_primary_key = 0
+              AND i.has_filter = 0 AND ic.is_included_column = 0
+            ORDER BY i.name, ic.key_ordinal
+        """, (f"{schema}.{table}",))
+        unique_keys = _unique_keys_from_rows((row[0], row[1], not row[2]) for row in cursor.fetchall())
+        logger.info(f"表 {table_name} 的非空唯一索引: {unique_keys}")
+        return unique_keys
+    
+    def get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取MSSQL表的字段类型"""
+        logger.info(f"获取MSSQL表 {table_name} 的字段类型")
+        cursor = self.connection.cursor()
+        schema, table = table_name.split('.', 1) if '.' in table_name else ('dbo', table_name)
+        cursor.execute("""
+            SELECT COLUMN_NAME, DATA_TYPE
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = %s AND TABLE_SCHEMA = %s
+            ORDER BY ORDINAL_POSITION
+        """, (table, schema))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    def watermark_literal(self, value) -> str:
+        # rowversion列的值为8字节二进制；MSSQL不支持TIMESTAMP字面量
+        if isinstance(value, (bytes, bytearray)):
+            return '0x' + bytes(value).hex().upper()
+        if isinstance(value, datetime):
+            target_type = 'DATETIMEOFFSET' if value.tzinfo is not None else 'DATETIME2'
+            return f"CAST('{value.isoformat(' ')}' AS {target_type})"
+        if isinstance(value, date):
+            return f"CAST('{value.isoformat()}' AS DATE)"
+        return super().watermark_literal(value)
+    
+    def build_checksum_select(self, fields: List[str], primary_keys: List[str]) -> Optional[str]:
+        separator = f", {self.sql_text_literal(ROW_HASH_SEPARATOR)}, "
+        columns = separator.join(self.row_hash_value(f"CAST({field} AS NVARCHAR(MAX))") for field in fields)
+        return f"COUNT(*), CHECKSUM_AGG(CHECKSUM(HASHBYTES('MD5', CONCAT({columns}, N''))))"
+    
+    def build_row_hash(self, fields: List[str]) -> Optional[str]:
+        # 使用VARCHAR而不是NVARCHAR，使ASCII文本的哈希与其他数据库的UTF-8文本一致
+        separator = f", {self.sql_text_literal(ROW_HASH_SEPARATOR)}, "
+        columns = separator.join(self.row_hash_value(f"CAST({field} AS VARCHAR(MAX))") for field in fields)
+        return f"LOWER(CONVERT(VARCHAR(32), HASHBYTES('MD5', CONCAT({columns}, '')), 2))"
+    
+    def column_kind(self, type_code) -> Optional[str]:
+        return MSSQL_TYPE_KINDS.get(type_code)
+    
+    def execute_query(self, query: str, fetch_size: Optional[int] = None):
+        logger.info(f"执行MSSQL查询: {query}")
+        cursor = self.connection.cursor()
+        if fetch_size:
+            cursor.arraysize = fetch_size
+        cursor.execute(query)
+        return cursor
+    
+    def close(self):
+        if self.connection:
+            logger.info("关闭MSSQL数据库连接")
+            self.connection.close()
+
+
+class DMAdapter(DatabaseAdapter):
+    """达梦数据库适配器"""
+    
+    def __init__(self):
+        self.connection = None
+        self.connect_params = None
+        # 流式读取时每次网络往返获取的行数和预取的行数（None表示与fetch_size相同）
+        self.arraysize = None
+        self.prefetchrows = None
+        # 是否已设置以文本形式获取时间列所需的会话格式
+        self.text_session = False
+    
+    def connect(self, **kwargs):
+        try:
+            dmPython = importlib.import_module('dmPython')
+        except ImportError:
+            raise ImportError("需要安装dmPython库，参考达梦官方文档进行安装")
+        
+        host = kwargs.get('host', 'localhost')
+        port = kwargs.get('port', 5236)
+        user = kwargs.get('user')
+        password = kwargs.get('password')
+        database = kwargs.get('database')
+        
+        logger.info(f"连接到达梦数据库: {host}:{port}, 用户: {user}, 数据库: {database}")
+        
+        self.arraysize, self.prefetchrows = _fetch_tuning_params(kwargs)
+        self.connect_params = dict(kwargs)
+        # 构建连接字符串
+        self.connection = dmPython.connect(
+            user=user,
+            password=password,
+            server=host,
+            port=port,
+            schema=database
+        )
+        return self.connection
+    
+    def get_table_fields(self, table_name: str) -> List[str]:
+        logger.info(f"获取达梦数据库表 {table_name} 的字段")
+        try:
+            dmPython = importlib.import_module('dmPython')
+            cursor = self.connection.cursor()
+            
+            # 处理可能包含模式的表名
+            if '.' in table_name:
+                parts = table_name.split('.')
+                if len(parts) == 2:
+                    schema, table = parts
+                else:
+                    schema, table = None, table_name
+            else:
+                schema, table = None, table_name
+                
+            if schema:
+                cursor.execute("""
+                    SELECT COLUMN_NAME 
+                    FROM ALL_TAB_COLUMNS 
+                    WHERE TABLE_NAME = UPPER(?) AND OWNER = UPPER(?)
+                    ORDER BY COLUMN_ID
+                """, (table, schema))
+            else:
+                cursor.execute("""
+                    SELECT COLUMN_NAME 
+                    FROM USER_TAB_COLUMNS 
+                    WHERE TABLE_NAME = UPPER(?)
+                    ORDER BY COLUMN_ID
+                """, (table,))
+                
+            fields = [row[0] for row in cursor.fetchall()]
+            logger.info(f"表 {table_name} 的字段: {fields}")
+            return fields
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
+    
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        """获取达梦数据库表的主键字段"""
+        logger.info(f"获取达梦数据库表 {table_name} 的主键")
+        try:
+            dmPython = importlib.import_module('dmPython')
+            cursor = self.connection.cursor()
+            
+            # 处理可能包含模式的表名
+            if '.' in table_name:
+                parts = table_name.split('.')
+                if len(parts) == 2:
+                    schema, table = parts
+                else:
+                    schema, table = None, table_name
+            else:
+                schema, table = None, table_name
+                
+            if schema:
+                cursor.execute("""
+                    SELECT COLS.COLUMN_NAME
+                    FROM ALL_CONSTRAINTS CONS
+                    JOIN ALL_CONS_COLUMNS COLS ON CONS.CONSTRAINT_NAME = COLS.CONSTRAINT_NAME AND CONS.OWNER = COLS.OWNER
+                    WHERE COLS.TABLE_NAME = UPPER(?) AND COLS.OWNER = UPPER(?) AND CONS.CONSTRAINT_TYPE = 'P'
+                    ORDER BY COLS.POSITION
+                """, (table, schema))
+            else:
+                cursor.execute("""
+                    SELECT COLUMN_NAME
+                    FROM USER_CONS_COLUMNS
+                    WHERE TABLE_NAME = UPPER(?) AND CONSTRAINT_NAME IN (
+                        SELECT CONSTRAINT_NAME 
+                        FROM USER_CONSTRAINTS 
+                        WHERE CONSTRAINT_TYPE = 'P'
+                    )
+                    ORDER BY POSITION
+                """, (table,))
+                
+            primary_keys = [row[0] for row in cursor.fetchall()]
+            logger.info(f"表 {table_name} 的主键: {primary_keys}")
+            return primary_keys
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
+    
+    def get_unique_keys(self, table_name: str) -> List[List[str]]:
+        """获取达梦数据库表的非空唯一索引字段（ALL_INDEXES）"""
+        logger.info(f"获取达梦数据库表 {table_name} 的唯一索引")
+        cursor = self.connection.cursor()
+        if '.' in table_name:
+            schema, table = table_name.split('.', 1)
+            cursor.execute("""
+                SELECT IC.INDEX_NAME, IC.COLUMN_NAME, TC.NULLABLE
+                FROM ALL_INDEXES I
+                JOIN ALL_IND_COLUMNS IC ON IC.INDEX_OWNER = I.OWNER AND IC.INDEX_NAME = I.INDEX_NAME
+                LEFT JOIN ALL_TAB_COLUMNS TC ON TC.OWNER = I.TABLE_OWNER AND TC.TABLE_NAME = I.TABLE_NAME
+                    AND TC.COLUMN_NAME = IC.COLUMN_NAME
+                WHERE I.TABLE_NAME = UPPER(?) AND I.TABLE_OWNER = UPPER(?) AND I.UNIQUENESS = 'UNIQUE'
+                ORDER BY IC.INDEX_NAME, IC.COLUMN_POSITION
+            """, (table, schema))
+        else:
+            cursor.execute("""
+                SELECT IC.INDEX_NAME, IC.COLUMN_NAME, TC.NULLABLE
+                FROM USER_INDEXES I
+                JOIN USER_IND_COLUMNS IC ON IC.INDEX_NAME = I.INDEX_NAME
+                LEFT JOIN USER_TAB_COLUMNS TC ON TC.TABLE_NAME = I.TABLE_NAME AND TC.COLUMN_NAME = IC.COLUMN_NAME
+                WHERE I.TABLE_NAME = UPPER(?) AND I.UNIQUENESS = 'UNIQUE'
+                ORDER BY IC.INDEX_NAME, IC.COLUMN_POSITION
+            """, (table_name,))
+        unique_keys = _unique_keys_from_rows((row[0], row[1], row[2] == 'N') for row in cursor.fetchall())
+        logger.info(f"表 {table_name} 的非空唯一索引: {unique_keys}")
+        return unique_keys
+    
+    def get_column_types(self, table_name: str) -> Dict[str, str]:
+        """获取达梦数据库表的字段类型"""
+        logger.info(f"获取达梦数据库表 {table_name} 的字段类型")
+        cursor = self.connection.cursor()
+        if '.' in table_name:
+            schema, table = table_name.split('.', 1)
+            cursor.execute("""
+                SELECT COLUMN_NAME, DATA_TYPE
+                FROM ALL_TAB_COLUMNS
+                WHERE TABLE_NAME = UPPER(?) AND OWNER = UPPER(?)
+                ORDER BY COLUMN_ID
+            """, (table, schema))
+        else:
+            cursor.execute("""
+                SELECT COLUMN_NAME, DATA_TYPE
+                FROM USER_TAB_COLUMNS
+                WHERE TABLE_NAME = UPPER(?)
+                ORDER BY COLUMN_ID
+            """, (table_name,))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    def null_safe_equal(self, left: str, right: str) -> str:
+        # DECODE将两个NULL视为相等
+        return f"DECODE({left}, {right}, 1, 0) = 1"
+    
+    def build_checksum_select(self, fields: List[str], primary_keys: List[str]) -> Optional[str]:
+        return _ora_hash_checksum_select(fields)
+    
+    def build_row_hash(self, fields: List[str]) -> Optional[str]:
+        separator = f" || {self.sql_text_literal(ROW_HASH_SEPARATOR)} || "
+        columns = separator.join(self.row_hash_value(f"TO_CHAR({field})") for field in fields)
+        return f"LOWER(MD5({columns}))"
+    
+    def execute_query(self, query: str, fetch_size: Optional[int] = None):
+        logger.info(f"执行达梦数据库查询: {query}")
+        cursor = self._cursor(fetch_size)
+        cursor.execute(query)
+        return cursor
+    
+    def execute_text_query(self, query: str, fetch_size: Optional[int] = None, native_columns: List[str] = ()):
+        dmPython = importlib.import_module('dmPython')
+        
+        text_types = tuple(getattr(dmPython, name) for name in ('NUMBER', 'DECIMAL', 'DATE', 'TIMESTAMP')
+                           if hasattr(dmPython, name))
+        native = {column.upper() for column in native_columns}
+        
+        def output_type_handler(cursor, name, default_type, size, precision, scale):
+            if default_type in text_types and name.upper() not in native:
+                return cursor.var(dmPython.STRING, TEXT_OUTPUT_SIZE, cursor.arraysize)
+        
+        cursor = self._cursor(fetch_size)
+        try:
+            if not self.text_session:
+                cursor.execute(DM_TEXT_SESSION_SQL)
+                self.text_session = True
+            cursor.outputtypehandler = output_type_handler
+        except Exception as e:
+            # 旧版本的dmPython不支持outputtypehandler，使用普通查询
+            logger.warning(f"达梦数据库驱动不支持以文本形式获取数据，使用普通查询: {e}")
+            cursor.close()
+            return None
+        logger.info(f"以文本形式执行达梦数据库查询: {query}")
+        cursor.execute(query)
+        return _TextRowCursor(cursor, self._text_decoders, ())
+    
+    def _cursor(self, fetch_size: Optional[int]):
+        """创建游标，流式读取时增大每次网络往返获取的行数"""
+        cursor = self.connection.cursor()
+        if fetch_size:
+            cursor.arraysize = self.arraysize or fetch_size
+            if self.prefetchrows is not None:
+                try:
+                    cursor.prefetchrows = self.prefetchrows
+                except AttributeError:
+                    logger.debug("达梦数据库驱动不支持设置prefetchrows")
+        return cursor
+    
+    def close(self):
+        if self.connection:
+            logger.info("关闭达梦数据库连接")
+            self.connection.close()
+
+
+def get_database_adapter(db_type: str) -> DatabaseAdapter:
+    """根据数据库类型获取对应的适配器"""
+    logger.info(f"获取数据库适配器: {db_type}")
+    adapters = {
+        'sqlite': SQLiteAdapter,
+        'mysql': MySQLAdapter,
+        'postgresql': PostgreSQLAdapter,
+        'oracle': OracleAdapter,
+        'mssql': MSSQLAdapter,
+        'dm': DMAdapter
+    }
+    
+    if db_type not in adapters:
+        raise ValueError(f"不支持的数据库类型: {db_type}")
+    
+    return adapters[db_type]()
+
+
+def connect_adapters(source_adapter: DatabaseAdapter, source_params: Dict[str, Any],
+                     target_adapter: DatabaseAdapter, target_params: Dict[str, Any]) -> None:
+    """
+    并发建立源数据库和目标数据库连接，跨机房时连接耗时取两者的较大值而不是两者之和
+    
+    :param source_adapter: 源数据库适配器
+    :param source_params: 源数据库连接参数
+    :param target_adapter: 目标数据库适配器
+    :param target_params: 目标数据库连接参数
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(source_adapter.connect, **source_params),
+            executor.submit(target_adapter.connect, **target_params)
+        ]
+        for future in futures:
+            future.result()
+
+
+# 自定义Action类用于处理逗号分隔的参数
+class CommaSeparatedArgsAction(argparse.Action):
+    def __call__(self, parser, namespace, values, option_string=None):
+        if isinstance(values, str):
+            # 如果输入是字符串，则按逗号分割
+            values = [v.strip() for v in values.split(',') if v.strip()]
+        setattr(namespace, self.dest, values)
+
+
+class TableComparator:
+    """
+    数据库表对比工具类
+    支持对比同一数据库中的两个表，可以指定字段、排除字段和设置WHERE条件
+    """
+
+    def __init__(self, db_adapter: DatabaseAdapter, db_adapter2: DatabaseAdapter = None):
+        """
+        初始化对比工具
+        
+        :param db_adapter: 源数据库适配器实例
+        :param db_adapter2: 目标数据库适配器实例（可选，默认为None表示使用同一个数据库）
+        """
+        self.db1 = db_adapter
+        self.db2 = db_adapter2 if db_adapter2 is not None else db_adapter
+        self.table1 = None
+        self.table2 = None
+        self.fields = []
+        self.exclude_fields = []
+        self.where_condition = None
+        # 支持两个表的不同WHERE条件
+        self.where_condition1 = None
+        self.where_condition2 = None
+        # 流式读取时每批获取的行数
+        self.fetch_size = DEFAULT_FETCH_SIZE
+        # 分段校验和对比设置
+        self.use_checksum = False
+        self.checksum_leaf_size = DEFAULT_CHECKSUM_LEAF_SIZE
+        # 两个表在同一个数据库中时，是否在数据库中完成对比只返回差异行
+        self.use_pushdown = False
+        # 是否先对比主键和数据库计算的行哈希，只拉取哈希不一致的行
+        self.use_key_hash = False
+        self.key_hash_batch_size = DEFAULT_KEY_HASH_BATCH_SIZE
+        # 并行扫描主键范围的任务数
+        self.jobs = 1
+        # 两侧使用不同连接时，每侧后台预读的批次数（0表示不预读）
+        self.prefetch_batches = DEFAULT_PREFETCH_BATCHES
+        # 适配器支持时是否使用批量导出协议读取数据（如PostgreSQL的COPY）
+        self.use_bulk_read = True
+        # 两侧是同一种数据库时，是否以数据库返回的文本形式获取值并按文本对比
+        self.use_text_output = True
+        # 本次对比中以文本形式获取时仍转换为Python值的列（主键和需要在Python中按值比较的列）
+        self._native_columns = []
+        # 本次对比中两侧把文本形式的行转换为Python值的函数（None表示行中已是Python值）
+        self._row_decoders = None
+        # 没有可用的主键时，是否按行的多重集合对比（不依赖两侧的行顺序）
+        self.use_multiset = False
+        # 没有可用的主键时，是否按行顺序对齐后对比（识别插入和删除的行）
+        self.use_alignment = False
+        self.alignment_window = DEFAULT_ALIGNMENT_WINDOW
+        # 表没有声明主键时，是否使用两个表共同的最窄非空唯一索引作为匹配键
+        self.use_unique_keys = True
+        # 增量对比的水位线列和保存水位线的状态（None表示全量对比）
+        self.watermark_column = None
+        self.watermark_store = None
+        # 持久化的分段校验和树文件（None表示不使用）
+        self.checksum_tree_file = None
+        # 表元数据缓存，每个表的字段和主键只查询一次
+        self.metadata = MetadataCache()
+        # 对比过程中输出行差异的位置（None表示保存在结果的row_differences中）
+        self.difference_sink = None
+        self.keep_differences = True
+        # 行差异数量上限，达到后提前结束对比（None表示不限制）
+        self.max_diffs = None
+        # 无法归并时主键对比可使用的内存上限（字节），超过时分区写入临时文件（None表示全部在内存中对比）
+        self.max_memory = None
+        # 列对比规则 {列名: {规则名: 参数}}
+        self.column_rules = {}
+        # 本次对比的 (字段列表, 行对比函数)，由游标的列类型和列对比规则生成（None表示尚未生成）
+        self._row_comparator = None
+        logger.info("TableComparator初始化完成")
+
+    def set_tables(self, table1: str, table2: str):
+        """
+        设置要对比的表
+        
+        :param table1: 第一个表名
+        :param table2: 第二个表名
+        """
+        logger.info(f"设置对比表: {table1} 和 {table2}")
+        self.table1 = table1
+        self.table2 = table2
+
+    def set_fields(self, fields: List[str]):
+        """
+        设置要对比的字段
+        
+        :param fields: 要对比的字段列表
+        """
+        logger.info(f"设置对比字段: {fields}")
+        self.fields = fields
+
+    def set_exclude_fields(self, exclude_fields: List[str]):
+        """
+        设置要排除的字段
+        
+        :param exclude_fields: 要排除的字段列表
+        """
+        logger.info(f"设置排除字段: {exclude_fields}")
+        self.exclude_fields = exclude_fields
+
+    def set_where_condition(self, where_condition: str):
+        """
+        设置WHERE条件（两个表使用相同的WHERE条件）
+        
+        :param where_condition: WHERE条件字符串
+        """
+        logger.info(f"设置WHERE条件: {where_condition}")
+        self.where_condition = where_condition
+
+    def set_where_condition1(self, where_condition: str):
+        """
+        设置第一个表的WHERE条件
+        
+        :param where_condition: WHERE条件字符串
+        """
+        logger.info(f"设置表 {self.table1} 的WHERE条件: {where_condition}")
+        self.where_condition1 = where_condition
+
+    def set_where_condition2(self, where_condition: str):
+        """
+        设置第二个表的WHERE条件
+        
+        :param where_condition: WHERE条件字符串
+        """
+        logger.info(f"设置表 {self.table2} 的WHERE条件: {where_condition}")
+        self.where_condition2 = where_condition
+
+    def set_fetch_size(self, fetch_size: int):
+        """
+        设置流式读取时每批获取的行数
+        
+        :param fetch_size: 每批获取的行数，必须大于0
+        """
+        if not fetch_size or fetch_size <= 0:
+            raise ValueError(f"fetch_size必须大于0: {fetch_size}")
+        logger.info(f"设置流式读取批次大小: {fetch_size}")
+        self.fetch_size = fetch_size
+
+    def set_checksum_mode(self, enabled: bool, leaf_size: int = DEFAULT_CHECKSUM_LEAF_SIZE):
+        """
+        设置是否使用分段校验和对比
+        
+        :param enabled: 是否启用
+        :param leaf_size: 不一致分段的行数不超过该值时直接拉取数据逐行对比
+        """
+        if not leaf_size or leaf_size <= 0:
+            raise ValueError(f"leaf_size必须大于0: {leaf_size}")
+        logger.info(f"设置分段校验和对比: {enabled}, 叶子分段行数: {leaf_size}")
+        self.use_checksum = enabled
+        self.checksum_leaf_size = leaf_size
+
+    def set_pushdown_mode(self, enabled: bool):
+        """
+        设置是否将对比下推到数据库中执行
+        
+        两个表在同一个数据库中时，有主键的表使用FULL OUTER JOIN、无主键的表按行分组统计两侧的出现次数，
+        由数据库完成对比，只有差异行通过网络返回。两个表不在同一个数据库中时使用常规对比。
+        
+        :param enabled: 是否启用
+        """
+        logger.info(f"设置数据库下推对比: {enabled}")
+        self.use_pushdown = enabled
+
+    def set_key_hash_mode(self, enabled: bool, batch_size: int = DEFAULT_KEY_HASH_BATCH_SIZE):
+        """
+        设置是否使用主键+行哈希的两阶段对比
+        
+        第一阶段两侧只返回主键和数据库计算的行哈希，第二阶段按主键分批拉取哈希不一致或只在一侧存在的行，
+        再逐字段对比。适用于跨数据库对比且大部分数据一致的表，网络传输量只与差异的数量相关。
+        
+        :param enabled: 是否启用
+        :param batch_size: 第二阶段每批按主键拉取的行数
+        """
+        if not batch_size or not 0 < batch_size <= MAX_KEY_HASH_BATCH_SIZE:
+            raise ValueError(f"batch_size必须在1到{MAX_KEY_HASH_BATCH_SIZE}之间: {batch_size}")
+        logger.info(f"设置主键+行哈希两阶段对比: {enabled}, 每批拉取行数: {batch_size}")
+        self.use_key_hash = enabled
+        self.key_hash_batch_size = batch_size
+
+    def set_jobs(self, jobs: int):
+        """
+        设置并行扫描的任务数，大于1时按主键范围拆分并使用独立连接并行对比
+        
+        :param jobs: 并行任务数
+        """
+        if not jobs or jobs < 1:
+            raise ValueError(f"jobs必须大于等于1: {jobs}")
+        logger.info(f"设置并行任务数: {jobs}")
+        self.jobs = jobs
+
+    def set_prefetch_batches(self, prefetch_batches: int):
+        """
+        设置后台预读的批次数
+        
+        两侧使用不同连接时，每侧由独立线程读取数据放入有界队列，对比与网络读取重叠进行。
+        
+        :param prefetch_batches: 每侧队列中最多缓存的批次数，0表示关闭后台预读
+        """
+        if prefetch_batches is None or prefetch_batches < 0:
+            raise ValueError(f"prefetch_batches不能小于0: {prefetch_batches}")
+        logger.info(f"设置后台预读批次数: {prefetch_batches}")
+        self.prefetch_batches = prefetch_batches
+
+    def set_bulk_read_mode(self, enabled: bool):
+        """
+        设置适配器支持时是否使用批量导出协议读取数据
+        
+        启用时PostgreSQL使用COPY (查询) TO STDOUT读取结果集，其他数据库不受影响。
+        
+        :param enabled: 是否启用
+        """
+        logger.info(f"设置批量读取: {enabled}")
+        self.use_bulk_read = enabled
+
+    def set_text_output_mode(self, enabled: bool):
+        """
+        设置两侧是同一种数据库时是否以文本形式获取值（默认启用）
+        
+        MySQL使用raw游标，PostgreSQL使用保留文本的类型转换函数，Oracle和达梦数据库由数据库将NUMBER、
+        DATE、TIMESTAMP转换为文本返回，省去驱动逐值转换为Python对象的开销。同一种数据库对相同的值转换出
+        的文本相同，因此先按文本对比；文本不同的行转换为Python值后再对比一次，报告中也是转换后的值。
+        两侧数据库类型不同时不使用。主键和设置了tolerance、truncate、timezone规则的列读取时即转换。
+        
+        :param enabled: 是否启用
+        """
+        logger.info(f"设置以文本形式获取数值和时间列: {enabled}")
+        self.use_text_output = enabled
+
+    def set_multiset_mode(self, enabled: bool):
+        """
+        设置没有可用的主键时是否按行的多重集合对比
+        
+        启用时两侧查询不排序，按任意顺序流式读取，统计每行（对比字段归一化后的值）在两侧出现的次数，
+        只报告两侧出现次数不同的行及多出的次数，插入或删除一行不会使后面的行都被报告为差异。
+        设置了max_memory时，待匹配的行超过内存上限后按行哈希分区写入临时文件。
+        
+        :param enabled: 是否启用
+        """
+        logger.info(f"设置按行的多重集合对比: {enabled}")
+        self.use_multiset = enabled
+
+    def set_alignment_mode(self, enabled: bool, window: int = DEFAULT_ALIGNMENT_WINDOW):
+        """
+        设置没有可用的主键时是否按行顺序对齐后对比
+        
+        适用于行顺序有意义的表（如追加写入的日志表）：两侧按查询顺序读取，开头的行不同时在两侧的窗口内
+        对行键做差异对齐，插入和删除的行分别报告为只在一侧存在，原位修改的行报告为数据不同，
+        插入或删除一行不会使后面的行都被报告为差异。内存占用只与窗口大小有关。
+        
+        :param enabled: 是否启用
+        :param window: 每侧窗口中保留的行数，插入或删除的连续行超过窗口大小时按原位修改报告
+        """
+        if not window or window < 1:
+            raise ValueError(f"window必须大于0: {window}")
+        logger.info(f"设置按行顺序对齐对比: {enabled}, 窗口大小: {window}")
+        self.use_alignment = enabled
+        self.alignment_window = window
+
+    def set_unique_key_mode(self, enabled: bool):
+        """
+        设置表没有声明主键时是否使用唯一索引作为匹配键（默认启用）
+        
+        启用时从两个表的唯一约束和唯一索引中选出所有列都为NOT NULL、两侧字段相同的索引，
+        取字段最少的一个代替主键排序和匹配，使用按主键对比的各种引擎，而不是依赖行顺序的按位置对比。
+        
+        :param enabled: 是否启用
+        """
+        logger.info(f"设置使用唯一索引作为匹配键: {enabled}")
+        self.use_unique_keys = enabled
+
+    def set_watermark(self, column: Optional[str], state_file: str = DEFAULT_WATERMARK_STATE_FILE):
+        """
+        设置增量对比使用的水位线列
+        
+        水位线列随行的每次修改递增（如updated_at、MSSQL的rowversion、PostgreSQL的xmin::text::bigint）。
+        每次对比开始时记录两侧水位线列的最大值并保存到状态文件；下次对比只按主键拉取任一侧水位线之后
+        变化的行，与另一侧主键相同的行逐字段对比。没有保存的水位线或对比字段、WHERE条件变化时执行全量对比。
+        只对有主键的表生效；水位线无法反映删除的行，删除只在全量对比中发现。
+        
+        :param column: 水位线列名或表达式，为None时关闭增量对比
+        :param state_file: 保存水位线的状态文件路径
+        """
+        logger.info(f"设置增量对比水位线列: {column}, 状态文件: {state_file}")
+        self.watermark_column = column
+        self.watermark_store = WatermarkStore(state_file) if column else None
+
+    def set_checksum_tree(self, state_file: Optional[str]):
+        """
+        设置持久化的分段校验和树文件
+        
+        两侧为同类数据库且第一个主键字段为整数时，把每侧按主键范围划分的分段行数和聚合哈希组成的Merkle树
+        保存在本地SQLite文件中。再次对比时统计信息显示没有变化的一侧直接使用保存的哈希；设置了水位线列时
+        只重新计算包含水位线之后变化的行的分段；否则在数据库中按分段分组重新计算该侧所有分段。
+        随后从根节点比较两侧的树，只拉取哈希不一致的叶子分段的数据逐行对比。
+        分段宽度使每个分段约有checksum_leaf_size行。
+        
+        :param state_file: SQLite文件路径，为None时不使用
+        """
+        logger.info(f"设置分段校验和树文件: {state_file}")
+        self.checksum_tree_file = state_file
+
+    def set_metadata_cache(self, cache_file: Optional[str] = None, ttl: float = DEFAULT_METADATA_CACHE_TTL):
+        """
+        设置元数据缓存
+        
+        :param cache_file: 磁盘缓存文件路径，为None时只在内存中缓存
+        :param ttl: 缓存有效期（秒）
+        """
+        if ttl is None or ttl < 0:
+            raise ValueError(f"元数据缓存有效期不能小于0: {ttl}")
+        logger.info(f"设置元数据缓存: 文件={cache_file}, 有效期={ttl}秒")
+        self.metadata = MetadataCache(cache_file, ttl)
+
+    def set_difference_sink(self, sink: Optional[DifferenceSink], keep_differences: bool = False):
+        """
+        设置行差异的输出位置
+        
+        设置后对比引擎每发现一行差异就写入sink，而不是在对比结束后统一生成报告。
+        
+        :param sink: 差异输出（如CsvDifferenceSink），None表示只保存在结果中
+        :param keep_differences: 是否同时在结果的row_differences中保留全部差异
+        """
+        logger.info(f"设置差异输出: {type(sink).__name__ if sink is not None else None}, 保留差异: {keep_differences}")
+        self.difference_sink = sink
+        self.keep_differences = keep_differences if sink is not None else True
+
+    def set_max_diffs(self, max_diffs: Optional[int]):
+        """
+        设置行差异数量上限
+        
+        发现的行差异达到上限后停止读取数据、关闭游标并返回，结果中truncated为True。
+        
+        :param max_diffs: 行差异数量上限，None表示不限制，1表示发现第一个差异即停止
+        """
+        if max_diffs is not None and max_diffs < 1:
+            raise ValueError(f"max_diffs必须大于等于1: {max_diffs}")
+        logger.info(f"设置行差异数量上限: {max_diffs}")
+        self.max_diffs = max_diffs
+
+    def set_max_memory(self, max_memory: Union[int, str, None]):
+        """
+        设置无法按数据库顺序归并时主键对比的内存上限
+        
+        设置后回退的主键对比不再把两个表全部加载到内存，而是按主键哈希分区写入临时文件，
+        再逐个分区对比；分区仍超过上限时继续递归拆分。
+        
+        :param max_memory: 内存上限，字节数或 '512M'、'16G' 这样的字符串，None表示不限制
+        """
+        if max_memory is not None:
+            max_memory = parse_memory_size(max_memory)
+        logger.info(f"设置主键对比内存上限: {max_memory}")
+        self.max_memory = max_memory
+
+    def set_column_rules(self, column_rules: Union[str, Dict[str, Dict[str, Any]], None]):
+        """
+        设置列对比规则
+        
+        trim、ignore_case、round在两侧的SELECT中由数据库完成转换，tolerance、truncate、timezone
+        在对比时应用。规则不作用于主键字段。
+        
+        :param column_rules: {列名: {规则名: 参数}} 字典或JSON格式的规则文件路径，None表示不使用规则
+        """
+        self.column_rules = load_column_rules(column_rules) if column_rules else {}
+        logger.info(f"设置列对比规则: {self.column_rules}")
+
+    def _run_on_both_sides(self, func1, func2) -> tuple:
+        """
+        分别在两侧执行操作，两侧使用不同连接时并发执行
+        
+        :param func1: 在源数据库上执行的无参函数
+        :param func2: 在目标数据库上执行的无参函数
+        :return: (func1结果, func2结果)
+        """
+        if self.db1 is self.db2:
+            return func1(), func2()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future1 = executor.submit(func1)
+            future2 = executor.submit(func2)
+            return future1.result(), future2.result()
+
+    def _execute_streaming_query(self, db: DatabaseAdapter, query: str):
+        """
+        流式执行一侧的查询，按设置优先使用批量导出协议或以文本形式获取
+        
+        :param db: 执行查询的适配器
+        :param query: 查询语句
+        :return: 游标
+        """
+        text_output = self.use_text_output and type(self.db1) is type(self.db2)
+        if self.use_bulk_read:
+            cursor = db.execute_bulk_query(query, fetch_size=self.fetch_size,
+                                           native_columns=self._native_columns if text_output else None)
+            if cursor is not None:
+                return cursor
+        if text_output:
+            cursor = db.execute_text_query(query, fetch_size=self.fetch_size, native_columns=self._native_columns)
+            if cursor is not None:
+                return cursor
+        return db.execute_query(query, fetch_size=self.fetch_size)
+
+    def _execute_query_pair(self, query1: str, query2: str,
+                            db1: DatabaseAdapter = None, db2: DatabaseAdapter = None) -> tuple:
+        """
+        执行两侧的查询并返回游标
+        
+        两侧使用不同连接时并发执行查询，并由后台线程预读数据，使两侧的网络读取相互重叠。
+        
+        :param query1: 第一个表的查询语句
+        :param query2: 第二个表的查询语句
+        :param db1: 执行查询1的适配器（默认为源数据库适配器）
+        :param db2: 执行查询2的适配器（默认为目标数据库适配器）
+        :return: (游标1, 游标2)
+        """
+        db1 = db1 or self.db1
+        db2 = db2 or self.db2
+        if db1 is db2 or self.prefetch_batches <= 0:
+            logger.info("执行查询1")
+            cursor1 = self._execute_streaming_query(db1, query1)
+            logger.info("执行查询2")
+            cursor2 = self._execute_streaming_query(db2, query2)
+            return cursor1, cursor2
+        
+        logger.info("并发执行查询1和查询2")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future1 = executor.submit(self._execute_streaming_query, db1, query1)
+            future2 = executor.submit(self._execute_streaming_query, db2, query2)
+            try:
+                cursor1 = future1.result()
+            except Exception:
+                if future2.exception() is None:
+                    self._close_cursor(future2.result())
+                raise
+            try:
+                cursor2 = future2.result()
+            except Exception:
+                self._close_cursor(cursor1)
+                raise
+        return (PrefetchCursor(cursor1, self.fetch_size, self.prefetch_batches),
+                PrefetchCursor(cursor2, self.fetch_size, self.prefetch_batches))
+
+    def get_table_fields(self, table_name: str, db_index: int = 1) -> List[str]:
+        """
+        获取表的所有字段名
+        
+        :param table_name: 表名
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :return: 字段名列表
+        """
+        logger.info(f"获取表 {table_name} 的所有字段")
+        try:
+            db = self.db1 if db_index == 1 else self.db2
+            fields = self.metadata.get_table_fields(db, table_name)
+            logger.info(f"表 {table_name} 的字段: {fields}")
+            return fields
+        except Exception as e:
+            # 检查是否是表不存在的错误
+            error_msg = str(e).lower()
+            if "no such table" in error_msg or "doesn't exist" in error_msg or "not found" in error_msg or "unknown" in error_msg or "表" in error_msg:
+                raise ValueError(f"表 '{table_name}' 不存在")
+            else:
+                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
+
+    def get_primary_keys(self, table_name: str, db_index: int = 1) -> List[str]:
+        """
+        获取表的主键字段
+        
+        :param table_name: 表名
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :return: 主键字段列表；表没有声明主键时为选作匹配键的唯一索引字段
+        """
+        db = self.db1 if db_index == 1 else self.db2
+        primary_keys = self.metadata.get_primary_keys(db, table_name)
+        if not primary_keys and self.use_unique_keys and table_name == (self.table1 if db_index == 1 else self.table2):
+            primary_keys = self.get_unique_match_key()
+        return primary_keys
+
+    def get_unique_match_key(self) -> List[str]:
+        """
+        选择两个表共同的最窄非空唯一键作为匹配键
+        
+        有主键的一侧只用主键，没有主键的一侧使用它的非空唯一索引，两侧字段集合相同的键中取字段最少的一个。
+        
+        :return: 按表1中顺序排列的字段列表（两侧查询按相同顺序排序），没有共同的唯一键时返回空列表
+        """
+        candidates1, candidates2 = self._key_candidates(1), self._key_candidates(2)
+        common_keys = [key for key in candidates1 if any(set(key) == set(other) for other in candidates2)]
+        if not common_keys:
+            return []
+        match_key = min(common_keys, key=len)
+        logger.info(f"表 {self.table1} 和 {self.table2} 使用唯一索引 {match_key} 作为匹配键")
+        return match_key
+
+    def _key_candidates(self, db_index: int) -> List[List[str]]:
+        """获取一侧表可作为匹配键的字段列表（主键，没有主键时为非空唯一索引）"""
+        db, table_name = (self.db1, self.table1) if db_index == 1 else (self.db2, self.table2)
+        primary_keys = self.metadata.get_primary_keys(db, table_name)
+        if primary_keys:
+            return [primary_keys]
+        try:
+            return self.metadata.get_unique_keys(db, table_name)
+        except Exception as e:
+            # 唯一索引只用于选择更快的对比方式，无法读取时按没有唯一索引处理
+            logger.warning(f"获取表 {table_name} 的唯一索引失败，不使用唯一索引匹配: {e}")
+            return []
+
+    def get_column_types(self, table_name: str, db_index: int = 1) -> Dict[str, str]:
+        """
+        获取表的字段类型
+        
+        :param table_name: 表名
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :return: {字段名: 类型名}
+        """
+        db = self.db1 if db_index == 1 else self.db2
+        return self.metadata.get_column_types(db, table_name)
+
+    def get_comparison_fields(self) -> List[str]:
+        """
+        获取最终要对比的字段列表
+        
+        :return: 对比字段列表
+        """
+        logger.info("获取对比字段列表")
+        # 如果用户指定了字段，则直接使用
+        if self.fields:
+            logger.info(f"使用指定的字段: {self.fields}")
+            # 检查指定的字段是否在两个表中都存在
+            try:
+                fields1 = self.get_table_fields(self.table1, 1)
+                fields2 = self.get_table_fields(self.table2, 2)
+            except Exception as e:
+                logger.error(f"获取表字段时出错: {str(e)}")
+                raise
+            
+            # 检查每个指定的字段是否存在于两个表中
+            missing_in_table1 = [f for f in self.fields if f not in fields1]
+            missing_in_table2 = [f for f in self.fields if f not in fields2]
+            
+            if missing_in_table1:
+                raise ValueError(f"字段 {', '.join(missing_in_table1)} 在表 '{self.table1}' 中不存在")
+                
+            if missing_in_table2:
+                raise ValueError(f"字段 {', '.join(missing_in_table2)} 在表 '{self.table2}' 中不存在")
+                
+            comparison_fields = list(self.fields)
+        else:
+            # 否则获取两个表的公共字段
+            logger.info(f"获取表 {self.table1} 的字段")
+            fields1 = self.get_table_fields(self.table1, 1)
+            logger.info(f"获取表 {self.table2} 的字段")
+            fields2 = self.get_table_fields(self.table2, 2)
+
+            # 获取公共字段
+            common_fields = list(set(fields1) & set(fields2))
+            logger.info(f"两个表的公共字段: {common_fields}")
+
+            # 如果有排除字段，则移除它们
+            if self.exclude_fields:
+                logger.info(f"排除字段: {self.exclude_fields}")
+                # 检查要排除的字段是否存在于公共字段中
+                existing_exclude_fields = [f for f in self.exclude_fields if f in common_fields]
+                non_existing_exclude_fields = [f for f in self.exclude_fields if f not in common_fields]
+                
+                if non_existing_exclude_fields:
+                    logger.warning(f"要排除的字段 {', '.join(non_existing_exclude_fields)} 不存在于两个表的公共字段中")
+                
+                common_fields = [f for f in common_fields if f not in existing_exclude_fields]
+                logger.info(f"排除后剩余字段: {common_fields}")
+
+            comparison_fields = common_fields
+
+        logger.info(f"最终对比字段: {comparison_fields}")
+        
+        # 如果表有主键但主键不在比较字段中，则添加主键字段
+        # 仅当用户没有指定字段时才添加主键，如果用户指定了字段，则完全按照用户指定的字段进行比较
+        if not self.fields:
+            primary_keys = self.get_primary_keys(self.table1, 1)
+            if primary_keys:
+                for pk in primary_keys:
+                    if pk not in comparison_fields:
+                        logger.info(f"添加主键字段 {pk} 到比较字段中")
+                        comparison_fields.append(pk)
+        
+        return comparison_fields
+
+    def get_where_condition(self, table_name: str) -> Optional[str]:
+        """
+        获取指定表实际使用的WHERE条件，优先使用特定表的WHERE条件
+        
+        :param table_name: 表名
+        :return: WHERE条件字符串，没有条件时返回None
+        """
+        where_condition = None
+        logger.info(f"表名匹配详情 - 当前表名: '{table_name}', self.table1: '{self.table1}', self.table2: '{self.table2}'")
+        logger.info(f"WHERE条件值 - where_condition1: {self.where_condition1}, where_condition2: {self.where_condition2}, where_condition: {self.where_condition}")
+        
+        # 改进表名匹配逻辑，处理可能的模式名前缀
+        # 确保表名不为空
+        if self.table1 and self.table2:
+            table1_name = self.table1.split('.')[-1]  # 获取表名部分（去掉模式前缀）
+            table2_name = self.table2.split('.')[-1]  # 获取表名部分（去掉模式前缀）
+            current_table_name = table_name.split('.')[-1]  # 获取当前表名部分（去掉模式前缀）
+            
+            logger.info(f"简化表名匹配 - 当前表名: '{current_table_name}', 表1名: '{table1_name}', 表2名: '{table2_name}'")
+            
+            if current_table_name == table1_name:
+                where_condition = self.where_condition1 or self.where_condition
+                logger.info(f"匹配到表1，使用表1的WHERE条件: {where_condition}")
+            elif current_table_name == table2_name:
+                where_condition = self.where_condition2 or self.where_condition
+                logger.info(f"匹配到表2，使用表2的WHERE条件: {where_condition}")
+            else:
+                where_condition = self.where_condition
+                logger.info(f"未匹配到特定表，使用通用WHERE条件: {where_condition}")
+        else:
+            where_condition = self.where_condition
+            logger.info(f"表名未设置，使用通用WHERE条件: {where_condition}")
+        
+        return where_condition
+
+    def build_query(self, fields: List[str], table_name: str, db_index: int = 1,
+                    extra_condition: Optional[str] = None, ordered: bool = True) -> str:
+        """
+        构建查询SQL
+        
+        :param fields: 字段列表
+        :param table_name: 表名
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :param extra_condition: 附加的过滤条件（如主键范围），与WHERE条件以AND组合
+        :param ordered: 是否添加ORDER BY（按行的多重集合对比不依赖行顺序，不需要排序）
+        :return: 查询SQL语句
+        """
+        logger.info(f"为表 {table_name} 构建查询，字段: {fields}")
+        
+        # 获取主键字段
+        primary_keys = self.get_primary_keys(table_name, db_index)
+        
+        # 确保主键字段包含在查询字段中，以避免KeyError
+        query_fields = list(fields)
+        for pk in primary_keys:
+            if pk not in query_fields:
+                query_fields.append(pk)
+        
+        # 可以用SQL表达的列对比规则在SELECT中完成转换
+        field_list = ', '.join(self._select_expression(field, primary_keys) for field in query_fields)
+        query = f"SELECT {field_list} FROM {table_name}"
+        query += self._build_where_clause(table_name, extra_condition)
+        
+        # 按行的多重集合对比时不排序
+        if not ordered:
+            logger.info("不添加ORDER BY")
+        # 添加ORDER BY主键
+        elif primary_keys:
+            order_by_fields = ', '.join(primary_keys)
+            query += f" ORDER BY {order_by_fields}"
+            logger.info(f"添加ORDER BY主键: {order_by_fields}")
+        # 如果没有主键，使用所有字段进行排序
+        else:
+            # 为PostgreSQL添加ORDER BY以确保结果顺序一致
+            db = self.db1 if db_index == 1 else self.db2
+            if isinstance(db, PostgreSQLAdapter):
+                order_by_fields = ', '.join(query_fields)
+                query += f" ORDER BY {order_by_fields}"
+                logger.info(f"添加ORDER BY所有字段: {order_by_fields}")
+            # 为其他数据库也添加排序以确保一致性
+            else:
+                # 对于非PostgreSQL数据库，如果有主键就按主键排序，否则不强制排序
+                pass
+        
+        logger.info(f"构建完成的查询: {query}")
+        return query
+
+    def _build_where_clause(self, table_name: str, extra_condition: Optional[str] = None) -> str:
+        """
+        构建包含用户WHERE条件和附加条件的WHERE子句
+        
+        :param table_name: 表名
+        :param extra_condition: 附加的过滤条件
+        :return: 以空格开头的WHERE子句，没有条件时返回空字符串
+        """
+        where_condition = self.get_where_condition(table_name)
+        if where_condition and extra_condition:
+            where_condition = f"({where_condition}) AND {extra_condition}"
+        elif extra_condition:
+            where_condition = extra_condition
+        
+        if not where_condition:
+            return ""
+        logger.info(f"最终添加的WHERE条件: {where_condition}")
+        return f" WHERE {where_condition}"
+
+    def compare(self) -> Dict[str, Any]:
+        """
+        执行表对比
+        
+        :return: 对比结果
+        """
+        try:
+            logger.info("开始执行表对比")
+            # 获取两个表的所有字段
+            logger.info(f"获取表 {self.table1} 和 {self.table2} 的字段")
+            fields1, fields2 = self._run_on_both_sides(
+                lambda: self.get_table_fields(self.table1, 1),
+                lambda: self.get_table_fields(self.table2, 2))
+            
+            # 只有在用户没有指定字段且没有指定排除字段时，才检查字段一致性
+            if not self.fields and not self.exclude_fields:
+                # 检查字段是否完全一致
+                if set(fields1) != set(fields2):
+                    # 获取公共字段
+                    common_fields = list(set(fields1) & set(fields2))
+                    
+                    # 字段不一致，返回字段不匹配
+                    logger.warning(f"表 {self.table1} 和 {self.table2} 字段不一致")
+                    # 获取差异字段
+                    only_in_table1 = list(set(fields1) - set(fields2))
+                    only_in_table2 = list(set(fields2) - set(fields1))
+                    
+                    result = {
+                        'fields': [],
+                        'table1_row_count': 0,
+                        'table2_row_count': 0,
+                        'differences': [{
+                            'type': 'field_mismatch',
+                            'message': f'表 {self.table1} 和 {self.table2} 字段不一致',
+                            'details': {
+                                'table1_fields': fields1,
+                                'table2_fields': fields2,
+                                'only_in_table1': only_in_table1,
+                                'only_in_table2': only_in_table2,
+                                'common_fields': common_fields
+                            }
+                        }],
+                        'row_differences': [],
+                        'table1_fields': fields1,
+                        'table2_fields': fields2,
+                        'only_in_table1': only_in_table1,
+                        'only_in_table2': only_in_table2,
+                        'common_fields': common_fields
+                    }
+                    return result
+            
+            # 获取要对比的字段
+            logger.info("获取对比字段")
+            comparison_fields = self.get_comparison_fields()
+            logger.info(f"对比字段: {comparison_fields}")
+            
+            # 如果指定了字段或有公共字段，但最终没有可对比字段
+            if not comparison_fields:
+                logger.error("没有找到可对比的字段")
+                raise ValueError("没有找到可对比的字段")
+            
+            # 获取主键字段
+            primary_keys1, primary_keys2 = self._run_on_both_sides(
+                lambda: self.get_primary_keys(self.table1, 1),
+                lambda: self.get_primary_keys(self.table2, 2))
+            # 保持表1主键的声明顺序，与build_query中ORDER BY的顺序一致
+            common_primary_keys = [pk for pk in primary_keys1 if pk in primary_keys2]
+            
+            # 准备结果
+            result = {
+                'fields': comparison_fields,
+                'table1_row_count': 0,
+                'table2_row_count': 0,
+                'differences': [],
+                'row_differences': [],
+                'table1_fields': fields1,  # 添加表1的所有字段
+                'table2_fields': fields2   # 添加表2的所有字段
+            }
+            
+            # 如果两个表都有主键，且主键字段一致，并且主键字段在比较字段中，则按主键进行匹配对比
+            use_primary_key = bool(common_primary_keys) and all(pk in comparison_fields for pk in common_primary_keys)
+            
+            # 行差异保存在内存列表中，或边对比边写入设置的差异输出
+            kept_differences = DifferenceList() if self.keep_differences else None
+            if self.difference_sink is None:
+                differences = kept_differences
+            elif kept_differences is None:
+                differences = self.difference_sink
+            else:
+                differences = _DifferenceTee(kept_differences, self.difference_sink)
+            
+            if self.max_diffs is not None:
+                differences = _LimitedDifferences(differences, self.max_diffs)
+            
+            self._row_comparator = None
+            self._row_decoders = None
+            self._native_columns = list(common_primary_keys) + [
+                field for field in comparison_fields
+                if any(self._column_rule(field).get(name) is not None for name in ('tolerance', 'truncate', 'timezone'))]
+            try:
+                if self.watermark_column and use_primary_key and not self.checksum_tree_file:
+                    comparison_result = self._compare_rows_with_watermark(common_primary_keys,
+                                                                          comparison_fields, differences)
+                else:
+                    if self.watermark_column:
+                        logger.warning("增量对比需要两个表共同的主键，执行全量对比")
+                    comparison_result = self._compare_rows(use_primary_key, common_primary_keys,
+                                                           comparison_fields, differences)
+                result['truncated'] = False
+            except DifferenceLimitReached:
+                # 差异达到上限时停止读取数据，行数只统计到提前结束时为止，因此不再报告
+                logger.warning(f"行差异达到上限 {self.max_diffs}，提前结束对比")
+                comparison_result = {
+                    'table1_row_count': None,
+                    'table2_row_count': None,
+                    'difference_count': self.max_diffs
+                }
+                result['truncated'] = True
+            
+            result['row_differences'] = kept_differences if kept_differences is not None else []
+            result['table1_row_count'] = comparison_result['table1_row_count']
+            result['table2_row_count'] = comparison_result['table2_row_count']
+            result['row_difference_count'] = comparison_result['difference_count']
+            if 'changed_row_count' in comparison_result:
+                # 增量对比只读取变化的行，不统计表的行数
+                result['changed_row_count'] = comparison_result['changed_row_count']
+            
+            # 添加差异计数信息
+            diff_count = result['row_difference_count']
+            if diff_count > 0:
+                message = f'共有{diff_count}行存在数据差异'
+                if result['truncated']:
+                    message = f'发现{diff_count}行数据差异后提前结束对比（结果已截断）'
+                result['differences'].append({
+                    'type': 'multiple_row_diff',
+                    'count': diff_count,
+                    'message': message
+                })
+            
+            logger.info("表对比完成")
+            return result
+
+        except Exception as e:
+            logger.error(f"对比过程中发生错误: {str(e)}", exc_info=True)
+            raise RuntimeError(f"对比过程中发生错误: {str(e)}")
+            
+    def _compare_rows(self, use_primary_key: bool, primary_keys: List[str], comparison_fields: List[str],
+                      differences: DifferenceSink) -> dict:
+        """
+        选择对比引擎执行行数据对比
+        
+        :param use_primary_key: 是否按主键匹配对比
+        :param primary_keys: 两个表共同的主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
+        :return: 包含差异列表和行数统计的字典
+        """
+        comparison_result = None
+        # 两个SQLite数据库文件按主键对比时，除非使用校验和树，总是附加到同一连接中由SQLite完成对比
+        if self.use_pushdown or (use_primary_key and self._can_attach() and not self.checksum_tree_file):
+            comparison_result = self._compare_rows_by_pushdown(
+                use_primary_key, primary_keys, comparison_fields, differences)
+        
+        if comparison_result is None and use_primary_key and self.checksum_tree_file:
+            logger.info(f"使用主键 {primary_keys} 和持久化的分段校验和树进行对比")
+            comparison_result = self._compare_rows_by_checksum_tree(primary_keys, comparison_fields, differences)
+        
+        if comparison_result is None and use_primary_key and self.use_key_hash:
+            logger.info(f"使用主键 {primary_keys} 进行主键+行哈希两阶段对比")
+            comparison_result = self._compare_rows_by_key_hash(primary_keys, comparison_fields, differences)
+        
+        if comparison_result is None and use_primary_key and self.use_checksum:
+            logger.info(f"使用主键 {primary_keys} 进行分段校验和对比")
+            comparison_result = self._compare_rows_by_checksum(primary_keys, comparison_fields, differences)
+        
+        if comparison_result is None and use_primary_key and self.jobs > 1:
+            logger.info(f"使用主键 {primary_keys} 进行并行范围对比，任务数: {self.jobs}")
+            comparison_result = self._compare_rows_by_key_ranges(primary_keys, comparison_fields, differences)
+        
+        if comparison_result is not None:
+            return comparison_result
+        
+        # 构建查询语句
+        logger.info("构建查询语句")
+        ordered = use_primary_key or not self.use_multiset
+        query1 = self.build_query(comparison_fields, self.table1, 1, ordered=ordered)
+        query2 = self.build_query(comparison_fields, self.table2, 2, ordered=ordered)
+        
+        if use_primary_key:
+            logger.info(f"使用主键 {primary_keys} 进行匹配对比")
+            return self._compare_rows_by_primary_key(
+                query1, query2, primary_keys, comparison_fields, differences=differences)
+        
+        # 否则按行的多重集合、行顺序对齐或行位置进行对比
+        if self.use_multiset:
+            logger.info("没有共同主键或主键不在比较字段中，按行的多重集合进行对比")
+        elif self.use_alignment:
+            logger.info("没有共同主键或主键不在比较字段中，按行顺序对齐后进行对比")
+        else:
+            logger.info("没有共同主键或主键不在比较字段中，按行位置进行对比")
+        # 执行查询获取游标，但不立即获取所有数据
+        cursor1, cursor2 = self._execute_query_pair(query1, query2)
+        self._prepare_row_comparator(getattr(cursor1, 'description', None),
+                                     getattr(cursor2, 'description', None), comparison_fields)
+        self._prepare_row_decoders(cursor1, cursor2)
+        try:
+            if self.use_multiset:
+                return self._compare_rows_as_multiset(cursor1, cursor2, comparison_fields, differences)
+            if self.use_alignment:
+                return self._compare_rows_by_alignment(cursor1, cursor2, comparison_fields, differences)
+            return self._compare_rows_by_position_streaming(cursor1, cursor2, comparison_fields, differences)
+        except DifferenceLimitReached:
+            self._cancel_queries(self.db1, self.db2)
+            raise
+        finally:
+            self._close_cursor(cursor1)
+            self._close_cursor(cursor2)
+
+    def _compare_rows_with_watermark(self, primary_keys: List[str], comparison_fields: List[str],
+                                     differences: DifferenceSink) -> dict:
+        """
+        按水位线增量对比两个表，对比成功后保存本次的水位线和仍然不同的行的主键
+        
+        上次报告差异的行即使之后没有再修改也会在下次对比时重新检查，直到两侧一致为止。
+        
+        :param primary_keys: 两个表共同的主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
+        :return: 包含差异列表和行数统计的字典，增量对比时包含changed_row_count
+        """
+        state_key = WatermarkStore.state_key(self.db1, self.table1, self.db2, self.table2, self.watermark_column)
+        settings = {
+            'fields': sorted(comparison_fields),
+            'where1': self.get_where_condition(self.table1),
+            'where2': self.get_where_condition(self.table2)
+        }
+        # 在读取数据之前记录水位线，对比期间修改的行在下次对比时仍会被检查
+        watermark1, watermark2 = self._run_on_both_sides(lambda: self._query_watermark(1),
+                                                         lambda: self._query_watermark(2))
+        previous = self.watermark_store.get(state_key)
+        pending_keys = _DifferenceKeys(primary_keys)
+        differences = _DifferenceTee(differences, pending_keys) if differences is not None else pending_keys
+        comparison_result = None
+        if previous is None:
+            logger.info("没有保存的水位线，执行全量对比")
+        elif previous.get('settings') != settings:
+            logger.info("对比字段或WHERE条件与上次不同，执行全量对比")
+        else:
+            comparison_result = self._compare_changed_rows(previous['table1'], previous['table2'], primary_keys,
+                                                           comparison_fields, differences, previous['pending_keys'])
+        if comparison_result is None:
+            comparison_result = self._compare_rows(True, primary_keys, comparison_fields, differences)
+        
+        keys = pending_keys.keys
+        if not pending_keys.complete or not all(
+                isinstance(value, (int, float, Decimal, str)) and not isinstance(value, bool)
+                for key in keys for value in key):
+            # 仍然不同的行无法按主键重新检查，不更新水位线，下次对比从上次的水位线开始
+            logger.warning("仍然不同的行的主键无法保存，不更新水位线")
+        else:
+            self.watermark_store.set(state_key, watermark1, watermark2, settings, keys)
+        return comparison_result
+
+    def _query_watermark(self, db_index: int) -> Optional[str]:
+        """
+        查询一侧表满足WHERE条件的行中水位线列的最大值
+        
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :return: 最大值的SQL字面量，表为空时返回None
+        """
+        db = self.db1 if db_index == 1 else self.db2
+        table_name = self.table1 if db_index == 1 else self.table2
+        cursor = db.execute_query(
+            f"SELECT MAX({self.watermark_column}) FROM {table_name}{self._build_where_clause(table_name)}")
+        try:
+            value = cursor.fetchone()[0]
+        finally:
+            self._close_cursor(cursor)
+        watermark = None if value is None else db.watermark_literal(value)
+        logger.info(f"表 {table_name} 的水位线: {watermark}")
+        return watermark
+
+    def _compare_changed_rows(self, watermark1: Optional[str], watermark2: Optional[str], primary_keys: List[str],
+                              comparison_fields: List[str], differences: DifferenceSink,
+                              pending_keys: Optional[List[tuple]] = None) -> Optional[dict]:
+        """
+        只对比任一侧在水位线之后变化的行和上次仍然不同的行
+        
+        两侧分别查询水位线列不小于上次水位线的行的主键，与上次仍然不同的行的主键合并后按主键分批拉取
+        两侧的完整数据逐字段对比，一侧变化的行与另一侧主键相同的行匹配。
+        
+        :param watermark1: 表1上次的水位线（None表示上次表为空，所有行都视为变化）
+        :param watermark2: 表2上次的水位线
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
+        :param pending_keys: 上次对比后仍然不同的行的主键
+        :return: 包含差异列表和变化行数的字典，主键无法转换为SQL字面量时返回None
+        """
+        changed_keys1, changed_keys2 = self._run_on_both_sides(
+            lambda: self._query_changed_keys(1, watermark1, primary_keys),
+            lambda: self._query_changed_keys(2, watermark2, primary_keys))
+        changed_keys = self._sorted_keys(changed_keys1 | changed_keys2 | set(pending_keys or []))
+        logger.info(f"自上次对比以来表1变化 {len(changed_keys1)} 行，表2变化 {len(changed_keys2)} 行，"
+                    f"上次仍然不同 {len(pending_keys or [])} 行")
+        
+        counts = [0, 0, 0]
+        mark = differences.mark()
+        try:
+            for start in range(0, len(changed_keys), self.key_hash_batch_size):
+                pending = [(row_number, key, True, True) for row_number, key in enumerate(
+                    changed_keys[start:start + self.key_hash_batch_size], start + 1)]
+                self._compare_key_hash_batch(pending, primary_keys, comparison_fields, differences, counts)
+        except ValueError as e:
+            # 主键无法转换为SQL字面量，撤销已输出的差异后执行全量对比
+            logger.warning(f"{e}，执行全量对比")
+            differences.rollback(mark)
+            return None
+        
+        logger.info(f"增量对比完成，发现数据不同的记录 {counts[0]} 条，源表独有记录 {counts[1]} 条，目标表独有记录 {counts[2]} 条")
+        return {
+            'differences': differences,
+            'table1_row_count': None,
+            'table2_row_count': None,
+            'difference_count': sum(counts),
+            'changed_row_count': len(changed_keys)
+        }
+
+    def _query_changed_keys(self, db_index: int, watermark: Optional[str], primary_keys: List[str]) -> set:
+        """
+        查询一侧表水位线之后变化的行的主键
+        
+        水位线列等于上次水位线的行也包含在内：上次记录水位线之后写入的行可能与最大值相同（如按秒记录的时间戳）。
+        
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :param watermark: 上次的水位线（None表示所有行）
+        :param primary_keys: 主键字段列表
+        :return: 主键元组的集合
+        """
+        db = self.db1 if db_index == 1 else self.db2
+        table_name = self.table1 if db_index == 1 else self.table2
+        condition = f"{self.watermark_column} >= {watermark}" if watermark is not None else None
+        query = self.build_query(list(primary_keys), table_name, db_index, condition, ordered=False)
+        get_key = self._key_getter(list(primary_keys), primary_keys)
+        cursor = db.execute_query(query, fetch_size=self.fetch_size)
+        try:
+            return {get_key(row) for row in iter_cursor_rows(cursor, self.fetch_size)}
+        finally:
+            self._close_cursor(cursor)
 
+    def _is_same_server(self) -> bool:
+        """两侧适配器是否指向同一个数据库（同一个适配器，或类型和连接参数都相同）"""
+        if self.db1 is self.db2:
+            return True
+        connect_params = getattr(self.db1, 'connect_params', None)
+        return (type(self.db1) is type(self.db2) and isinstance(connect_params, dict)
+                and connect_params == getattr(self.db2, 'connect_params', None))
 
-class MSSQLAdapter(DatabaseAdapter):
-    """MSSQL数据库适配器"""
-    
-    def __init__(self):
-        self.connection = None
-    
-    def connect(self, **kwargs):
+    def _can_attach(self) -> bool:
+        """两侧是否为不同的SQLite数据库文件，可以将目标数据库附加到源数据库连接中对比"""
+        if not isinstance(self.db1, SQLiteAdapter) or not isinstance(self.db2, SQLiteAdapter):
+            return False
+        if self._is_same_server():
+            return False
+        params1 = self.db1.connect_params or {}
+        params2 = self.db2.connect_params or {}
+        return (self.db1.connection is not None and bool(params2.get('db_path'))
+                and ':memory:' not in (params1.get('db_path'), params2.get('db_path')))
+
+    def _count_rows(self, db: DatabaseAdapter, table_name: str, source: Optional[str] = None) -> int:
+        """
+        在数据库中统计表满足WHERE条件的行数
+        
+        :param db: 执行查询的适配器
+        :param table_name: 表名（用于确定WHERE条件）
+        :param source: 查询使用的表名（附加数据库时带数据库名前缀，默认为表名）
+        :return: 行数
+        """
+        cursor = db.execute_query(
+            f"SELECT COUNT(*) FROM {source or table_name}{self._build_where_clause(table_name)}")
         try:
-            import pymssql
-        except ImportError:
-            raise ImportError("需要安装pymssql库: pip install pymssql")
+            return int(cursor.fetchone()[0])
+        finally:
+            self._close_cursor(cursor)
+
+    def _compare_rows_by_pushdown(self, use_primary_key: bool, primary_keys: List[str],
+                                  comparison_fields: List[str],
+                                  differences: Optional[DifferenceSink] = None) -> Optional[dict]:
+        """
+        将对比下推到数据库中执行，只读取有差异的行
         
-        host = kwargs.get('host', 'localhost')
-        port = kwargs.get('port', 1433)
-        user = kwargs.get('user')
-        password = kwargs.get('password')
-        database = kwargs.get('database')
+        两个表在不同的SQLite数据库文件中时，将目标数据库以只读模式附加到源数据库连接后执行。
         
-        # 构建服务器地址
-        if port != 1433:
-            server = f"{host}:{port}"
-        else:
-            server = host
-            
-        logger.info(f"连接到MSSQL数据库: {server}, 用户: {user}, 数据库: {database}")
+        :param use_primary_key: 是否按主键匹配对比
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典，无法下推时返回None
+        """
+        if self.column_rules:
+            logger.warning("设置了列对比规则，无法下推对比，使用常规对比")
+            return None
+        db = self.db1
+        sources = (self.table1, self.table2)
+        attached = False
+        if not self._is_same_server():
+            if not self._can_attach():
+                logger.warning("两个表不在同一个数据库中，无法下推对比，使用常规对比")
+                return None
+            try:
+                db.attach(self.db2.connect_params['db_path'], SQLITE_ATTACH_ALIAS)
+            except sqlite3.Error as e:
+                logger.warning(f"附加SQLite数据库失败: {e}，使用常规对比")
+                return None
+            attached = True
+            sources = (self.table1, f"{SQLITE_ATTACH_ALIAS}.{self.table2}")
         
-        self.connection = pymssql.connect(
-            server=server,
-            user=user,
-            password=password,
-            database=database
-        )
-        return self.connection
-    
-    def get_table_fields(self, table_name: str) -> List[str]:
-        logger.info(f"获取MSSQL表 {table_name} 的字段")
-        try:
-            cursor = self.connection.cursor()
-            
-            # 处理可能包含模式的表名
-            if '.' in table_name:
-                parts = table_name.split('.')
-                if len(parts) == 2:
-                    schema, table = parts
-                else:
-                    schema, table = 'dbo', table_name
-            else:
-                schema, table = 'dbo', table_name
-                
-            cursor.execute("""
-                SELECT COLUMN_NAME
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = %s AND TABLE_SCHEMA = %s
-                ORDER BY ORDINAL_POSITION
-            """, (table, schema))
-            
-            fields = [row[0] for row in cursor.fetchall()]
-            logger.info(f"表 {table_name} 的字段: {fields}")
-            return fields
-        except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
-            else:
-                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
-    
-    def get_primary_keys(self, table_name: str) -> List[str]:
-        """获取MSSQL表的主键字段"""
-        logger.info(f"获取MSSQL表 {table_name} 的主键")
+        if differences is None:
+            differences = DifferenceList()
+        mark = differences.mark()
         try:
-            cursor = self.connection.cursor()
-            
-            # 处理可能包含模式的表名
-            if '.' in table_name:
-                parts = table_name.split('.')
-                if len(parts) == 2:
-                    schema, table = parts
-                else:
-                    schema, table = 'dbo', table_name
+            table1_row_count = self._count_rows(db, self.table1, sources[0])
+            table2_row_count = self._count_rows(db, self.table2, sources[1])
+            if use_primary_key:
+                logger.info(f"使用主键 {primary_keys} 在数据库中进行FULL OUTER JOIN下推对比")
+                difference_count = self._pushdown_by_primary_key(
+                    db, sources, primary_keys, comparison_fields, differences)
             else:
-                schema, table = 'dbo', table_name
-                
-            cursor.execute("""
-                SELECT COLUMN_NAME
-                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE 
-                WHERE OBJECTPROPERTY(OBJECT_ID(CONSTRAINT_SCHEMA + '.' + QUOTENAME(CONSTRAINT_NAME)), 'IsPrimaryKey') = 1
-                AND TABLE_NAME = %s AND TABLE_SCHEMA = %s
-                ORDER BY ORDINAL_POSITION
-            """, (table, schema))
-            
-            primary_keys = [row[0] for row in cursor.fetchall()]
-            logger.info(f"表 {table_name} 的主键: {primary_keys}")
-            return primary_keys
+                logger.info("没有共同主键，在数据库中按行分组统计出现次数进行下推对比")
+                difference_count = self._pushdown_by_row_counts(db, sources, comparison_fields, differences)
+        except DifferenceLimitReached:
+            self._cancel_queries(db, db)
+            raise
         except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
-            else:
-                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
-    
-    def execute_query(self, query: str):
-        logger.info(f"执行MSSQL查询: {query}")
-        cursor = self.connection.cursor()
-        cursor.execute(query)
-        return cursor
-    
-    def close(self):
-        if self.connection:
-            logger.info("关闭MSSQL数据库连接")
-            self.connection.close()
-
+            # 数据库版本不支持生成的语句（如窗口函数）时回退到常规对比
+            logger.warning(f"下推对比失败: {e}，使用常规对比")
+            differences.rollback(mark)
+            return None
+        finally:
+            if attached:
+                db.detach(SQLITE_ATTACH_ALIAS)
+        
+        logger.info(f"下推对比完成，发现 {difference_count} 个差异")
+        return {
+            'differences': differences,
+            'table1_row_count': table1_row_count,
+            'table2_row_count': table2_row_count,
+            'difference_count': difference_count
+        }
 
-class DMAdapter(DatabaseAdapter):
-    """达梦数据库适配器"""
-    
-    def __init__(self):
-        self.connection = None
-    
-    def connect(self, **kwargs):
-        try:
-            dmPython = importlib.import_module('dmPython')
-        except ImportError:
-            raise ImportError("需要安装dmPython库，参考达梦官方文档进行安装")
+    def _pushdown_by_primary_key(self, db: DatabaseAdapter, sources: tuple, primary_keys: List[str],
+                                 comparison_fields: List[str], differences: DifferenceSink) -> int:
+        """
+        使用FULL OUTER JOIN按主键连接两个表，NULL安全地比较每个字段，只返回不一致的行
         
-        host = kwargs.get('host', 'localhost')
-        port = kwargs.get('port', 5236)
-        user = kwargs.get('user')
-        password = kwargs.get('password')
-        database = kwargs.get('database')
+        行号由数据库按主键并集排序后用ROW_NUMBER()生成，与常规主键对比的行号一致。
         
-        logger.info(f"连接到达梦数据库: {host}:{port}, 用户: {user}, 数据库: {database}")
+        :param db: 执行查询的适配器
+        :param sources: 查询两个表时使用的表名
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
+        :return: 差异行数
+        """
+        field_count = len(comparison_fields)
+        key_indexes = [comparison_fields.index(pk) for pk in primary_keys]
+        where_clauses = (self._build_where_clause(self.table1), self._build_where_clause(self.table2))
+        join_condition = ' AND '.join(f"t1.{pk} = t2.{pk}" for pk in primary_keys)
         
-        # 构建连接字符串
-        self.connection = dmPython.connect(
-            user=user,
-            password=password,
-            server=host,
-            port=port,
-            schema=database
-        )
-        return self.connection
-    
-    def get_table_fields(self, table_name: str) -> List[str]:
-        logger.info(f"获取达梦数据库表 {table_name} 的字段")
+        def join_rows(columns: List[tuple]) -> str:
+            # 按主键连接两个表，输出 c1_i / c2_i 两组列；某一侧不存在时该侧的列为NULL
+            field_list = ', '.join(field for _, field in columns)
+            source1 = f"(SELECT {field_list} FROM {sources[0]}{where_clauses[0]}) t1"
+            source2 = f"(SELECT {field_list} FROM {sources[1]}{where_clauses[1]}) t2"
+            select_list = ', '.join([f"t1.{field} AS c1_{i}" for i, field in columns] +
+                                    [f"t2.{field} AS c2_{i}" for i, field in columns])
+            if db.supports_full_outer_join():
+                return f"SELECT {select_list} FROM {source1} FULL OUTER JOIN {source2} ON {join_condition}"
+            return (f"SELECT {select_list} FROM {source1} LEFT JOIN {source2} ON {join_condition} "
+                    f"UNION ALL SELECT {select_list} FROM {source2} LEFT JOIN {source1} ON {join_condition} "
+                    f"WHERE t1.{primary_keys[0]} IS NULL")
+        
+        def coalesce_key(alias: str, index: int) -> str:
+            return f"COALESCE({alias}.c1_{index}, {alias}.c2_{index})"
+        
+        # 行号只需对主键并集排序编号，不对整行排序
+        key_order = ', '.join(coalesce_key('k', i) for i in key_indexes)
+        key_columns = ', '.join(f"{coalesce_key('k', i)} AS k_{i}" for i in key_indexes)
+        numbered_keys = (f"SELECT ROW_NUMBER() OVER (ORDER BY {key_order}) AS diff_row_number, {key_columns} "
+                         f"FROM ({join_rows([(i, comparison_fields[i]) for i in key_indexes])}) k")
+        all_equal = ' AND '.join(db.null_safe_equal(f"j.c1_{i}", f"j.c2_{i}") for i in range(field_count))
+        changed_rows = f"SELECT * FROM ({join_rows(list(enumerate(comparison_fields)))}) j WHERE NOT ({all_equal})"
+        key_match = ' AND '.join(f"n.k_{i} = {coalesce_key('d', i)}" for i in key_indexes)
+        query = (f"SELECT n.diff_row_number, d.* FROM ({changed_rows}) d JOIN ({numbered_keys}) n "
+                 f"ON {key_match} ORDER BY n.diff_row_number")
+        logger.info(f"下推对比查询: {query}")
+        
+        difference_count = 0
+        cursor = db.execute_query(query, fetch_size=self.fetch_size)
         try:
-            dmPython = importlib.import_module('dmPython')
-            cursor = self.connection.cursor()
-            
-            # 处理可能包含模式的表名
-            if '.' in table_name:
-                parts = table_name.split('.')
-                if len(parts) == 2:
-                    schema, table = parts
+            for row in iter_cursor_rows(cursor, self.fetch_size):
+                row_number = int(row[0])
+                row1 = tuple(row[1:field_count + 1])
+                row2 = tuple(row[field_count + 1:])
+                # 主键字段不为NULL，某一侧主键全为NULL说明该行只在另一个表中存在
+                if all(row1[i] is None for i in key_indexes):
+                    key = tuple(row2[i] for i in key_indexes)
+                    row_diff = {
+                        'row_number': row_number,
+                        'type': 'only_in_table2',
+                        'differences': self._one_side_differences(row2, comparison_fields, 2)
+                    }
+                elif all(row2[i] is None for i in key_indexes):
+                    key = tuple(row1[i] for i in key_indexes)
+                    row_diff = {
+                        'row_number': row_number,
+                        'type': 'only_in_table1',
+                        'differences': self._one_side_differences(row1, comparison_fields, 1)
+                    }
                 else:
-                    schema, table = None, table_name
-            else:
-                schema, table = None, table_name
-                
-            if schema:
-                cursor.execute("""
-                    SELECT COLUMN_NAME 
-                    FROM ALL_TAB_COLUMNS 
-                    WHERE TABLE_NAME = UPPER(?) AND OWNER = UPPER(?)
-                    ORDER BY COLUMN_ID
-                """, (table, schema))
-            else:
-                cursor.execute("""
-                    SELECT COLUMN_NAME 
-                    FROM USER_TAB_COLUMNS 
-                    WHERE TABLE_NAME = UPPER(?)
-                    ORDER BY COLUMN_ID
-                """, (table,))
-                
-            fields = [row[0] for row in cursor.fetchall()]
-            logger.info(f"表 {table_name} 的字段: {fields}")
-            return fields
-        except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
-            else:
-                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
-    
-    def get_primary_keys(self, table_name: str) -> List[str]:
-        """获取达梦数据库表的主键字段"""
-        logger.info(f"获取达梦数据库表 {table_name} 的主键")
-        try:
-            dmPython = importlib.import_module('dmPython')
-            cursor = self.connection.cursor()
+                    key = tuple(row1[i] for i in key_indexes)
+                    row_diff = self._compare_single_row(row1, row2, row_number, comparison_fields)
+                    if not row_diff:
+                        # 数据库认为不同但Python比较相等（如数值类型不同），不计为差异
+                        continue
+                    row_diff['type'] = 'different_data'
+                row_diff['key'] = dict(zip(primary_keys, key))
+                differences.append(row_diff)
+                difference_count += 1
+        finally:
+            self._close_cursor(cursor)
+        return difference_count
+
+    def _pushdown_by_row_counts(self, db: DatabaseAdapter, sources: tuple, comparison_fields: List[str],
+                                differences: DifferenceSink) -> int:
+        """
+        按整行分组统计两个表中每行的出现次数，分别查询在一个表中比另一个表多出的行
+        
+        与按行的多重集合对比相同，重复行的个数不同也是差异，每组多出的行输出一次并记录多出的行数；
+        行号按输出顺序编排，先输出源表多出的行。
+        
+        :param db: 执行查询的适配器
+        :param sources: 查询两个表时使用的表名
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
+        :return: 差异行数
+        """
+        field_list = ', '.join(comparison_fields)
+        row_number = 1
+        queries = [f"SELECT {field_list}, COUNT(*) AS {ROW_COUNT_COLUMN} FROM {source}"
+                   f"{self._build_where_clause(table)} GROUP BY {field_list}"
+                   for source, table in zip(sources, (self.table1, self.table2))]
+        matched = ' AND '.join(db.null_safe_equal(f"a.{field}", f"b.{field}") for field in comparison_fields)
+        for table_index, (query1, query2) in enumerate(((queries[0], queries[1]), (queries[1], queries[0])), 1):
+            query = (f"SELECT {', '.join(f'a.{field}' for field in comparison_fields)}, "
+                     f"a.{ROW_COUNT_COLUMN} - COALESCE(b.{ROW_COUNT_COLUMN}, 0) "
+                     f"FROM ({query1}) a LEFT JOIN ({query2}) b ON {matched} "
+                     f"WHERE b.{ROW_COUNT_COLUMN} IS NULL OR a.{ROW_COUNT_COLUMN} > b.{ROW_COUNT_COLUMN}")
+            logger.info(f"下推对比查询: {query}")
             
-            # 处理可能包含模式的表名
-            if '.' in table_name:
-                parts = table_name.split('.')
-                if len(parts) == 2:
-                    schema, table = parts
-                else:
-                    schema, table = None, table_name
-            else:
-                schema, table = None, table_name
-                
-            if schema:
-                cursor.execute("""
-                    SELECT COLS.COLUMN_NAME
-                    FROM ALL_CONSTRAINTS CONS
-                    JOIN ALL_CONS_COLUMNS COLS ON CONS.CONSTRAINT_NAME = COLS.CONSTRAINT_NAME AND CONS.OWNER = COLS.OWNER
-                    WHERE COLS.TABLE_NAME = UPPER(?) AND COLS.OWNER = UPPER(?) AND CONS.CONSTRAINT_TYPE = 'P'
-                    ORDER BY COLS.POSITION
-                """, (table, schema))
+            cursor = db.execute_query(query, fetch_size=self.fetch_size)
+            try:
+                for row in iter_cursor_rows(cursor, self.fetch_size):
+                    differences.append({
+                        'row_number': row_number,
+                        'type': f'only_in_table{table_index}',
+                        'count': int(row[-1]),
+                        'differences': self._one_side_differences(row[:-1], comparison_fields, table_index)
+                    })
+                    row_number += 1
+            finally:
+                self._close_cursor(cursor)
+        return row_number - 1
+
+    def _compare_rows_by_primary_key(self, query1: str, query2: str, primary_keys: List[str],
+                                     comparison_fields: List[str], start_row_number: int = 1,
+                                     db1: DatabaseAdapter = None, db2: DatabaseAdapter = None,
+                                     differences: Optional[DifferenceSink] = None) -> dict:
+        """
+        执行两个按主键排序的查询并进行主键对比，数据库顺序不可用于归并时回退到内存对比
+        
+        :param query1: 第一个表的查询语句
+        :param query2: 第二个表的查询语句
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param start_row_number: 第一条记录的行号
+        :param db1: 执行查询1的适配器（默认为源数据库适配器）
+        :param db2: 执行查询2的适配器（默认为目标数据库适配器）
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典
+        """
+        db1 = db1 or self.db1
+        db2 = db2 or self.db2
+        if differences is None:
+            differences = DifferenceList()
+        cursor1, cursor2 = self._execute_query_pair(query1, query2, db1, db2)
+        self._prepare_row_comparator(getattr(cursor1, 'description', None),
+                                     getattr(cursor2, 'description', None), comparison_fields)
+        self._prepare_row_decoders(cursor1, cursor2)
+        try:
+            mark = differences.mark()
+            try:
+                return self._compare_rows_by_primary_key_streaming(
+                    cursor1, cursor2, primary_keys, comparison_fields, start_row_number, differences)
+            except KeyOrderError as e:
+                # 数据库排序规则与Python不一致（如大小写不敏感的排序规则），回退到内存对比
+                logger.warning(f"{e}，回退到基于内存的主键对比")
+                # 撤销归并对比已输出的差异，由内存对比重新输出
+                differences.rollback(mark)
+                self._close_cursor(cursor1)
+                self._close_cursor(cursor2)
+                cursor1, cursor2 = self._execute_query_pair(query1, query2, db1, db2)
+                if self.max_memory is not None:
+                    return self._compare_rows_by_primary_key_spilled(
+                        cursor1, cursor2, primary_keys, comparison_fields, start_row_number, differences)
+                return self._compare_rows_by_primary_key_in_memory(
+                    cursor1, cursor2, primary_keys, comparison_fields, start_row_number, differences)
+        except DifferenceLimitReached:
+            self._cancel_queries(db1, db2)
+            raise
+        finally:
+            self._close_cursor(cursor1)
+            self._close_cursor(cursor2)
+
+    def _compare_rows_by_primary_key_streaming(self, cursor1, cursor2, 
+                                     primary_keys: List[str], comparison_fields: List[str],
+                                     start_row_number: int = 1,
+                                     differences: Optional[DifferenceSink] = None) -> dict:
+        """
+        基于主键流式归并对比两组行数据
+
+        两个游标均按主键升序返回数据（由build_query添加ORDER BY保证），
+        因此可以同步推进两个游标，内存占用只与批次大小有关，而与表的大小无关。
+        如果发现数据库返回的顺序与Python的比较顺序不一致，则抛出KeyOrderError。
+        
+        :param cursor1: 第一个表的游标
+        :param cursor2: 第二个表的游标
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param start_row_number: 第一条记录的行号（分段对比时用于延续行号）
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典
+        """
+        logger.info("基于主键进行流式归并对比")
+        
+        row_counts = [0, 0]
+        rows1 = self._iter_ordered_rows(cursor1, comparison_fields, primary_keys, row_counts, 0)
+        rows2 = self._iter_ordered_rows(cursor2, comparison_fields, primary_keys, row_counts, 1)
+        
+        if differences is None:
+            differences = DifferenceList()
+        row_number = start_row_number
+        diff_count = 0
+        only_in_table1_count = 0
+        only_in_table2_count = 0
+        
+        item1 = next(rows1, None)
+        item2 = next(rows2, None)
+        while item1 is not None or item2 is not None:
+            if item1 is not None and item2 is not None:
+                try:
+                    if item1[0] < item2[0]:
+                        position = -1
+                    elif item2[0] < item1[0]:
+                        position = 1
+                    else:
+                        position = 0
+                except TypeError:
+                    raise KeyOrderError(f"主键值 {item1[0]} 与 {item2[0]} 无法比较大小")
             else:
-                cursor.execute("""
-                    SELECT COLUMN_NAME
-                    FROM USER_CONS_COLUMNS
-                    WHERE TABLE_NAME = UPPER(?) AND CONSTRAINT_NAME IN (
-                        SELECT CONSTRAINT_NAME 
-                        FROM USER_CONSTRAINTS 
-                        WHERE CONSTRAINT_TYPE = 'P'
-                    )
-                    ORDER BY POSITION
-                """, (table,))
-                
-            primary_keys = [row[0] for row in cursor.fetchall()]
-            logger.info(f"表 {table_name} 的主键: {primary_keys}")
-            return primary_keys
-        except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "not exist" in error_msg or "not found" in error_msg or "invalid" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
+                position = -1 if item2 is None else 1
+            
+            if position < 0:
+                # 只在表1中存在
+                key, row1 = item1
+                differences.append({
+                    'row_number': row_number,
+                    'type': 'only_in_table1',
+                    'key': dict(zip(primary_keys, key)),
+                    'differences': self._one_side_differences(row1, comparison_fields, 1)
+                })
+                only_in_table1_count += 1
+                item1 = next(rows1, None)
+            elif position > 0:
+                # 只在表2中存在
+                key, row2 = item2
+                differences.append({
+                    'row_number': row_number,
+                    'type': 'only_in_table2',
+                    'key': dict(zip(primary_keys, key)),
+                    'differences': self._one_side_differences(row2, comparison_fields, 2)
+                })
+                only_in_table2_count += 1
+                item2 = next(rows2, None)
             else:
-                raise RuntimeError(f"获取表 '{table_name}' 主键信息时出错: {str(e)}")
-    
-    def execute_query(self, query: str):
-        logger.info(f"执行达梦数据库查询: {query}")
-        cursor = self.connection.cursor()
-        cursor.execute(query)
-        return cursor
-    
-    def close(self):
-        if self.connection:
-            logger.info("关闭达梦数据库连接")
-            self.connection.close()
-
+                # 两个表中都存在，对比字段值
+                key, row1 = item1
+                row2 = item2[1]
+                row_diff = self._compare_single_row(row1, row2, row_number, comparison_fields)
+                if row_diff:
+                    row_diff['type'] = 'different_data'
+                    row_diff['key'] = dict(zip(primary_keys, key))
+                    differences.append(row_diff)
+                    diff_count += 1
+                item1 = next(rows1, None)
+                item2 = next(rows2, None)
+            
+            row_number += 1
+        
+        logger.info(f"基于主键对比完成，发现数据不同的记录 {diff_count} 条，源表独有记录 {only_in_table1_count} 条，目标表独有记录 {only_in_table2_count} 条")
+        return {
+            'differences': differences,
+            'table1_row_count': row_counts[0],
+            'table2_row_count': row_counts[1],
+            'difference_count': diff_count + only_in_table1_count + only_in_table2_count,
+            'union_row_count': row_number - start_row_number
+        }
 
-def get_database_adapter(db_type: str) -> DatabaseAdapter:
-    """根据数据库类型获取对应的适配器"""
-    logger.info(f"获取数据库适配器: {db_type}")
-    adapters = {
-        'sqlite': SQLiteAdapter,
-        'mysql': MySQLAdapter,
-        'postgresql': PostgreSQLAdapter,
-        'oracle': OracleAdapter,
-        'mssql': MSSQLAdapter,
-        'dm': DMAdapter
-    }
-    
-    if db_type not in adapters:
-        raise ValueError(f"不支持的数据库类型: {db_type}")
-    
-    return adapters[db_type]()
+    def _iter_ordered_rows(self, cursor, comparison_fields: List[str], primary_keys: List[str],
+                           row_counts: List[int], index: int):
+        """
+        逐行读取游标并校验主键严格递增
+        
+        每行在读取并校验了下一行的主键之后才产出，使排序规则不一致的相邻主键在输出基于该行的差异之前
+        就抛出KeyOrderError（差异达到上限后不再读取，来不及回退到内存对比）。
+        
+        :param cursor: 数据库游标
+        :param comparison_fields: 查询返回的字段列表
+        :param primary_keys: 主键字段列表
+        :param row_counts: 行数计数列表，读取时原地累加
+        :param index: 计数列表中对应的下标
+        :return: 产出(主键元组, 行元组)的生成器
+        """
+        get_key = self._key_getter(comparison_fields, primary_keys)
+        pending = None
+        for row in iter_cursor_rows(cursor, self.fetch_size):
+            key = get_key(row)
+            if pending is not None:
+                try:
+                    in_order = pending[0] < key
+                except TypeError:
+                    in_order = False
+                if not in_order:
+                    raise KeyOrderError(f"表{index + 1}返回的主键顺序不是严格递增: {pending[0]} -> {key}")
+                yield pending
+            pending = key, row
+            row_counts[index] += 1
+        if pending is not None:
+            yield pending
 
+    @staticmethod
+    def _key_getter(comparison_fields: List[str], primary_keys: List[str]):
+        """
+        按预先计算的列下标从行元组中取出主键元组
+        
+        :param comparison_fields: 查询返回的字段列表
+        :param primary_keys: 主键字段列表
+        :return: 参数为行元组、返回主键元组的函数
+        """
+        indexes = [comparison_fields.index(pk) for pk in primary_keys]
+        if len(indexes) == 1:
+            # itemgetter只有一个下标时返回单个值而不是元组
+            index = indexes[0]
+            return lambda row: (row[index],)
+        return itemgetter(*indexes)
 
-# 自定义Action类用于处理逗号分隔的参数
-class CommaSeparatedArgsAction(argparse.Action):
-    def __call__(self, parser, namespace, values, option_string=None):
-        if isinstance(values, str):
-            # 如果输入是字符串，则按逗号分割
-            values = [v.strip() for v in values.split(',') if v.strip()]
-        setattr(namespace, self.dest, values)
+    def _one_side_differences(self, row, comparison_fields: List[str], table_index: int) -> List[Dict]:
+        """
+        构建只在一个表中存在的行的字段差异列表
+        
+        :param row: 行元组
+        :param comparison_fields: 需要对比的字段列表
+        :param table_index: 行所在的表 (1或2)
+        :return: 字段差异列表
+        """
+        if self._row_decoders is not None:
+            row = self._row_decoders[table_index - 1](row)
+        if table_index == 1:
+            return [{'field': field, 'table1_value': value, 'table2_value': None}
+                    for field, value in zip(comparison_fields, row)]
+        return [{'field': field, 'table1_value': None, 'table2_value': value}
+                for field, value in zip(comparison_fields, row)]
 
+    @staticmethod
+    def _cancel_queries(db1: DatabaseAdapter, db2: DatabaseAdapter) -> None:
+        """提前结束对比时取消两侧正在执行的查询"""
+        for db in {id(db1): db1, id(db2): db2}.values():
+            try:
+                db.cancel()
+            except Exception as e:
+                logger.debug(f"取消查询时出错: {e}")
 
-class TableComparator:
-    """
-    数据库表对比工具类
-    支持对比同一数据库中的两个表，可以指定字段、排除字段和设置WHERE条件
-    """
+    @staticmethod
+    def _close_cursor(cursor) -> None:
+        """关闭游标，忽略驱动不支持或已关闭时的错误"""
+        close = getattr(cursor, 'close', None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            logger.debug(f"关闭游标时出错: {e}")
 
-    def __init__(self, db_adapter: DatabaseAdapter, db_adapter2: DatabaseAdapter = None):
+    def _compare_rows_by_primary_key_in_memory(self, cursor1, cursor2, 
+                                     primary_keys: List[str], comparison_fields: List[str],
+                                     start_row_number: int = 1,
+                                     differences: Optional[DifferenceSink] = None) -> dict:
         """
-        初始化对比工具
+        基于主键在内存中对比两组行数据（数据库顺序不可用于归并时的回退方案）
         
-        :param db_adapter: 源数据库适配器实例
-        :param db_adapter2: 目标数据库适配器实例（可选，默认为None表示使用同一个数据库）
+        :param cursor1: 第一个表的游标
+        :param cursor2: 第二个表的游标
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param start_row_number: 第一条记录的行号
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典
         """
-        self.db1 = db_adapter
-        self.db2 = db_adapter2 if db_adapter2 is not None else db_adapter
-        self.table1 = None
-        self.table2 = None
-        self.fields = []
-        self.exclude_fields = []
-        self.where_condition = None
-        # 支持两个表的不同WHERE条件
-        self.where_condition1 = None
-        self.where_condition2 = None
-        logger.info("TableComparator初始化完成")
+        logger.info("基于主键进行内存行数据对比")
+        
+        # 获取所有数据并按主键排序
+        rows1_data = {}
+        rows2_data = {}
+        
+        get_key = self._key_getter(comparison_fields, primary_keys)
+        
+        # 读取第一个表的数据
+        row_count1 = 0
+        for row in iter_cursor_rows(cursor1, self.fetch_size):
+            rows1_data[get_key(row)] = row
+            row_count1 += 1
+            
+        # 读取第二个表的数据
+        row_count2 = 0
+        for row in iter_cursor_rows(cursor2, self.fetch_size):
+            rows2_data[get_key(row)] = row
+            row_count2 += 1
+            
+        if differences is None:
+            differences = DifferenceList()
+        # 分别统计三种类型的差异：数据不同、源表独有、目标表独有
+        counts = [0, 0, 0]
+        row_number = self._compare_keyed_rows(rows1_data, rows2_data, primary_keys, comparison_fields,
+                                              start_row_number, differences, counts)
+        
+        logger.info(f"基于主键对比完成，发现数据不同的记录 {counts[0]} 条，源表独有记录 {counts[1]} 条，目标表独有记录 {counts[2]} 条")
+        return {
+            'differences': differences,
+            'table1_row_count': row_count1,
+            'table2_row_count': row_count2,
+            'difference_count': sum(counts),
+            'union_row_count': row_number - start_row_number
+        }
 
-    def set_tables(self, table1: str, table2: str):
+    def _compare_keyed_rows(self, rows1_data: dict, rows2_data: dict, primary_keys: List[str],
+                            comparison_fields: List[str], row_number: int,
+                            differences: DifferenceSink, counts: List[int]) -> int:
         """
-        设置要对比的表
+        按主键顺序对比两个“主键元组 -> 行元组”字典并输出差异
         
-        :param table1: 第一个表名
-        :param table2: 第二个表名
+        :param rows1_data: 第一个表的行数据
+        :param rows2_data: 第二个表的行数据
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param row_number: 第一条记录的行号
+        :param differences: 行差异的输出位置
+        :param counts: [数据不同, 源表独有, 目标表独有] 计数列表，对比时原地累加
+        :return: 下一条记录的行号
         """
-        logger.info(f"设置对比表: {table1} 和 {table2}")
-        self.table1 = table1
-        self.table2 = table2
+        all_keys = set(rows1_data.keys()) | set(rows2_data.keys())
+        logger.info(f"总共 {len(all_keys)} 个唯一主键值")
+        
+        for key in self._sorted_keys(all_keys):  # 按主键排序，保证输出顺序一致
+            row1 = rows1_data.get(key)
+            row2 = rows2_data.get(key)
+            
+            if row1 is None:
+                # 只在表2中存在
+                differences.append({
+                    'row_number': row_number,
+                    'type': 'only_in_table2',
+                    'key': dict(zip(primary_keys, key)),
+                    'differences': self._one_side_differences(row2, comparison_fields, 2)
+                })
+                counts[2] += 1
+            elif row2 is None:
+                # 只在表1中存在
+                differences.append({
+                    'row_number': row_number,
+                    'type': 'only_in_table1',
+                    'key': dict(zip(primary_keys, key)),
+                    'differences': self._one_side_differences(row1, comparison_fields, 1)
+                })
+                counts[1] += 1
+            else:
+                # 两个表中都存在，对比字段值
+                row_diff = self._compare_single_row(row1, row2, row_number, comparison_fields)
+                if row_diff:
+                    row_diff['type'] = 'different_data'
+                    row_diff['key'] = dict(zip(primary_keys, key))
+                    counts[0] += 1
+                    differences.append(row_diff)
+            
+            row_number += 1
+        return row_number
 
-    def set_fields(self, fields: List[str]):
+    @staticmethod
+    def _sorted_keys(keys) -> list:
+        """对主键排序；主键混合了无法比较大小的类型时，按类型名和文本排序"""
+        try:
+            return sorted(keys)
+        except TypeError:
+            return sorted(keys, key=lambda key: tuple((value is not None, type(value).__name__, str(value))
+                                                      for value in key))
+
+    def _compare_rows_by_primary_key_spilled(self, cursor1, cursor2,
+                                             primary_keys: List[str], comparison_fields: List[str],
+                                             start_row_number: int = 1,
+                                             differences: Optional[DifferenceSink] = None) -> dict:
         """
-        设置要对比的字段
+        基于主键的外存哈希分区对比（数据库顺序不可用于归并且数据量超过内存上限时使用）
         
-        :param fields: 要对比的字段列表
+        两侧数据按主键哈希拆分写入临时文件，同一主键必然落在两侧编号相同的分区中，
+        因此只需逐个分区加载到内存对比。分区估算的内存占用超过上限时继续递归拆分。
+        差异按分区输出，分区内按主键排序。
+        
+        :param cursor1: 第一个表的游标
+        :param cursor2: 第二个表的游标
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param start_row_number: 第一条记录的行号
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典
         """
-        logger.info(f"设置对比字段: {fields}")
-        self.fields = fields
+        # 并行范围对比时各任务同时执行，平分内存上限
+        memory_limit = self.max_memory // self.jobs
+        logger.info(f"基于主键进行外存哈希分区对比，内存上限: {memory_limit} 字节")
+        
+        get_key = self._key_getter(comparison_fields, primary_keys)
+        if differences is None:
+            differences = DifferenceList()
+        counts = [0, 0, 0]
+        
+        with tempfile.TemporaryDirectory(prefix='table_diff_') as directory:
+            spills = []
+            for index, cursor in enumerate((cursor1, cursor2)):
+                spill = _SpillPartitions(os.path.join(directory, f"t{index + 1}"), DEFAULT_SPILL_PARTITIONS, 0)
+                try:
+                    for row in iter_cursor_rows(cursor, self.fetch_size):
+                        spill.add(get_key(row), row)
+                finally:
+                    spill.close()
+                spills.append(spill)
+            
+            row_number = start_row_number
+            for path1, path2 in zip(spills[0].paths, spills[1].paths):
+                row_number = self._compare_spilled_partition(
+                    path1, path2, 1, memory_limit, get_key, primary_keys, comparison_fields,
+                    row_number, differences, counts)
+        
+        logger.info(f"基于主键对比完成，发现数据不同的记录 {counts[0]} 条，源表独有记录 {counts[1]} 条，目标表独有记录 {counts[2]} 条")
+        return {
+            'differences': differences,
+            'table1_row_count': spills[0].row_count,
+            'table2_row_count': spills[1].row_count,
+            'difference_count': sum(counts),
+            'union_row_count': row_number - start_row_number
+        }
 
-    def set_exclude_fields(self, exclude_fields: List[str]):
+    def _compare_spilled_partition(self, path1: str, path2: str, depth: int, memory_limit: int, get_key,
+                                   primary_keys: List[str], comparison_fields: List[str], row_number: int,
+                                   differences: DifferenceSink, counts: List[int]) -> int:
         """
-        设置要排除的字段
+        对比两侧编号相同的一对分区文件，估算内存超过上限时递归拆分
         
-        :param exclude_fields: 要排除的字段列表
+        :param path1: 第一个表的分区文件
+        :param path2: 第二个表的分区文件
+        :param depth: 当前拆分层数
+        :param memory_limit: 内存上限（字节）
+        :param get_key: 从行元组中取出主键元组的函数
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param row_number: 第一条记录的行号
+        :param differences: 行差异的输出位置
+        :param counts: [数据不同, 源表独有, 目标表独有] 计数列表
+        :return: 下一条记录的行号
         """
-        logger.info(f"设置排除字段: {exclude_fields}")
-        self.exclude_fields = exclude_fields
+        estimated_memory = (os.path.getsize(path1) + os.path.getsize(path2)) * SPILL_MEMORY_FACTOR
+        if estimated_memory > memory_limit:
+            if depth < MAX_SPILL_DEPTH:
+                sub_spills = []
+                for path in (path1, path2):
+                    spill = _SpillPartitions(path, DEFAULT_SPILL_PARTITIONS, depth)
+                    try:
+                        for row in _SpillPartitions.read(path):
+                            spill.add(get_key(row), row)
+                    finally:
+                        spill.close()
+                    os.remove(path)
+                    sub_spills.append(spill)
+                for sub_path1, sub_path2 in zip(sub_spills[0].paths, sub_spills[1].paths):
+                    row_number = self._compare_spilled_partition(
+                        sub_path1, sub_path2, depth + 1, memory_limit, get_key, primary_keys,
+                        comparison_fields, row_number, differences, counts)
+                return row_number
+            logger.warning(f"分区拆分 {depth} 层后估算内存 {estimated_memory} 字节仍超过上限，直接加载该分区")
+        
+        rows1_data = {get_key(row): row for row in _SpillPartitions.read(path1)}
+        rows2_data = {get_key(row): row for row in _SpillPartitions.read(path2)}
+        os.remove(path1)
+        os.remove(path2)
+        return self._compare_keyed_rows(rows1_data, rows2_data, primary_keys, comparison_fields,
+                                        row_number, differences, counts)
 
-    def set_where_condition(self, where_condition: str):
+    def _compare_rows_by_key_hash(self, primary_keys: List[str], comparison_fields: List[str],
+                                  differences: Optional[DifferenceSink] = None) -> Optional[dict]:
         """
-        设置WHERE条件（两个表使用相同的WHERE条件）
+        基于主键和行哈希两阶段对比两个表
         
-        :param where_condition: WHERE条件字符串
+        第一阶段两侧按主键顺序只返回主键和数据库计算的行哈希，在Python中归并；
+        第二阶段按主键分批拉取哈希不一致或只在一侧存在的行，生成字段级差异。
+        两侧数据库对同一个值的文本表示不同时（如浮点数、日期），哈希不一致只会多拉取数据，
+        最终结果仍以逐字段对比为准。
+        
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典，无法使用两阶段对比时返回None
         """
-        logger.info(f"设置WHERE条件: {where_condition}")
-        self.where_condition = where_condition
+        hash_expression1 = self.db1.build_row_hash(comparison_fields)
+        hash_expression2 = self.db2.build_row_hash(comparison_fields)
+        if not hash_expression1 or not hash_expression2:
+            logger.warning("数据库不支持在查询中计算行哈希，使用常规主键对比")
+            return None
+        
+        if differences is None:
+            differences = DifferenceList()
+        key_fields = list(primary_keys) + [KEY_HASH_COLUMN]
+        query1 = self.build_query(list(primary_keys) + [f"{hash_expression1} AS {KEY_HASH_COLUMN}"], self.table1, 1)
+        query2 = self.build_query(list(primary_keys) + [f"{hash_expression2} AS {KEY_HASH_COLUMN}"], self.table2, 2)
+        try:
+            cursor1, cursor2 = self._execute_query_pair(query1, query2)
+        except Exception as e:
+            # 数据库无法计算行哈希时（如Oracle拼接后的文本超过4000字节）使用常规主键对比
+            logger.warning(f"计算行哈希的查询失败: {e}，使用常规主键对比")
+            return None
+        mark = differences.mark()
+        try:
+            return self._compare_key_hash_streams(cursor1, cursor2, key_fields, primary_keys,
+                                                  comparison_fields, differences)
+        except DifferenceLimitReached:
+            self._cancel_queries(self.db1, self.db2)
+            raise
+        except Exception as e:
+            # 数据库顺序不可用于归并、主键无法转换为SQL字面量，或读取中途数据库无法计算某些行的哈希，
+            # 撤销已输出的差异后使用常规主键对比
+            logger.warning(f"{e}，使用常规主键对比")
+            differences.rollback(mark)
+            return None
+        finally:
+            self._close_cursor(cursor1)
+            self._close_cursor(cursor2)
 
-    def set_where_condition1(self, where_condition: str):
+    def _compare_key_hash_streams(self, cursor1, cursor2, key_fields: List[str], primary_keys: List[str],
+                                  comparison_fields: List[str], differences: DifferenceSink) -> dict:
         """
-        设置第一个表的WHERE条件
+        归并两侧的(主键, 行哈希)流，分批拉取不一致的行并输出差异
         
-        :param where_condition: WHERE条件字符串
+        :param cursor1: 第一个表的主键和行哈希游标
+        :param cursor2: 第二个表的主键和行哈希游标
+        :param key_fields: 游标返回的字段列表（主键字段和行哈希列）
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
+        :return: 包含差异列表和行数统计的字典
         """
-        logger.info(f"设置表 {self.table1} 的WHERE条件: {where_condition}")
-        self.where_condition1 = where_condition
+        row_counts = [0, 0]
+        rows1 = self._iter_ordered_rows(cursor1, key_fields, primary_keys, row_counts, 0)
+        rows2 = self._iter_ordered_rows(cursor2, key_fields, primary_keys, row_counts, 1)
+        
+        # 待拉取的 (行号, 主键, 是否在表1中, 是否在表2中)
+        pending = []
+        counts = [0, 0, 0]
+        row_number = 1
+        item1 = next(rows1, None)
+        item2 = next(rows2, None)
+        while item1 is not None or item2 is not None:
+            if item1 is not None and item2 is not None:
+                try:
+                    if item1[0] < item2[0]:
+                        position = -1
+                    elif item2[0] < item1[0]:
+                        position = 1
+                    else:
+                        position = 0
+                except TypeError:
+                    raise KeyOrderError(f"主键值 {item1[0]} 与 {item2[0]} 无法比较大小")
+            else:
+                position = -1 if item2 is None else 1
+            
+            if position < 0:
+                pending.append((row_number, item1[0], True, False))
+                item1 = next(rows1, None)
+            elif position > 0:
+                pending.append((row_number, item2[0], False, True))
+                item2 = next(rows2, None)
+            else:
+                if item1[1][-1] != item2[1][-1]:
+                    pending.append((row_number, item1[0], True, True))
+                item1 = next(rows1, None)
+                item2 = next(rows2, None)
+            
+            if len(pending) >= self.key_hash_batch_size:
+                self._compare_key_hash_batch(pending, primary_keys, comparison_fields, differences, counts)
+                pending = []
+            row_number += 1
+        
+        if pending:
+            self._compare_key_hash_batch(pending, primary_keys, comparison_fields, differences, counts)
+        
+        logger.info(f"主键+行哈希对比完成，发现数据不同的记录 {counts[0]} 条，源表独有记录 {counts[1]} 条，目标表独有记录 {counts[2]} 条")
+        return {
+            'differences': differences,
+            'table1_row_count': row_counts[0],
+            'table2_row_count': row_counts[1],
+            'difference_count': sum(counts),
+            'union_row_count': row_number - 1
+        }
 
-    def set_where_condition2(self, where_condition: str):
+    def _compare_key_hash_batch(self, pending: list, primary_keys: List[str], comparison_fields: List[str],
+                                differences: DifferenceSink, counts: List[int]) -> None:
         """
-        设置第二个表的WHERE条件
+        按主键拉取一批行哈希不一致的行的完整数据并逐字段对比
         
-        :param where_condition: WHERE条件字符串
+        :param pending: (行号, 主键, 是否在表1中, 是否在表2中) 列表
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
+        :param counts: [数据不同, 源表独有, 目标表独有] 计数列表，对比时原地累加
         """
-        logger.info(f"设置表 {self.table2} 的WHERE条件: {where_condition}")
-        self.where_condition2 = where_condition
+        keys1 = [key for _, key, in_table1, _ in pending if in_table1]
+        keys2 = [key for _, key, _, in_table2 in pending if in_table2]
+        logger.debug(f"按主键拉取 {len(keys1)}/{len(keys2)} 行数据进行对比")
+        (rows1_data, description1), (rows2_data, description2) = self._run_on_both_sides(
+            lambda: self._fetch_rows_by_keys(1, keys1, primary_keys, comparison_fields),
+            lambda: self._fetch_rows_by_keys(2, keys2, primary_keys, comparison_fields))
+        if description1 and description2:
+            self._prepare_row_comparator(description1, description2, comparison_fields)
+        
+        for row_number, key, _, _ in pending:
+            row1 = rows1_data.get(key)
+            row2 = rows2_data.get(key)
+            if row1 is None and row2 is None:
+                # 两个阶段之间行被删除
+                continue
+            if row1 is None:
+                differences.append({
+                    'row_number': row_number,
+                    'type': 'only_in_table2',
+                    'key': dict(zip(primary_keys, key)),
+                    'differences': self._one_side_differences(row2, comparison_fields, 2)
+                })
+                counts[2] += 1
+            elif row2 is None:
+                differences.append({
+                    'row_number': row_number,
+                    'type': 'only_in_table1',
+                    'key': dict(zip(primary_keys, key)),
+                    'differences': self._one_side_differences(row1, comparison_fields, 1)
+                })
+                counts[1] += 1
+            else:
+                # 哈希不一致但字段值相同（两侧数据库的文本表示不同）时不产生差异
+                row_diff = self._compare_single_row(row1, row2, row_number, comparison_fields)
+                if row_diff:
+                    row_diff['type'] = 'different_data'
+                    row_diff['key'] = dict(zip(primary_keys, key))
+                    counts[0] += 1
+                    differences.append(row_diff)
 
-    def get_table_fields(self, table_name: str, db_index: int = 1) -> List[str]:
+    def _fetch_rows_by_keys(self, db_index: int, keys: List[tuple], primary_keys: List[str],
+                            comparison_fields: List[str]) -> dict:
         """
-        获取表的所有字段名
+        按主键查询一批行的完整数据
         
-        :param table_name: 表名
         :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
-        :return: 字段名列表
+        :param keys: 主键元组列表
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :return: (主键元组 -> 行元组 的字典, 游标的description)，没有主键时description为None
         """
-        logger.info(f"获取表 {table_name} 的所有字段")
+        if not keys:
+            return {}, None
+        db = self.db1 if db_index == 1 else self.db2
+        table_name = self.table1 if db_index == 1 else self.table2
+        if len(primary_keys) == 1:
+            key_condition = f"{primary_keys[0]} IN ({', '.join(self._key_literal(key[0]) for key in keys)})"
+        else:
+            key_condition = '(' + ' OR '.join(
+                '(' + ' AND '.join(f"{pk} = {self._key_literal(value)}" for pk, value in zip(primary_keys, key)) + ')'
+                for key in keys) + ')'
+        query = self.build_query(comparison_fields, table_name, db_index, key_condition)
+        get_key = self._key_getter(comparison_fields, primary_keys)
+        cursor = db.execute_query(query, fetch_size=self.fetch_size)
         try:
-            if db_index == 1:
-                fields = self.db1.get_table_fields(table_name)
-            else:
-                fields = self.db2.get_table_fields(table_name)
-            logger.info(f"表 {table_name} 的字段: {fields}")
-            return fields
-        except Exception as e:
-            # 检查是否是表不存在的错误
-            error_msg = str(e).lower()
-            if "no such table" in error_msg or "doesn't exist" in error_msg or "not found" in error_msg or "unknown" in error_msg or "表" in error_msg:
-                raise ValueError(f"表 '{table_name}' 不存在")
-            else:
-                raise RuntimeError(f"获取表 '{table_name}' 字段信息时出错: {str(e)}")
+            rows = {get_key(row): row for row in iter_cursor_rows(cursor, self.fetch_size)}
+            return rows, getattr(cursor, 'description', None)
+        finally:
+            self._close_cursor(cursor)
 
-    def get_comparison_fields(self) -> List[str]:
+    @classmethod
+    def _key_literal(cls, value) -> str:
+        """将主键值转换为SQL字面量，只支持整数、小数和字符串"""
+        if isinstance(value, str):
+            return cls._quote_literal(value)
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            return str(value)
+        raise ValueError(f"主键值 {value!r} 的类型 {type(value).__name__} 无法转换为SQL字面量")
+
+    def _compare_rows_by_checksum(self, primary_keys: List[str], comparison_fields: List[str],
+                                  differences: Optional[DifferenceSink] = None) -> Optional[dict]:
         """
-        获取最终要对比的字段列表
+        基于分段校验和对比两个表
         
-        :return: 对比字段列表
+        在数据库中按主键范围计算每个分段的行数和聚合哈希，只对不一致的分段继续二分，
+        直到分段足够小时才拉取实际数据进行逐行对比。两个表大部分数据一致时，
+        传输的数据量只与差异的数量相关。
+        
+        :param primary_keys: 主键字段列表，第一个主键字段必须是整数类型
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典，无法使用校验和对比时返回None
         """
-        logger.info("获取对比字段列表")
-        # 如果用户指定了字段，则直接使用
-        if self.fields:
-            logger.info(f"使用指定的字段: {self.fields}")
-            # 检查指定的字段是否在两个表中都存在
+        checksum_select1 = self.db1.build_checksum_select(comparison_fields, primary_keys)
+        checksum_select2 = self.db2.build_checksum_select(comparison_fields, primary_keys)
+        if not checksum_select1 or not checksum_select2 or type(self.db1) is not type(self.db2):
+            # 不同数据库的哈希函数和值的文本表示不同，校验和无法直接比较
+            logger.warning("数据库不支持分段校验和对比或两侧数据库类型不同，使用流式对比")
+            return None
+        
+        if differences is None:
+            differences = DifferenceList()
+        split_key = primary_keys[0]
+        bounds = self._query_key_bounds(split_key)
+        if not bounds:
+            logger.info("两个表均没有数据")
+            return {'differences': differences, 'table1_row_count': 0, 'table2_row_count': 0,
+                    'difference_count': 0, 'union_row_count': 0}
+        if not all(self._is_integral(value) for value in bounds):
+            logger.warning(f"主键字段 {split_key} 不是整数类型，无法按范围分段，使用流式对比")
+            return None
+        
+        row_counts = None
+        difference_count = 0
+        row_number = 1
+        # 使用栈按主键顺序处理分段，分段为闭区间[lower, upper]
+        segments = [(int(min(bounds)), int(max(bounds)))]
+        while segments:
+            lower, upper = segments.pop()
+            range_condition = f"{split_key} >= {lower} AND {split_key} <= {upper}"
             try:
-                fields1 = self.get_table_fields(self.table1, 1)
-                fields2 = self.get_table_fields(self.table2, 2)
+                checksum1 = self._query_segment_checksum(1, checksum_select1, range_condition)
+                checksum2 = self._query_segment_checksum(2, checksum_select2, range_condition)
             except Exception as e:
-                logger.error(f"获取表字段时出错: {str(e)}")
-                raise
+                if row_counts is not None:
+                    raise
+                # 第一个分段包含所有的行，数据库无法计算校验和时（如拼接的文本超过长度上限）尚未输出任何差异
+                logger.warning(f"计算分段校验和失败: {e}，使用流式对比")
+                return None
+            count1, count2 = checksum1[0], checksum2[0]
+            if row_counts is None:
+                # 第一个分段覆盖整个主键范围
+                row_counts = (count1, count2)
             
-            # 检查每个指定的字段是否存在于两个表中
-            missing_in_table1 = [f for f in self.fields if f not in fields1]
-            missing_in_table2 = [f for f in self.fields if f not in fields2]
+            if checksum1 == checksum2:
+                logger.debug(f"分段 [{lower}, {upper}] 校验和一致，共 {count1} 行")
+                row_number += count1
+                continue
             
-            if missing_in_table1:
-                raise ValueError(f"字段 {', '.join(missing_in_table1)} 在表 '{self.table1}' 中不存在")
-                
-            if missing_in_table2:
-                raise ValueError(f"字段 {', '.join(missing_in_table2)} 在表 '{self.table2}' 中不存在")
-                
-            comparison_fields = list(self.fields)
-        else:
-            # 否则获取两个表的公共字段
-            logger.info(f"获取表 {self.table1} 的字段")
-            fields1 = self.get_table_fields(self.table1, 1)
-            logger.info(f"获取表 {self.table2} 的字段")
-            fields2 = self.get_table_fields(self.table2, 2)
-
-            # 获取公共字段
-            common_fields = list(set(fields1) & set(fields2))
-            logger.info(f"两个表的公共字段: {common_fields}")
-
-            # 如果有排除字段，则移除它们
-            if self.exclude_fields:
-                logger.info(f"排除字段: {self.exclude_fields}")
-                # 检查要排除的字段是否存在于公共字段中
-                existing_exclude_fields = [f for f in self.exclude_fields if f in common_fields]
-                non_existing_exclude_fields = [f for f in self.exclude_fields if f not in common_fields]
-                
-                if non_existing_exclude_fields:
-                    logger.warning(f"要排除的字段 {', '.join(non_existing_exclude_fields)} 不存在于两个表的公共字段中")
-                
-                common_fields = [f for f in common_fields if f not in existing_exclude_fields]
-                logger.info(f"排除后剩余字段: {common_fields}")
-
-            comparison_fields = common_fields
+            if lower == upper or max(count1, count2) <= self.checksum_leaf_size:
+                logger.info(f"分段 [{lower}, {upper}] 校验和不一致，拉取 {count1}/{count2} 行数据进行对比")
+                query1 = self.build_query(comparison_fields, self.table1, 1, range_condition)
+                query2 = self.build_query(comparison_fields, self.table2, 2, range_condition)
+                segment_result = self._compare_rows_by_primary_key(
+                    query1, query2, primary_keys, comparison_fields, row_number, differences=differences)
+                difference_count += segment_result['difference_count']
+                # 行号按两个表主键的并集递增
+                row_number += segment_result['union_row_count']
+                continue
+            
+            middle = (lower + upper) // 2
+            segments.append((middle + 1, upper))
+            segments.append((lower, middle))
+        
+        logger.info(f"分段校验和对比完成，发现 {difference_count} 个差异")
+        return {
+            'differences': differences,
+            'table1_row_count': row_counts[0],
+            'table2_row_count': row_counts[1],
+            'difference_count': difference_count,
+            'union_row_count': row_number - 1
+        }
 
-        logger.info(f"最终对比字段: {comparison_fields}")
+    def _compare_rows_by_checksum_tree(self, primary_keys: List[str], comparison_fields: List[str],
+                                       differences: Optional[DifferenceSink] = None) -> Optional[dict]:
+        """
+        基于持久化的分段校验和树对比两个表
         
-        # 如果表有主键但主键不在比较字段中，则添加主键字段
-        # 仅当用户没有指定字段时才添加主键，如果用户指定了字段，则完全按照用户指定的字段进行比较
-        if not self.fields:
-            primary_keys = self.db1.get_primary_keys(self.table1)
-            if primary_keys:
-                for pk in primary_keys:
-                    if pk not in comparison_fields:
-                        logger.info(f"添加主键字段 {pk} 到比较字段中")
-                        comparison_fields.append(pk)
+        先按上次保存的统计信息和水位线刷新两侧的树，只重新计算可能变化的叶子分段；再从根节点开始比较两侧的节点，
+        哈希一致的子树直接跳过，只拉取哈希不一致的叶子分段的数据逐行对比。
         
-        return comparison_fields
+        :param primary_keys: 主键字段列表，第一个主键字段必须是整数类型
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典，无法使用校验和树时返回None
+        """
+        checksum_selects = [self.db1.build_checksum_select(comparison_fields, primary_keys),
+                            self.db2.build_checksum_select(comparison_fields, primary_keys)]
+        if not all(checksum_selects) or type(self.db1) is not type(self.db2):
+            # 不同数据库的哈希函数和值的文本表示不同，校验和无法直接比较
+            logger.warning("数据库不支持分段校验和对比或两侧数据库类型不同，不使用校验和树")
+            return None
+        
+        if differences is None:
+            differences = DifferenceList()
+        tree_key = '|'.join((MetadataCache.connection_key(self.db1), self.table1,
+                             MetadataCache.connection_key(self.db2), self.table2))
+        settings = {
+            'fields': sorted(comparison_fields),
+            'split_key': primary_keys[0],
+            'where1': self.get_where_condition(self.table1),
+            'where2': self.get_where_condition(self.table2),
+            'leaf_size': self.checksum_leaf_size
+        }
+        # 在计算校验和之前记录统计信息和水位线，计算期间修改的行在下次对比时仍会被检查
+        states = list(self._run_on_both_sides(lambda: self._checksum_tree_state(1),
+                                              lambda: self._checksum_tree_state(2)))
+        store = ChecksumTreeStore(self.checksum_tree_file)
+        try:
+            tree = store.load(tree_key)
+            if tree is not None and tree['settings'] != settings:
+                logger.info("对比字段、WHERE条件或分段设置与上次不同，重新构建校验和树")
+                tree = None
+            sides = None
+            try:
+                if tree is not None:
+                    sides = self._refresh_checksum_tree(store, tree_key, tree, states, checksum_selects,
+                                                        primary_keys)
+                if sides is None:
+                    tree, sides = self._build_checksum_tree(settings, checksum_selects)
+            except Exception as e:
+                # 数据库无法计算校验和时（如拼接的文本超过长度上限）使用流式对比，保存的树保持不变
+                logger.warning(f"计算分段校验和失败: {e}，不使用校验和树")
+                return None
+            if tree is None:
+                return None
+            sides = self._update_checksum_tree_levels(tree, sides)
+            tree['states'] = states
+            store.save(tree_key, tree, sides)
+        finally:
+            store.close()
+        return self._compare_checksum_trees(tree, sides[0][0], sides[1][0], primary_keys, comparison_fields,
+                                            differences)
 
-    def build_query(self, fields: List[str], table_name: str, db_index: int = 1) -> str:
+    def _checksum_tree_state(self, db_index: int) -> Dict[str, Any]:
         """
-        构建查询SQL
+        记录一侧表当前的统计信息和水位线，下次对比时据此判断哪些分段可能变化
         
-        :param fields: 字段列表
-        :param table_name: 表名
         :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
-        :return: 查询SQL语句
+        :return: {'statistics': 修改计数器或None}，设置了水位线列时还包含'watermark'
         """
-        logger.info(f"为表 {table_name} 构建查询，字段: {fields}")
-        
-        # 获取主键字段
-        primary_keys = self.db1.get_primary_keys(table_name) if db_index == 1 else self.db2.get_primary_keys(table_name)
-        
-        # 确保主键字段包含在查询字段中，以避免KeyError
-        query_fields = list(fields)
-        for pk in primary_keys:
-            if pk not in query_fields:
-                query_fields.append(pk)
+        db = self.db1 if db_index == 1 else self.db2
+        table_name = self.table1 if db_index == 1 else self.table2
+        state = {'statistics': None}
+        try:
+            state['statistics'] = db.get_modification_counters(table_name)
+        except Exception as e:
+            logger.warning(f"读取表 {table_name} 的统计信息失败: {e}")
+        if self.watermark_column:
+            state['watermark'] = self._query_watermark(db_index)
+        return state
+
+    def _build_checksum_tree(self, settings: Dict[str, Any], checksum_selects: List[str]) -> tuple:
+        """
+        按两个表的主键范围确定分段起点和宽度，在数据库中按分段分组计算两侧所有叶子的校验和
         
-        field_list = ', '.join(query_fields)
-        query = f"SELECT {field_list} FROM {table_name}"
+        :param settings: 对比设置
+        :param checksum_selects: 两侧适配器生成的校验和SELECT表达式
+        :return: (树的参数, 每侧的 (节点列表, None))，第一个主键字段不是整数时返回 (None, None)
+        """
+        split_key = settings['split_key']
+        bounds = self._query_key_bounds(split_key)
+        if not all(self._is_integral(value) for value in bounds):
+            logger.warning(f"主键字段 {split_key} 不是整数类型，无法按范围分段，不使用校验和树")
+            return None, None
+        base, width = 0, 1
+        if bounds:
+            base, upper = int(min(bounds)), int(max(bounds))
+            row_counts = self._run_on_both_sides(lambda: self._count_rows(self.db1, self.table1),
+                                                 lambda: self._count_rows(self.db2, self.table2))
+            # 使每个分段平均约有checksum_leaf_size行
+            width = max(1, -(-(upper - base + 1) * self.checksum_leaf_size // max(max(row_counts), 1)))
+        leaves1, leaves2 = self._run_on_both_sides(
+            lambda: self._query_checksum_leaves(1, checksum_selects[0], split_key, base, width),
+            lambda: self._query_checksum_leaves(2, checksum_selects[1], split_key, base, width))
+        logger.info(f"构建校验和树，分段起点 {base}，宽度 {width}，叶子分段 {len(leaves1)}/{len(leaves2)} 个")
+        tree = {'settings': settings, 'base': base, 'width': width, 'height': 0}
+        return tree, [([leaves1], None), ([leaves2], None)]
+
+    def _refresh_checksum_tree(self, store: ChecksumTreeStore, tree_key: str, tree: Dict[str, Any],
+                               states: List[Dict[str, Any]], checksum_selects: List[str],
+                               primary_keys: List[str]) -> Optional[List[tuple]]:
+        """
+        读取保存的树，按两侧的统计信息和水位线重新计算可能变化的叶子分段
         
-        # 添加WHERE条件，优先使用特定表的WHERE条件
-        where_condition = None
-        logger.info(f"表名匹配详情 - 当前表名: '{table_name}', self.table1: '{self.table1}', self.table2: '{self.table2}'")
-        logger.info(f"WHERE条件值 - where_condition1: {self.where_condition1}, where_condition2: {self.where_condition2}, where_condition: {self.where_condition}")
+        统计信息与上次相同的一侧直接使用保存的节点；设置了水位线列时，只重新计算包含水位线之后变化的行的分段，
+        不能确定没有删除过行时（没有统计信息或删除计数变化）还按分段分组统计行数，重新计算行数与保存的不同的分段；
+        否则按分段分组重新计算该侧所有叶子。
         
-        # 改进表名匹配逻辑，处理可能的模式名前缀
-        # 确保表名不为空
-        if self.table1 and self.table2:
-            table1_name = self.table1.split('.')[-1]  # 获取表名部分（去掉模式前缀）
-            table2_name = self.table2.split('.')[-1]  # 获取表名部分（去掉模式前缀）
-            current_table_name = table_name.split('.')[-1]  # 获取当前表名部分（去掉模式前缀）
-            
-            logger.info(f"简化表名匹配 - 当前表名: '{current_table_name}', 表1名: '{table1_name}', 表2名: '{table2_name}'")
+        :param store: 校验和树文件
+        :param tree_key: 标识一对表的键
+        :param tree: 保存的树的参数
+        :param states: 两侧本次的统计信息和水位线
+        :param checksum_selects: 两侧适配器生成的校验和SELECT表达式
+        :param primary_keys: 主键字段列表
+        :return: 每侧的 (节点列表, 重新计算的叶子位置集合或None)，主键超出分段起点需要重新构建时返回None
+        """
+        split_key = primary_keys[0]
+        base, width = tree['base'], tree['width']
+        sides = []
+        for index, db_index in enumerate((1, 2)):
+            db = self.db1 if db_index == 1 else self.db2
+            table_name = self.table1 if db_index == 1 else self.table2
+            levels = store.load_nodes(tree_key, db_index)
+            previous, current = tree['states'][index] or {}, states[index]
+            statistics = previous.get('statistics')
+            if statistics is not None and statistics == current['statistics']:
+                logger.info(f"表 {table_name} 的统计信息没有变化，使用保存的校验和")
+                sides.append((levels, set()))
+                continue
             
-            if current_table_name == table1_name:
-                where_condition = self.where_condition1 or self.where_condition
-                logger.info(f"匹配到表1，使用表1的WHERE条件: {where_condition}")
-            elif current_table_name == table2_name:
-                where_condition = self.where_condition2 or self.where_condition
-                logger.info(f"匹配到表2，使用表2的WHERE条件: {where_condition}")
-            else:
-                where_condition = self.where_condition
-                logger.info(f"未匹配到特定表，使用通用WHERE条件: {where_condition}")
-        else:
-            where_condition = self.where_condition
-            logger.info(f"表名未设置，使用通用WHERE条件: {where_condition}")
+            if self.watermark_column and previous.get('watermark') is not None:
+                keys = self._query_changed_keys(db_index, previous['watermark'], primary_keys)
+                dirty = {(int(key[0]) - base) // width for key in keys}
+                if (statistics is None or current['statistics'] is None
+                        or statistics.get('deletes') != current['statistics'].get('deletes')):
+                    # 水位线无法反映删除的行，行数与保存的不同的分段也重新计算
+                    counts = self._query_checksum_leaf_counts(db_index, split_key, base, width)
+                    dirty.update(position for position in set(counts) | set(levels[0])
+                                 if counts.get(position, 0) != levels[0].get(position, (0,))[0])
+                if any(position < 0 for position in dirty):
+                    logger.info(f"表 {table_name} 中出现小于分段起点的主键，重新构建校验和树")
+                    return None
+                logger.info(f"表 {table_name} 自上次对比以来变化 {len(keys)} 行，重新计算 {len(dirty)} 个分段")
+                for position in dirty:
+                    lower = base + position * width
+                    checksum = self._query_segment_checksum(
+                        db_index, checksum_selects[index], f"{split_key} >= {lower} AND {split_key} <= {lower + width - 1}")
+                    if checksum[0]:
+                        levels[0][position] = self._checksum_tree_leaf(checksum)
+                    else:
+                        levels[0].pop(position, None)
+                sides.append((levels, dirty))
+                continue
             
-        if where_condition:
-            query += f" WHERE {where_condition}"
-            logger.info(f"最终添加的WHERE条件: {where_condition}")
-        
-        # 添加ORDER BY主键
-        if primary_keys:
-            order_by_fields = ', '.join(primary_keys)
-            query += f" ORDER BY {order_by_fields}"
-            logger.info(f"添加ORDER BY主键: {order_by_fields}")
-        # 如果没有主键，使用所有字段进行排序
-        else:
-            # 为PostgreSQL添加ORDER BY以确保结果顺序一致
-            db = self.db1 if db_index == 1 else self.db2
-            if isinstance(db, PostgreSQLAdapter):
-                order_by_fields = ', '.join(query_fields)
-                query += f" ORDER BY {order_by_fields}"
-                logger.info(f"添加ORDER BY所有字段: {order_by_fields}")
-            # 为其他数据库也添加排序以确保一致性
-            else:
-                # 对于非PostgreSQL数据库，如果有主键就按主键排序，否则不强制排序
-                pass
-        
-        logger.info(f"构建完成的查询: {query}")
-        return query
+            cursor = db.execute_query(f"SELECT MIN({split_key}) FROM {table_name}{self._build_where_clause(table_name)}")
+            try:
+                minimum = cursor.fetchone()[0]
+            finally:
+                self._close_cursor(cursor)
+            if minimum is not None and (not self._is_integral(minimum) or int(minimum) < base):
+                logger.info(f"表 {table_name} 中出现小于分段起点的主键，重新构建校验和树")
+                return None
+            logger.info(f"表 {table_name} 可能已变化，重新计算所有分段的校验和")
+            sides.append(([self._query_checksum_leaves(db_index, checksum_selects[index], split_key, base, width)],
+                          None))
+        return sides
 
-    def compare(self) -> Dict[str, Any]:
+    def _query_checksum_leaves(self, db_index: int, checksum_select: str, split_key: str,
+                               base: int, width: int) -> Dict[int, tuple]:
         """
-        执行表对比
+        在数据库中按分段分组计算一侧表所有叶子分段的行数和聚合哈希
         
-        :return: 对比结果
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :param checksum_select: 适配器生成的校验和SELECT表达式
+        :param split_key: 用于分段的主键字段
+        :param base: 分段起点（不大于表中的最小主键）
+        :param width: 分段宽度
+        :return: {叶子位置: (行数, 哈希)}
         """
+        db = self.db1 if db_index == 1 else self.db2
+        table_name = self.table1 if db_index == 1 else self.table2
+        position = db.integer_division(f"{split_key} - ({base})", width)
+        query = (f"SELECT {position}, {checksum_select} FROM {table_name}"
+                 f"{self._build_where_clause(table_name)} GROUP BY {position}")
+        cursor = db.execute_query(query, fetch_size=self.fetch_size)
         try:
-            logger.info("开始执行表对比")
-            # 获取两个表的所有字段
-            logger.info(f"获取表 {self.table1} 的字段")
-            fields1 = self.get_table_fields(self.table1, 1)
-            logger.info(f"获取表 {self.table2} 的字段")
-            fields2 = self.get_table_fields(self.table2, 2)
-            
-            # 只有在用户没有指定字段且没有指定排除字段时，才检查字段一致性
-            if not self.fields and not self.exclude_fields:
-                # 检查字段是否完全一致
-                if set(fields1) != set(fields2):
-                    # 获取公共字段
-                    common_fields = list(set(fields1) & set(fields2))
-                    
-                    # 字段不一致，返回字段不匹配
-                    logger.warning(f"表 {self.table1} 和 {self.table2} 字段不一致")
-                    # 获取差异字段
-                    only_in_table1 = list(set(fields1) - set(fields2))
-                    only_in_table2 = list(set(fields2) - set(fields1))
-                    
-                    result = {
-                        'fields': [],
-                        'table1_row_count': 0,
-                        'table2_row_count': 0,
-                        'differences': [{
-                            'type': 'field_mismatch',
-                            'message': f'表 {self.table1} 和 {self.table2} 字段不一致',
-                            'details': {
-                                'table1_fields': fields1,
-                                'table2_fields': fields2,
-                                'only_in_table1': only_in_table1,
-                                'only_in_table2': only_in_table2,
-                                'common_fields': common_fields
-                            }
-                        }],
-                        'row_differences': [],
-                        'table1_fields': fields1,
-                        'table2_fields': fields2,
-                        'only_in_table1': only_in_table1,
-                        'only_in_table2': only_in_table2,
-                        'common_fields': common_fields
-                    }
-                    return result
-            
-            # 获取要对比的字段
-            logger.info("获取对比字段")
-            comparison_fields = self.get_comparison_fields()
-            logger.info(f"对比字段: {comparison_fields}")
-            
-            # 如果指定了字段或有公共字段，但最终没有可对比字段
-            if not comparison_fields:
-                logger.error("没有找到可对比的字段")
-                raise ValueError("没有找到可对比的字段")
-            
-            # 构建查询语句
-            logger.info("构建查询语句")
-            query1 = self.build_query(comparison_fields, self.table1, 1)
-            query2 = self.build_query(comparison_fields, self.table2, 2)
-            
-            # 执行查询获取游标，但不立即获取所有数据
-            logger.info("执行查询1")
-            cursor1 = self.db1.execute_query(query1)
-            logger.info("执行查询2")
-            cursor2 = self.db2.execute_query(query2)
-            
-            # 获取主键字段
-            primary_keys1 = self.db1.get_primary_keys(self.table1)
-            primary_keys2 = self.db2.get_primary_keys(self.table2)
-            common_primary_keys = list(set(primary_keys1) & set(primary_keys2))
-            
-            # 准备结果
-            result = {
-                'fields': comparison_fields,
-                'table1_row_count': 0,
-                'table2_row_count': 0,
-                'differences': [],
-                'row_differences': [],
-                'table1_fields': fields1,  # 添加表1的所有字段
-                'table2_fields': fields2   # 添加表2的所有字段
-            }
-            
-            # 如果两个表都有主键，且主键字段一致，并且主键字段在比较字段中，则按主键进行匹配对比
-            if common_primary_keys and all(pk in comparison_fields for pk in common_primary_keys):
-                logger.info(f"使用主键 {common_primary_keys} 进行匹配对比")
-                comparison_result = self._compare_rows_by_primary_key_streaming(
-                    cursor1, cursor2, common_primary_keys, comparison_fields)
-                result['row_differences'] = comparison_result['differences']
-                result['table1_row_count'] = comparison_result['table1_row_count']
-                result['table2_row_count'] = comparison_result['table2_row_count']
+            return {int(row[0]): self._checksum_tree_leaf(row[1:]) for row in iter_cursor_rows(cursor, self.fetch_size)}
+        finally:
+            self._close_cursor(cursor)
+
+    def _query_checksum_leaf_counts(self, db_index: int, split_key: str, base: int, width: int) -> Dict[int, int]:
+        """
+        在数据库中按分段分组统计一侧表每个叶子分段的行数
+        
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :param split_key: 用于分段的主键字段
+        :param base: 分段起点
+        :param width: 分段宽度
+        :return: {叶子位置: 行数}
+        """
+        db = self.db1 if db_index == 1 else self.db2
+        table_name = self.table1 if db_index == 1 else self.table2
+        position = db.integer_division(f"{split_key} - ({base})", width)
+        query = (f"SELECT {position}, COUNT(*) FROM {table_name}"
+                 f"{self._build_where_clause(table_name)} GROUP BY {position}")
+        cursor = db.execute_query(query, fetch_size=self.fetch_size)
+        try:
+            return {int(row[0]): int(row[1]) for row in iter_cursor_rows(cursor, self.fetch_size)}
+        finally:
+            self._close_cursor(cursor)
+
+    @staticmethod
+    def _checksum_tree_leaf(checksum) -> tuple:
+        """将数据库返回的 (行数, 哈希值...) 转换为保存的叶子节点 (行数, 哈希文本)"""
+        return int(checksum[0]), json.dumps([None if value is None else str(value) for value in checksum[1:]])
+
+    def _update_checksum_tree_levels(self, tree: Dict[str, Any], sides: List[tuple]) -> List[tuple]:
+        """
+        按两侧叶子的最大位置确定树的高度，重新计算变化的叶子到根节点路径上的内部节点
+        
+        :param tree: 树的参数，height原地更新
+        :param sides: 每侧的 (节点列表, 重新计算的叶子位置集合或None)，None表示所有叶子都是新计算的
+        :return: 每侧的 (节点列表, 变化的(层, 位置)集合或None)
+        """
+        max_position = max((max(levels[0], default=0) for levels, _ in sides), default=0)
+        height = tree['height']
+        while max_position // CHECKSUM_TREE_FANOUT ** height > 0:
+            height += 1
+        updated = []
+        for levels, dirty in sides:
+            if dirty is None:
+                self._update_checksum_tree(levels, set(levels[0]), 0, height)
+                updated.append((levels, None))
             else:
-                # 否则按行位置进行对比
-                logger.info("没有共同主键或主键不在比较字段中，按行位置进行对比")
-                comparison_result = self._compare_rows_by_position_streaming(
-                    cursor1, cursor2, comparison_fields)
-                result['row_differences'] = comparison_result['differences']
-                result['table1_row_count'] = comparison_result['table1_row_count']
-                result['table2_row_count'] = comparison_result['table2_row_count']
-            
-            # 添加差异计数信息
-            diff_count = len(result['row_differences'])
-            if diff_count > 0:
-                result['differences'].append({
-                    'type': 'multiple_row_diff',
-                    'count': diff_count,
-                    'message': f'共有{diff_count}行存在数据差异'
-                })
-            
-            logger.info("表对比完成")
-            return result
+                updated.append((levels, self._update_checksum_tree(levels, dirty, tree['height'], height)))
+        tree['height'] = height
+        return updated
 
-        except Exception as e:
-            logger.error(f"对比过程中发生错误: {str(e)}", exc_info=True)
-            raise RuntimeError(f"对比过程中发生错误: {str(e)}")
-            
-    def _compare_rows_by_primary_key_streaming(self, cursor1, cursor2, 
-                                     primary_keys: List[str], comparison_fields: List[str]) -> dict:
+    @staticmethod
+    def _update_checksum_tree(levels: List[Dict[int, tuple]], dirty: set, previous_height: int, height: int) -> set:
         """
-        基于主键流式对比两组行数据
+        自下而上重新计算变化的叶子的所有祖先节点
         
-        :param cursor1: 第一个表的游标
-        :param cursor2: 第二个表的游标
+        :param levels: 每层 {位置: (行数, 哈希)} 的列表，原地更新
+        :param dirty: 变化的叶子位置集合
+        :param previous_height: 保存的树的高度，更高的层由下一层的所有节点计算
+        :param height: 树的高度
+        :return: 变化的 (层, 位置) 集合
+        """
+        while len(levels) <= height:
+            levels.append({})
+        changed = {(0, position) for position in dirty}
+        for level in range(1, height + 1):
+            children = levels[level - 1]
+            if level > previous_height:
+                dirty = dirty | set(children)
+            parents = {position // CHECKSUM_TREE_FANOUT for position in dirty}
+            for parent in parents:
+                first = parent * CHECKSUM_TREE_FANOUT
+                nodes = [(position, children[position]) for position in range(first, first + CHECKSUM_TREE_FANOUT)
+                         if position in children]
+                if nodes:
+                    text = '|'.join(f"{position}:{row_count}:{checksum}" for position, (row_count, checksum) in nodes)
+                    levels[level][parent] = (sum(row_count for _, (row_count, _) in nodes),
+                                             hashlib.md5(text.encode('utf-8')).hexdigest())
+                else:
+                    levels[level].pop(parent, None)
+            changed.update((level, parent) for parent in parents)
+            dirty = parents
+        return changed
+
+    def _compare_checksum_trees(self, tree: Dict[str, Any], levels1: List[Dict[int, tuple]],
+                                levels2: List[Dict[int, tuple]], primary_keys: List[str],
+                                comparison_fields: List[str], differences: DifferenceSink) -> dict:
+        """
+        从根节点开始按主键顺序比较两侧的树，只拉取哈希不一致的叶子分段的数据逐行对比
+        
+        :param tree: 树的参数
+        :param levels1: 表1的节点
+        :param levels2: 表2的节点
         :param primary_keys: 主键字段列表
         :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置
         :return: 包含差异列表和行数统计的字典
         """
-        logger.info("基于主键进行流式行数据对比")
+        split_key = primary_keys[0]
+        base, width, height = tree['base'], tree['width'], tree['height']
+        difference_count = 0
+        row_number = 1
+        # 使用栈按主键顺序处理节点
+        nodes = [(height, 0)]
+        while nodes:
+            level, position = nodes.pop()
+            node1, node2 = levels1[level].get(position), levels2[level].get(position)
+            if node1 == node2:
+                if node1 is not None:
+                    row_number += node1[0]
+                continue
+            if level > 0:
+                first = position * CHECKSUM_TREE_FANOUT
+                nodes.extend((level - 1, child) for child in range(first + CHECKSUM_TREE_FANOUT - 1, first - 1, -1))
+                continue
+            
+            lower, upper = base + position * width, base + (position + 1) * width - 1
+            logger.info(f"分段 [{lower}, {upper}] 校验和不一致，拉取数据进行对比")
+            range_condition = f"{split_key} >= {lower} AND {split_key} <= {upper}"
+            query1 = self.build_query(comparison_fields, self.table1, 1, range_condition)
+            query2 = self.build_query(comparison_fields, self.table2, 2, range_condition)
+            segment_result = self._compare_rows_by_primary_key(
+                query1, query2, primary_keys, comparison_fields, row_number, differences=differences)
+            difference_count += segment_result['difference_count']
+            row_number += segment_result['union_row_count']
         
-        # 获取所有数据并按主键排序
-        rows1_data = {}
-        rows2_data = {}
+        roots = levels1[height].get(0), levels2[height].get(0)
+        logger.info(f"校验和树对比完成，发现 {difference_count} 个差异")
+        return {
+            'differences': differences,
+            'table1_row_count': roots[0][0] if roots[0] else 0,
+            'table2_row_count': roots[1][0] if roots[1] else 0,
+            'difference_count': difference_count,
+            'union_row_count': row_number - 1
+        }
+
+    def _query_key_bounds(self, split_key: str) -> list:
+        """
+        查询两个表中主键字段的最小值和最大值
         
-        # 读取第一个表的数据
-        row_count1 = 0
-        for row in cursor1:
-            row_dict = dict(zip(comparison_fields, row))
-            key = tuple(row_dict[pk] for pk in primary_keys)
-            rows1_data[key] = row_dict
-            row_count1 += 1
-            
-        # 读取第二个表的数据
-        row_count2 = 0
-        for row in cursor2:
-            row_dict = dict(zip(comparison_fields, row))
-            key = tuple(row_dict[pk] for pk in primary_keys)
-            rows2_data[key] = row_dict
-            row_count2 += 1
-            
-        # 收集所有主键值
-        all_keys = set(rows1_data.keys()) | set(rows2_data.keys())
-        logger.info(f"总共 {len(all_keys)} 个唯一主键值")
+        :param split_key: 主键字段
+        :return: 两个表的MIN/MAX中非NULL的值列表，两个表均无数据时为空列表
+        """
+        bounds = []
+        for db_index, table_name in ((1, self.table1), (2, self.table2)):
+            db = self.db1 if db_index == 1 else self.db2
+            query = f"SELECT MIN({split_key}), MAX({split_key}) FROM {table_name}"
+            query += self._build_where_clause(table_name)
+            cursor = db.execute_query(query)
+            bounds.extend(value for value in cursor.fetchone() if value is not None)
+            self._close_cursor(cursor)
+        return bounds
+
+    def _compare_rows_by_key_ranges(self, primary_keys: List[str], comparison_fields: List[str],
+                                    differences: Optional[DifferenceSink] = None) -> Optional[dict]:
+        """
+        按主键范围拆分并行对比
         
-        # 对比每一行
-        differences = []
-        row_number = 1
+        将第一个主键字段的取值范围拆分为jobs段，每段在各自从连接池获取的连接上执行归并对比，
+        按主键顺序依次取出已完成分段的结果，重新编排行号后输出。
         
-        # 分别收集三种类型的差异
-        diff_rows = []  # 两个表中都存在但数据不同的记录
-        only_in_table1 = []  # 源表中有但目标表中没有的记录
-        only_in_table2 = []  # 目标表中有但源表中没有的记录
+        :param primary_keys: 主键字段列表
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典，无法拆分范围时返回None
+        """
+        split_key = primary_keys[0]
+        boundaries = self._get_key_range_boundaries(split_key)
+        if not boundaries:
+            logger.warning(f"无法按主键字段 {split_key} 拆分范围，使用单连接对比")
+            return None
         
-        for key in sorted(all_keys):  # 按主键排序，保证输出顺序一致
-            row1 = rows1_data.get(key)
-            row2 = rows2_data.get(key)
-            
-            if row1 is None:
-                # 只在表2中存在
-                diff = {
-                    'row_number': row_number,
-                    'type': 'only_in_table2',
-                    'key': dict(zip(primary_keys, key)),
-                    'differences': [{'field': field, 'table1_value': None, 'table2_value': row2[field]} 
-                                   for field in comparison_fields]
-                }
-                only_in_table2.append(diff)
-                differences.append(diff)
-            elif row2 is None:
-                # 只在表1中存在
-                diff = {
-                    'row_number': row_number,
-                    'type': 'only_in_table1',
-                    'key': dict(zip(primary_keys, key)),
-                    'differences': [{'field': field, 'table1_value': row1[field], 'table2_value': None} 
-                                   for field in comparison_fields]
-                }
-                only_in_table1.append(diff)
-                differences.append(diff)
-            else:
-                # 两个表中都存在，对比字段值
-                row_diff = self._compare_single_row(row1, row2, row_number, comparison_fields)
-                if row_diff:
-                    row_diff['type'] = 'different_data'
-                    row_diff['key'] = dict(zip(primary_keys, key))
-                    diff_rows.append(row_diff)
-                    differences.append(row_diff)
-                    
-            row_number += 1
-            
-        logger.info(f"基于主键对比完成，发现数据不同的记录 {len(diff_rows)} 条，源表独有记录 {len(only_in_table1)} 条，目标表独有记录 {len(only_in_table2)} 条")
+        range_queries = []
+        for i in range(len(boundaries) + 1):
+            conditions = []
+            if i > 0:
+                conditions.append(f"{split_key} >= {boundaries[i - 1]}")
+            if i < len(boundaries):
+                conditions.append(f"{split_key} < {boundaries[i]}")
+            range_condition = ' AND '.join(conditions)
+            range_queries.append((
+                self.build_query(comparison_fields, self.table1, 1, range_condition),
+                self.build_query(comparison_fields, self.table2, 2, range_condition)
+            ))
+        logger.info(f"主键范围拆分为 {len(range_queries)} 段，边界: {boundaries}")
+        
+        # 每一侧使用独立的连接池，每个任务同时持有两侧各一个连接
+        pool1 = ConnectionPool(self.db1, self.jobs)
+        pool2 = ConnectionPool(self.db2, self.jobs)
+        
+        def compare_range(query1, query2):
+            # 每个分段使用对比器的副本，按该分段自己的游标生成行对比函数和解码函数，工作线程不修改共享的对比器状态
+            range_comparator = copy.copy(self)
+            range_comparator._row_comparator = None
+            range_comparator._row_decoders = None
+            db1 = pool1.acquire()
+            try:
+                db2 = pool2.acquire()
+                try:
+                    if self.max_diffs is None:
+                        return range_comparator._compare_rows_by_primary_key(
+                            query1, query2, primary_keys, comparison_fields, db1=db1, db2=db2)
+                    # 单个分段的差异达到上限时，合并到该分段即会达到总上限，无需继续读取
+                    range_differences = DifferenceList()
+                    try:
+                        range_result = range_comparator._compare_rows_by_primary_key(
+                            query1, query2, primary_keys, comparison_fields, db1=db1, db2=db2,
+                            differences=_LimitedDifferences(range_differences, self.max_diffs))
+                        # 引擎返回的是包装后的输出，合并时需要可遍历的差异列表
+                        range_result['differences'] = range_differences
+                        return range_result
+                    except DifferenceLimitReached:
+                        return {'differences': range_differences, 'table1_row_count': 0, 'table2_row_count': 0,
+                                'difference_count': len(range_differences), 'union_row_count': 0}
+                finally:
+                    pool2.release(db2)
+            finally:
+                pool1.release(db1)
+        
+        if differences is None:
+            differences = DifferenceList()
+        # 按主键顺序合并各段结果，行号按两个表主键的并集连续编排
+        row_counts = [0, 0]
+        difference_count = 0
+        row_offset = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                futures = [executor.submit(compare_range, query1, query2) for query1, query2 in range_queries]
+                try:
+                    for future in futures:
+                        range_result = future.result()
+                        for diff in range_result['differences']:
+                            diff['row_number'] += row_offset
+                            differences.append(diff)
+                        row_counts[0] += range_result['table1_row_count']
+                        row_counts[1] += range_result['table2_row_count']
+                        difference_count += range_result['difference_count']
+                        row_offset += range_result['union_row_count']
+                except BaseException:
+                    # 差异达到上限或分段出错时，不再启动尚未开始的分段
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            pool1.close()
+            pool2.close()
+        
+        logger.info(f"并行范围对比完成，发现 {difference_count} 个差异")
         return {
             'differences': differences,
-            'table1_row_count': row_count1,
-            'table2_row_count': row_count2
+            'table1_row_count': row_counts[0],
+            'table2_row_count': row_counts[1],
+            'difference_count': difference_count,
+            'union_row_count': row_offset
         }
 
+    def _get_key_range_boundaries(self, split_key: str) -> Optional[List[str]]:
+        """
+        计算并行对比时主键范围的拆分边界
+        
+        整数主键使用两个表的MIN/MAX等距拆分；两侧为同类数据库的字符串主键，
+        则从表1的有序主键中按行数等距采样边界。
+        
+        :param split_key: 用于拆分范围的主键字段
+        :return: 升序且去重的边界SQL字面量列表，无法拆分时返回None
+        """
+        bounds = self._query_key_bounds(split_key)
+        if not bounds:
+            return None
+        
+        if all(self._is_integral(value) for value in bounds):
+            lower, upper = int(min(bounds)), int(max(bounds))
+            step = (upper - lower + 1) / self.jobs
+            boundaries = []
+            for i in range(1, self.jobs):
+                boundary = lower + int(step * i)
+                if lower < boundary <= upper and boundary not in boundaries:
+                    boundaries.append(boundary)
+            return [str(boundary) for boundary in boundaries] or None
+        
+        if type(self.db1) is not type(self.db2) or not all(isinstance(value, str) for value in bounds):
+            # 不同数据库的字符串排序规则可能不同，同一边界在两侧会划分出不同的数据
+            return None
+        
+        where_clause = self._build_where_clause(self.table1)
+        cursor = self.db1.execute_query(f"SELECT COUNT(*) FROM {self.table1}{where_clause}")
+        row_count = int(cursor.fetchone()[0])
+        self._close_cursor(cursor)
+        positions = {row_count * i // self.jobs for i in range(1, self.jobs)}
+        
+        boundaries = []
+        cursor = self.db1.execute_query(
+            f"SELECT {split_key} FROM {self.table1}{where_clause} ORDER BY {split_key}",
+            fetch_size=self.fetch_size)
+        for position, row in enumerate(iter_cursor_rows(cursor, self.fetch_size)):
+            if position in positions and row[0] not in boundaries and position > 0:
+                boundaries.append(row[0])
+            if position >= max(positions, default=0):
+                break
+        self._close_cursor(cursor)
+        return [self._quote_literal(boundary) for boundary in boundaries] or None
+
+    @staticmethod
+    def _quote_literal(value: str) -> str:
+        """将字符串转换为SQL字符串字面量"""
+        return "'" + value.replace("'", "''") + "'"
+
+    def _query_segment_checksum(self, db_index: int, checksum_select: str, range_condition: str) -> tuple:
+        """
+        查询一个主键范围分段的行数和聚合哈希
+        
+        :param db_index: 数据库索引 (1表示源数据库, 2表示目标数据库)
+        :param checksum_select: 适配器生成的校验和SELECT表达式
+        :param range_condition: 主键范围条件
+        :return: (行数, 哈希值...) 元组
+        """
+        db = self.db1 if db_index == 1 else self.db2
+        table_name = self.table1 if db_index == 1 else self.table2
+        query = f"SELECT {checksum_select} FROM {table_name}"
+        query += self._build_where_clause(table_name, range_condition)
+        cursor = db.execute_query(query)
+        try:
+            row = cursor.fetchone()
+        finally:
+            self._close_cursor(cursor)
+        return (int(row[0]),) + tuple(row[1:])
+
+    @staticmethod
+    def _is_integral(value) -> bool:
+        """判断主键值是否为整数（包括整数值的Decimal）"""
+        if isinstance(value, bool):
+            return False
+        if isinstance(value, int):
+            return True
+        if isinstance(value, Decimal):
+            return value == value.to_integral_value()
+        return False
+
     def _compare_rows_by_position_streaming(self, cursor1, cursor2, 
-                                  comparison_fields: List[str]) -> dict:
+                                  comparison_fields: List[str],
+                                  differences: Optional[DifferenceSink] = None) -> dict:
         """
         基于行位置流式对比两组行数据
         
         :param cursor1: 第一个表的游标
         :param cursor2: 第二个表的游标
         :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
         :return: 包含差异列表和行数统计的字典
         """
         logger.info("基于行位置进行流式行数据对比")
-        differences = []
+        if differences is None:
+            differences = DifferenceList()
+        difference_count = 0
         
-        rows1_list = list(cursor1)
-        rows2_list = list(cursor2)
+        # 两个游标按批次同步读取，较短一侧读完后继续读取另一侧的剩余行
+        rows1 = iter_cursor_rows(cursor1, self.fetch_size)
+        rows2 = iter_cursor_rows(cursor2, self.fetch_size)
         
-        row_count1 = len(rows1_list)
-        row_count2 = len(rows2_list)
-        
-        # 处理共同行数范围内的对比
-        for i in range(min(row_count1, row_count2)):
-            row1_dict = dict(zip(comparison_fields, rows1_list[i]))
-            row2_dict = dict(zip(comparison_fields, rows2_list[i]))
-            row_diff = self._compare_single_row(row1_dict, row2_dict, i+1, comparison_fields)
-            if row_diff:
-                row_diff['type'] = 'different_data'
-                differences.append(row_diff)
+        row_count1 = 0
+        row_count2 = 0
+        for row1, row2 in zip_longest(rows1, rows2, fillvalue=_MISSING_ROW):
+            if row1 is not _MISSING_ROW and row2 is not _MISSING_ROW:
+                row_count1 += 1
+                row_count2 += 1
+                row_diff = self._compare_single_row(row1, row2, row_count1, comparison_fields)
+                if row_diff:
+                    row_diff['type'] = 'different_data'
+                    differences.append(row_diff)
+                    difference_count += 1
+            elif row2 is _MISSING_ROW:
+                # 表1的多余行
+                row_count1 += 1
+                difference_count += 1
+                differences.append({
+                    'row_number': row_count1,
+                    'type': 'only_in_table1',
+                    'differences': self._one_side_differences(row1, comparison_fields, 1)
+                })
+            else:
+                # 表2的多余行
+                row_count2 += 1
+                difference_count += 1
+                differences.append({
+                    'row_number': row_count2,
+                    'type': 'only_in_table2',
+                    'differences': self._one_side_differences(row2, comparison_fields, 2)
+                })
         
-        # 处理多余的行（如果有的话）
         if row_count1 != row_count2:
             logger.info(f"行数不同: 表1有{row_count1}行, 表2有{row_count2}行")
+        
+        logger.info(f"基于行位置对比完成，发现 {difference_count} 个差异")
+        return {
+            'differences': differences,
+            'table1_row_count': row_count1,
+            'table2_row_count': row_count2,
+            'difference_count': difference_count
+        }
+
+    def _compare_rows_by_alignment(self, cursor1, cursor2, comparison_fields: List[str],
+                                   differences: Optional[DifferenceSink] = None) -> dict:
+        """
+        按行顺序对齐后流式对比两组行数据（没有主键但行顺序有意义的表）
+        
+        两侧各保留最多alignment_window行的窗口，窗口开头的行键（归一化后的对比字段值）相同时直接前进；
+        不同时对两个窗口的行键做差异对齐（difflib.SequenceMatcher），只提交第一个相同块之前的编辑：
+        删除的行报告为only_in_table1，插入的行报告为only_in_table2，替换的行按顺序配对后逐字段对比，
+        报告为different_data。提交后补满窗口继续，因此差异数量与真实的修改成正比。
+        
+        :param cursor1: 第一个表的游标
+        :param cursor2: 第二个表的游标
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典
+        """
+        logger.info(f"按行顺序对齐进行流式对比，窗口大小: {self.alignment_window}")
+        if differences is None:
+            differences = DifferenceList()
+        get_key = self._multiset_key_getter(getattr(cursor1, 'description', None),
+                                            getattr(cursor2, 'description', None), comparison_fields)
+        rows1 = iter_cursor_rows(cursor1, self.fetch_size)
+        rows2 = iter_cursor_rows(cursor2, self.fetch_size)
+        # 窗口中保存 (行键, 行)
+        window1 = deque()
+        window2 = deque()
+        row_counts = [0, 0]
+        difference_count = 0
+        
+        while True:
+            self._fill_alignment_window(window1, rows1, get_key)
+            self._fill_alignment_window(window2, rows2, get_key)
+            if not window1 and not window2:
+                break
+            if window1 and window2 and window1[0][0] == window2[0][0]:
+                window1.popleft()
+                window2.popleft()
+                row_counts[0] += 1
+                row_counts[1] += 1
+                continue
             
-            # 标记多余行
-            if row_count1 > row_count2:
-                for i in range(row_count2, row_count1):
-                    row_dict = dict(zip(comparison_fields, rows1_list[i]))
+            matcher = difflib.SequenceMatcher(None, [item[0] for item in window1], [item[0] for item in window2],
+                                              autojunk=False)
+            for tag, start1, end1, start2, end2 in matcher.get_opcodes():
+                if tag == 'equal':
+                    break
+                count1 = end1 - start1
+                count2 = end2 - start2
+                # 替换的行按顺序配对，多出的行为删除或插入
+                for _ in range(min(count1, count2)):
+                    row1 = window1.popleft()[1]
+                    row2 = window2.popleft()[1]
+                    row_counts[0] += 1
+                    row_counts[1] += 1
+                    row_diff = self._compare_single_row(row1, row2, row_counts[0], comparison_fields)
+                    if row_diff:
+                        row_diff['type'] = 'different_data'
+                        differences.append(row_diff)
+                        difference_count += 1
+                for _ in range(count1 - count2):
+                    row_counts[0] += 1
+                    difference_count += 1
                     differences.append({
-                        'row_number': i+1,
+                        'row_number': row_counts[0],
                         'type': 'only_in_table1',
-                        'differences': [{'field': field, 'table1_value': row_dict[field], 'table2_value': None} 
-                                       for field in comparison_fields]
+                        'differences': self._one_side_differences(window1.popleft()[1], comparison_fields, 1)
                     })
-            else:
-                for i in range(row_count1, row_count2):
-                    row_dict = dict(zip(comparison_fields, rows2_list[i]))
+                for _ in range(count2 - count1):
+                    row_counts[1] += 1
+                    difference_count += 1
                     differences.append({
-                        'row_number': i+1,
+                        'row_number': row_counts[1],
                         'type': 'only_in_table2',
-                        'differences': [{'field': field, 'table1_value': None, 'table2_value': row_dict[field]} 
-                                       for field in comparison_fields]
+                        'differences': self._one_side_differences(window2.popleft()[1], comparison_fields, 2)
                     })
         
-        logger.info(f"基于行位置对比完成，发现 {len(differences)} 个差异")
+        logger.info(f"按行顺序对齐对比完成，发现 {difference_count} 个差异")
         return {
             'differences': differences,
-            'table1_row_count': row_count1,
-            'table2_row_count': row_count2
+            'table1_row_count': row_counts[0],
+            'table2_row_count': row_counts[1],
+            'difference_count': difference_count
+        }
+
+    def _fill_alignment_window(self, window: deque, rows, get_key) -> None:
+        """从行迭代器中读取数据，把窗口补满到alignment_window行（迭代器读完时不再补充）"""
+        while len(window) < self.alignment_window:
+            row = next(rows, _MISSING_ROW)
+            if row is _MISSING_ROW:
+                return
+            window.append((get_key(row), row))
+
+    def _compare_rows_as_multiset(self, cursor1, cursor2, comparison_fields: List[str],
+                                  differences: Optional[DifferenceSink] = None) -> dict:
+        """
+        按行的多重集合对比两组行数据（没有可用的主键时使用，不依赖两侧的行顺序）
+        
+        两侧按批次交替读取，以对比字段归一化后的值组成的元组作为行键，统计每个行键在表1中出现的次数
+        减去在表2中出现的次数，次数归零的行键立即删除，因此两侧顺序相近时内存中只有尚未匹配的行。
+        设置了max_memory时，待匹配的行估算超过内存上限后，已统计的次数和之后读取的行按行键哈希分区
+        写入临时文件，再逐个分区统计。最后只报告次数不为0的行：大于0为表1中多出的行，小于0为表2中
+        多出的行，差异记录的count为多出的次数。
+        
+        :param cursor1: 第一个表的游标
+        :param cursor2: 第二个表的游标
+        :param comparison_fields: 需要对比的字段列表
+        :param differences: 行差异的输出位置（默认为新的内存列表）
+        :return: 包含差异列表和行数统计的字典
+        """
+        logger.info("按行的多重集合进行流式对比")
+        if differences is None:
+            differences = DifferenceList()
+        if any(self._column_rule(field).get('tolerance') is not None for field in comparison_fields):
+            logger.warning("按行的多重集合对比时不支持tolerance规则，设置了tolerance的列按归一化后的值精确比较")
+        get_key = self._multiset_key_getter(getattr(cursor1, 'description', None),
+                                            getattr(cursor2, 'description', None), comparison_fields)
+        
+        # 行键 -> [表1中出现的次数减表2中出现的次数, 次数所在一侧的一行原始数据]
+        counts = {}
+        row_counts = [0, 0]
+        row_memory = None
+        spill = None
+        residual = []
+        batches1 = iter_cursor_batches(cursor1, self.fetch_size)
+        batches2 = iter_cursor_batches(cursor2, self.fetch_size)
+        with tempfile.TemporaryDirectory(prefix='table_diff_') as directory:
+            try:
+                for batch1, batch2 in zip_longest(batches1, batches2, fillvalue=()):
+                    row_counts[0] += len(batch1)
+                    row_counts[1] += len(batch2)
+                    for delta, batch in ((1, batch1), (-1, batch2)):
+                        if spill is not None:
+                            for row in batch:
+                                spill.add(get_key(row), (delta, row))
+                            continue
+                        for row in batch:
+                            key = get_key(row)
+                            entry = counts.get(key)
+                            if entry is None:
+                                counts[key] = [delta, row]
+                            elif entry[0] + delta:
+                                entry[0] += delta
+                            else:
+                                del counts[key]
+                    
+                    if spill is None and self.max_memory is not None and counts:
+                        if row_memory is None:
+                            # 由第一批数据序列化后的大小估算每个待匹配行（行和行键）占用的内存
+                            sample = batch1 or batch2
+                            row_memory = (len(pickle.dumps(sample, pickle.HIGHEST_PROTOCOL)) / len(sample)
+                                          * SPILL_MEMORY_FACTOR * 2)
+                        if len(counts) * row_memory > self.max_memory:
+                            logger.info(f"待匹配的行 {len(counts)} 条超过内存上限，按行哈希分区写入临时文件")
+                            spill = _SpillPartitions(os.path.join(directory, 'multiset'),
+                                                     DEFAULT_SPILL_PARTITIONS, 0)
+                            for key, (delta, row) in counts.items():
+                                spill.add(key, (delta, row))
+                            counts = {}
+            finally:
+                if spill is not None:
+                    spill.close()
+            
+            if spill is None:
+                residual.extend(counts.values())
+            else:
+                for path in spill.paths:
+                    self._count_spilled_multiset(path, 1, get_key, residual)
+        
+        if self._row_decoders is not None and residual:
+            # 以文本形式获取时，文本不同的行转换为Python值后再统计一次（如两侧DECIMAL的小数位数不同）
+            decoded_counts = {}
+            for delta, row in residual:
+                key = get_key(self._row_decoders[0 if delta > 0 else 1](row))
+                self._add_multiset_count(decoded_counts, key, delta, row)
+            residual = list(decoded_counts.values())
+        
+        extra_counts = [0, 0]
+        row_number = 0
+        for delta, row in residual:
+            table_index = 1 if delta > 0 else 2
+            row_number += 1
+            extra_counts[table_index - 1] += abs(delta)
+            differences.append({
+                'row_number': row_number,
+                'type': f'only_in_table{table_index}',
+                'count': abs(delta),
+                'differences': self._one_side_differences(row, comparison_fields, table_index)
+            })
+        
+        logger.info(f"按行的多重集合对比完成，源表多出 {extra_counts[0]} 行，目标表多出 {extra_counts[1]} 行")
+        return {
+            'differences': differences,
+            'table1_row_count': row_counts[0],
+            'table2_row_count': row_counts[1],
+            'difference_count': row_number
         }
 
-    def _compare_single_row(self, row1: Dict, row2: Dict, row_number: int, 
+    @staticmethod
+    def _add_multiset_count(counts: dict, key: tuple, delta: int, row) -> None:
+        """把行键的出现次数累加到统计中，次数改变符号时记录另一侧的行，次数归零时删除行键"""
+        entry = counts.get(key)
+        if entry is None:
+            counts[key] = [delta, row]
+            return
+        total = entry[0] + delta
+        if not total:
+            del counts[key]
+        elif (total > 0) != (entry[0] > 0):
+            counts[key] = [total, row]
+        else:
+            entry[0] = total
+
+    def _count_spilled_multiset(self, path: str, depth: int, get_key, residual: list) -> None:
+        """
+        统计一个多重集合分区文件中每个行键的出现次数，估算内存超过上限时递归拆分
+        
+        :param path: 分区文件，每项为 (次数, 行)
+        :param depth: 当前拆分层数
+        :param get_key: 计算行键的函数
+        :param residual: 次数不为0的 [次数, 行] 的输出列表
+        """
+        estimated_memory = os.path.getsize(path) * SPILL_MEMORY_FACTOR * 2
+        if estimated_memory > self.max_memory:
+            if depth < MAX_SPILL_DEPTH:
+                spill = _SpillPartitions(path, DEFAULT_SPILL_PARTITIONS, depth)
+                try:
+                    for item in _SpillPartitions.read(path):
+                        spill.add(get_key(item[1]), item)
+                finally:
+                    spill.close()
+                os.remove(path)
+                for sub_path in spill.paths:
+                    self._count_spilled_multiset(sub_path, depth + 1, get_key, residual)
+                return
+            logger.warning(f"分区拆分 {depth} 层后估算内存 {estimated_memory} 字节仍超过上限，直接加载该分区")
+        
+        counts = {}
+        for delta, row in _SpillPartitions.read(path):
+            self._add_multiset_count(counts, get_key(row), delta, row)
+        os.remove(path)
+        residual.extend(counts.values())
+
+    def _multiset_key_getter(self, description1, description2, comparison_fields: List[str]):
+        """
+        生成按行的多重集合对比时计算行键的函数
+        
+        行键为对比字段的值组成的元组（查询中附加的单侧主键不参与），对需要的列应用时间规则和跨数据库的
+        类型归一化；数值相等的int、float、Decimal哈希值相同，不可哈希的值转换为可哈希的形式。
+        
+        :param description1: 第一个表的游标description
+        :param description2: 第二个表的游标description
+        :param comparison_fields: 需要对比的字段列表
+        :return: 参数为行元组、返回行键的函数
+        """
+        normalizers = self._build_value_normalizers(description1, description2)
+        transforms = []
+        for index, field in enumerate(comparison_fields):
+            functions = []
+            time_transform = _datetime_rule_transform(self._column_rule(field))
+            if time_transform is not None:
+                functions.append(time_transform)
+            if index in normalizers:
+                functions.append(normalizers[index])
+            if functions:
+                transforms.append((index, self._compose(functions)))
+        field_count = len(comparison_fields)
+        
+        def get_key(row):
+            key = tuple(row[:field_count])
+            if transforms:
+                values = list(key)
+                for index, transform in transforms:
+                    if values[index] is not None:
+                        values[index] = transform(values[index])
+                key = tuple(values)
+            try:
+                hash(key)
+            except TypeError:
+                key = tuple(_hashable_value(value) for value in key)
+            return key
+        return get_key
+
+    def _prepare_row_comparator(self, description1, description2, comparison_fields: List[str]) -> None:
+        """
+        根据两侧游标的列类型和列对比规则为本次对比生成行对比函数（每次对比只生成一次）
+        
+        :param description1: 第一个表的游标description
+        :param description2: 第二个表的游标description
+        :param comparison_fields: 需要对比的字段列表
+        """
+        if self._row_comparator is not None:
+            return
+        normalizers = self._build_value_normalizers(description1, description2)
+        self._row_comparator = (comparison_fields, self._compile_row_comparator(comparison_fields, normalizers))
+
+    def _prepare_row_decoders(self, cursor1, cursor2) -> None:
+        """
+        记录两侧游标把文本形式的行转换为Python值的函数（每次对比只记录一次）
+        
+        :param cursor1: 第一个表的游标
+        :param cursor2: 第二个表的游标
+        """
+        if self._row_decoders is not None:
+            return
+        decoder1 = getattr(cursor1, 'decode_row', None)
+        decoder2 = getattr(cursor2, 'decode_row', None)
+        if decoder1 is None and decoder2 is None:
+            return
+        self._row_decoders = (decoder1 or tuple, decoder2 or tuple)
+
+    def _build_value_normalizers(self, description1, description2) -> Dict[int, Any]:
+        """
+        根据两侧游标的列类型生成每列的归一化函数
+        
+        两侧为同一种数据库且列的类型代码相同时直接比较原始值；定长字符列、类型代码不同的列
+        或跨数据库对比的列，按两侧的值类别组合归一化函数，如Decimal与float、带时区与不带时区的时间、
+        bytes与memoryview、CHAR尾部填充的空格。
+        
+        :param description1: 第一个表的游标description
+        :param description2: 第二个表的游标description
+        :return: 列下标 -> 归一化函数 的字典
+        """
+        if not description1 or not description2:
+            return {}
+        
+        same_engine = type(self.db1) is type(self.db2)
+        normalizers = {}
+        for index, (column1, column2) in enumerate(zip(description1, description2)):
+            kind1 = self.db1.column_kind(column1[1])
+            kind2 = self.db2.column_kind(column2[1])
+            if same_engine and column1[1] == column2[1] and 'char' not in (kind1, kind2):
+                continue
+            functions = [VALUE_NORMALIZERS[kind] for kind in dict.fromkeys((kind1, kind2))
+                         if kind in VALUE_NORMALIZERS]
+            if functions:
+                normalizers[index] = self._compose(functions)
+        if normalizers:
+            logger.info(f"以下列按类型归一化后对比: {[description1[index][0] for index in normalizers]}")
+        return normalizers
+
+    @staticmethod
+    def _compose(functions: list):
+        """组合多个单参数函数，按列表顺序依次调用"""
+        if len(functions) == 1:
+            return functions[0]
+        
+        def composed(value):
+            for function in functions:
+                value = function(value)
+            return value
+        return composed
+
+    def _column_rule(self, field: str) -> Dict[str, Any]:
+        """获取字段的列对比规则（列名优先精确匹配，其次忽略大小写匹配），没有规则时返回空字典"""
+        if not self.column_rules:
+            return {}
+        rule = self.column_rules.get(field)
+        if rule is None:
+            lower_field = field.lower()
+            rule = next((rule for column, rule in self.column_rules.items() if column.lower() == lower_field), None)
+        return rule or {}
+
+    def _select_expression(self, field: str, primary_keys: List[str]) -> str:
+        """
+        将列对比规则中可以用SQL表达的部分（trim、ignore_case、round）下推到SELECT中
+        
+        :param field: 字段名
+        :param primary_keys: 主键字段列表（主键用于排序和匹配，不做转换）
+        :return: SELECT列表中的表达式
+        """
+        rule = self._column_rule(field)
+        if not rule or field in primary_keys:
+            return field
+        expression = field
+        if rule.get('trim'):
+            expression = f"TRIM({expression})"
+        if rule.get('ignore_case'):
+            expression = f"UPPER({expression})"
+        if rule.get('round') is not None:
+            expression = f"ROUND({expression}, {rule['round']})"
+        return expression if expression == field else f"{expression} AS {field}"
+
+    def _compile_row_comparator(self, comparison_fields: List[str], normalizers: Dict[int, Any]):
+        """
+        为本次对比的字段列表生成一个专用的行对比函数
+        
+        每个字段按需要展开为独立的比较语句：没有规则的字段直接比较原始值；原始值不相等时，
+        依次应用时间规则（timezone、truncate）和类型归一化后再比较，设置了tolerance的字段按误差比较。
+        
+        :param comparison_fields: 需要对比的字段列表
+        :param normalizers: 列下标 -> 归一化函数 的字典
+        :return: 参数为(行1, 行2)、返回值不同的字段下标列表的函数
+        """
+        namespace = {'_within_tolerance': _within_tolerance}
+        lines = ['def compare_row(row1, row2):', '    different = []']
+        for index, field in enumerate(comparison_fields):
+            rule = self._column_rule(field)
+            transforms = []
+            time_transform = _datetime_rule_transform(rule)
+            if time_transform is not None:
+                transforms.append(time_transform)
+            if index in normalizers:
+                transforms.append(normalizers[index])
+            
+            lines.append(f'    a = row1[{index}]')
+            lines.append(f'    b = row2[{index}]')
+            lines.append('    if a != b:')
+            if transforms:
+                namespace[f'transform{index}'] = self._compose(transforms)
+                lines.append(f'        a = transform{index}(a)')
+                lines.append(f'        b = transform{index}(b)')
+            if rule.get('tolerance') is not None:
+                namespace[f'tolerance{index}'] = Decimal(str(rule['tolerance']))
+                lines.append(f'        if a != b and not _within_tolerance(a, b, tolerance{index}):')
+                lines.append(f'            different.append({index})')
+            elif transforms:
+                lines.append('        if a != b:')
+                lines.append(f'            different.append({index})')
+            else:
+                lines.append(f'        different.append({index})')
+        lines.append('    return different')
+        
+        exec(compile('\n'.join(lines), '<table_diff row comparator>', 'exec'), namespace)
+        return namespace['compare_row']
+
+    def _compare_single_row(self, row1: tuple, row2: tuple, row_number: int, 
                             comparison_fields: List[str]) -> Optional[Dict]:
         """
         对比单行数据
         
+        行以数据库返回的元组形式传入，字段顺序与comparison_fields一致。
+        先整体比较两个元组，只有不相等时才调用为本次对比生成的行对比函数找出不同的字段。
+        
         :param row1: 第一行数据
         :param row2: 第二行数据
         :param row_number: 行号
         :param comparison_fields: 需要对比的字段列表
         :return: 差异信息，如果没有差异则返回None
         """
-        logger.debug(f"对比第 {row_number} 行数据")
-        differences = []
+        if row1 == row2:
+            return None
         
-        for field in comparison_fields:
-            value1 = row1[field]
-            value2 = row2[field]
-            
-            if value1 != value2:
-                logger.debug(f"字段 {field} 值不同: {value1} vs {value2}")
-                differences.append({
-                    'field': field,
-                    'table1_value': value1,
-                    'table2_value': value2
-                })
+        row_comparator = self._row_comparator
+        if row_comparator is None or (row_comparator[0] is not comparison_fields
+                                      and row_comparator[0] != comparison_fields):
+            # 游标不提供列类型时只按列对比规则生成
+            self._row_comparator = None
+            self._prepare_row_comparator(None, None, comparison_fields)
+            row_comparator = self._row_comparator
         
-        if differences:
-            logger.info(f"第 {row_number} 行发现 {len(differences)} 个差异")
+        different = row_comparator[1](row1, row2)
+        if different and self._row_decoders is not None:
+            # 文本不同的值转换为Python值后再对比（如两侧DECIMAL的小数位数不同），报告中也使用转换后的值
+            row1 = self._row_decoders[0](row1)
+            row2 = self._row_decoders[1](row2)
+            different = row_comparator[1](row1, row2)
+        if different:
+            logger.info(f"第 {row_number} 行发现 {len(different)} 个差异")
             return {
                 'row_number': row_number,
-                'differences': differences
+                'differences': [{'field': comparison_fields[index], 'table1_value': row1[index],
+                                 'table2_value': row2[index]} for index in different]
             }
         
-        logger.debug(f"第 {row_number} 行无差异")
+        # 只有查询中附加的非对比字段（如单侧的主键）不同，或按规则比较后相同
         return None
 
     def generate_csv_report(self, result: Dict[str, Any], output_file: str) -> None:
@@ -1220,39 +6087,10 @@ class TableComparator:
         :param result: 对比结果
         :param output_file: 输出文件路径
         """
-        import csv
-        
-        logger.info(f"生成CSV报告到文件: {output_file}")
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['row_type', 'key_info', 'row_number', 'column_name', 'table1_value', 'table2_value']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            
+        with CsvDifferenceSink(output_file) as sink:
             # 遍历所有行差异
-            if 'row_differences' in result:
-                for row_diff in result['row_differences']:
-                    row_type = row_diff.get('type', 'unknown')
-                    row_number = row_diff['row_number']
-                    key_info = ''
-                    
-                    # 如果有主键信息，则记录主键信息
-                    if 'key' in row_diff:
-                        key_info = ', '.join([f"{k}={v}" for k, v in row_diff['key'].items()])
-                    
-                    for diff in row_diff['differences']:
-                        csv_row = {
-                            'row_type': row_type,
-                            'key_info': key_info,
-                            'row_number': row_number,
-                            'column_name': diff['field'],
-                            'table1_value': diff['table1_value'],
-                            'table2_value': diff['table2_value']
-                        }
-                        writer.writerow(csv_row)
-        
-        logger.info("CSV报告生成完成")
+            for row_diff in result.get('row_differences', []):
+                sink.append(row_diff)
 
 
 def create_sample_database(db_path: str):
@@ -1360,6 +6198,58 @@ def main():
     parser.add_argument('--create-sample', action='store_true', help='创建示例数据库')
     parser.add_argument('--detailed', action='store_true', help='显示详细差异信息')
     parser.add_argument('--csv-report', help='生成CSV格式的详细差异报告到指定文件')
+    parser.add_argument('--fetch-size', type=int, default=DEFAULT_FETCH_SIZE,
+                       help=f'流式读取时每批从数据库获取的行数 (默认: {DEFAULT_FETCH_SIZE})')
+    parser.add_argument('--checksum', action='store_true',
+                       help='使用分段校验和对比，在数据库中计算哈希，只拉取不一致分段的数据（要求整数主键）')
+    parser.add_argument('--checksum-leaf-size', type=int, default=DEFAULT_CHECKSUM_LEAF_SIZE,
+                       help=f'分段校验和对比时直接拉取数据的分段最大行数 (默认: {DEFAULT_CHECKSUM_LEAF_SIZE})')
+    parser.add_argument('--pushdown', action='store_true',
+                       help='两个表在同一个数据库中时，在数据库中完成对比（有主键时FULL OUTER JOIN，无主键时按行分组统计出现次数），只返回差异行')
+    parser.add_argument('--key-hash', action='store_true',
+                       help='先对比主键和数据库计算的行哈希，只按主键拉取哈希不一致的行（适用于跨数据库对比）')
+    parser.add_argument('--key-hash-batch-size', type=int, default=DEFAULT_KEY_HASH_BATCH_SIZE,
+                       help=f'主键+行哈希对比时每批按主键拉取的行数 (默认: {DEFAULT_KEY_HASH_BATCH_SIZE})')
+    parser.add_argument('--column-rules',
+                       help='列对比规则的JSON文件，格式为 {列名: {规则名: 参数}}，'
+                            '支持tolerance、round、trim、ignore_case、truncate、timezone')
+    parser.add_argument('--no-bulk-read', action='store_true',
+                       help='不使用数据库的批量导出协议读取数据（默认PostgreSQL使用COPY ... TO STDOUT）')
+    parser.add_argument('--arraysize', type=int,
+                       help='Oracle和达梦数据库流式读取时每次网络往返获取的行数 (默认与--fetch-size相同)')
+    parser.add_argument('--prefetch-rows', type=int,
+                       help='Oracle和达梦数据库执行查询时预取的行数 (默认与--arraysize相同)')
+    parser.add_argument('--no-text-output', action='store_true',
+                       help='两侧是同一种数据库时也不以文本形式获取值（默认MySQL、PostgreSQL、Oracle、达梦按文本对比，'
+                            '只转换差异行）')
+    parser.add_argument('--multiset', action='store_true',
+                       help='没有可用的主键时按行的多重集合对比：查询不排序，统计每行在两侧出现的次数，只报告多出或缺少的行')
+    parser.add_argument('--align', action='store_true',
+                       help='没有可用的主键时按行顺序对齐后对比，报告插入、删除和原位修改的行（适用于行顺序有意义的表，如日志表）')
+    parser.add_argument('--align-window', type=int, default=DEFAULT_ALIGNMENT_WINDOW,
+                       help=f'按行顺序对齐对比时每侧窗口中保留的行数 (默认: {DEFAULT_ALIGNMENT_WINDOW})')
+    parser.add_argument('--no-unique-keys', action='store_true',
+                       help='表没有声明主键时不使用非空唯一索引作为匹配键（默认使用两个表共同的最窄非空唯一索引按主键对比）')
+    parser.add_argument('--watermark',
+                       help='增量对比使用的水位线列或表达式（如updated_at、MSSQL的rowversion列、PostgreSQL的xmin::text::bigint），'
+                            '只对比上次对比以来任一侧变化（水位线列不小于上次最大值）的行和上次仍然不同的行；没有保存的水位线时执行全量对比')
+    parser.add_argument('--watermark-state', default=DEFAULT_WATERMARK_STATE_FILE,
+                       help=f'保存每对表水位线的状态文件路径 (默认: {DEFAULT_WATERMARK_STATE_FILE})')
+    parser.add_argument('--checksum-tree', metavar='FILE',
+                       help='把每侧按主键范围分段的校验和树保存在本地SQLite文件中，再次对比时只重新计算统计信息或水位线显示可能变化的分段，'
+                            '只拉取校验和不一致的分段的数据（要求两侧为同类数据库且第一个主键字段为整数，分段大小由--checksum-leaf-size指定）')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='并行任务数，大于1时按主键范围拆分并使用独立连接并行对比 (默认: 1)')
+    parser.add_argument('--metadata-cache', help='表元数据（字段、字段类型、主键、唯一索引）的磁盘缓存文件路径')
+    parser.add_argument('--metadata-cache-ttl', type=float, default=DEFAULT_METADATA_CACHE_TTL,
+                       help=f'元数据磁盘缓存的有效期，单位秒 (默认: {DEFAULT_METADATA_CACHE_TTL})')
+    parser.add_argument('--max-diffs', type=int,
+                       help='行差异数量上限，达到后停止读取数据并提前结束对比，结果标记为已截断')
+    parser.add_argument('--fail-fast', action='store_true',
+                       help='发现第一个行差异即结束对比，等同于 --max-diffs 1')
+    parser.add_argument('--max-memory', type=parse_memory_size,
+                       help='无法按数据库顺序归并时主键对比的内存上限，如 512M、16G；'
+                            '超过时按主键哈希分区写入临时文件逐个分区对比')
     parser.add_argument('--verbose', '-v', action='store_true', help='显示详细日志')
     parser.add_argument('--gui', action='store_true', help='启动图形界面')
 
@@ -1390,11 +6280,11 @@ def main():
         logger.info(f"获取 {target_db_type} 目标数据库适配器")
         target_db_adapter = get_database_adapter(target_db_type)
         
-        # 建立源数据库连接
+        # 准备源数据库连接参数
         if args.source_db_type == 'sqlite':
             if not args.source_db_path:
                 raise ValueError("SQLite数据库需要指定 --source-db-path 参数")
-            source_db_adapter.connect(db_path=args.source_db_path)
+            source_connect_params = {'db_path': args.source_db_path, 'read_only': True}
         else:
             if not all([args.source_host, args.source_user, args.source_password, args.source_database]):
                 raise ValueError("MySQL和PostgreSQL需要指定 --source-host, --source-user, --source-password, --source-database 参数")
@@ -1408,19 +6298,18 @@ def main():
                 connect_params['port'] = args.source_port
             if args.source_db_type == 'oracle' and args.source_service_name:
                 connect_params['service_name'] = args.source_service_name
-            source_db_adapter.connect(**connect_params)
+            source_connect_params = connect_params
         
-        # 建立目标数据库连接
+        # 准备目标数据库连接参数
         if target_db_type == 'sqlite':
             if not args.target_db_path:
                 # 如果未指定目标数据库路径，则使用源数据库路径
                 if args.source_db_type == 'sqlite' and args.source_db_path:
-                    connect_params = {'db_path': args.source_db_path}
+                    connect_params = {'db_path': args.source_db_path, 'read_only': True}
                 else:
                     raise ValueError("目标SQLite数据库需要指定 --target-db-path 参数")
             else:
-                connect_params = {'db_path': args.target_db_path}
-            target_db_adapter.connect(**connect_params)
+                connect_params = {'db_path': args.target_db_path, 'read_only': True}
         else:
             # 对于MySQL和PostgreSQL，如果未提供目标数据库参数，则使用源数据库参数
             if not all([args.target_host, args.target_user, args.target_password, args.target_database]):
@@ -1451,11 +6340,42 @@ def main():
                     connect_params['port'] = args.target_port
                 if target_db_type == 'oracle' and args.target_service_name:
                     connect_params['service_name'] = args.target_service_name
-            target_db_adapter.connect(**connect_params)
+        
+        add_fetch_tuning_params(args.source_db_type, source_connect_params, args.arraysize, args.prefetch_rows)
+        add_fetch_tuning_params(target_db_type, connect_params, args.arraysize, args.prefetch_rows)
+        
+        # 并发建立源数据库和目标数据库连接
+        connect_adapters(source_db_adapter, source_connect_params, target_db_adapter, connect_params)
         
         # 创建对比器实例
         comparator = TableComparator(source_db_adapter, target_db_adapter)
         comparator.set_tables(args.table1, args.table2)
+        comparator.set_fetch_size(args.fetch_size)
+        comparator.set_checksum_mode(args.checksum, args.checksum_leaf_size)
+        comparator.set_pushdown_mode(args.pushdown)
+        comparator.set_key_hash_mode(args.key_hash, args.key_hash_batch_size)
+        comparator.set_jobs(args.jobs)
+        if args.metadata_cache:
+            comparator.set_metadata_cache(args.metadata_cache, args.metadata_cache_ttl)
+        if args.fail_fast or args.max_diffs is not None:
+            comparator.set_max_diffs(1 if args.fail_fast else args.max_diffs)
+        if args.max_memory:
+            comparator.set_max_memory(args.max_memory)
+        if args.column_rules:
+            comparator.set_column_rules(args.column_rules)
+        if args.no_bulk_read:
+            comparator.set_bulk_read_mode(False)
+        comparator.set_text_output_mode(not args.no_text_output)
+        if args.multiset:
+            comparator.set_multiset_mode(True)
+        if args.align:
+            comparator.set_alignment_mode(True, args.align_window)
+        if args.no_unique_keys:
+            comparator.set_unique_key_mode(False)
+        if args.watermark:
+            comparator.set_watermark(args.watermark, args.watermark_state)
+        if args.checksum_tree:
+            comparator.set_checksum_tree(args.checksum_tree)
         
         if args.fields:
             comparator.set_fields(args.fields)
@@ -1471,10 +6391,24 @@ def main():
         if args.where2:
             comparator.set_where_condition2(args.where2)
 
+        # CSV报告在对比过程中边发现差异边写入，只有需要显示详细差异时才在内存中保留
+        csv_sink = None
+        if args.csv_report:
+            try:
+                csv_sink = CsvDifferenceSink(args.csv_report)
+                comparator.set_difference_sink(csv_sink, keep_differences=args.detailed)
+            except Exception as e:
+                logger.error(f"生成CSV报告失败: {str(e)}", exc_info=True)
+                print(f"生成CSV报告失败: {str(e)}")
+
         # 执行对比
         print(f"开始对比表 {args.table1} 和 {args.table2}...")
         logger.info(f"开始对比表 {args.table1} 和 {args.table2}")
-        result = comparator.compare()
+        try:
+            result = comparator.compare()
+        finally:
+            if csv_sink is not None:
+                csv_sink.close()
         logger.info("对比完成")
         
         # 输出结果
@@ -1500,8 +6434,13 @@ def main():
             return
             
         print(f"字段列表: {', '.join(result['fields'])}")
-        print(f"表 {args.table1} 记录数: {result['table1_row_count']}")
-        print(f"表 {args.table2} 记录数: {result['table2_row_count']}")
+        if result.get('truncated'):
+            print(f"差异达到上限 {result['row_difference_count']} 行，对比已提前结束，以下结果不完整")
+        elif 'changed_row_count' in result:
+            print(f"增量对比: 自上次对比以来两个表变化的记录 {result['changed_row_count']} 条")
+        else:
+            print(f"表 {args.table1} 记录数: {result['table1_row_count']}")
+            print(f"表 {args.table2} 记录数: {result['table2_row_count']}")
         
         if result['differences']:
             print("发现差异:")
@@ -1539,7 +6478,9 @@ def main():
                             for diff in row_diff['differences']:
                                 print(f"    {diff['field']}: {diff['table1_value']}")
                         else:
-                            print(f"  第 {row_diff['row_number']} 行:")
+                            # 按行的多重集合对比时显示多出的次数
+                            count_info = f"（多出 {row_diff['count']} 次）" if 'count' in row_diff else ''
+                            print(f"  第 {row_diff['row_number']} 行{count_info}:")
                             for diff in row_diff['differences']:
                                 print(f"    {diff['field']}: {diff['table1_value']}")
                     
@@ -1552,7 +6493,9 @@ def main():
                             for diff in row_diff['differences']:
                                 print(f"    {diff['field']}: {diff['table2_value']}")
                         else:
-                            print(f"  第 {row_diff['row_number']} 行:")
+                            # 按行的多重集合对比时显示多出的次数
+                            count_info = f"（多出 {row_diff['count']} 次）" if 'count' in row_diff else ''
+                            print(f"  第 {row_diff['row_number']} 行{count_info}:")
                             for diff in row_diff['differences']:
                                 print(f"    {diff['field']}: {diff['table2_value']}")
             else:
@@ -1563,17 +6506,14 @@ def main():
                     print(f"\n发现第{first_diff['row_number']}行存在数据差异，共{multiple_diff_info[0]['count']}行有差异 (使用 --detailed 参数查看详细信息)")
                 else:
                     print(f"\n发现第{first_diff['row_number']}行存在数据差异 (使用 --detailed 参数查看详细信息)")
+        elif result.get('row_difference_count'):
+            # 差异已直接写入CSV报告，结果中只有差异计数
+            print(f"\n共{result['row_difference_count']}行有差异，详细信息见CSV报告")
         elif not result['differences']:
             print("未发现明显差异")
 
-        # 生成CSV报告
-        if args.csv_report:
-            try:
-                comparator.generate_csv_report(result, args.csv_report)
-                print(f"\n已生成CSV详细差异报告到: {args.csv_report}")
-            except Exception as e:
-                logger.error(f"生成CSV报告失败: {str(e)}", exc_info=True)
-                print(f"生成CSV报告失败: {str(e)}")
+        if csv_sink is not None:
+            print(f"\n已生成CSV详细差异报告到: {args.csv_report}")
 
         # 关闭数据库连接
         logger.info("关闭数据库连接")
@@ -1618,7 +6558,32 @@ def run_comparison(
     where: str = None,
     where1: str = None,
     where2: str = None,
-    csv_report: str = None
+    csv_report: str = None,
+    fetch_size: int = DEFAULT_FETCH_SIZE,
+    checksum: bool = False,
+    checksum_leaf_size: int = DEFAULT_CHECKSUM_LEAF_SIZE,
+    pushdown: bool = False,
+    key_hash: bool = False,
+    key_hash_batch_size: int = DEFAULT_KEY_HASH_BATCH_SIZE,
+    jobs: int = 1,
+    metadata_cache: str = None,
+    metadata_cache_ttl: float = DEFAULT_METADATA_CACHE_TTL,
+    keep_differences: bool = True,
+    max_diffs: int = None,
+    fail_fast: bool = False,
+    max_memory: Union[int, str] = None,
+    column_rules: Union[str, Dict[str, Dict[str, Any]]] = None,
+    bulk_read: bool = True,
+    arraysize: int = None,
+    prefetch_rows: int = None,
+    text_output: bool = True,
+    multiset: bool = False,
+    align: bool = False,
+    align_window: int = DEFAULT_ALIGNMENT_WINDOW,
+    unique_keys: bool = True,
+    watermark: str = None,
+    watermark_state: str = DEFAULT_WATERMARK_STATE_FILE,
+    checksum_tree: str = None
 ) -> Dict[str, Any]:
     """
     以编程方式运行表对比工具
@@ -1647,6 +6612,31 @@ def run_comparison(
     :param where1: 第一个表的WHERE条件字符串
     :param where2: 第二个表的WHERE条件字符串
     :param csv_report: CSV报告输出文件路径
+    :param fetch_size: 流式读取时每批从数据库获取的行数
+    :param checksum: 是否使用分段校验和对比
+    :param checksum_leaf_size: 分段校验和对比时直接拉取数据的分段最大行数
+    :param pushdown: 两个表在同一个数据库中时是否在数据库中完成对比，只返回差异行
+    :param key_hash: 是否先对比主键和数据库计算的行哈希，只按主键拉取哈希不一致的行
+    :param key_hash_batch_size: 主键+行哈希对比时每批按主键拉取的行数
+    :param jobs: 并行任务数，大于1时按主键范围拆分并行对比
+    :param metadata_cache: 表元数据的磁盘缓存文件路径
+    :param metadata_cache_ttl: 元数据磁盘缓存的有效期（秒）
+    :param keep_differences: 生成CSV报告时是否同时在结果中保留全部行差异，为False时结果中只有差异计数
+    :param max_diffs: 行差异数量上限，达到后提前结束对比，结果中truncated为True
+    :param fail_fast: 是否发现第一个行差异即结束对比，等同于max_diffs=1
+    :param max_memory: 无法按数据库顺序归并时主键对比的内存上限，字节数或 '512M'、'16G' 这样的字符串
+    :param column_rules: 列对比规则 {列名: {规则名: 参数}} 或JSON格式的规则文件路径
+    :param bulk_read: 适配器支持时是否使用批量导出协议读取数据（如PostgreSQL的COPY）
+    :param arraysize: Oracle和达梦数据库流式读取时每次网络往返获取的行数（默认与fetch_size相同）
+    :param prefetch_rows: Oracle和达梦数据库执行查询时预取的行数（默认与arraysize相同）
+    :param text_output: 两侧是同一种数据库时是否以文本形式获取值并按文本对比，只转换差异行
+    :param multiset: 没有可用的主键时是否按行的多重集合对比（不依赖两侧的行顺序）
+    :param align: 没有可用的主键时是否按行顺序对齐后对比（报告插入、删除和原位修改的行）
+    :param align_window: 按行顺序对齐对比时每侧窗口中保留的行数
+    :param unique_keys: 表没有声明主键时是否使用两个表共同的最窄非空唯一索引作为匹配键
+    :param watermark: 增量对比使用的水位线列或表达式，只对比上次对比以来任一侧变化的行和上次仍然不同的行
+    :param watermark_state: 保存每对表水位线的状态文件路径
+    :param checksum_tree: 保存分段校验和树的SQLite文件路径，再次对比时只重新计算可能变化的分段
     :return: 对比结果字典
     """
     logger.info("开始以编程方式运行表对比")
@@ -1661,11 +6651,11 @@ def run_comparison(
     # 获取目标数据库适配器
     target_db_adapter = get_database_adapter(target_db_type)
     
-    # 建立源数据库连接
+    # 准备源数据库连接参数
     if source_db_type == 'sqlite':
         if not source_db_path:
             raise ValueError("SQLite数据库需要指定 source_db_path 参数")
-        source_db_adapter.connect(db_path=source_db_path)
+        source_connect_params = {'db_path': source_db_path, 'read_only': True}
     else:
         if not all([source_host, source_user, source_password, source_database]):
             raise ValueError("MySQL和PostgreSQL需要指定 source_host, source_user, source_password, source_database 参数")
@@ -1677,19 +6667,18 @@ def run_comparison(
         }
         if source_port:
             connect_params['port'] = source_port
-        source_db_adapter.connect(**connect_params)
+        source_connect_params = connect_params
 
-    # 建立目标数据库连接
+    # 准备目标数据库连接参数
     if target_db_type == 'sqlite':
         if not target_db_path:
             # 如果未指定目标数据库路径，则使用源数据库路径
             if source_db_type == 'sqlite' and source_db_path:
-                connect_params = {'db_path': source_db_path}
+                connect_params = {'db_path': source_db_path, 'read_only': True}
             else:
                 raise ValueError("目标SQLite数据库需要指定 target_db_path 参数")
         else:
-            connect_params = {'db_path': target_db_path}
-        target_db_adapter.connect(**connect_params)
+            connect_params = {'db_path': target_db_path, 'read_only': True}
     else:
         if not all([target_host, target_user, target_password, target_database]):
             raise ValueError("目标MySQL和PostgreSQL需要指定 target_host, target_user, target_password, target_database 参数")
@@ -1701,11 +6690,38 @@ def run_comparison(
         }
         if target_port:
             connect_params['port'] = target_port
-        target_db_adapter.connect(**connect_params)
+
+    add_fetch_tuning_params(source_db_type, source_connect_params, arraysize, prefetch_rows)
+    add_fetch_tuning_params(target_db_type, connect_params, arraysize, prefetch_rows)
+
+    # 并发建立源数据库和目标数据库连接
+    connect_adapters(source_db_adapter, source_connect_params, target_db_adapter, connect_params)
 
     # 创建对比器实例
     comparator = TableComparator(source_db_adapter, target_db_adapter)
     comparator.set_tables(table1, table2)
+    comparator.set_fetch_size(fetch_size)
+    comparator.set_checksum_mode(checksum, checksum_leaf_size)
+    comparator.set_pushdown_mode(pushdown)
+    comparator.set_key_hash_mode(key_hash, key_hash_batch_size)
+    comparator.set_jobs(jobs)
+    if metadata_cache:
+        comparator.set_metadata_cache(metadata_cache, metadata_cache_ttl)
+    if fail_fast or max_diffs is not None:
+        comparator.set_max_diffs(1 if fail_fast else max_diffs)
+    if max_memory:
+        comparator.set_max_memory(max_memory)
+    if column_rules:
+        comparator.set_column_rules(column_rules)
+    comparator.set_bulk_read_mode(bulk_read)
+    comparator.set_text_output_mode(text_output)
+    comparator.set_multiset_mode(multiset)
+    comparator.set_alignment_mode(align, align_window)
+    comparator.set_unique_key_mode(unique_keys)
+    if watermark:
+        comparator.set_watermark(watermark, watermark_state)
+    if checksum_tree:
+        comparator.set_checksum_tree(checksum_tree)
     
     if fields:
         comparator.set_fields(fields)
@@ -1723,18 +6739,25 @@ def run_comparison(
     if where2:
         comparator.set_where_condition2(where2)
 
-    # 执行对比
-    logger.info(f"开始对比表 {table1} 和 {table2}")
-    result = comparator.compare()
-    logger.info("对比完成")
-    
-    # 生成CSV报告
+    # CSV报告在对比过程中边发现差异边写入
+    csv_sink = None
     if csv_report:
         try:
-            comparator.generate_csv_report(result, csv_report)
-            logger.info(f"已生成CSV详细差异报告到: {csv_report}")
+            csv_sink = CsvDifferenceSink(csv_report)
+            comparator.set_difference_sink(csv_sink, keep_differences=keep_differences)
         except Exception as e:
             logger.error(f"生成CSV报告失败: {str(e)}", exc_info=True)
+
+    # 执行对比
+    logger.info(f"开始对比表 {table1} 和 {table2}")
+    try:
+        result = comparator.compare()
+    finally:
+        if csv_sink is not None:
+            csv_sink.close()
+    logger.info("对比完成")
+    if csv_sink is not None:
+        logger.info(f"已生成CSV详细差异报告到: {csv_report}")
     
     # 关闭数据库连接
     logger.info("关闭数据库连接")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    run_comparison
+)
+
+
+class TestAlignmentComparison(unittest.TestCase):
+    """测试没有主键的有序表按行顺序对齐后对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE event1 (seq INTEGER, message TEXT)')
+        conn.execute('CREATE TABLE event2 (seq INTEGER, message TEXT)')
+        rows = [(i, f"event{i}") for i in range(500)]
+        rows2 = list(rows)
+        rows2.insert(20, (-1, 'inserted'))
+        del rows2[201]
+        rows2[300] = (299, 'changed')
+        rows2[400:400] = [(-2, 'a'), (-3, 'b'), (-4, 'c')]
+        conn.executemany("INSERT INTO event1 VALUES (?, ?)", rows)
+        conn.executemany("INSERT INTO event2 VALUES (?, ?)", rows2)
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+
+    def _compare(self, window):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('event1', 'event2')
+        comparator.fetch_size = 64
+        comparator.set_alignment_mode(True, window)
+        return comparator.compare()
+
+    def test_inserts_deletes_and_changes(self):
+        """测试只报告插入、删除和原位修改的行"""
+        result = self._compare(50)
+        self.assertEqual((result['table1_row_count'], result['table2_row_count']), (500, 503))
+        summary = [(diff['type'], diff['row_number']) for diff in result['row_differences']]
+        self.assertEqual(summary, [('only_in_table2', 21), ('only_in_table1', 201), ('different_data', 301),
+                                   ('only_in_table2', 401), ('only_in_table2', 402), ('only_in_table2', 403)])
+        changed = result['row_differences'][2]['differences']
+        self.assertEqual({diff['field']: (diff['table1_value'], diff['table2_value']) for diff in changed},
+                         {'seq': (300, 299), 'message': ('event300', 'changed')})
+
+        # 按位置对比时插入一行后的行全部错位
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('event1', 'event2')
+        self.assertGreater(comparator.compare()['row_difference_count'], 200)
+
+    def test_window_smaller_than_gap(self):
+        """测试连续插入的行超过窗口大小时按原位修改报告，但仍能重新对齐"""
+        result = self._compare(2)
+        self.assertLess(result['row_difference_count'], 150)
+        self.assertEqual(result['row_differences'][0]['type'], 'only_in_table2')
+        with self.assertRaises(ValueError):
+            self._compare(0)
+
+    def test_run_comparison_with_alignment(self):
+        """测试run_comparison支持align参数"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='event1',
+            table2='event2',
+            align=True,
+            align_window=100
+        )
+        self.assertEqual(result['row_difference_count'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import Mock, patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    PostgreSQLAdapter,
+    OracleAdapter,
+    MSSQLAdapter,
+    DMAdapter,
+    run_comparison
+)
+
+
+class CountingSQLiteAdapter(SQLiteAdapter):
+    """统计拉取到Python中的数据行数的SQLite适配器"""
+
+    def __init__(self):
+        super().__init__()
+        self.fetched_rows = 0
+
+    def execute_query(self, query, fetch_size=None):
+        cursor = super().execute_query(query, fetch_size)
+        adapter = self
+
+        class CountingCursor:
+            def fetchmany(self, size):
+                rows = cursor.fetchmany(size)
+                adapter.fetched_rows += len(rows)
+                return rows
+
+            def fetchone(self):
+                return cursor.fetchone()
+
+            def close(self):
+                cursor.close()
+
+        return CountingCursor()
+
+
+class TestChecksumComparison(unittest.TestCase):
+    """测试分段校验和对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE sum1 (id INTEGER PRIMARY KEY, name TEXT, amount REAL, note TEXT)')
+        conn.execute('CREATE TABLE sum2 (id INTEGER PRIMARY KEY, name TEXT, amount REAL, note TEXT)')
+        for i in range(1, 20001):
+            note = None if i % 3 == 0 else f"note{i}"
+            conn.execute("INSERT INTO sum1 VALUES (?, ?, ?, ?)", (i, f"name{i}", i * 1.5, note))
+            if i == 7777:
+                continue
+            if i == 12345:
+                note = "changed"
+            if i == 15001:
+                note = None
+            conn.execute("INSERT INTO sum2 VALUES (?, ?, ?, ?)", (i, f"name{i}", i * 1.5, note))
+        conn.execute("INSERT INTO sum2 VALUES (30000, 'extra', 0, NULL)")
+
+        conn.execute('CREATE TABLE text_key1 (code TEXT PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE text_key2 (code TEXT PRIMARY KEY, value INTEGER)')
+        conn.execute("INSERT INTO text_key1 VALUES ('a', 1)")
+        conn.execute("INSERT INTO text_key2 VALUES ('a', 2)")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def _compare(self, adapter, checksum, table1='sum1', table2='sum2'):
+        comparator = TableComparator(adapter)
+        comparator.set_tables(table1, table2)
+        comparator.set_checksum_mode(checksum, leaf_size=100)
+        return comparator.compare()
+
+    def test_checksum_result_matches_full_comparison(self):
+        """测试校验和对比结果与完整对比结果一致"""
+        adapter = SQLiteAdapter()
+        adapter.connect(db_path=self.db_path)
+        full = self._compare(adapter, False)
+        checksum = self._compare(adapter, True)
+        adapter.close()
+
+        self.assertEqual(checksum, full)
+        self.assertEqual(checksum['table1_row_count'], 20000)
+        self.assertEqual(checksum['table2_row_count'], 20000)
+        types = sorted(diff['type'] for diff in checksum['row_differences'])
+        self.assertEqual(types, ['different_data', 'different_data', 'only_in_table1', 'only_in_table2'])
+
+    def test_checksum_transfers_only_mismatched_segments(self):
+        """测试校验和对比只拉取不一致分段的数据"""
+        adapter = CountingSQLiteAdapter()
+        adapter.connect(db_path=self.db_path)
+        self._compare(adapter, True)
+        adapter.close()
+
+        self.assertGreater(adapter.fetched_rows, 0)
+        self.assertLess(adapter.fetched_rows, 1000)
+
+    def test_identical_tables_fetch_no_rows(self):
+        """测试两个表完全一致时不拉取数据行"""
+        adapter = CountingSQLiteAdapter()
+        adapter.connect(db_path=self.db_path)
+        result = self._compare(adapter, True, 'sum1', 'sum1')
+        adapter.close()
+
+        self.assertEqual(result['row_differences'], [])
+        self.assertEqual(result['table1_row_count'], 20000)
+        self.assertEqual(adapter.fetched_rows, 0)
+
+    def test_non_integer_key_falls_back(self):
+        """测试非整数主键时回退到流式对比"""
+        adapter = SQLiteAdapter()
+        adapter.connect(db_path=self.db_path)
+        result = self._compare(adapter, True, 'text_key1', 'text_key2')
+        adapter.close()
+
+        self.assertEqual(len(result['row_differences']), 1)
+        self.assertEqual(result['row_differences'][0]['key'], {'code': 'a'})
+
+    def test_separator_and_null_text_do_not_collide(self):
+        """测试字段文本中的分隔符和与NULL标记相同的文本不会使不一致的分段得到相同的校验和"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE piped1 (id INTEGER PRIMARY KEY, name TEXT, note TEXT)')
+        conn.execute('CREATE TABLE piped2 (id INTEGER PRIMARY KEY, name TEXT, note TEXT)')
+        conn.executemany("INSERT INTO piped1 VALUES (?, ?, ?)", [(1, 'x|y', 'z'), (2, None, 'v'), (3, None, 'v')])
+        conn.executemany("INSERT INTO piped2 VALUES (?, ?, ?)", [(1, 'x', 'y|z'), (2, '\\N', 'v'), (3, '#NULL#', 'v')])
+        conn.commit()
+        conn.close()
+        adapter = SQLiteAdapter()
+        adapter.connect(db_path=self.db_path)
+        comparator = TableComparator(adapter)
+        comparator.set_tables('piped1', 'piped2')
+        # 指定字段顺序使name、note相邻
+        comparator.set_fields(['id', 'name', 'note'])
+        # 分段行数不超过叶子分段大小时直接拉取数据，这里使每个分段都先比较校验和
+        comparator.set_checksum_mode(True, leaf_size=1)
+        result = comparator.compare()
+        adapter.close()
+        self.assertEqual(result['row_difference_count'], 3)
+
+    def test_checksum_query_failure_falls_back(self):
+        """测试数据库无法计算校验和时（如Oracle拼接的文本超过4000字节）回退到流式对比"""
+        adapter = SQLiteAdapter()
+        adapter.connect(db_path=self.db_path)
+        full = self._compare(adapter, False)
+        with patch.object(SQLiteAdapter, 'build_checksum_select',
+                          return_value='COUNT(*), table_diff_missing_function(name)'):
+            result = self._compare(adapter, True)
+        adapter.close()
+        self.assertEqual(result, full)
+
+    def test_different_database_types_fall_back(self):
+        """测试两侧数据库类型不同时不使用校验和对比"""
+        comparator = TableComparator(SQLiteAdapter(), Mock(spec=MySQLAdapter))
+        comparator.set_tables('sum1', 'sum2')
+        self.assertIsNone(comparator._compare_rows_by_checksum(['id'], ['id', 'name']))
+
+    def test_run_comparison_with_checksum(self):
+        """测试run_comparison支持checksum参数"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='sum1',
+            table2='sum2',
+            checksum=True,
+            checksum_leaf_size=50
+        )
+        self.assertEqual(len(result['row_differences']), 4)
+
+
+class TestChecksumSQL(unittest.TestCase):
+    """测试各数据库的校验和SQL生成"""
+
+    def test_dialect_checksum_functions(self):
+        """测试各数据库使用对应的哈希函数"""
+        fields = ['id', 'name']
+        expected = {
+            MySQLAdapter: 'BIT_XOR',
+            PostgreSQLAdapter: 'string_agg',
+            OracleAdapter: 'ORA_HASH',
+            DMAdapter: 'ORA_HASH',
+            MSSQLAdapter: 'CHECKSUM_AGG',
+            SQLiteAdapter: 'table_diff_xor',
+        }
+        for adapter_class, function_name in expected.items():
+            sql = adapter_class().build_checksum_select(fields, ['id'])
+            self.assertTrue(sql.startswith('COUNT(*)'), adapter_class.__name__)
+            self.assertIn(function_name, sql)
+            self.assertIn('name', sql)
+            if adapter_class in (OracleAdapter, DMAdapter):
+                # 每个字段单独计算哈希，使用两个种子
+                self.assertIn("ORA_HASH(TO_CHAR(name), 4294967295, 0)", sql)
+                self.assertIn("ORA_HASH(TO_CHAR(name), 4294967295, 1)", sql)
+            elif adapter_class is not SQLiteAdapter:
+                # 各字段文本转义后再拼接，与build_row_hash使用相同的编码
+                self.assertIn("REPLACE(REPLACE(", sql)
+
+    def test_ora_hash_checksum_of_wide_rows(self):
+        """测试Oracle和达梦数据库的宽行按列计算哈希后分组合并，拼接的文本长度与字段的值无关"""
+        fields = [f"c{i}" for i in range(250)]
+        for adapter_class in (OracleAdapter, DMAdapter):
+            sql = adapter_class().build_checksum_select(fields, ['c0'])
+            self.assertNotIn("REPLACE(", sql)
+            # 每个种子250个字段哈希，3组的组哈希和1个行哈希
+            self.assertEqual(sql.count("ORA_HASH("), 2 * (250 + 3 + 1))
+            self.assertEqual(sql.count("SUM("), 2)
+            self.assertIn("NVL2(TO_CHAR(c249), TO_CHAR(ORA_HASH(TO_CHAR(c249), 4294967295, 1)), 'N')", sql)
+
+    def test_postgresql_aggregate_is_ordered_by_key(self):
+        """测试PostgreSQL按主键顺序聚合哈希"""
+        sql = PostgreSQLAdapter().build_checksum_select(['id', 'name'], ['id'])
+        self.assertIn("ORDER BY id", sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    ChecksumTreeStore,
+    run_comparison
+)
+
+
+class TestChecksumTreeComparison(unittest.TestCase):
+    """测试持久化的分段校验和树"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.tree_file = self.db_path + '.tree'
+        conn = sqlite3.connect(self.db_path)
+        for table in ('item1', 'item2'):
+            conn.execute(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, price INTEGER, version INTEGER NOT NULL)')
+            conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?)", [(i, i * 3, i) for i in range(1, 1001)])
+        conn.execute("UPDATE item2 SET price = -1 WHERE id = 123")
+        conn.execute("DELETE FROM item2 WHERE id = 800")
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+        if os.path.exists(self.tree_file):
+            os.unlink(self.tree_file)
+
+    def _execute(self, *statements):
+        conn = sqlite3.connect(self.db_path)
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+    def _compare(self, watermark=None, fields=None):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('item1', 'item2')
+        comparator.set_checksum_mode(False, 20)
+        comparator.set_checksum_tree(self.tree_file)
+        comparator.key_hash_batch_size = 7
+        if watermark:
+            comparator.set_watermark(watermark, self.tree_file + '.json')
+        if fields:
+            comparator.set_fields(fields)
+        else:
+            comparator.set_exclude_fields(['version'])
+        return comparator.compare()
+
+    def _summary(self, result):
+        return [(diff['type'], diff['key']['id']) for diff in result['row_differences']]
+
+    def test_build_and_walk(self):
+        """测试第一次对比构建并保存两侧的树，只拉取不一致分段的数据，结果与分段校验和对比相同"""
+        with patch.object(TableComparator, '_compare_rows_by_primary_key', autospec=True,
+                          side_effect=TableComparator._compare_rows_by_primary_key) as compare_segment:
+            result = self._compare()
+        self.assertEqual(compare_segment.call_count, 2)
+        self.assertEqual((result['table1_row_count'], result['table2_row_count']), (1000, 999))
+        self.assertEqual(self._summary(result), [('different_data', 123), ('only_in_table1', 800)])
+        # 行号与逐行对比时相同
+        self.assertEqual([diff['row_number'] for diff in result['row_differences']], [123, 800])
+
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('item1', 'item2')
+        comparator.set_exclude_fields(['version'])
+        comparator.set_checksum_mode(True, 20)
+        self.assertEqual(self._summary(comparator.compare()), self._summary(result))
+
+        store = ChecksumTreeStore(self.tree_file)
+        try:
+            conn = sqlite3.connect(self.tree_file)
+            tree_key = conn.execute('SELECT tree_key FROM trees').fetchone()[0]
+            conn.close()
+            tree = store.load(tree_key)
+            levels = store.load_nodes(tree_key, 1)
+        finally:
+            store.close()
+        self.assertEqual((tree['base'], tree['width'], tree['height']), (1, 20, 2))
+        self.assertEqual(len(levels[0]), 50)
+        self.assertEqual(levels[2][0][0], 1000)
+
+    def test_watermark_recomputes_dirty_leaves(self):
+        """测试设置水位线列时只重新计算包含变化的行的分段，未变化的一侧只查询水位线"""
+        self._compare(watermark='version')
+        self._execute("UPDATE item1 SET price = 0, version = 2000 WHERE id = 5",
+                      "UPDATE item1 SET price = 0, version = 2000 WHERE id = 7",
+                      "UPDATE item1 SET price = 0, version = 2000 WHERE id = 999",
+                      "INSERT INTO item1 VALUES (1010, 1, 2000)")
+        with patch.object(TableComparator, '_query_segment_checksum', autospec=True,
+                          side_effect=TableComparator._query_segment_checksum) as segment_checksum, \
+                patch.object(TableComparator, '_query_checksum_leaves', autospec=True) as leaves:
+            result = self._compare(watermark='version')
+        self.assertFalse(leaves.called)
+        # id 5和7在同一分段中；1010超出上次的最大主键，增加一个分段；水位线列等于上次最大值的id=1000也重新检查
+        self.assertEqual({(call[0][1], call[0][3]) for call in segment_checksum.call_args_list},
+                         {(1, 'id >= 1 AND id <= 20'), (1, 'id >= 981 AND id <= 1000'),
+                          (1, 'id >= 1001 AND id <= 1020'), (2, 'id >= 981 AND id <= 1000')})
+        self.assertEqual(segment_checksum.call_count, 4)
+        self.assertEqual((result['table1_row_count'], result['table2_row_count']), (1001, 999))
+        self.assertEqual(self._summary(result), [('different_data', 5), ('different_data', 7),
+                                                 ('different_data', 123), ('only_in_table1', 800),
+                                                 ('different_data', 999), ('only_in_table1', 1010)])
+
+    def test_watermark_detects_deleted_rows(self):
+        """测试没有统计信息时按分段行数发现删除的行，只重新计算行数变化的分段"""
+        self._compare(watermark='version')
+        self._execute("DELETE FROM item1 WHERE id = 400")
+        with patch.object(TableComparator, '_query_segment_checksum', autospec=True,
+                          side_effect=TableComparator._query_segment_checksum) as segment_checksum:
+            result = self._compare(watermark='version')
+        # 删除的行所在的分段，以及水位线列等于上次最大值的id=1000所在的分段
+        self.assertEqual({(call[0][1], call[0][3]) for call in segment_checksum.call_args_list},
+                         {(1, 'id >= 381 AND id <= 400'), (1, 'id >= 981 AND id <= 1000'),
+                          (2, 'id >= 981 AND id <= 1000')})
+        self.assertEqual((result['table1_row_count'], result['table2_row_count']), (999, 999))
+        self.assertEqual(self._summary(result), [('different_data', 123), ('only_in_table2', 400),
+                                                 ('only_in_table1', 800)])
+
+    def test_unchanged_statistics_reuse_saved_tree(self):
+        """测试统计信息没有变化时不执行任何校验和查询，变化后重新计算该侧所有分段"""
+        counters = {'inserts': 10, 'updates': 0, 'deletes': 0}
+        with patch.object(SQLiteAdapter, 'get_modification_counters', lambda adapter, table: dict(counters)):
+            self._compare()
+            with patch.object(TableComparator, '_query_checksum_leaves', autospec=True) as leaves, \
+                    patch.object(TableComparator, '_query_segment_checksum', autospec=True) as segment_checksum:
+                result = self._compare()
+            self.assertFalse(leaves.called or segment_checksum.called)
+            self.assertEqual(self._summary(result), [('different_data', 123), ('only_in_table1', 800)])
+
+            self._execute("UPDATE item1 SET price = 0 WHERE id = 400")
+            counters['updates'] = 1
+            with patch.object(TableComparator, '_query_checksum_leaves', autospec=True,
+                              side_effect=TableComparator._query_checksum_leaves) as leaves:
+                result = self._compare()
+        self.assertEqual(leaves.call_count, 2)
+        self.assertEqual(self._summary(result), [('different_data', 123), ('different_data', 400),
+                                                 ('only_in_table1', 800)])
+
+    def test_rebuild_on_settings_change_or_lower_key(self):
+        """测试对比字段变化或出现小于分段起点的主键时重新构建树"""
+        self._compare()
+        with patch.object(TableComparator, '_build_checksum_tree', autospec=True,
+                          side_effect=TableComparator._build_checksum_tree) as build:
+            result = self._compare(fields=['id', 'price', 'version'])
+            self.assertEqual(build.call_count, 1)
+            self._execute("INSERT INTO item2 VALUES (-5, 0, 1)")
+            result = self._compare(fields=['id', 'price', 'version'])
+            self.assertEqual(build.call_count, 2)
+        self.assertEqual(self._summary(result), [('only_in_table2', -5), ('different_data', 123),
+                                                 ('only_in_table1', 800)])
+
+    def test_checksum_query_failure_falls_back(self):
+        """测试数据库无法计算校验和时不使用校验和树，结果与常规对比相同"""
+        with patch.object(SQLiteAdapter, 'build_checksum_select',
+                          return_value='COUNT(*), table_diff_missing_function(price)'):
+            result = self._compare()
+        self.assertEqual(self._summary(result), [('different_data', 123), ('only_in_table1', 800)])
+        self.assertEqual(result['table1_row_count'], 1000)
+
+    def test_run_comparison_with_checksum_tree(self):
+        """测试run_comparison支持checksum_tree参数"""
+        kwargs = dict(source_db_type='sqlite', source_db_path=self.db_path, table1='item1', table2='item2',
+                      checksum_tree=self.tree_file, checksum_leaf_size=50)
+        self.assertEqual(run_comparison(**kwargs)['row_difference_count'], 2)
+        self.assertEqual(run_comparison(**kwargs)['row_difference_count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    load_column_rules,
+    run_comparison
+)
+
+
+class TestColumnRules(unittest.TestCase):
+    """测试列对比规则"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.rules_path = self.db_path + '.json'
+
+        conn = sqlite3.connect(self.db_path)
+        for table in ('account1', 'account2'):
+            conn.execute(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, email TEXT, balance REAL, rate REAL)')
+        conn.executemany("INSERT INTO account1 VALUES (?, ?, ?, ?)", [
+            (1, 'Alice@Example.com', 10.00, 0.123),
+            (2, ' bob@example.com ', 20.00, 0.5),
+            (3, 'carol@example.com', 30.00, 0.25),
+            (4, 'dave@example.com', 40.00, 0.75),
+        ])
+        conn.executemany("INSERT INTO account2 VALUES (?, ?, ?, ?)", [
+            (1, 'alice@example.com', 10.004, 0.1234),
+            (2, 'BOB@example.com', 19.999, 0.5),
+            (3, 'carol@example.org', 30.00, 0.25),
+            (4, 'dave@example.com', 40.50, 0.751),
+        ])
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+        self.rules = {
+            'email': {'trim': True, 'ignore_case': True},
+            'balance': {'tolerance': 0.01},
+            'rate': {'round': 2}
+        }
+
+    def tearDown(self):
+        self.adapter.close()
+        for path in (self.db_path, self.rules_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _compare(self, rules):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('account1', 'account2')
+        comparator.set_column_rules(rules)
+        return comparator.compare()
+
+    def test_rules_suppress_noise_differences(self):
+        """测试按规则比较后只报告真实的差异"""
+        result = self._compare(None)
+        self.assertEqual(result['row_difference_count'], 4)
+
+        result = self._compare(self.rules)
+        differences = {diff['key']['id']: sorted(field['field'] for field in diff['differences'])
+                       for diff in result['row_differences']}
+        self.assertEqual(differences, {3: ['email'], 4: ['balance']})
+
+    def test_sql_rules_pushed_into_select(self):
+        """测试trim、ignore_case、round下推到SELECT中，主键不做转换"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('account1', 'account2')
+        comparator.set_column_rules(dict(self.rules, id={'round': 0}))
+        query = comparator.build_query(['id', 'email', 'balance', 'rate'], 'account1')
+        self.assertEqual(query, "SELECT id, UPPER(TRIM(email)) AS email, balance, ROUND(rate, 2) AS rate "
+                                "FROM account1 ORDER BY id")
+
+    def test_datetime_rules(self):
+        """测试时间截断和时区规则"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_column_rules({'created': {'truncate': 'second', 'timezone': '+08:00'},
+                                     'updated': {'truncate': 'millisecond'}})
+        fields = ['created', 'updated']
+        aware = datetime(2024, 1, 1, 0, 0, 0, 123456, tzinfo=timezone.utc)
+        row1 = (aware, datetime(2024, 1, 1, 0, 0, 0, 123456))
+        row2 = (datetime(2024, 1, 1, 8, 0, 0), datetime(2024, 1, 1, 0, 0, 0, 123999))
+        self.assertIsNone(comparator._compare_single_row(row1, row2, 1, fields))
+
+        row2 = (datetime(2024, 1, 1, 0, 0, 0), datetime(2024, 1, 1, 0, 0, 0, 124000))
+        row_diff = comparator._compare_single_row(row1, row2, 1, fields)
+        self.assertEqual([diff['field'] for diff in row_diff['differences']], ['created', 'updated'])
+        self.assertEqual(row_diff['differences'][0]['table1_value'], aware)
+
+    def test_rules_file_and_validation(self):
+        """测试从JSON文件加载规则和非法规则"""
+        with open(self.rules_path, 'w', encoding='utf-8') as f:
+            json.dump(self.rules, f)
+        self.assertEqual(load_column_rules(self.rules_path), self.rules)
+        for rules in ({'a': {'unknown': 1}}, {'a': {'tolerance': -1}}, {'a': {'truncate': 'week'}},
+                      {'a': {'timezone': '+8:xx'}}, {'a': {'trim': 'yes'}}, ['a']):
+            with self.assertRaises(ValueError):
+                load_column_rules(rules)
+        self.assertEqual(load_column_rules({'a': {'timezone': 'UTC'}}), {'a': {'timezone': 'UTC'}})
+
+    def test_rules_disable_pushdown(self):
+        """测试设置规则后不使用下推对比"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('account1', 'account2')
+        comparator.set_pushdown_mode(True)
+        comparator.set_column_rules(self.rules)
+        with patch.object(comparator, '_pushdown_by_primary_key') as pushdown_mock:
+            result = comparator.compare()
+        pushdown_mock.assert_not_called()
+        self.assertEqual(result['row_difference_count'], 2)
+
+    def test_run_comparison_with_rules_file(self):
+        """测试run_comparison支持规则文件"""
+        with open(self.rules_path, 'w', encoding='utf-8') as f:
+            json.dump(self.rules, f)
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='account1',
+            table2='account2',
+            column_rules=self.rules_path
+        )
+        self.assertEqual(result['row_difference_count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+import threading
+from unittest.mock import Mock
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    PrefetchCursor,
+    connect_adapters
+)
+
+
+class ListCursor:
+    """按批次返回预设数据的游标"""
+
+    def __init__(self, rows, error_after=None):
+        self.rows = list(rows)
+        self.error_after = error_after
+        self.position = 0
+        self.closed = False
+
+    def fetchmany(self, size):
+        if self.error_after is not None and self.position >= self.error_after:
+            raise RuntimeError("读取失败")
+        batch = self.rows[self.position:self.position + size]
+        self.position += len(batch)
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class TestPrefetchCursor(unittest.TestCase):
+    """测试后台预读游标"""
+
+    def test_returns_all_rows_in_order(self):
+        """测试预读游标按顺序返回全部数据"""
+        rows = [(i,) for i in range(25)]
+        cursor = PrefetchCursor(ListCursor(rows), batch_size=4, max_batches=2)
+        fetched = []
+        while True:
+            batch = cursor.fetchmany()
+            if not batch:
+                break
+            fetched.extend(batch)
+        cursor.close()
+        self.assertEqual(fetched, rows)
+
+    def test_reader_error_is_raised_to_consumer(self):
+        """测试读取线程中的异常在对比线程中抛出"""
+        cursor = PrefetchCursor(ListCursor([(i,) for i in range(10)], error_after=4), batch_size=4)
+        self.assertEqual(len(cursor.fetchmany()), 4)
+        with self.assertRaises(RuntimeError):
+            cursor.fetchmany()
+        cursor.close()
+
+    def test_close_stops_blocked_reader(self):
+        """测试关闭游标时停止被有界队列阻塞的读取线程"""
+        source = ListCursor([(i,) for i in range(1000)])
+        cursor = PrefetchCursor(source, batch_size=1, max_batches=1)
+        cursor.fetchmany()
+        cursor.close()
+        self.assertFalse(cursor.thread.is_alive())
+        self.assertTrue(source.closed)
+        self.assertLess(source.position, 1000)
+
+
+class TestConcurrentComparison(unittest.TestCase):
+    """测试两侧使用不同连接时的并发对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE fetch1 (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.execute('CREATE TABLE fetch2 (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.execute('CREATE TABLE heap1 (id INTEGER, name TEXT)')
+        conn.execute('CREATE TABLE heap2 (id INTEGER, name TEXT)')
+        for i in range(1, 3001):
+            if i % 400 != 0:
+                conn.execute("INSERT INTO fetch1 VALUES (?, ?)", (i, f"name{i}"))
+            if i % 650 != 0:
+                name = "changed" if i % 900 == 0 else f"name{i}"
+                conn.execute("INSERT INTO fetch2 VALUES (?, ?)", (i, name))
+            conn.execute("INSERT INTO heap1 VALUES (?, ?)", (i, f"name{i}"))
+            conn.execute("INSERT INTO heap2 VALUES (?, ?)", (i, "changed" if i == 1500 else f"name{i}"))
+        conn.commit()
+        conn.close()
+
+        self.adapter1 = SQLiteAdapter()
+        self.adapter1.connect(db_path=self.db_path)
+        self.adapter2 = SQLiteAdapter()
+        self.adapter2.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter1.close()
+        self.adapter2.close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def _compare(self, prefetch_batches):
+        comparator = TableComparator(self.adapter1, self.adapter2)
+        comparator.set_tables('fetch1', 'fetch2')
+        comparator.set_fetch_size(100)
+        comparator.set_prefetch_batches(prefetch_batches)
+        return comparator.compare()
+
+    def test_concurrent_result_matches_serial_result(self):
+        """测试并发预读的对比结果与串行结果一致"""
+        serial = self._compare(0)
+        concurrent = self._compare(2)
+        self.assertEqual(concurrent, serial)
+        self.assertGreater(len(concurrent['row_differences']), 0)
+
+    def test_concurrent_position_comparison(self):
+        """测试无主键按位置对比时的并发预读"""
+        comparator = TableComparator(self.adapter1, self.adapter2)
+        comparator.set_tables('heap1', 'heap2')
+        comparator.set_fetch_size(100)
+        comparator.set_prefetch_batches(2)
+        result = comparator.compare()
+        self.assertEqual(result['table1_row_count'], 3000)
+        self.assertEqual(len(result['row_differences']), 1)
+        self.assertEqual(result['row_differences'][0]['row_number'], 1500)
+
+    def test_invalid_prefetch_batches(self):
+        """测试非法的预读批次数"""
+        comparator = TableComparator(self.adapter1, self.adapter2)
+        with self.assertRaises(ValueError):
+            comparator.set_prefetch_batches(-1)
+
+
+class TestConnectAdapters(unittest.TestCase):
+    """测试并发建立连接"""
+
+    def test_connects_both_sides_concurrently(self):
+        """测试两侧连接同时进行"""
+        barrier = threading.Barrier(2, timeout=2)
+        source = Mock()
+        target = Mock()
+        source.connect.side_effect = lambda **kwargs: barrier.wait()
+        target.connect.side_effect = lambda **kwargs: barrier.wait()
+
+        connect_adapters(source, {'db_path': 'a.db'}, target, {'db_path': 'b.db'})
+        source.connect.assert_called_once_with(db_path='a.db')
+        target.connect.assert_called_once_with(db_path='b.db')
+
+    def test_connect_error_is_raised(self):
+        """测试连接失败时抛出异常"""
+        source = Mock()
+        target = Mock()
+        target.connect.side_effect = RuntimeError("连接失败")
+        with self.assertRaises(RuntimeError):
+            connect_adapters(source, {}, target, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    CsvDifferenceSink,
+    run_comparison
+)
+
+
+class TestDifferenceLimit(unittest.TestCase):
+    """测试行差异数量上限和提前结束对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.csv_path = self.db_path + '.csv'
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE limit1 (id INTEGER PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE limit2 (id INTEGER PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE heap1 (id INTEGER, value INTEGER)')
+        conn.execute('CREATE TABLE heap2 (id INTEGER, value INTEGER)')
+        for i in range(1, 5001):
+            value = -i if i % 100 == 0 else i
+            conn.execute("INSERT INTO limit1 VALUES (?, ?)", (i, i))
+            conn.execute("INSERT INTO limit2 VALUES (?, ?)", (i, value))
+            conn.execute("INSERT INTO heap1 VALUES (?, ?)", (i, i))
+            conn.execute("INSERT INTO heap2 VALUES (?, ?)", (i, value))
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        for path in (self.db_path, self.csv_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _compare(self, table1, table2, max_diffs, configure=None):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables(table1, table2)
+        comparator.set_fetch_size(100)
+        comparator.set_max_diffs(max_diffs)
+        if configure:
+            configure(comparator)
+        return comparator.compare()
+
+    def test_stops_at_limit(self):
+        """测试差异达到上限后提前结束并标记结果已截断"""
+        with patch.object(self.adapter, 'cancel', wraps=self.adapter.cancel) as cancel_mock:
+            result = self._compare('limit1', 'limit2', 3)
+        self.assertTrue(result['truncated'])
+        self.assertEqual(result['row_difference_count'], 3)
+        self.assertEqual([diff['key']['id'] for diff in result['row_differences']], [100, 200, 300])
+        self.assertIsNone(result['table1_row_count'])
+        cancel_mock.assert_called()
+
+    def test_limit_not_reached(self):
+        """测试差异未达到上限时结果完整"""
+        result = self._compare('limit1', 'limit2', 1000)
+        self.assertFalse(result['truncated'])
+        self.assertEqual(result['row_difference_count'], 50)
+        self.assertEqual(result['table1_row_count'], 5000)
+
+    def test_position_comparison(self):
+        """测试按位置对比时提前结束"""
+        result = self._compare('heap1', 'heap2', 1)
+        self.assertTrue(result['truncated'])
+        self.assertEqual(len(result['row_differences']), 1)
+        self.assertEqual(result['row_differences'][0]['row_number'], 100)
+
+    def test_checksum_and_parallel_modes(self):
+        """测试校验和对比和并行对比同样遵守差异上限"""
+        for configure in (lambda c: c.set_checksum_mode(True, 100), lambda c: c.set_jobs(3)):
+            result = self._compare('limit1', 'limit2', 5, configure)
+            self.assertTrue(result['truncated'])
+            self.assertEqual([diff['key']['id'] for diff in result['row_differences']],
+                             [100, 200, 300, 400, 500])
+        # 差异未达到上限，以及两侧数据相同时，并行对比返回完整的结果
+        result = self._compare('limit1', 'limit2', 1000, lambda c: c.set_jobs(3))
+        self.assertFalse(result['truncated'])
+        self.assertEqual(result['row_difference_count'], 50)
+        self.assertEqual(result['table1_row_count'], 5000)
+        result = self._compare('limit1', 'limit1', 10, lambda c: c.set_jobs(4))
+        self.assertFalse(result['truncated'])
+        self.assertEqual(result['row_differences'], [])
+
+    def test_sink_receives_limited_rows(self):
+        """测试差异输出只写入上限数量的差异"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('limit1', 'limit2')
+        comparator.set_max_diffs(4)
+        with CsvDifferenceSink(self.csv_path) as sink:
+            comparator.set_difference_sink(sink)
+            result = comparator.compare()
+        self.assertTrue(result['truncated'])
+        self.assertEqual(sink.row_count, 4)
+
+    def test_key_order_fallback_before_limit(self):
+        """测试排序规则与Python不一致时，在输出达到上限的差异之前回退到内存对比"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE nocase1 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE nocase2 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        conn.executemany("INSERT INTO nocase1 VALUES (?, ?)", [('a', 1), ('B', 2), ('c', 3)])
+        conn.executemany("INSERT INTO nocase2 VALUES (?, ?)", [('B', 2), ('c', 3)])
+        conn.commit()
+        conn.close()
+        result = self._compare('nocase1', 'nocase2', 1)
+        self.assertTrue(result['truncated'])
+        self.assertEqual([(diff['type'], diff['key']['code']) for diff in result['row_differences']],
+                         [('only_in_table1', 'a')])
+
+    def test_invalid_max_diffs(self):
+        """测试非法的差异上限"""
+        comparator = TableComparator(self.adapter)
+        with self.assertRaises(ValueError):
+            comparator.set_max_diffs(0)
+
+    def test_run_comparison_fail_fast(self):
+        """测试run_comparison支持fail_fast和max_diffs参数"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='limit1',
+            table2='limit2',
+            fail_fast=True
+        )
+        self.assertTrue(result['truncated'])
+        self.assertEqual(len(result['row_differences']), 1)
+
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='limit1',
+            table2='limit2',
+            max_diffs=10
+        )
+        self.assertEqual(len(result['row_differences']), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
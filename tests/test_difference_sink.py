@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    CsvDifferenceSink,
+    run_comparison
+)
+
+
+class TestDifferenceSink(unittest.TestCase):
+    """测试边对比边输出行差异"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.expected_csv = self.db_path + '.expected.csv'
+        self.streamed_csv = self.db_path + '.streamed.csv'
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE sink1 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        conn.execute('CREATE TABLE sink2 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        for i in range(1, 2001):
+            if i % 300 != 0:
+                conn.execute("INSERT INTO sink1 VALUES (?, ?, ?)", (i, f"name{i}", i))
+            if i % 450 != 0:
+                value = -i if i % 170 == 0 else i
+                conn.execute("INSERT INTO sink2 VALUES (?, ?, ?)", (i, f"name{i}", value))
+
+        # 主键使用大小写不敏感的排序规则，归并对比会回退到内存对比
+        conn.execute('CREATE TABLE nocase1 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE nocase2 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        conn.executemany("INSERT INTO nocase1 VALUES (?, ?)", [('a', 0), ('B', 2), ('c', 3)])
+        conn.executemany("INSERT INTO nocase2 VALUES (?, ?)", [('a', 1), ('B', 5), ('d', 4)])
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        for path in (self.db_path, self.expected_csv, self.streamed_csv):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def _assert_streamed_report_matches(self, table1, table2, configure=None):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables(table1, table2)
+        if configure:
+            configure(comparator)
+        expected = comparator.compare()
+        comparator.generate_csv_report(expected, self.expected_csv)
+
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables(table1, table2)
+        if configure:
+            configure(comparator)
+        with CsvDifferenceSink(self.streamed_csv) as sink:
+            comparator.set_difference_sink(sink)
+            result = comparator.compare()
+
+        self.assertEqual(result['row_differences'], [])
+        self.assertEqual(result['row_difference_count'], len(expected['row_differences']))
+        self.assertEqual(result['table1_row_count'], expected['table1_row_count'])
+        self.assertEqual(self._read(self.streamed_csv), self._read(self.expected_csv))
+        return result
+
+    def test_streamed_report_matches_generated_report(self):
+        """测试边对比边写入的报告与对比后生成的报告一致"""
+        result = self._assert_streamed_report_matches('sink1', 'sink2')
+        self.assertGreater(result['row_difference_count'], 0)
+
+    def test_fallback_does_not_duplicate_rows(self):
+        """测试回退到内存对比时撤销已写入的差异"""
+        result = self._assert_streamed_report_matches('nocase1', 'nocase2')
+        self.assertEqual(result['row_difference_count'], 4)
+
+    def test_checksum_and_parallel_modes(self):
+        """测试校验和对比和并行对比同样边对比边写入"""
+        self._assert_streamed_report_matches('sink1', 'sink2', lambda c: c.set_checksum_mode(True, 100))
+        self._assert_streamed_report_matches('sink1', 'sink2', lambda c: c.set_jobs(3))
+
+    def test_keep_differences(self):
+        """测试写入报告的同时在结果中保留差异"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('sink1', 'sink2')
+        with CsvDifferenceSink(self.streamed_csv) as sink:
+            comparator.set_difference_sink(sink, keep_differences=True)
+            result = comparator.compare()
+        self.assertEqual(len(result['row_differences']), result['row_difference_count'])
+        self.assertEqual(sink.row_count, result['row_difference_count'])
+
+    def test_run_comparison_streams_csv_report(self):
+        """测试run_comparison生成CSV报告时可以不在结果中保留差异"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='sink1',
+            table2='sink2',
+            csv_report=self.streamed_csv,
+            keep_differences=False
+        )
+        self.assertEqual(result['row_differences'], [])
+        lines = self._read(self.streamed_csv).splitlines()
+        self.assertEqual(lines[0], 'row_type,key_info,row_number,column_name,table1_value,table2_value')
+        self.assertGreater(len(lines), result['row_difference_count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
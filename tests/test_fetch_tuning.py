@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    OracleAdapter,
+    DMAdapter,
+    ORACLE_TEXT_SESSION_SQL,
+    add_fetch_tuning_params,
+    run_comparison
+)
+
+
+class TestOracleDMFetchTuning(unittest.TestCase):
+    """测试Oracle和达梦数据库的arraysize、prefetchrows和文本输出"""
+
+    def _oracle(self, **params):
+        oracledb = Mock()
+        oracledb.DB_TYPE_NUMBER, oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP = 'NUMBER', 'DATE', 'TIMESTAMP'
+        oracledb.DB_TYPE_VARCHAR = 'VARCHAR'
+        patcher = patch.dict('sys.modules', {'oracledb': oracledb})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        adapter = OracleAdapter()
+        adapter.connect(host='localhost', user='scott', password='tiger', database='orcl', **params)
+        return adapter, oracledb.connect.return_value
+
+    def test_arraysize_and_prefetchrows_from_connect_params(self):
+        """测试连接参数中的arraysize和prefetchrows用于流式游标，未设置时与fetch_size相同"""
+        adapter, connection = self._oracle(arraysize=5000, prefetchrows=200)
+        cursor = adapter.execute_query("SELECT 1 FROM dual", fetch_size=1000)
+        self.assertEqual((cursor.arraysize, cursor.prefetchrows), (5000, 200))
+        self.assertEqual(adapter.clone().arraysize, 5000)
+
+        adapter, connection = self._oracle()
+        cursor = adapter.execute_query("SELECT 1 FROM dual", fetch_size=1000)
+        self.assertEqual((cursor.arraysize, cursor.prefetchrows), (1000, 1000))
+
+        for params in ({'arraysize': 0}, {'prefetchrows': -1}, {'arraysize': '100'}):
+            with self.assertRaises(ValueError):
+                self._oracle(**params)
+
+    def test_oracle_text_output_handler(self):
+        """测试Oracle以文本形式获取数值和时间列，主键仍按原始类型返回"""
+        adapter, connection = self._oracle()
+        cursor = adapter.execute_text_query("SELECT id, amount FROM t ORDER BY id", 1000, native_columns=['id'])
+        adapter.execute_text_query("SELECT id, amount FROM t ORDER BY id", 1000, native_columns=['id'])
+        executed = [call[0][0] for call in connection.cursor.return_value.execute.call_args_list]
+        self.assertEqual(executed.count(ORACLE_TEXT_SESSION_SQL), 1)
+
+        handler = cursor.outputtypehandler
+        self.assertIsNotNone(handler(cursor, SimpleNamespace(type_code='NUMBER', name='AMOUNT')))
+        self.assertIsNotNone(handler(cursor, SimpleNamespace(type_code='DATE', name='CREATED')))
+        self.assertIsNone(handler(cursor, SimpleNamespace(type_code='NUMBER', name='ID')))
+        self.assertIsNone(handler(cursor, SimpleNamespace(type_code='VARCHAR', name='NAME')))
+        cursor.var.assert_called_with('VARCHAR', 64, arraysize=cursor.arraysize)
+
+    def test_dm_text_output_and_fallback(self):
+        """测试达梦数据库以文本形式获取数值，驱动不支持时返回None"""
+        dmPython = SimpleNamespace(NUMBER='NUMBER', DATE='DATE', STRING='STRING', connect=Mock())
+        with patch('table_diff.importlib.import_module', return_value=dmPython):
+            adapter = DMAdapter()
+            adapter.connect(host='localhost', user='SYSDBA', password='pw', database='TEST', prefetchrows=300)
+            cursor = adapter.execute_text_query("SELECT id, amount FROM t", 1000, native_columns=['ID'])
+            self.assertEqual((cursor.arraysize, cursor.prefetchrows), (1000, 300))
+            handler = cursor.outputtypehandler
+            self.assertIsNotNone(handler(cursor, 'AMOUNT', 'NUMBER', 22, 10, 2))
+            self.assertIsNone(handler(cursor, 'ID', 'NUMBER', 22, 10, 0))
+
+            class OldCursor:
+                arraysize = 1
+
+                def execute(self, query):
+                    pass
+
+                def close(self):
+                    self.closed = True
+
+                def __setattr__(self, name, value):
+                    if name == 'outputtypehandler':
+                        raise AttributeError(name)
+                    object.__setattr__(self, name, value)
+
+            old_cursor = OldCursor()
+            dmPython.connect.return_value.cursor.return_value = old_cursor
+            self.assertIsNone(adapter.execute_text_query("SELECT id FROM t", 1000))
+            self.assertTrue(old_cursor.closed)
+
+    def test_tuning_params_only_for_oracle_and_dm(self):
+        """测试arraysize和prefetchrows只加入Oracle和达梦数据库的连接参数"""
+        params = {'host': 'localhost'}
+        add_fetch_tuning_params('mysql', params, 5000, 100)
+        self.assertEqual(params, {'host': 'localhost'})
+        add_fetch_tuning_params('dm', params, 5000)
+        self.assertEqual(params, {'host': 'localhost', 'arraysize': 5000})
+
+
+class TestTextOutputSelection(unittest.TestCase):
+    """测试对比引擎只在两侧是同一种数据库时以文本形式获取数据"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE text1 (id INTEGER PRIMARY KEY, amount REAL, balance REAL)')
+        conn.execute('CREATE TABLE text2 (id INTEGER PRIMARY KEY, amount REAL, balance REAL)')
+        conn.executemany("INSERT INTO text1 VALUES (?, ?, ?)", [(i, i * 1.5, i) for i in range(1, 21)])
+        conn.executemany("INSERT INTO text2 VALUES (?, ?, ?)", [(i, i * 1.5 + (i == 7), i) for i in range(1, 21)])
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+
+    def test_native_columns_passed_to_adapter(self):
+        """测试主键和需要按值比较的列仍按原始类型返回"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('text1', 'text2')
+        comparator.set_text_output_mode(True)
+        comparator.set_column_rules({'balance': {'tolerance': 0.01}, 'amount': {'trim': True}})
+        text_query = Mock(side_effect=lambda query, fetch_size=None, native_columns=():
+                          self.adapter.execute_query(query, fetch_size))
+        with patch.object(self.adapter, 'execute_text_query', text_query):
+            result = comparator.compare()
+        self.assertEqual(text_query.call_count, 2)
+        self.assertEqual(text_query.call_args[1]['native_columns'], ['id', 'balance'])
+        self.assertEqual(result['row_difference_count'], 1)
+
+    def test_different_engines_keep_native_values(self):
+        """测试两侧数据库类型不同时不以文本形式获取"""
+        comparator = TableComparator(self.adapter, MySQLAdapter())
+        comparator.set_text_output_mode(True)
+        with patch.object(self.adapter, 'execute_text_query') as text_query:
+            cursor = comparator._execute_streaming_query(self.adapter, "SELECT id FROM text1")
+        text_query.assert_not_called()
+        self.assertEqual(len(cursor.fetchall()), 20)
+
+    def test_run_comparison_with_text_output(self):
+        """测试run_comparison支持text_output参数"""
+        with patch.object(SQLiteAdapter, 'execute_text_query', return_value=None) as text_query:
+            result = run_comparison(
+                source_db_type='sqlite',
+                source_db_path=self.db_path,
+                table1='text1',
+                table2='text2',
+                text_output=True
+            )
+        text_query.assert_called()
+        self.assertEqual(result['row_difference_count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
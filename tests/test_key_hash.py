@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import hashlib
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    PostgreSQLAdapter,
+    run_comparison
+)
+
+
+class TestKeyHashComparison(unittest.TestCase):
+    """测试主键+行哈希两阶段对比"""
+
+    def setUp(self):
+        self.paths = []
+        for index in range(2):
+            temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+            temp_db.close()
+            self.paths.append(temp_db.name)
+            conn = sqlite3.connect(temp_db.name)
+            conn.execute('CREATE TABLE orders (id INTEGER PRIMARY KEY, name TEXT, amount REAL)')
+            conn.execute('CREATE TABLE lines (order_id INTEGER, code TEXT, qty INTEGER, '
+                         'PRIMARY KEY (order_id, code))')
+            conn.execute('CREATE TABLE nocase (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+            for i in range(1, 1001):
+                if index == 0 and i % 300 == 0:
+                    continue
+                if index == 1 and i % 450 == 0:
+                    continue
+                name = None if i % 97 == 0 else f"name'{i}"
+                amount = float(-i if index == 1 and i % 170 == 0 else i)
+                conn.execute("INSERT INTO orders VALUES (?, ?, ?)", (i, name, amount))
+                qty = i * 2 if index == 1 and i % 230 == 0 else i
+                conn.execute("INSERT INTO lines VALUES (?, ?, ?)", (i % 50, f"c'{i}", qty))
+            conn.executemany("INSERT INTO nocase VALUES (?, ?)",
+                             [('a', 0), ('B', 2), ('c', 3)] if index == 0 else [('a', 1), ('B', 2), ('d', 4)])
+            conn.commit()
+            conn.close()
+
+        self.adapter1 = SQLiteAdapter()
+        self.adapter1.connect(db_path=self.paths[0], read_only=True)
+        self.adapter2 = SQLiteAdapter()
+        self.adapter2.connect(db_path=self.paths[1], read_only=True)
+        # 两个SQLite文件默认附加到同一连接对比，这里模拟两个不同的数据库
+        attach_patcher = patch.object(TableComparator, '_can_attach', return_value=False)
+        attach_patcher.start()
+        self.addCleanup(attach_patcher.stop)
+
+    def tearDown(self):
+        self.adapter1.close()
+        self.adapter2.close()
+        for path in self.paths:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _compare(self, table, key_hash, where=None, batch_size=7, fields=None):
+        comparator = TableComparator(self.adapter1, self.adapter2)
+        comparator.set_tables(table, table)
+        if fields:
+            comparator.set_fields(fields)
+        comparator.set_key_hash_mode(key_hash, batch_size)
+        if where:
+            comparator.set_where_condition(where)
+        return comparator.compare()
+
+    def test_result_matches_regular_comparison(self):
+        """测试两阶段对比结果与常规主键对比一致"""
+        for table in ('orders', 'lines'):
+            for where in (None, 'qty > 100' if table == 'lines' else 'id > 200'):
+                expected = self._compare(table, False, where)
+                result = self._compare(table, True, where)
+                self.assertEqual(result['row_differences'], expected['row_differences'])
+                self.assertEqual(result['table1_row_count'], expected['table1_row_count'])
+                self.assertEqual(result['table2_row_count'], expected['table2_row_count'])
+                self.assertGreater(result['row_difference_count'], 0)
+
+    def test_fetches_only_mismatched_rows(self):
+        """测试第二阶段只拉取哈希不一致或只在一侧存在的行"""
+        queries = []
+        execute_query = self.adapter2.execute_query
+
+        def record(query, fetch_size=None):
+            queries.append(query)
+            return execute_query(query, fetch_size)
+
+        with patch.object(self.adapter2, 'execute_query', side_effect=record):
+            result = self._compare('orders', True, batch_size=500)
+        fetched = sum(len(execute_query(f"SELECT id FROM ({query})").fetchall())
+                      for query in queries if ' IN (' in query)
+        # 第一阶段只返回主键和行哈希
+        self.assertTrue(queries[0].startswith('SELECT id, table_diff_row_md5('))
+        self.assertTrue(queries[0].endswith(') AS table_diff_hash FROM orders ORDER BY id'))
+        # 表2中需要拉取的行：数据不同5行 + 只在表2中的2行
+        self.assertEqual(fetched, 7)
+        self.assertEqual(result['row_difference_count'], 7 + 1)
+
+    def test_falls_back_when_order_differs(self):
+        """测试数据库排序规则与Python不一致时回退到常规主键对比"""
+        expected = self._compare('nocase', False)
+        result = self._compare('nocase', True)
+        self.assertEqual(result['row_differences'], expected['row_differences'])
+        self.assertEqual(result['row_difference_count'], 3)
+
+    def test_falls_back_when_hash_query_fails(self):
+        """测试数据库无法计算行哈希时（如Oracle拼接的文本超过4000字节）回退到常规主键对比"""
+        expected = self._compare('orders', False)
+        with patch.object(SQLiteAdapter, 'build_row_hash', return_value='table_diff_missing_function(name)'):
+            result = self._compare('orders', True)
+        self.assertEqual(result['row_differences'], expected['row_differences'])
+
+    def test_row_hash_expressions(self):
+        """测试各数据库的行哈希表达式与SQLite自定义函数的哈希一致"""
+        expression = self.adapter1.build_row_hash(['name', 'amount'])
+        row = self.adapter1.execute_query(f"SELECT {expression} FROM orders WHERE id = 97").fetchone()
+        self.assertEqual(row[0], hashlib.md5('\\N|97.0'.encode('utf-8')).hexdigest())
+        row = self.adapter1.execute_query(f"SELECT {expression} FROM (SELECT 'a|b\\' AS name, 1 AS amount)").fetchone()
+        self.assertEqual(row[0], hashlib.md5('a\\|b\\\\|1'.encode('utf-8')).hexdigest())
+        # MySQL默认把反斜杠作为字符串字面量的转义字符
+        self.assertEqual(MySQLAdapter().build_row_hash(['a']),
+                         "MD5(CONCAT_WS('|', COALESCE(REPLACE(REPLACE(CAST(a AS CHAR), '\\\\', '\\\\\\\\'), "
+                         "'|', '\\\\|'), '\\\\N')))")
+        self.assertEqual(PostgreSQLAdapter().build_row_hash(['a', 'b']),
+                         "md5(COALESCE(REPLACE(REPLACE(CAST(a AS TEXT), '\\', '\\\\'), '|', '\\|'), '\\N') || '|' || "
+                         "COALESCE(REPLACE(REPLACE(CAST(b AS TEXT), '\\', '\\\\'), '|', '\\|'), '\\N'))")
+
+    def test_separator_and_null_text_do_not_collide(self):
+        """测试字段文本中的分隔符和与NULL标记相同的文本不会使不同的行得到相同的哈希"""
+        rows1 = [(1, 'x|y', 'z'), (2, None, 'v'), (3, None, 'v'), (4, 'a\\', '|b')]
+        rows2 = [(1, 'x', 'y|z'), (2, '\\N', 'v'), (3, '#NULL#', 'v'), (4, 'a', '\\|b')]
+        for path, rows in zip(self.paths, (rows1, rows2)):
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE piped (id INTEGER PRIMARY KEY, a TEXT, b TEXT)')
+            conn.executemany("INSERT INTO piped VALUES (?, ?, ?)", rows)
+            conn.commit()
+            conn.close()
+        # 指定字段顺序使a、b相邻，分隔符位置不同的文本拼接后相同
+        self.assertEqual(self._compare('piped', False, fields=['id', 'a', 'b'])['row_difference_count'], 4)
+        self.assertEqual(self._compare('piped', True, fields=['id', 'a', 'b'])['row_difference_count'], 4)
+
+    def test_invalid_batch_size(self):
+        """测试非法的每批拉取行数"""
+        comparator = TableComparator(self.adapter1, self.adapter2)
+        for batch_size in (0, 1001):
+            with self.assertRaises(ValueError):
+                comparator.set_key_hash_mode(True, batch_size)
+
+    def test_run_comparison_with_key_hash(self):
+        """测试run_comparison支持key_hash参数"""
+        expected = self._compare('orders', False)
+        with patch.object(TableComparator, '_compare_rows_by_key_hash',
+                          autospec=True, side_effect=TableComparator._compare_rows_by_key_hash) as key_hash_mock:
+            result = run_comparison(
+                source_db_type='sqlite',
+                source_db_path=self.paths[0],
+                target_db_path=self.paths[1],
+                table1='orders',
+                table2='orders',
+                key_hash=True
+            )
+        key_hash_mock.assert_called_once()
+        self.assertEqual(result['row_differences'], expected['row_differences'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    KeyOrderError
+)
+
+
+class RecordingCursor:
+    """记录fetchmany调用情况的游标包装类"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.fetch_sizes = []
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        return self.cursor.fetchmany(size)
+
+    def __iter__(self):
+        raise AssertionError("归并对比不应直接迭代整个游标")
+
+
+class TestMergeComparison(unittest.TestCase):
+    """测试基于主键的流式归并对比"""
+
+    def setUp(self):
+        # 创建临时数据库文件
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE merge1 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        conn.execute('CREATE TABLE merge2 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        for i in range(1, 3001):
+            if i % 500 != 0:
+                conn.execute("INSERT INTO merge1 VALUES (?, ?, ?)", (i, f"name{i}", i))
+            if i % 700 != 0:
+                value = i + 1 if i % 300 == 0 else i
+                conn.execute("INSERT INTO merge2 VALUES (?, ?, ?)", (i, f"name{i}", value))
+        conn.execute("INSERT INTO merge2 VALUES (5000, 'extra', 1)")
+
+        # 主键使用大小写不敏感的排序规则，数据库顺序与Python顺序不同
+        conn.execute('CREATE TABLE nocase1 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE nocase2 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        conn.executemany("INSERT INTO nocase1 VALUES (?, ?)", [('a', 1), ('B', 2), ('c', 3)])
+        conn.executemany("INSERT INTO nocase2 VALUES (?, ?)", [('a', 1), ('B', 5), ('d', 4)])
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+        self.comparator = TableComparator(self.adapter)
+
+    def tearDown(self):
+        self.adapter.close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def _run_engine(self, engine, table1, table2, fields, primary_keys):
+        self.comparator.set_tables(table1, table2)
+        cursor1 = self.adapter.execute_query(self.comparator.build_query(fields, table1, 1))
+        cursor2 = self.adapter.execute_query(self.comparator.build_query(fields, table2, 2))
+        return engine(cursor1, cursor2, primary_keys, fields)
+
+    def test_merge_matches_in_memory_result(self):
+        """测试归并对比结果与内存对比结果完全一致"""
+        fields = ['id', 'name', 'value']
+        merged = self._run_engine(self.comparator._compare_rows_by_primary_key_streaming,
+                                  'merge1', 'merge2', fields, ['id'])
+        in_memory = self._run_engine(self.comparator._compare_rows_by_primary_key_in_memory,
+                                     'merge1', 'merge2', fields, ['id'])
+        self.assertEqual(merged, in_memory)
+        self.assertEqual(merged['table1_row_count'], 2994)
+        self.assertEqual(merged['table2_row_count'], 2997)
+
+        types = [diff['type'] for diff in merged['differences']]
+        self.assertEqual(types.count('only_in_table1'), 4)
+        self.assertEqual(types.count('only_in_table2'), 7)
+        self.assertEqual(types.count('different_data'), 7)
+
+    def test_merge_reads_cursor_in_batches(self):
+        """测试归并对比按批次读取游标"""
+        fields = ['id', 'name', 'value']
+        self.comparator.set_tables('merge1', 'merge2')
+        cursor1 = RecordingCursor(self.adapter.execute_query(self.comparator.build_query(fields, 'merge1', 1)))
+        cursor2 = RecordingCursor(self.adapter.execute_query(self.comparator.build_query(fields, 'merge2', 2)))
+        result = self.comparator._compare_rows_by_primary_key_streaming(cursor1, cursor2, ['id'], fields)
+
+        self.assertEqual(result['table1_row_count'], 2994)
+        self.assertGreater(len(cursor1.fetch_sizes), 1)
+        self.assertTrue(all(size == cursor1.fetch_sizes[0] for size in cursor1.fetch_sizes))
+
+    def test_merge_detects_unordered_keys(self):
+        """测试数据库顺序与Python顺序不一致时抛出KeyOrderError"""
+        fields = ['code', 'value']
+        with self.assertRaises(KeyOrderError):
+            self._run_engine(self.comparator._compare_rows_by_primary_key_streaming,
+                             'nocase1', 'nocase2', fields, ['code'])
+
+    def test_compare_falls_back_when_order_differs(self):
+        """测试compare在顺序不一致时回退到内存对比"""
+        self.comparator.set_tables('nocase1', 'nocase2')
+        result = self.comparator.compare()
+
+        self.assertEqual(result['table1_row_count'], 3)
+        self.assertEqual(result['table2_row_count'], 3)
+        diffs = {diff['key']['code']: diff['type'] for diff in result['row_differences']}
+        self.assertEqual(diffs, {'B': 'different_data', 'c': 'only_in_table1', 'd': 'only_in_table2'})
+
+
+class TestRowTuplePipeline(unittest.TestCase):
+    """测试基于行元组的对比"""
+
+    def setUp(self):
+        self.comparator = TableComparator(SQLiteAdapter())
+
+    def test_identical_rows_have_no_difference(self):
+        """测试两行完全相同时直接返回None"""
+        self.assertIsNone(self.comparator._compare_single_row((1, 'a', None), (1, 'a', None), 1, ['id', 'name', 'note']))
+
+    def test_only_different_fields_are_reported(self):
+        """测试只为不同的字段生成差异记录"""
+        diff = self.comparator._compare_single_row((1, 'a', 'x'), (1, 'b', 'x'), 3, ['id', 'name', 'note'])
+        self.assertEqual(diff, {
+            'row_number': 3,
+            'differences': [{'field': 'name', 'table1_value': 'a', 'table2_value': 'b'}]
+        })
+
+    def test_extra_query_columns_are_ignored(self):
+        """测试查询中附加的非对比字段不参与对比"""
+        self.assertIsNone(self.comparator._compare_single_row((1, 'a', 10), (1, 'a'), 1, ['id', 'name']))
+
+    def test_key_getter(self):
+        """测试按列下标提取主键元组"""
+        fields = ['name', 'id', 'region']
+        self.assertEqual(TableComparator._key_getter(fields, ['id'])(('a', 5, 'east')), (5,))
+        self.assertEqual(TableComparator._key_getter(fields, ['region', 'id'])(('a', 5, 'east')), ('east', 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
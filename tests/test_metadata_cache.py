@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import json
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MetadataCache,
+    run_comparison
+)
+
+
+class TestMetadataCache(unittest.TestCase):
+    """测试表元数据缓存"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.cache_file = self.db_path + '.metadata.json'
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE meta1 (id INTEGER PRIMARY KEY, name TEXT, amount REAL)')
+        conn.execute('CREATE TABLE meta2 (id INTEGER PRIMARY KEY, name TEXT, amount REAL)')
+        conn.executemany("INSERT INTO meta1 VALUES (?, ?, ?)", [(1, 'a', 1.0), (2, 'b', 2.0)])
+        conn.executemany("INSERT INTO meta2 VALUES (?, ?, ?)", [(1, 'a', 1.0), (2, 'c', 2.0)])
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        for path in (self.db_path, self.cache_file):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def test_compare_queries_catalog_once_per_table(self):
+        """测试一次对比中每个表的字段和主键只查询一次"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('meta1', 'meta2')
+        with patch.object(self.adapter, 'get_table_fields', wraps=self.adapter.get_table_fields) as fields_mock, \
+                patch.object(self.adapter, 'get_primary_keys', wraps=self.adapter.get_primary_keys) as keys_mock:
+            result = comparator.compare()
+
+        self.assertEqual(len(result['row_differences']), 1)
+        self.assertEqual(sorted(call[0][0] for call in fields_mock.call_args_list), ['meta1', 'meta2'])
+        self.assertEqual(sorted(call[0][0] for call in keys_mock.call_args_list), ['meta1', 'meta2'])
+
+    def test_column_types(self):
+        """测试获取字段类型"""
+        comparator = TableComparator(self.adapter)
+        self.assertEqual(comparator.get_column_types('meta1'),
+                         {'id': 'INTEGER', 'name': 'TEXT', 'amount': 'REAL'})
+
+    def test_disk_cache_is_reused(self):
+        """测试磁盘缓存在下次运行时复用"""
+        cache = MetadataCache(self.cache_file)
+        self.assertEqual(cache.get_primary_keys(self.adapter, 'meta1'), ['id'])
+        self.assertTrue(os.path.exists(self.cache_file))
+        with open(self.cache_file, 'r', encoding='utf-8') as f:
+            self.assertNotIn('password', f.read())
+
+        with patch.object(self.adapter, 'get_primary_keys', side_effect=AssertionError("不应查询数据库")):
+            self.assertEqual(MetadataCache(self.cache_file).get_primary_keys(self.adapter, 'meta1'), ['id'])
+
+    def test_expired_disk_cache_is_ignored(self):
+        """测试过期的磁盘缓存不会被使用"""
+        MetadataCache(self.cache_file).get_table_fields(self.adapter, 'meta1')
+        with open(self.cache_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        for entry in entries.values():
+            entry['cached_at'] -= 120
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+
+        with patch.object(self.adapter, 'get_table_fields', wraps=self.adapter.get_table_fields) as fields_mock:
+            MetadataCache(self.cache_file, ttl=60).get_table_fields(self.adapter, 'meta1')
+        fields_mock.assert_called_once_with('meta1')
+
+    def test_connection_key_excludes_password(self):
+        """测试缓存键不包含密码"""
+        adapter = SQLiteAdapter()
+        adapter.connect_params = {'host': 'db', 'user': 'u', 'password': 'secret'}
+        key = MetadataCache.connection_key(adapter)
+        self.assertIn('host=db', key)
+        self.assertNotIn('secret', key)
+
+    def test_invalid_ttl(self):
+        """测试非法的缓存有效期"""
+        comparator = TableComparator(self.adapter)
+        with self.assertRaises(ValueError):
+            comparator.set_metadata_cache(self.cache_file, ttl=-1)
+
+    def test_run_comparison_with_metadata_cache(self):
+        """测试run_comparison支持metadata_cache参数"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='meta1',
+            table2='meta2',
+            metadata_cache=self.cache_file
+        )
+        self.assertEqual(len(result['row_differences']), 1)
+        self.assertTrue(os.path.exists(self.cache_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
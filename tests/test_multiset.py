@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    PostgreSQLAdapter,
+    _SpillPartitions,
+    run_comparison
+)
+
+
+class TestMultisetComparison(unittest.TestCase):
+    """测试没有主键的表按行的多重集合对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE log1 (level INTEGER, message TEXT)')
+        conn.execute('CREATE TABLE log2 (level INTEGER, message TEXT)')
+        rows = [(i % 5, f"message{i % 40}") for i in range(400)]
+        # 表2顺序相反，插入一行新数据，删除一行，重复一行两次
+        rows2 = list(reversed(rows))
+        rows2.insert(3, (9, 'inserted'))
+        rows2.remove((2, 'message2'))
+        rows2 += [(4, 'message4'), (4, 'message4')]
+        conn.executemany("INSERT INTO log1 VALUES (?, ?)", rows)
+        conn.executemany("INSERT INTO log2 VALUES (?, ?)", rows2)
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+
+    def _compare(self, max_memory=None):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('log1', 'log2')
+        comparator.set_multiset_mode(True)
+        comparator.fetch_size = 50
+        if max_memory:
+            comparator.set_max_memory(max_memory)
+        return comparator.compare()
+
+    def _summary(self, result):
+        return sorted((diff['type'], diff['count'], tuple(sorted(
+            (field['field'], field['table1_value'] if diff['type'] == 'only_in_table1' else field['table2_value'])
+            for field in diff['differences']))) for diff in result['row_differences'])
+
+    def test_reports_extra_and_missing_occurrences(self):
+        """测试行顺序不同时只报告两侧出现次数不同的行"""
+        result = self._compare()
+        self.assertEqual((result['table1_row_count'], result['table2_row_count']), (400, 402))
+        self.assertEqual(result['row_difference_count'], 3)
+        self.assertEqual(self._summary(result), [
+            ('only_in_table1', 1, (('level', 2), ('message', 'message2'))),
+            ('only_in_table2', 1, (('level', 9), ('message', 'inserted'))),
+            ('only_in_table2', 2, (('level', 4), ('message', 'message4'))),
+        ])
+
+        # 按位置对比时第一行之后的行全部错位
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('log1', 'log2')
+        self.assertGreater(comparator.compare()['row_difference_count'], 300)
+
+    def test_spill_to_disk_past_memory_limit(self):
+        """测试待匹配的行超过内存上限时写入临时分区文件，结果与内存中统计相同"""
+        expected = self._summary(self._compare())
+        with patch.object(_SpillPartitions, 'add', autospec=True, side_effect=_SpillPartitions.add) as spill_add:
+            result = self._compare(max_memory=4096)
+        self.assertTrue(spill_add.called)
+        self.assertEqual(self._summary(result), expected)
+
+    def test_queries_not_sorted(self):
+        """测试多重集合对比的查询不包含ORDER BY（PostgreSQL按位置对比时按所有字段排序）"""
+        comparator = TableComparator(PostgreSQLAdapter(), PostgreSQLAdapter())
+        comparator.metadata.get_primary_keys = Mock(return_value=[])
+        self.assertIn('ORDER BY', comparator.build_query(['a', 'b'], 't'))
+        self.assertNotIn('ORDER BY', comparator.build_query(['a', 'b'], 't', ordered=False))
+
+    def test_normalized_values_and_run_comparison(self):
+        """测试行键使用归一化后的值，数值相等的int、float、Decimal视为同一行"""
+        comparator = TableComparator(self.adapter)
+        get_key = comparator._multiset_key_getter(None, None, ['a', 'b'])
+        self.assertEqual(hash(get_key((1, Decimal('1.50'), 'extra'))), hash(get_key((1.0, 1.5))))
+        self.assertEqual(get_key((bytearray(b'x'), [1, 2])), (b'x', (1, 2)))
+
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='log1',
+            table2='log2',
+            multiset=True
+        )
+        self.assertEqual(result['row_difference_count'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
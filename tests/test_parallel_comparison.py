@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    ConnectionPool,
+    run_comparison
+)
+
+
+class TestParallelComparison(unittest.TestCase):
+    """测试按主键范围并行对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE par1 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        conn.execute('CREATE TABLE par2 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        conn.execute('CREATE TABLE code1 (code TEXT PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE code2 (code TEXT PRIMARY KEY, value INTEGER)')
+        for i in range(1, 5001):
+            if i % 997 != 0:
+                conn.execute("INSERT INTO par1 VALUES (?, ?, ?)", (i, f"name{i}", i))
+                conn.execute("INSERT INTO code1 VALUES (?, ?)", (f"K{i:05d}", i))
+            if i % 1201 != 0:
+                value = -i if i % 450 == 0 else i
+                conn.execute("INSERT INTO par2 VALUES (?, ?, ?)", (i, f"name{i}", value))
+                conn.execute("INSERT INTO code2 VALUES (?, ?)", (f"K{i:05d}", value))
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def _compare(self, table1, table2, jobs):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables(table1, table2)
+        comparator.set_jobs(jobs)
+        return comparator.compare()
+
+    def test_integer_key_ranges_match_serial_result(self):
+        """测试整数主键并行对比结果与串行结果一致"""
+        serial = self._compare('par1', 'par2', 1)
+        parallel = self._compare('par1', 'par2', 4)
+        self.assertEqual(parallel, serial)
+        self.assertGreater(len(parallel['row_differences']), 0)
+
+    def test_string_key_ranges_match_serial_result(self):
+        """测试字符串主键采样边界后的并行对比结果与串行结果一致"""
+        serial = self._compare('code1', 'code2', 1)
+        parallel = self._compare('code1', 'code2', 3)
+        self.assertEqual(parallel, serial)
+
+    def test_ranges_prepare_own_decoders(self):
+        """测试每个分段按自己的游标准备解码函数，工作线程不修改对比器自身的状态"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('par1', 'par2')
+        comparator.set_jobs(4)
+        with patch.object(TableComparator, '_prepare_row_decoders', autospec=True,
+                          side_effect=TableComparator._prepare_row_decoders) as prepare:
+            comparator.compare()
+        owners = [call[0][0] for call in prepare.call_args_list]
+        self.assertEqual(len(owners), 4)
+        self.assertEqual(len({id(owner) for owner in owners}), 4)
+        self.assertNotIn(comparator, owners)
+        self.assertIsNone(comparator._row_comparator)
+        self.assertIsNone(comparator._row_decoders)
+
+    def test_key_range_boundaries(self):
+        """测试整数主键按MIN/MAX拆分边界"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('par1', 'par2')
+        comparator.set_jobs(4)
+        self.assertEqual(comparator._get_key_range_boundaries('id'), ['1251', '2501', '3751'])
+
+    def test_invalid_jobs(self):
+        """测试非法的并行任务数"""
+        comparator = TableComparator(self.adapter)
+        with self.assertRaises(ValueError):
+            comparator.set_jobs(0)
+
+    def test_run_comparison_with_jobs(self):
+        """测试run_comparison支持jobs参数"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='par1',
+            table2='par2',
+            jobs=2
+        )
+        self.assertEqual(result['table1_row_count'], 4995)
+        self.assertEqual(result['table2_row_count'], 4996)
+
+
+class TestConnectionPool(unittest.TestCase):
+    """测试连接池"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def test_pool_reuses_released_connections(self):
+        """测试连接归还后被复用"""
+        pool = ConnectionPool(self.adapter, 2)
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+        self.assertIs(first, second)
+        self.assertIsNot(first, self.adapter)
+        pool.release(second)
+        pool.close()
+
+    def test_clone_requires_connection(self):
+        """测试未连接的适配器无法复制连接"""
+        with self.assertRaises(RuntimeError):
+            SQLiteAdapter().clone()
+
+
+if __name__ == '__main__':
+    unittest.main()
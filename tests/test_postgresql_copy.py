@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import io
+import os
+import sys
+import tempfile
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    PostgreSQLAdapter,
+    run_comparison
+)
+
+
+class FakeCopyConnection:
+    """模拟执行COPY的psycopg2连接"""
+
+    def __init__(self, columns, data, error=None):
+        self.columns = columns
+        self.data = data
+        self.error = error
+        self.queries = []
+        self.cancelled = False
+        self.closed = False
+
+    def cursor(self):
+        return FakeCopyCursor(self)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCopyCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+
+    def execute(self, query):
+        self.connection.queries.append(query)
+        self.description = [(name, oid, None, None, None, None, None) for name, oid in self.connection.columns]
+
+    def copy_expert(self, sql, file):
+        # psycopg2只对文本文件对象写入解码后的字符串；数据块不按行对齐
+        assert isinstance(file, io.TextIOBase)
+        self.connection.queries.append(sql)
+        for start in range(0, len(self.connection.data), 7):
+            file.write(self.connection.data[start:start + 7])
+        if self.connection.error:
+            raise self.connection.error
+
+    def close(self):
+        pass
+
+
+class TestPostgreSQLCopy(unittest.TestCase):
+    """测试PostgreSQL使用COPY批量读取结果集"""
+
+    def _adapter(self, copy_connection):
+        psycopg2 = Mock()
+        psycopg2.connect.side_effect = [Mock(), copy_connection]
+        psycopg2.extensions.string_types = {
+            23: lambda value, cursor: int(value),
+            1700: lambda value, cursor: Decimal(value),
+            # 文本列不经过类型转换函数
+            25: Mock(side_effect=AssertionError('text caster called')),
+        }
+        patcher = patch.dict('sys.modules', {'psycopg2': psycopg2, 'psycopg2.extensions': psycopg2.extensions})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        adapter = PostgreSQLAdapter()
+        adapter.connect(host='localhost', user='postgres', password='pw', database='test')
+        return adapter
+
+    def test_copy_rows_converted_like_cursor_rows(self):
+        """测试COPY文本解析为与普通游标相同的值，包括NULL和转义字符"""
+        columns = [('id', 23), ('name', 25), ('amount', 1700), ('unknown', 9999)]
+        data = ('1\ta\\tb\t1.50\tx\n'
+                '2\t\\N\t\\N\tline\\nbreak\n'
+                '3\tback\\\\slash\t-3\t\\x41\\101\n')
+        connection = FakeCopyConnection(columns, data)
+        adapter = self._adapter(connection)
+        query = "SELECT id, name, amount, unknown FROM t ORDER BY id"
+
+        cursor = adapter.execute_bulk_query(query, fetch_size=2)
+        self.assertEqual([column[0] for column in cursor.description], ['id', 'name', 'amount', 'unknown'])
+        self.assertEqual(cursor.fetchmany(), [(1, 'a\tb', Decimal('1.50'), 'x'), (2, None, None, 'line\nbreak')])
+        self.assertEqual(cursor.fetchmany(), [(3, 'back\\slash', Decimal('-3'), 'AA')])
+        self.assertEqual(cursor.fetchmany(), [])
+        self.assertEqual(connection.queries, [f"SELECT * FROM ({query}) AS table_diff_copy LIMIT 0",
+                                              f"COPY ({query}) TO STDOUT"])
+
+        # 关闭游标时同时关闭COPY专用连接
+        cursor.close()
+        self.assertTrue(connection.closed)
+        self.assertEqual(adapter.copy_connections, [])
+
+    def test_close_before_end_stops_copy(self):
+        """测试数据未读完时关闭游标会取消COPY并结束后台线程"""
+        data = ''.join(f"{i}\tname{i}\n" for i in range(20000))
+        connection = FakeCopyConnection([('id', 23), ('name', 25)], data)
+        adapter = self._adapter(connection)
+
+        cursor = adapter.execute_bulk_query("SELECT id, name FROM t ORDER BY id", fetch_size=10)
+        self.assertEqual(cursor.fetchmany(), [(i, f"name{i}") for i in range(10)])
+        cursor.close()
+        self.assertFalse(cursor.cursor.thread.is_alive())
+        self.assertTrue(connection.cancelled)
+        self.assertTrue(connection.closed)
+
+    def test_copy_text_output_converts_native_columns_only(self):
+        """测试以文本形式获取时COPY只转换主键，其余列由decode_row转换"""
+        connection = FakeCopyConnection([('id', 23), ('amount', 1700)], '10\t1.50\n9\t\\N\n')
+        adapter = self._adapter(connection)
+        cursor = adapter.execute_bulk_query("SELECT id, amount FROM t ORDER BY id", 10, native_columns=['ID'])
+        rows = cursor.fetchall()
+        self.assertEqual(rows, [(10, '1.50'), (9, None)])
+        self.assertEqual([cursor.decode_row(row) for row in rows], [(10, Decimal('1.50')), (9, None)])
+        cursor.close()
+
+    def test_copy_error_raised_when_fetching(self):
+        """测试COPY执行出错时在读取数据时抛出异常"""
+        connection = FakeCopyConnection([('id', 23)], '1\n2\n', error=RuntimeError('connection lost'))
+        adapter = self._adapter(connection)
+        cursor = adapter.execute_bulk_query("SELECT id FROM t ORDER BY id", fetch_size=10)
+        with self.assertRaises(RuntimeError):
+            cursor.fetchall()
+        cursor.close()
+
+
+class TestBulkReadSelection(unittest.TestCase):
+    """测试对比引擎自动选择批量读取"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE bulk1 (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.execute('CREATE TABLE bulk2 (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.executemany("INSERT INTO bulk1 VALUES (?, ?)", [(i, f"name{i}") for i in range(1, 101)])
+        conn.executemany("INSERT INTO bulk2 VALUES (?, ?)", [(i, f"name{i % 40}") for i in range(1, 101)])
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+
+    def test_comparator_uses_bulk_cursor_when_available(self):
+        """测试适配器支持批量读取时对比使用批量读取的游标，关闭后使用普通流式游标"""
+        self.assertIsNone(self.adapter.execute_bulk_query("SELECT 1"))
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('bulk1', 'bulk2')
+        expected = comparator.compare()
+
+        bulk_query = Mock(side_effect=lambda query, fetch_size=None, native_columns=None:
+                          self.adapter.execute_query(query, fetch_size))
+        with patch.object(self.adapter, 'execute_bulk_query', bulk_query):
+            result = comparator.compare()
+            self.assertEqual(bulk_query.call_count, 2)
+            self.assertEqual(result['row_differences'], expected['row_differences'])
+
+            comparator.set_bulk_read_mode(False)
+            comparator.compare()
+            self.assertEqual(bulk_query.call_count, 2)
+
+    def test_run_comparison_without_bulk_read(self):
+        """测试run_comparison支持bulk_read参数"""
+        with patch.object(SQLiteAdapter, 'execute_bulk_query', return_value=None) as bulk_query:
+            result = run_comparison(
+                source_db_type='sqlite',
+                source_db_path=self.db_path,
+                table1='bulk1',
+                table2='bulk2',
+                bulk_read=False
+            )
+        bulk_query.assert_not_called()
+        self.assertEqual(result['row_difference_count'], 61)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    OracleAdapter,
+    run_comparison
+)
+
+
+class TestPushdownComparison(unittest.TestCase):
+    """测试同一数据库中的下推对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE push1 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        conn.execute('CREATE TABLE push2 (id INTEGER PRIMARY KEY, name TEXT, value INTEGER)')
+        for i in range(1, 1001):
+            name = None if i % 97 == 0 else f"name{i}"
+            if i % 150 != 0:
+                conn.execute("INSERT INTO push1 VALUES (?, ?, ?)", (i, name, i))
+            if i % 220 != 0:
+                # 一侧为NULL另一侧不为NULL也是差异
+                name2 = f"name{i}" if i % 194 == 0 else name
+                conn.execute("INSERT INTO push2 VALUES (?, ?, ?)", (i, name2, -i if i % 130 == 0 else i))
+        conn.execute('CREATE TABLE heap1 (name TEXT, value INTEGER)')
+        conn.execute('CREATE TABLE heap2 (name TEXT, value INTEGER)')
+        # 重复行的个数不同也是差异
+        conn.executemany("INSERT INTO heap1 VALUES (?, ?)",
+                         [('a', 1), ('a', 1), ('b', None), ('c', 3), ('d', 4), ('f', 6), ('f', 6), ('f', 6)])
+        conn.executemany("INSERT INTO heap2 VALUES (?, ?)",
+                         [('a', 1), ('b', None), ('b', None), ('c', 30), ('e', 5), ('f', 6), ('f', 6), ('f', 6)])
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def _compare(self, table1, table2, pushdown, where=None):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables(table1, table2)
+        comparator.set_pushdown_mode(pushdown)
+        if where:
+            comparator.set_where_condition(where)
+        return comparator.compare()
+
+    def test_keyed_result_matches_regular_comparison(self):
+        """测试主键下推对比结果与常规对比一致"""
+        for where in (None, 'id > 300'):
+            expected = self._compare('push1', 'push2', False, where)
+            with patch.object(self.adapter, 'execute_query', wraps=self.adapter.execute_query) as execute_mock, \
+                    patch.object(self.adapter, 'supports_full_outer_join', return_value=True):
+                result = self._compare('push1', 'push2', True, where)
+            self.assertEqual(result['row_differences'], expected['row_differences'])
+            self.assertEqual(result['table1_row_count'], expected['table1_row_count'])
+            self.assertEqual(result['table2_row_count'], expected['table2_row_count'])
+            self.assertTrue(any('FULL OUTER JOIN' in call[0][0] for call in execute_mock.call_args_list))
+
+    def test_emulated_full_outer_join(self):
+        """测试不使用FULL OUTER JOIN时使用两个LEFT JOIN的UNION ALL代替"""
+        expected = self._compare('push1', 'push2', False)
+        with patch.object(self.adapter, 'execute_query', wraps=self.adapter.execute_query) as execute_mock:
+            result = self._compare('push1', 'push2', True)
+        self.assertEqual(result['row_differences'], expected['row_differences'])
+        self.assertTrue(any('UNION ALL' in call[0][0] for call in execute_mock.call_args_list))
+
+    def test_keyless_row_counts(self):
+        """测试无主键表按行分组统计出现次数下推对比，结果与按行的多重集合对比一致"""
+        def summary(result):
+            return sorted((diff['type'], diff['count'], tuple(
+                field['table1_value' if diff['type'] == 'only_in_table1' else 'table2_value']
+                for field in diff['differences'] if field['field'] == 'name'))
+                for diff in result['row_differences'])
+
+        result = self._compare('heap1', 'heap2', True)
+        self.assertEqual(summary(result), [
+            ('only_in_table1', 1, ('a',)), ('only_in_table1', 1, ('c',)), ('only_in_table1', 1, ('d',)),
+            ('only_in_table2', 1, ('b',)), ('only_in_table2', 1, ('c',)), ('only_in_table2', 1, ('e',))])
+        self.assertEqual(result['row_difference_count'], 6)
+        self.assertEqual(result['table1_row_count'], 8)
+
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('heap1', 'heap2')
+        comparator.set_multiset_mode(True)
+        self.assertEqual(summary(comparator.compare()), summary(result))
+
+    def test_same_server_detection(self):
+        """测试判断两个适配器是否指向同一个数据库"""
+        other = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        other.close()
+        adapter2 = SQLiteAdapter()
+        adapter2.connect(db_path=other.name)
+        try:
+            comparator = TableComparator(self.adapter, adapter2)
+            comparator.set_pushdown_mode(True)
+            self.assertFalse(comparator._is_same_server())
+
+            # 连接参数相同的两个适配器视为同一个数据库
+            same = SQLiteAdapter()
+            same.connect(db_path=self.db_path)
+            self.assertTrue(TableComparator(self.adapter, same)._is_same_server())
+            same.close()
+        finally:
+            adapter2.close()
+            os.unlink(other.name)
+
+    def test_dialect_null_safe_equal(self):
+        """测试各数据库的NULL安全比较"""
+        self.assertEqual(MySQLAdapter().null_safe_equal('a', 'b'), 'a <=> b')
+        self.assertEqual(OracleAdapter().null_safe_equal('a', 'b'), 'DECODE(a, b, 1, 0) = 1')
+        self.assertFalse(MySQLAdapter().supports_full_outer_join())
+
+    def test_run_comparison_with_pushdown(self):
+        """测试run_comparison支持pushdown参数"""
+        expected = self._compare('push1', 'push2', False)
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='push1',
+            table2='push2',
+            pushdown=True
+        )
+        self.assertEqual(result['row_differences'], expected['row_differences'])
+
+
+if __name__ == '__main__':
+    unittest.main()
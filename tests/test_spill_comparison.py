@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    parse_memory_size,
+    run_comparison
+)
+
+
+class TestSpilledComparison(unittest.TestCase):
+    """测试外存哈希分区的主键对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.spill_dir = tempfile.mkdtemp()
+
+        conn = sqlite3.connect(self.db_path)
+        # 主键使用大小写不敏感的排序规则，归并对比会回退
+        conn.execute('CREATE TABLE spill1 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE spill2 (code TEXT COLLATE NOCASE PRIMARY KEY, value INTEGER)')
+        for i in range(3000):
+            code = f"Key{i}" if i % 2 else f"key{i}"
+            if i % 250 != 0:
+                conn.execute("INSERT INTO spill1 VALUES (?, ?)", (code, i))
+            if i % 400 != 0:
+                conn.execute("INSERT INTO spill2 VALUES (?, ?)", (code, -i if i % 170 == 0 else i))
+        # 无类型主键列中同时存在整数和文本
+        conn.execute('CREATE TABLE mixed1 (id PRIMARY KEY, value INTEGER)')
+        conn.execute('CREATE TABLE mixed2 (id PRIMARY KEY, value INTEGER)')
+        conn.executemany("INSERT INTO mixed1 VALUES (?, ?)", [(1, 1), (2, 2), ('a', 3), ('b', 4)])
+        conn.executemany("INSERT INTO mixed2 VALUES (?, ?)", [(1, 1), (2, 5), ('a', 3), ('c', 6)])
+        conn.commit()
+        conn.close()
+
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+        os.rmdir(self.spill_dir)
+
+    def _compare(self, table1, table2, max_memory=None):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables(table1, table2)
+        comparator.set_fetch_size(200)
+        if max_memory is not None:
+            comparator.set_max_memory(max_memory)
+        with patch.object(tempfile, 'tempdir', self.spill_dir):
+            return comparator.compare()
+
+    @staticmethod
+    def _by_key(result):
+        return {tuple(diff['key'].values()): (diff['type'], diff['differences'])
+                for diff in result['row_differences']}
+
+    def test_matches_in_memory_comparison(self):
+        """测试分区对比结果与内存对比一致，并清理临时文件"""
+        expected = self._compare('spill1', 'spill2')
+        for max_memory in ('64M', 1):
+            # 内存上限为1字节时每个分区都会递归拆分到最大层数
+            result = self._compare('spill1', 'spill2', max_memory)
+            self.assertEqual(self._by_key(result), self._by_key(expected))
+            self.assertEqual(result['table1_row_count'], expected['table1_row_count'])
+            self.assertEqual(result['table2_row_count'], expected['table2_row_count'])
+            # 差异按分区输出，行号仍按主键并集连续编排且不重复
+            row_numbers = [diff['row_number'] for diff in result['row_differences']]
+            self.assertEqual(len(set(row_numbers)), len(row_numbers))
+            self.assertLessEqual(max(row_numbers), 3000)
+            self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_mixed_key_types(self):
+        """测试主键混合整数和文本时的对比"""
+        for max_memory in (None, '1K'):
+            result = self._compare('mixed1', 'mixed2', max_memory)
+            differences = {tuple(diff['key'].values()): diff['type'] for diff in result['row_differences']}
+            self.assertEqual(differences, {(2,): 'different_data', ('b',): 'only_in_table1',
+                                           ('c',): 'only_in_table2'})
+            self.assertEqual(result['table1_row_count'], 4)
+
+    def test_parse_memory_size(self):
+        """测试解析内存大小"""
+        self.assertEqual(parse_memory_size('512M'), 512 * 1024 ** 2)
+        self.assertEqual(parse_memory_size('1.5g'), 3 * 1024 ** 3 // 2)
+        self.assertEqual(parse_memory_size(4096), 4096)
+        for value in ('abc', '10X', 0, '-1G'):
+            with self.assertRaises(ValueError):
+                parse_memory_size(value)
+
+    def test_run_comparison_with_max_memory(self):
+        """测试run_comparison支持max_memory参数"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='mixed1',
+            table2='mixed2',
+            max_memory='1M'
+        )
+        self.assertEqual(len(result['row_differences']), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    SQLITE_CACHE_SIZE_KB,
+    run_comparison
+)
+
+
+class TestSQLiteAttachComparison(unittest.TestCase):
+    """测试两个SQLite数据库文件附加到同一连接后的对比"""
+
+    def setUp(self):
+        self.paths = []
+        for index in range(2):
+            temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+            temp_db.close()
+            self.paths.append(temp_db.name)
+            conn = sqlite3.connect(temp_db.name)
+            conn.execute('CREATE TABLE snapshot (id INTEGER PRIMARY KEY, name TEXT, amount REAL)')
+            conn.execute('CREATE TABLE heap (name TEXT, amount REAL)')
+            for i in range(1, 2001):
+                if index == 0 and i % 300 == 0:
+                    continue
+                if index == 1 and i % 450 == 0:
+                    continue
+                amount = float(-i if index == 1 and i % 170 == 0 else i)
+                conn.execute("INSERT INTO snapshot VALUES (?, ?, ?)", (i, f"name{i}", amount))
+                conn.execute("INSERT INTO heap VALUES (?, ?)", (f"name{i}", amount))
+            conn.commit()
+            conn.close()
+
+        self.adapter1 = SQLiteAdapter()
+        self.adapter1.connect(db_path=self.paths[0], read_only=True)
+        self.adapter2 = SQLiteAdapter()
+        self.adapter2.connect(db_path=self.paths[1], read_only=True)
+
+    def tearDown(self):
+        self.adapter1.close()
+        self.adapter2.close()
+        for path in self.paths:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _compare(self, table, where=None):
+        comparator = TableComparator(self.adapter1, self.adapter2)
+        comparator.set_tables(table, table)
+        if where:
+            comparator.set_where_condition2(where)
+        return comparator.compare()
+
+    def test_attached_result_matches_row_comparison(self):
+        """测试附加数据库后在SQLite中对比的结果与逐行对比一致"""
+        for where in (None, 'id < 1000'):
+            with patch.object(TableComparator, '_can_attach', return_value=False):
+                expected = self._compare('snapshot', where)
+            with patch.object(self.adapter2, 'execute_query') as target_execute:
+                result = self._compare('snapshot', where)
+            target_execute.assert_not_called()
+            self.assertEqual(result['row_differences'], expected['row_differences'])
+            self.assertEqual(result['table1_row_count'], expected['table1_row_count'])
+            self.assertEqual(result['table2_row_count'], expected['table2_row_count'])
+            self.assertGreater(result['row_difference_count'], 0)
+
+        # 对比结束后分离附加的数据库
+        databases = [row[1] for row in self.adapter1.connection.execute("PRAGMA database_list")]
+        self.assertEqual(databases, ['main'])
+
+    def test_keyless_tables_keep_position_comparison(self):
+        """测试无主键表仍按位置对比"""
+        with patch.object(self.adapter1, 'attach') as attach_mock:
+            result = self._compare('heap')
+        attach_mock.assert_not_called()
+        self.assertEqual(result['table1_row_count'], 1994)
+
+    def test_read_only_connection_and_pragmas(self):
+        """测试只读URI模式和大文件读取参数"""
+        with self.assertRaises(sqlite3.OperationalError):
+            self.adapter1.connection.execute("DELETE FROM snapshot")
+        cache_size = self.adapter1.connection.execute("PRAGMA cache_size").fetchone()[0]
+        self.assertEqual(cache_size, -SQLITE_CACHE_SIZE_KB)
+
+    def test_path_with_special_characters(self):
+        """测试路径中包含URI特殊字符时仍能打开数据库"""
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'snap #1?.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY)')
+        conn.commit()
+        conn.close()
+        adapter = SQLiteAdapter()
+        try:
+            adapter.connect(db_path=path, read_only=True)
+            self.assertEqual(adapter.get_table_fields('t'), ['id'])
+            adapter.attach(self.paths[1], 'other')
+            count = adapter.execute_query("SELECT COUNT(*) FROM other.snapshot").fetchone()[0]
+            self.assertEqual(count, 1996)
+        finally:
+            adapter.close()
+            os.unlink(path)
+            os.rmdir(directory)
+
+    def test_run_comparison_two_files(self):
+        """测试run_comparison对比两个SQLite数据库文件"""
+        with patch.object(TableComparator, '_can_attach', return_value=False):
+            expected = self._compare('snapshot')
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.paths[0],
+            target_db_path=self.paths[1],
+            table1='snapshot',
+            table2='snapshot'
+        )
+        self.assertEqual(result['row_differences'], expected['row_differences'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -374,6 +374,49 @@ class TestMemoryEfficiency(unittest.TestCase):
         
         print("测试游标迭代效率完成")
 
+    def test_position_comparison_reads_in_batches(self):
+        """测试按位置对比时分批读取游标并正确统计多余行"""
+        print("测试按位置对比分批读取...")
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE batch_no_pk1 (code TEXT, data TEXT)')
+        conn.execute('CREATE TABLE batch_no_pk2 (code TEXT, data TEXT)')
+        for i in range(2500):
+            conn.execute("INSERT INTO batch_no_pk1 VALUES (?, ?)", (f"C{i}", f"Data {i}"))
+        for i in range(2300):
+            data = f"Changed {i}" if i == 1500 else f"Data {i}"
+            conn.execute("INSERT INTO batch_no_pk2 VALUES (?, ?)", (f"C{i}", data))
+        conn.commit()
+        conn.close()
+        
+        class BatchOnlyCursor:
+            """只允许fetchmany读取的游标"""
+            def __init__(self, cursor):
+                self.cursor = cursor
+                self.fetch_calls = 0
+            
+            def fetchmany(self, size):
+                self.fetch_calls += 1
+                return self.cursor.fetchmany(size)
+        
+        fields = ['code', 'data']
+        cursor1 = BatchOnlyCursor(self.adapter.execute_query("SELECT code, data FROM batch_no_pk1"))
+        cursor2 = BatchOnlyCursor(self.adapter.execute_query("SELECT code, data FROM batch_no_pk2"))
+        result = self.comparator._compare_rows_by_position_streaming(cursor1, cursor2, fields)
+        
+        self.assertEqual(result['table1_row_count'], 2500)
+        self.assertEqual(result['table2_row_count'], 2300)
+        self.assertGreater(cursor1.fetch_calls, 1)
+        
+        different = [d for d in result['differences'] if d['type'] == 'different_data']
+        only_in_table1 = [d for d in result['differences'] if d['type'] == 'only_in_table1']
+        self.assertEqual([d['row_number'] for d in different], [1501])
+        self.assertEqual(len(only_in_table1), 200)
+        self.assertEqual(only_in_table1[0]['row_number'], 2301)
+        self.assertEqual(only_in_table1[-1]['row_number'], 2500)
+        
+        print("测试按位置对比分批读取完成")
+
 
 class TestFiftyFieldsAndNullValues(unittest.TestCase):
     """测试50个字段及空值情况"""
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import Mock, patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    PostgreSQLAdapter,
+    OracleAdapter,
+    MSSQLAdapter,
+    run_comparison
+)
+
+
+class TestAdapterStreamingCursors(unittest.TestCase):
+    """测试各适配器的流式游标模式"""
+
+    def test_mysql_streaming_uses_unbuffered_dedicated_connection(self):
+        """测试MySQL流式查询使用专用连接上的非缓冲游标"""
+        mock_connector = Mock()
+        main_connection = Mock()
+        stream_connection = Mock()
+        mock_connector.connect.side_effect = [main_connection, stream_connection]
+        mock_mysql = Mock()
+        mock_mysql.connector = mock_connector
+
+        with patch.dict('sys.modules', {'mysql': mock_mysql, 'mysql.connector': mock_connector}):
+            adapter = MySQLAdapter()
+            adapter.connect(host='localhost', user='root', password='pw', database='test')
+            cursor = adapter.execute_query("SELECT 1", fetch_size=500)
+
+        self.assertEqual(cursor.cursor, stream_connection.cursor.return_value)
+        stream_connection.cursor.assert_called_with(buffered=False)
+        self.assertFalse(mock_connector.connect.call_args_list[1][1]['buffered'])
+        main_connection.cursor.assert_not_called()
+
+        # 关闭读完的游标后专用连接保留给下一个流式查询复用，关闭适配器时才关闭
+        cursor.close()
+        stream_connection.close.assert_not_called()
+        with patch.dict('sys.modules', {'mysql': mock_mysql, 'mysql.connector': mock_connector}):
+            adapter.execute_query("SELECT 2", fetch_size=500).close()
+        self.assertEqual(mock_connector.connect.call_count, 2)
+        self.assertEqual(stream_connection.cursor.call_count, 2)
+        adapter.close()
+        stream_connection.close.assert_called_once()
+        main_connection.close.assert_called_once()
+
+    def test_mysql_stream_connection_not_reused_after_failure(self):
+        """测试执行失败、结果未读完或查询被终止的MySQL专用连接被关闭而不是复用，断开的空闲连接重试"""
+        mock_connector = Mock()
+        main_connection = Mock()
+        failed, unread, cancelled, stale, fresh = Mock(), Mock(), Mock(), Mock(), Mock()
+        failed.cursor.return_value.execute.side_effect = RuntimeError('syntax error')
+        unread.cursor.return_value.close.side_effect = RuntimeError('Unread result found')
+        stale.cursor.return_value.execute.side_effect = [None, RuntimeError('server has gone away')]
+        stale.is_connected.return_value = False
+        mock_connector.connect.side_effect = [main_connection, failed, unread, cancelled, stale, fresh]
+        mock_mysql = Mock()
+        mock_mysql.connector = mock_connector
+
+        with patch.dict('sys.modules', {'mysql': mock_mysql, 'mysql.connector': mock_connector}):
+            adapter = MySQLAdapter()
+            adapter.connect(host='localhost', user='root', password='pw', database='test')
+            with self.assertRaises(RuntimeError):
+                adapter.execute_query("SELECT x", fetch_size=500)
+            failed.close.assert_called_once()
+            self.assertEqual(adapter.stream_connections, [])
+
+            adapter.execute_query("SELECT 1", fetch_size=500).close()
+            unread.close.assert_called_once()
+
+            cursor = adapter.execute_query("SELECT 1", fetch_size=500)
+            adapter.cancel()
+            cursor.close()
+            cancelled.close.assert_called_once()
+            self.assertEqual(adapter.idle_stream_connections, [])
+
+            adapter.execute_query("SELECT 1", fetch_size=500).close()
+            self.assertEqual(adapter.idle_stream_connections, [stale])
+            cursor = adapter.execute_query("SELECT 1", fetch_size=500)
+            stale.close.assert_called_once()
+            self.assertIs(cursor.connection, fresh)
+            self.assertEqual(adapter.stream_connections, [fresh])
+            adapter.close()
+
+    def test_mysql_default_query_stays_buffered(self):
+        """测试MySQL未指定fetch_size时仍使用缓冲游标"""
+        adapter = MySQLAdapter()
+        adapter.connection = Mock()
+        adapter.execute_query("SELECT 1")
+        adapter.connection.cursor.assert_called_with(buffered=True)
+
+    def test_postgresql_streaming_uses_named_cursor(self):
+        """测试PostgreSQL流式查询使用命名的服务端游标"""
+        adapter = PostgreSQLAdapter()
+        adapter.connection = Mock()
+        cursor1 = adapter.execute_query("SELECT 1", fetch_size=2000)
+        adapter.execute_query("SELECT 2", fetch_size=2000)
+
+        names = [call[1]['name'] for call in adapter.connection.cursor.call_args_list]
+        self.assertEqual(len(set(names)), 2)
+        self.assertEqual(cursor1.itersize, 2000)
+
+    def test_oracle_streaming_sets_arraysize_and_prefetch(self):
+        """测试Oracle流式查询设置arraysize和prefetchrows"""
+        adapter = OracleAdapter()
+        adapter.connection = Mock()
+        cursor = adapter.execute_query("SELECT 1 FROM dual", fetch_size=5000)
+        self.assertEqual(cursor.arraysize, 5000)
+        self.assertEqual(cursor.prefetchrows, 5000)
+
+    def test_mssql_streaming_sets_arraysize(self):
+        """测试MSSQL流式查询设置arraysize"""
+        adapter = MSSQLAdapter()
+        adapter.connection = Mock()
+        cursor = adapter.execute_query("SELECT 1", fetch_size=3000)
+        self.assertEqual(cursor.arraysize, 3000)
+
+
+class TestFetchSizeConfiguration(unittest.TestCase):
+    """测试批次大小配置"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE fetch1 (id INTEGER PRIMARY KEY, value TEXT)')
+        conn.execute('CREATE TABLE fetch2 (id INTEGER PRIMARY KEY, value TEXT)')
+        for i in range(50):
+            conn.execute("INSERT INTO fetch1 VALUES (?, ?)", (i, f"v{i}"))
+            conn.execute("INSERT INTO fetch2 VALUES (?, ?)", (i, f"v{i}" if i != 7 else "changed"))
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def test_invalid_fetch_size(self):
+        """测试非法的批次大小"""
+        comparator = TableComparator(Mock())
+        with self.assertRaises(ValueError):
+            comparator.set_fetch_size(0)
+
+    def test_compare_passes_fetch_size_to_adapter(self):
+        """测试compare将批次大小传递给适配器"""
+        adapter = SQLiteAdapter()
+        adapter.connect(db_path=self.db_path)
+        comparator = TableComparator(adapter)
+        comparator.set_tables('fetch1', 'fetch2')
+        comparator.set_fetch_size(7)
+
+        with patch.object(adapter, 'execute_query', wraps=adapter.execute_query) as mock_execute:
+            result = comparator.compare()
+        adapter.close()
+
+        for call in mock_execute.call_args_list:
+            self.assertEqual(call[1]['fetch_size'], 7)
+        self.assertEqual(len(result['row_differences']), 1)
+
+    def test_run_comparison_with_fetch_size(self):
+        """测试run_comparison支持fetch_size参数"""
+        result = run_comparison(
+            source_db_type='sqlite',
+            source_db_path=self.db_path,
+            table1='fetch1',
+            table2='fetch2',
+            fetch_size=3
+        )
+        self.assertEqual(result['table1_row_count'], 50)
+        self.assertEqual(len(result['row_differences']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
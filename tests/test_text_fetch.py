@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    PostgreSQLAdapter,
+    TEXT_VALUE_DECODERS,
+    _TextRowCursor
+)
+
+
+class FakeRawCursor:
+    """模拟返回字节的raw游标，description在第一次读取后才可用（与服务端游标相同）"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = list(rows)
+        self.description = None
+
+    def execute(self, query):
+        pass
+
+    def fetchmany(self, size=None):
+        self.description = [(name, type_code, None, None, None, None, True) for name, type_code in self.columns]
+        rows, self.rows = self.rows[:size or 1], self.rows[size or 1:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class TestTextFetch(unittest.TestCase):
+    """测试同一种数据库对比时以文本形式获取值"""
+
+    def test_text_value_decoders(self):
+        """测试把数据库返回的文本转换为Python值"""
+        number = TEXT_VALUE_DECODERS['number']
+        moment = TEXT_VALUE_DECODERS['datetime']
+        self.assertEqual(number(b'42'), 42)
+        self.assertEqual(number('1.50'), Decimal('1.50'))
+        self.assertEqual(number(7), 7)
+        self.assertEqual(moment(b'2024-01-02'), date(2024, 1, 2))
+        self.assertEqual(moment('2024-01-02 03:04:05.123456789'), datetime(2024, 1, 2, 3, 4, 5, 123456))
+        self.assertEqual(moment('2024-01-02 03:04:05.5'), datetime(2024, 1, 2, 3, 4, 5, 500000))
+        self.assertEqual(moment(b'0000-00-00 00:00:00'), '0000-00-00 00:00:00')
+        self.assertEqual(TEXT_VALUE_DECODERS['text'](bytearray('名称'.encode('utf-8'))), '名称')
+        self.assertEqual(TEXT_VALUE_DECODERS['binary'](bytearray(b'\xff')), b'\xff')
+
+    def test_mysql_raw_cursor(self):
+        """测试MySQL使用raw游标，主键读取时转换，其余列由decode_row转换"""
+        mock_connector = Mock()
+        stream_connection = Mock()
+        stream_connection.cursor.return_value = FakeRawCursor(
+            [('id', 3), ('amount', 246), ('name', 253), ('created', 12)],
+            [(b'10', b'1.50', b'x', b'2024-01-02 03:04:05'), (b'9', None, b'y', None)])
+        mock_connector.connect.side_effect = [Mock(), stream_connection]
+        mock_mysql = Mock()
+        mock_mysql.connector = mock_connector
+
+        with patch.dict('sys.modules', {'mysql': mock_mysql, 'mysql.connector': mock_connector}):
+            adapter = MySQLAdapter()
+            adapter.connect(host='localhost', user='root', password='pw', database='test')
+            cursor = adapter.execute_text_query("SELECT id, amount, name, created FROM t", 500, native_columns=['ID'])
+
+        stream_connection.cursor.assert_called_with(buffered=False, raw=True)
+        rows = cursor.fetchmany(2)
+        self.assertEqual(rows, [(10, b'1.50', b'x', b'2024-01-02 03:04:05'), (9, None, b'y', None)])
+        self.assertEqual(cursor.decode_row(rows[0]), (10, Decimal('1.50'), 'x', datetime(2024, 1, 2, 3, 4, 5)))
+        cursor.close()
+        self.assertEqual(adapter.idle_stream_connections, [stream_connection])
+        adapter.close()
+        stream_connection.close.assert_called_once()
+
+    def test_postgresql_text_typecasters(self):
+        """测试PostgreSQL在游标上注册保留文本的类型转换函数，并用默认的转换函数转换报告中的值"""
+        psycopg2 = Mock()
+        psycopg2.extensions.string_types = {23: lambda value, cursor: int(value),
+                                            1700: lambda value, cursor: Decimal(value)}
+        named_cursor = FakeRawCursor([('id', 23), ('amount', 1700), ('name', 25)], [('10', '1.50', 'x')])
+        psycopg2.connect.return_value.cursor.return_value = named_cursor
+        with patch.dict('sys.modules', {'psycopg2': psycopg2, 'psycopg2.extensions': psycopg2.extensions}):
+            adapter = PostgreSQLAdapter()
+            adapter.connect(host='localhost', user='postgres', password='pw', database='test')
+            cursor = adapter.execute_text_query("SELECT id, amount, name FROM t", 100, native_columns=['id'])
+            row = cursor.fetchmany(100)[0]
+            self.assertEqual(row, (10, '1.50', 'x'))
+            self.assertEqual(cursor.decode_row(row), (10, Decimal('1.50'), 'x'))
+
+        oids, name, caster = psycopg2.extensions.new_type.call_args[0]
+        self.assertIn(1700, oids)
+        self.assertNotIn(25, oids)
+        self.assertEqual(caster('1.50', named_cursor), '1.50')
+        psycopg2.extensions.register_type.assert_called_once_with(psycopg2.extensions.new_type.return_value,
+                                                                  named_cursor)
+
+
+class TestTextComparison(unittest.TestCase):
+    """测试按文本对比时只转换差异行"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        conn = sqlite3.connect(self.db_path)
+        # 用TEXT列模拟数据库以文本形式返回的DECIMAL值
+        conn.execute('CREATE TABLE price1 (id INTEGER PRIMARY KEY, amount TEXT)')
+        conn.execute('CREATE TABLE price2 (id INTEGER PRIMARY KEY, amount TEXT)')
+        conn.executemany("INSERT INTO price1 VALUES (?, ?)", [(1, '1.50'), (2, '2.00'), (3, '3.00')])
+        conn.executemany("INSERT INTO price2 VALUES (?, ?)", [(1, '1.500'), (2, '2.01'), (4, '4.000')])
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+
+    def test_differences_decoded_before_reporting(self):
+        """测试文本不同但值相同的行不报告差异，报告中的值为转换后的Python值"""
+        decode_calls = []
+
+        def make_decoders(description):
+            # 对比字段的顺序与公共字段的集合顺序有关，按列名选择转换函数
+            return [TEXT_VALUE_DECODERS['number'] if column[0] == 'amount' else None for column in description]
+
+        def execute_text_query(query, fetch_size=None, native_columns=()):
+            cursor = _TextRowCursor(self.adapter.execute_query(query, fetch_size), make_decoders, native_columns)
+            decode_row = cursor.decode_row
+            cursor.decode_row = lambda row: decode_calls.append(row) or decode_row(row)
+            return cursor
+
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('price1', 'price2')
+        with patch.object(self.adapter, 'execute_text_query', side_effect=execute_text_query):
+            result = comparator.compare()
+
+        differences = {diff['key']['id']: diff for diff in result['row_differences']}
+        self.assertEqual(sorted(differences), [2, 3, 4])
+        self.assertEqual(differences[2]['differences'][0]['table2_value'], Decimal('2.01'))
+        self.assertEqual(differences[4]['differences'][1]['table2_value'], Decimal('4.000'))
+        # 相同的行不转换，文本不同的行（1和2）和只在一侧存在的行（3和4）才转换
+        self.assertEqual(len(decode_calls), 6)
+
+        comparator.set_text_output_mode(False)
+        result = comparator.compare()
+        self.assertEqual(result['row_difference_count'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
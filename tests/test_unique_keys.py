@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from unittest.mock import Mock, patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    _unique_keys_from_rows,
+    run_comparison
+)
+
+
+class TestUniqueKeyDiscovery(unittest.TestCase):
+    """测试读取表的非空唯一索引"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''CREATE TABLE account (
+            region TEXT NOT NULL, code TEXT NOT NULL, email TEXT UNIQUE, serial INTEGER NOT NULL,
+            name TEXT, UNIQUE (region, code))''')
+        conn.execute('CREATE UNIQUE INDEX account_serial ON account (serial)')
+        conn.execute('CREATE UNIQUE INDEX account_name ON account (name) WHERE name IS NOT NULL')
+        conn.execute('CREATE UNIQUE INDEX account_lower ON account (lower(code), region)')
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+
+    def test_sqlite_unique_keys(self):
+        """测试只返回所有列都为NOT NULL的唯一索引，不含部分索引和表达式索引"""
+        self.assertEqual(sorted(self.adapter.get_unique_keys('account')), [['region', 'code'], ['serial']])
+
+    def test_mysql_show_index(self):
+        """测试MySQL按SHOW INDEX的Null列排除可为空的唯一索引"""
+        mock_connector = Mock()
+        cursor = mock_connector.connect.return_value.cursor.return_value
+        cursor.fetchall.return_value = [
+            ('t', 0, 'uk_code', 1, 'region', 'A', 10, None, None, '', 'BTREE'),
+            ('t', 0, 'uk_code', 2, 'code', 'A', 10, None, None, '', 'BTREE'),
+            ('t', 0, 'uk_email', 1, 'email', 'A', 10, None, None, 'YES', 'BTREE'),
+            ('t', 0, 'uk_expr', 1, None, 'A', 10, None, None, '', 'BTREE'),
+        ]
+        mock_mysql = Mock()
+        mock_mysql.connector = mock_connector
+        with patch.dict('sys.modules', {'mysql': mock_mysql, 'mysql.connector': mock_connector}):
+            adapter = MySQLAdapter()
+            adapter.connect(host='localhost', user='root', password='pw', database='test')
+            self.assertEqual(adapter.get_unique_keys('t'), [['region', 'code']])
+        self.assertIn('Non_unique = 0', cursor.execute.call_args[0][0])
+
+    def test_unique_keys_from_rows(self):
+        """测试包含可为空列或表达式列的索引被排除，字段相同的索引只返回一次"""
+        rows = [('a', 'x', True), ('a', 'y', True), ('b', 'x', True), ('b', 'z', False),
+                ('c', None, True), ('d', 'x', True), ('d', 'y', True)]
+        self.assertEqual(_unique_keys_from_rows(rows), [['x', 'y']])
+
+
+class TestUniqueKeyComparison(unittest.TestCase):
+    """测试没有主键的表使用唯一索引按主键对比"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE legacy1 (code TEXT NOT NULL UNIQUE, batch INTEGER NOT NULL, '
+                     'seq INTEGER NOT NULL, amount INTEGER, UNIQUE (batch, seq))')
+        conn.execute('CREATE TABLE legacy2 (code TEXT NOT NULL, batch INTEGER NOT NULL, '
+                     'seq INTEGER NOT NULL, amount INTEGER, UNIQUE (seq, batch))')
+        rows = [(f"c{i:03d}", i // 10, i % 10, i) for i in range(100)]
+        # 表2按相反顺序插入，删除一行，修改一行，新增一行
+        rows2 = [row for row in reversed(rows) if row[0] != 'c050']
+        rows2 = [(code, batch, seq, -1 if code == 'c020' else amount) for code, batch, seq, amount in rows2]
+        rows2.insert(10, ('new', 99, 0, 0))
+        conn.executemany("INSERT INTO legacy1 VALUES (?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO legacy2 VALUES (?, ?, ?, ?)", rows2)
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+
+    def test_common_unique_index_as_match_key(self):
+        """测试使用两侧字段相同的唯一索引（按表1中的顺序）排序和匹配，行顺序不同不影响结果"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('legacy1', 'legacy2')
+        self.assertEqual(comparator.get_unique_match_key(), ['batch', 'seq'])
+        self.assertEqual(comparator.get_primary_keys('legacy2', 2), ['batch', 'seq'])
+        self.assertIn('ORDER BY batch, seq', comparator.build_query(['code', 'amount'], 'legacy2', 2))
+
+        result = comparator.compare()
+        differences = {(diff['type'], diff['key']['batch'], diff['key']['seq']) for diff in result['row_differences']}
+        self.assertEqual(differences, {('different_data', 2, 0), ('only_in_table1', 5, 0), ('only_in_table2', 99, 0)})
+
+        # 不使用唯一索引时按位置对比，行顺序不同使几乎所有行都不同
+        comparator.set_unique_key_mode(False)
+        self.assertEqual(comparator.get_primary_keys('legacy2', 2), [])
+        self.assertGreater(comparator.compare()['row_difference_count'], 90)
+
+    def test_narrowest_key_and_primary_key_side(self):
+        """测试有多个共同的唯一索引时选择字段最少的，一侧有主键时与另一侧的唯一索引匹配"""
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('legacy1', 'legacy2')
+        comparator.metadata.get_unique_keys = Mock(side_effect=[[['batch', 'seq'], ['code']],
+                                                                [['seq', 'batch'], ['code']]])
+        self.assertEqual(comparator.get_unique_match_key(), ['code'])
+
+        comparator.metadata.get_primary_keys = Mock(side_effect=lambda db, table: ['seq', 'batch']
+                                                    if table == 'legacy1' else [])
+        comparator.metadata.get_unique_keys = Mock(return_value=[['code'], ['batch', 'seq']])
+        self.assertEqual(comparator.get_primary_keys('legacy2', 2), ['seq', 'batch'])
+
+        # 读取唯一索引失败时按没有唯一索引处理
+        comparator.metadata.get_primary_keys = Mock(return_value=[])
+        comparator.metadata.get_unique_keys = Mock(side_effect=RuntimeError('permission denied'))
+        self.assertEqual(comparator.get_unique_match_key(), [])
+
+    def test_run_comparison_unique_keys(self):
+        """测试run_comparison支持unique_keys参数"""
+        kwargs = dict(source_db_type='sqlite', source_db_path=self.db_path, table1='legacy1', table2='legacy2')
+        self.assertEqual(run_comparison(**kwargs)['row_difference_count'], 3)
+        self.assertGreater(run_comparison(unique_keys=False, **kwargs)['row_difference_count'], 90)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    PostgreSQLAdapter,
+    OracleAdapter,
+    MSSQLAdapter
+)
+
+
+class TestValueNormalization(unittest.TestCase):
+    """测试按列类型归一化后对比跨数据库的值"""
+
+    def _comparator(self, description1, description2, db1=None, db2=None):
+        comparator = TableComparator(db1 or MySQLAdapter(), db2 or PostgreSQLAdapter())
+        comparator._prepare_row_comparator(description1, description2, [column[0] for column in description1])
+        return comparator
+
+    def test_cross_database_values(self):
+        """测试MySQL与PostgreSQL之间数值、定长字符、二进制和时间的对比"""
+        fields = ['amount', 'code', 'payload', 'created', 'day']
+        description1 = [('amount', 246), ('code', 254), ('payload', 252), ('created', 12), ('day', 10)]
+        description2 = [('amount', 701), ('code', 1042), ('payload', 17), ('created', 1184), ('day', 1114)]
+        comparator = self._comparator(description1, description2)
+
+        row1 = (Decimal('1.50'), 'ab', bytearray(b'\x00\x01'), datetime(2024, 1, 1, 8, 0), date(2024, 1, 2))
+        row2 = (1.5, 'ab   ', memoryview(b'\x00\x01'),
+                datetime(2024, 1, 1, 16, 0, tzinfo=timezone(timedelta(hours=8))), datetime(2024, 1, 2))
+        self.assertIsNone(comparator._compare_single_row(row1, row2, 1, fields))
+
+        # 归一化后仍不同的值照常报告原始值
+        row2 = (Decimal('0.1'), 'abc', b'\x00\x01', datetime(2024, 1, 1, 8, 0), date(2024, 1, 2))
+        row_diff = comparator._compare_single_row((0.10000001, 'ab', b'\x00\x01', row1[3], row1[4]),
+                                                  row2, 1, fields)
+        self.assertEqual([diff['field'] for diff in row_diff['differences']], ['amount', 'code'])
+        self.assertEqual(row_diff['differences'][1]['table2_value'], 'abc')
+
+    def test_same_type_columns_compare_raw_values(self):
+        """测试同一种数据库中类型相同的列不做归一化，定长字符列仍去掉尾部空格"""
+        description = [('name', 1043), ('code', 1042), ('amount', 1700)]
+        comparator = self._comparator(description, description, PostgreSQLAdapter(), PostgreSQLAdapter())
+        self.assertEqual(sorted(comparator._build_value_normalizers(description, description)), [1])
+        row_diff = comparator._compare_single_row(('a ', 'b ', 1), ('a', 'b', 1), 1, ['name', 'code', 'amount'])
+        self.assertEqual([diff['field'] for diff in row_diff['differences']], ['name'])
+
+    def test_column_kinds(self):
+        """测试各数据库驱动的类型代码对应的值类别"""
+        self.assertEqual(MySQLAdapter().column_kind(246), 'number')
+        self.assertEqual(PostgreSQLAdapter().column_kind(1184), 'datetime')
+        self.assertEqual(MSSQLAdapter().column_kind(2), 'binary')
+        oracle = OracleAdapter()
+        self.assertEqual(oracle.column_kind(SimpleNamespace(name='DB_TYPE_CHAR')), 'char')
+        self.assertEqual(oracle.column_kind(SimpleNamespace(name='DB_TYPE_TIMESTAMP_TZ')), 'datetime')
+        self.assertEqual(oracle.column_kind(Decimal), 'number')
+        self.assertIsNone(SQLiteAdapter().column_kind(None))
+
+    def test_normalizers_built_once_per_comparison(self):
+        """测试每次对比只根据游标类型生成一次归一化函数"""
+        temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        temp_db.close()
+        conn = sqlite3.connect(temp_db.name)
+        conn.execute('CREATE TABLE fixed1 (id INTEGER PRIMARY KEY, code TEXT)')
+        conn.execute('CREATE TABLE fixed2 (id INTEGER PRIMARY KEY, code TEXT)')
+        conn.executemany("INSERT INTO fixed1 VALUES (?, ?)", [(1, 'a  '), (2, 'b  '), (3, 'c')])
+        conn.executemany("INSERT INTO fixed2 VALUES (?, ?)", [(1, 'a'), (2, 'x'), (3, 'c')])
+        conn.commit()
+        conn.close()
+        adapter = SQLiteAdapter()
+        adapter.connect(db_path=temp_db.name)
+        try:
+            comparator = TableComparator(adapter)
+            comparator.set_tables('fixed1', 'fixed2')
+            # SQLite游标不提供类型代码，这里模拟定长字符列
+            with patch.object(adapter, 'column_kind', return_value='char') as kind_mock:
+                result = comparator.compare()
+            self.assertEqual(kind_mock.call_count, 4)
+            self.assertEqual(result['row_difference_count'], 1)
+            self.assertEqual(result['row_differences'][0]['key'], {'id': 2})
+
+            # SQLite两侧类型代码相同，默认按原始值对比
+            result = comparator.compare()
+            self.assertEqual(result['row_difference_count'], 2)
+        finally:
+            adapter.close()
+            os.unlink(temp_db.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import sqlite3
+import os
+import sys
+import json
+import tempfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+# 添加上级目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 导入主模块
+from table_diff import (
+    TableComparator,
+    SQLiteAdapter,
+    MySQLAdapter,
+    MSSQLAdapter,
+    run_comparison
+)
+
+
+class TestWatermarkLiteral(unittest.TestCase):
+    """测试水位线值转换为SQL字面量"""
+
+    def test_literals(self):
+        """测试数值、字符串、时间和二进制水位线的字面量"""
+        mysql = MySQLAdapter()
+        self.assertEqual(mysql.watermark_literal(42), '42')
+        self.assertEqual(mysql.watermark_literal(Decimal('1.50')), '1.50')
+        self.assertEqual(mysql.watermark_literal("it's"), "'it''s'")
+        self.assertEqual(mysql.watermark_literal(datetime(2024, 1, 2, 3, 4, 5, 6)),
+                         "TIMESTAMP '2024-01-02 03:04:05.000006'")
+        self.assertEqual(mysql.watermark_literal(datetime(2024, 1, 2, tzinfo=timezone.utc)),
+                         "TIMESTAMP WITH TIME ZONE '2024-01-02 00:00:00+00:00'")
+        self.assertEqual(mysql.watermark_literal(date(2024, 1, 2)), "DATE '2024-01-02'")
+        with self.assertRaises(ValueError):
+            mysql.watermark_literal(b'\x00')
+
+        mssql = MSSQLAdapter()
+        self.assertEqual(mssql.watermark_literal(b'\x00\x00\x00\x00\x00\x00\x07\xd1'), '0x00000000000007D1')
+        self.assertEqual(mssql.watermark_literal(datetime(2024, 1, 2, 3, 4, 5)),
+                         "CAST('2024-01-02 03:04:05' AS DATETIME2)")
+        self.assertEqual(SQLiteAdapter().watermark_literal(datetime(2024, 1, 2, 3, 4, 5)), "'2024-01-02 03:04:05'")
+
+
+class TestWatermarkComparison(unittest.TestCase):
+    """测试按水位线只对比上次对比以来变化的行"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db_path = self.temp_db.name
+        self.state_file = self.db_path + '.state.json'
+        conn = sqlite3.connect(self.db_path)
+        for table in ('order1', 'order2'):
+            conn.execute(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, amount INTEGER, version INTEGER NOT NULL)')
+            conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?)", [(i, i * 10, i) for i in range(1, 201)])
+        conn.execute("UPDATE order2 SET amount = -1, version = 201 WHERE id = 7")
+        conn.commit()
+        conn.close()
+        self.adapter = SQLiteAdapter()
+        self.adapter.connect(db_path=self.db_path)
+
+    def tearDown(self):
+        self.adapter.close()
+        os.unlink(self.db_path)
+        if os.path.exists(self.state_file):
+            os.unlink(self.state_file)
+
+    def _compare(self, fields=None):
+        comparator = TableComparator(self.adapter)
+        comparator.set_tables('order1', 'order2')
+        comparator.set_watermark('version', self.state_file)
+        comparator.key_hash_batch_size = 2
+        if fields:
+            comparator.set_fields(fields)
+        else:
+            comparator.set_exclude_fields(['version'])
+        return comparator.compare()
+
+    def _summary(self, result):
+        return sorted((diff['type'], diff['key']['id']) for diff in result['row_differences'])
+
+    def test_incremental_runs(self):
+        """测试第一次全量对比并保存水位线，之后只按主键对比任一侧变化的行和上次仍然不同的行"""
+        result = self._compare()
+        self.assertEqual((result['table1_row_count'], result['table2_row_count']), (200, 200))
+        self.assertNotIn('changed_row_count', result)
+        self.assertEqual(self._summary(result), [('different_data', 7)])
+        with open(self.state_file, encoding='utf-8') as f:
+            state = list(json.load(f).values())[0]
+        self.assertEqual((state['table1'], state['table2'], state['pending_keys']), ('200', '201', [[7]]))
+
+        # 没有变化时只检查水位线列等于上次最大值的行和上次仍然不同的行，id=7的差异再次报告
+        result = self._compare()
+        self.assertEqual(result['changed_row_count'], 2)
+        self.assertEqual(self._summary(result), [('different_data', 7)])
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE order1 SET amount = 0, version = 300 WHERE id = 20")
+        conn.execute("UPDATE order2 SET amount = 30, version = 300 WHERE id = 3")
+        conn.execute("UPDATE order2 SET amount = 31, version = 300 WHERE id = 4")
+        conn.execute("INSERT INTO order1 VALUES (500, 1, 300)")
+        conn.execute("INSERT INTO order2 VALUES (501, 1, 300)")
+        # 与上次水位线相同的值（如按秒记录的时间戳）也会被检查
+        conn.execute("UPDATE order1 SET amount = 0 WHERE id = 200")
+        conn.commit()
+        conn.close()
+
+        result = self._compare()
+        self.assertEqual(result['changed_row_count'], 7)
+        self.assertIsNone(result['table1_row_count'])
+        # 只在表2中修改后两侧相同的行不报告
+        self.assertEqual(self._summary(result), [('different_data', 4), ('different_data', 7), ('different_data', 20),
+                                                 ('different_data', 200), ('only_in_table1', 500),
+                                                 ('only_in_table2', 501)])
+
+        # 修复后的行不再保存
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE order2 SET amount = 70 WHERE id = 7")
+        conn.commit()
+        conn.close()
+        self.assertNotIn(('different_data', 7), self._summary(self._compare()))
+        with open(self.state_file, encoding='utf-8') as f:
+            state = list(json.load(f).values())[0]
+        self.assertEqual(sorted(state['pending_keys']), [[4], [20], [200], [500], [501]])
+
+        # 对比字段变化后重新全量对比
+        result = self._compare(['id', 'amount', 'version'])
+        self.assertNotIn('changed_row_count', result)
+        self.assertEqual(result['row_difference_count'], 7)
+
+    def test_run_comparison_with_watermark(self):
+        """测试run_comparison支持watermark参数"""
+        kwargs = dict(source_db_type='sqlite', source_db_path=self.db_path, table1='order1', table2='order2',
+                      exclude=['version'], watermark='version', watermark_state=self.state_file)
+        self.assertEqual(run_comparison(**kwargs)['row_difference_count'], 1)
+        result = run_comparison(**kwargs)
+        self.assertEqual((result['changed_row_count'], result['row_difference_count']), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()